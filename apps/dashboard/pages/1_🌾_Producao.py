@@ -10,14 +10,34 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
 DB_PATH = os.path.join(project_root, "farmtech.db")
 
+# Celulas do cubo (cultura x ano x mes) mantido pelo banco; sem varrer producao_agricola
+CUBE_QUERY = """
+SELECT c.nome_cultura, k.ano, k.mes, k.registros,
+       k.quantidade AS quantidade_produzida, k.valor AS valor_estimado, k.area AS area_plantada
+FROM cubo_producao k
+JOIN culturas c ON k.id_cultura = c.id_cultura
+"""
+
+# Bancos anteriores ao cubo: mesma forma agregada direto da tabela de fatos
+FACT_QUERY = """
+SELECT c.nome_cultura,
+       COALESCE(CAST(strftime('%Y', p.data_colheita) AS INTEGER), 0) AS ano,
+       COALESCE(CAST(strftime('%m', p.data_colheita) AS INTEGER), 0) AS mes,
+       COUNT(*) AS registros,
+       SUM(p.quantidade_produzida) AS quantidade_produzida,
+       SUM(p.valor_estimado) AS valor_estimado,
+       SUM(p.area_plantada) AS area_plantada
+FROM producao_agricola p
+JOIN culturas c ON p.id_cultura = c.id_cultura
+GROUP BY 1, 2, 3
+"""
+
 def get_data():
     conn = sqlite3.connect(DB_PATH)
-    query = """
-    SELECT p.id_producao, c.nome_cultura, p.quantidade_produzida, p.data_colheita, p.valor_estimado, p.area_plantada
-    FROM producao_agricola p
-    JOIN culturas c ON p.id_cultura = c.id_cultura
-    """
-    df = pd.read_sql_query(query, conn)
+    try:
+        df = pd.read_sql_query(CUBE_QUERY, conn)
+    except Exception:
+        df = pd.read_sql_query(FACT_QUERY, conn)
     conn.close()
     return df
 
@@ -43,24 +63,26 @@ try:
         st.markdown("---")
         
         # Charts
+        por_cultura = df.groupby('nome_cultura', as_index=False)[['quantidade_produzida', 'valor_estimado']].sum()
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("Produção por Cultura")
-            fig_bar = px.bar(df, x='nome_cultura', y='quantidade_produzida', color='nome_cultura', 
+            fig_bar = px.bar(por_cultura, x='nome_cultura', y='quantidade_produzida', color='nome_cultura', 
                              title="Toneladas por Cultura", template="plotly_white")
             st.plotly_chart(fig_bar, use_container_width=True)
             
         with col2:
             st.subheader("Distribuição de Valor")
-            fig_pie = px.pie(df, values='valor_estimado', names='nome_cultura', 
+            fig_pie = px.pie(por_cultura, values='valor_estimado', names='nome_cultura', 
                              title="Share de Valor Estimado", template="plotly_white")
             st.plotly_chart(fig_pie, use_container_width=True)
             
-        # Time Series
+        # Time Series (mes de colheita; celulas sem data ficam de fora)
         st.subheader("Histórico de Colheitas")
-        df['data_colheita'] = pd.to_datetime(df['data_colheita'])
-        df_sorted = df.sort_values('data_colheita')
+        df_tempo = df[df['ano'] > 0].copy()
+        df_tempo['data_colheita'] = pd.to_datetime(dict(year=df_tempo['ano'], month=df_tempo['mes'], day=1))
+        df_sorted = df_tempo.sort_values('data_colheita')
         fig_line = px.line(df_sorted, x='data_colheita', y='quantidade_produzida', color='nome_cultura',
                            markers=True, title="Evolução da Produção no Tempo")
         st.plotly_chart(fig_line, use_container_width=True)
@@ -0,0 +1,135 @@
+"""
+Benchmark do pipeline de alertas (AlertsService -> AWSService) por transporte
+
+Executa milhares de alertas ponta a ponta contra um banco SQLite temporario e
+mede vazao e percentis de latencia (p50/p95/p99) para cada transporte:
+  fake  - clientes em memoria (latencia de rede simulada com --latency-ms)
+  file  - grava emails .eml e chamadas .jsonl em disco
+  boto3 - AWS real (requer credenciais; envia mensagens de verdade!)
+
+Uso:
+  python scripts/benchmark_alerts.py --alerts 2000 --transports fake,file
+  python scripts/benchmark_alerts.py --alerts 2000 --latency-ms 40 --async
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import structlog
+
+from services.core.alerts.dispatcher import NotificationDispatcher
+from services.core.alerts.service import AlertsService
+from services.core.aws_integration.service import AWSService
+from services.core.aws_integration.transports import Boto3Transport, FakeTransport, FileSinkTransport
+from services.core.database.service import DatabaseService
+
+SEVERIDADES = ["critica", "alta", "media", "baixa"]
+
+
+def _transport(name: str, workdir: Path, latency: float):
+    if name == "fake":
+        return FakeTransport(latency=latency, keep_calls=False)
+    if name == "file":
+        return FileSinkTransport(workdir / "sink", latency=latency)
+    return Boto3Transport()
+
+
+def run_benchmark(
+    transport_name: str,
+    alerts: int = 1000,
+    recipients: int = 5,
+    latency: float = 0.0,
+    use_dispatcher: bool = False,
+    workers: int = 8,
+) -> dict:
+    """Executa `alerts` notificacoes e devolve vazao e percentis de latencia (ms)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        db = DatabaseService(f"sqlite:///{workdir / 'bench.db'}")
+        db.create_tables()
+        for i in range(recipients):
+            db.create_funcionario({
+                "nome": f"Funcionario {i}",
+                "email": f"func{i}@farmtech.com",
+                "telefone": f"+55119{i:08d}",
+                "cargo": "Operador",
+                "recebe_sms": i % 2 == 0,
+                "alertas_medios": True,
+                "alertas_baixos": True,
+            })
+
+        transport = _transport(transport_name, workdir, latency)
+        aws = AWSService(transport=transport)
+        dispatcher = None
+        if use_dispatcher:
+            dispatcher = NotificationDispatcher(db, aws, max_workers=workers, rates={"email": 0, "sms": 0})
+
+        latencies = []
+        start = time.perf_counter()
+        with db.get_session() as session:
+            service = AlertsService(session, db, aws, dispatcher)
+            for i in range(alerts):
+                t0 = time.perf_counter()
+                service.send_alert_notification(
+                    titulo=f"Alerta de carga {i}",
+                    mensagem="Umidade do solo abaixo do limite",
+                    severidade=SEVERIDADES[i % len(SEVERIDADES)],
+                    origem="benchmark",
+                    alert_type="umidade_critica_baixa",
+                )
+                latencies.append(time.perf_counter() - t0)
+        ingest_elapsed = time.perf_counter() - start
+
+        if dispatcher:
+            dispatcher.drain(timeout=600)
+            dispatcher.stop()
+        aws.flush_telemetry()
+        total_elapsed = time.perf_counter() - start
+
+        ms = np.asarray(latencies) * 1000
+        return {
+            "transport": transport_name,
+            "mode": "async" if use_dispatcher else "sync",
+            "alerts": alerts,
+            "throughput": alerts / total_elapsed,
+            "ingest_throughput": alerts / ingest_elapsed,
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "api_calls": sum(getattr(transport, "counts", {}).values()),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de alertas")
+    parser.add_argument("--alerts", type=int, default=1000)
+    parser.add_argument("--recipients", type=int, default=5)
+    parser.add_argument("--transports", default="fake,file", help="lista separada por virgula: fake,file,boto3")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latencia simulada por chamada (fake/file)")
+    parser.add_argument("--async", dest="use_dispatcher", action="store_true", help="entrega via outbox + dispatcher")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    # Logs por alerta distorcem a medicao
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(40))
+
+    print(f"{'transport':<10}{'mode':<7}{'alerts':>8}{'alerts/s':>11}{'ingest/s':>11}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls':>8}")
+    for name in [t.strip() for t in args.transports.split(",") if t.strip()]:
+        r = run_benchmark(
+            name, args.alerts, args.recipients, args.latency_ms / 1000, args.use_dispatcher, args.workers
+        )
+        print(f"{r['transport']:<10}{r['mode']:<7}{r['alerts']:>8}{r['throughput']:>11.1f}"
+              f"{r['ingest_throughput']:>11.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['api_calls']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark dos caminhos de leitura: entidades ORM x modelos de leitura (Core)
+
+Popula um banco SQLite temporario com N leituras e N alertas e mede, para cada
+tamanho, o tempo de ler tudo pelo ORM (get_readings/get_alerts: identity map,
+expunge e Decimal) e pela projecao do Core (db.reads: float, __slots__).
+
+Uso:
+  python scripts/benchmark_read_paths.py --rows 10000,100000 --repeat 3
+"""
+import argparse
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import structlog
+
+from services.core.database.models import Alert, LeituraSensor, Sensor, Talhao, TipoSensor
+from services.core.database.service import DatabaseService
+
+START = datetime(2024, 1, 1)
+
+
+def _populate(db: DatabaseService, rows: int) -> None:
+    rng = np.random.default_rng(7)
+    with db.get_session() as session:
+        session.add(TipoSensor(id_tipo_sensor=1, nome_tipo_sensor="Umidade", unidade_medida_padrao="%"))
+        session.add(Talhao(id_talhao=1, nome_talhao="T1", area_hectares=1))
+        session.flush()
+        session.add(Sensor(id_sensor=1, identificacao_fabricante="S1",
+                           data_instalacao=date(2024, 1, 1), id_tipo_sensor=1, id_talhao=1))
+    umidade = rng.uniform(10, 60, rows).round(2)
+    ph = rng.uniform(5, 8, rows).round(2)
+    with db.engine.begin() as conn:
+        conn.execute(LeituraSensor.__table__.insert(), [
+            {
+                "data_hora_leitura": START + timedelta(minutes=i), "id_sensor": 1,
+                "valor_umidade": float(umidade[i]), "valor_ph": float(ph[i]),
+                "valor_fosforo_p": 1.0, "valor_potassio_k": 0.0, "temperatura": 25.5,
+                "bomba_ligada": bool(i % 2),
+            }
+            for i in range(rows)
+        ])
+        conn.execute(Alert.__table__.insert(), [
+            {
+                "titulo": f"Alerta {i}", "mensagem": "Umidade do solo abaixo do limite",
+                "severidade": "media", "origem": "benchmark", "data_hora": START + timedelta(seconds=i),
+            }
+            for i in range(rows)
+        ])
+
+
+def _best(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def run_benchmark(rows: int, repeat: int = 3) -> list:
+    """Tempo (melhor de `repeat`) de cada caminho de leitura para `rows` linhas."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseService(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        db.create_tables()
+        _populate(db, rows)
+
+        cases = [
+            ("readings", lambda: db.get_readings(limit=rows), lambda: db.reads.readings(limit=rows)),
+            ("alerts", lambda: db.get_alerts(limit=rows), lambda: db.reads.alerts(limit=rows)),
+        ]
+        results = []
+        for name, orm_path, core_path in cases:
+            orm = _best(orm_path, repeat)
+            core = _best(core_path, repeat)
+            results.append({"path": name, "rows": rows, "orm_s": orm, "core_s": core, "speedup": orm / core})
+        db.engine.dispose()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ORM x modelos de leitura")
+    parser.add_argument("--rows", default="10000,100000", help="tamanhos separados por virgula")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Logs por consulta distorcem a medicao
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(40))
+
+    print(f"{'path':<10}{'rows':>9}{'orm s':>10}{'core s':>10}{'rows/s core':>14}{'speedup':>9}")
+    for rows in [int(n) for n in args.rows.split(",") if n.strip()]:
+        for r in run_benchmark(rows, args.repeat):
+            print(f"{r['path']:<10}{r['rows']:>9}{r['orm_s']:>10.3f}{r['core_s']:>10.3f}"
+                  f"{r['rows'] / r['core_s']:>14.0f}{r['speedup']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
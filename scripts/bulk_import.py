@@ -0,0 +1,69 @@
+"""
+Importacao em massa de producao, insumos e leituras (CSV ou NDJSON)
+
+Le o arquivo em lotes, resolve culturas/sensores por dicionario e grava com
+upsert do Core: reexecutar com o mesmo arquivo nao duplica linhas.
+
+Colunas aceitas:
+  producao - cultura|id_cultura, area|area_plantada, insumo|quantidade_produzida,
+             custo_estimado|valor_estimado, data_registro|data_colheita
+  insumos  - cultura|id_cultura, coef_insumo_por_m2, custo_por_m2
+  leituras - data_hora_leitura|timestamp, id_sensor|identificacao_fabricante,
+             valor_umidade, valor_ph, valor_fosforo_p, valor_potassio_k,
+             temperatura, precipitacao_mm, bomba_ligada, decisao_logica_esp32
+
+Uso:
+  python scripts/bulk_import.py producao dados_fase1.csv --derive-insumos
+  python scripts/bulk_import.py leituras dump_sensores.ndjson --chunk 50000 --fast-pragmas
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import structlog
+
+from services.core.database.bulk_import import KINDS, BulkImporter
+from services.core.database.service import DatabaseService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importacao em massa para o banco consolidado")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///./farmtech.db"))
+    parser.add_argument("--chunk", type=int, default=int(os.getenv("IMPORT_CHUNK_ROWS", 20000)),
+                        help="linhas por lote/transacao")
+    parser.add_argument("--fast-pragmas", action="store_true",
+                        help="SQLite: synchronous=OFF e cache maior durante a importacao")
+    parser.add_argument("--derive-insumos", action="store_true",
+                        help="producao: recalcula coeficientes de insumo por cultura")
+    args = parser.parse_args()
+
+    if not args.path.exists():
+        raise SystemExit(f"Arquivo nao encontrado: {args.path}")
+
+    # Logs por lote distorcem a medicao
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(30))
+
+    db = DatabaseService(args.database_url)
+    db.create_tables()
+    importer = BulkImporter(db, chunk_size=args.chunk, fast_pragmas=args.fast_pragmas)
+
+    def progress(report):
+        print(f"\r   {report.read:>10} linhas  {report.rows_per_second:>10.0f} linhas/s", end="", flush=True)
+
+    report = importer.import_file(args.kind, args.path, derive_insumos=args.derive_insumos, progress=progress)
+    print()
+    print(f"Importacao de {report.kind} concluida:")
+    print(f"   - Lidas: {report.read}")
+    print(f"   - Gravadas (inseridas ou atualizadas): {report.written}")
+    print(f"   - Rejeitadas: {report.rejected}")
+    print(f"   - Tempo: {report.elapsed:.2f}s ({report.rows_per_second:.0f} linhas/s)")
+
+
+if __name__ == "__main__":
+    main()
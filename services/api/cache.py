@@ -0,0 +1,174 @@
+"""
+Cache de respostas da API - Fase 7
+Endpoints de leitura consultados em polling pelo dashboard (overview, culturas,
+modelos, acoes) tem o JSON serializado guardado em memoria com TTL, limite de
+entradas e de bytes (LRU). Cada resposta leva ETag e Cache-Control; um
+If-None-Match igual devolve 304 sem corpo. Entradas marcadas com tabelas sao
+descartadas pelos hooks de alteracao do DatabaseService; o TTL cobre o que o
+banco nao avisa (APIs externas, arquivos em disco, outros workers).
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional
+
+import structlog
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    expires: float
+    tables: FrozenSet[str]
+
+
+def _serialize(content: Any) -> bytes:
+    # Mesmo formato do JSONResponse do FastAPI
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCache:
+    """LRU em processo com TTL por entrada e invalidacao por tabela"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, enabled: bool = True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        import os
+
+        return cls(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 256)),
+            max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", 32)) * 1024 * 1024),
+            enabled=os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1",
+        )
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= now:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, key: str, body: bytes, ttl: float, tables: Iterable[str] = (),
+            generation: Optional[int] = None) -> CachedResponse:
+        """
+        Guarda o corpo serializado. Se houve invalidacao desde `generation`
+        (resposta montada durante uma escrita), a entrada nao e guardada.
+        """
+        entry = CachedResponse(
+            body=body,
+            etag=_etag(body),
+            expires=time.monotonic() + ttl,
+            tables=frozenset(tables),
+        )
+        if not self.enabled or ttl <= 0 or len(body) > self.max_bytes // 4:
+            return entry
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return entry
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+        return entry
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def invalidate(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Descarta entradas que dependem de `tables` (todas, se None); usado como change listener."""
+        with self._lock:
+            self._generation += 1
+            if tables is None:
+                keys = list(self._entries)
+            else:
+                changed = set(tables)
+                keys = [k for k, e in self._entries.items() if e.tables & changed]
+            for key in keys:
+                self._drop(key)
+            self.counters["invalidations"] += len(keys)
+        if keys:
+            logger.debug("response_cache_invalidated", tables=sorted(tables) if tables else None, entries=len(keys))
+        return len(keys)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries), "bytes": self._bytes, "enabled": self.enabled}
+
+
+def cached_json(
+    request: Request,
+    build: Callable[[], Any],
+    ttl: float = 30.0,
+    tables: Iterable[str] = (),
+    max_age: int = 0,
+    key: Optional[str] = None,
+) -> Response:
+    """
+    Resposta JSON de `build()` servida do cache de app.state.response_cache
+    (chave: caminho + query string). max_age=0 obriga o cliente a revalidar
+    (If-None-Match -> 304); acima disso o navegador reutiliza sem perguntar.
+    """
+    cache: Optional[ResponseCache] = getattr(request.app.state, "response_cache", None)
+    key = key or f"{request.url.path}?{request.url.query}"
+    headers = {"Cache-Control": f"max-age={max_age}" if max_age else "no-cache"}
+
+    entry = cache.get(key) if cache else None
+    if entry is None:
+        generation = cache.generation() if cache else None
+        body = _serialize(build())
+        if cache:
+            entry = cache.put(key, body, ttl, tables, generation)
+        else:
+            entry = CachedResponse(body, _etag(body), 0.0, frozenset())
+
+    headers["ETag"] = entry.etag
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        if cache:
+            cache.counters["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -60,14 +60,15 @@ def _resolve_static_images_dir() -> Path | None:
     # Prefer amostras versionadas no repositorio
     candidates.append(project_root / "models" / "cv_samples")
     # Pasta legada (caso tenha sido baixada separadamente)
-    candidates.append(
-        project_root.parents[2]
-        / "Fase 6 - 2025"
-        / "Cap 1 - Despertar da rede neural"
-        / "Imagens para Demanda"
-        / "test"
-        / "images"
-    )
+    if len(project_root.parents) > 2:
+        candidates.append(
+            project_root.parents[2]
+            / "Fase 6 - 2025"
+            / "Cap 1 - Despertar da rede neural"
+            / "Imagens para Demanda"
+            / "test"
+            / "images"
+        )
 
     for c in candidates:
         if c.exists():
@@ -75,52 +76,112 @@ def _resolve_static_images_dir() -> Path | None:
     return None
 
 
-def _seed_cv_detections(app) -> None:
-    """Seed detections running YOLO over static images so UI is immediately real."""
+def _seed_signature(image_paths, model_id: str, confidence: float) -> str:
+    """Fingerprint of the seed inputs: image names/sizes/mtimes, model and threshold."""
+    import hashlib
+
+    digest = hashlib.sha256(f"{model_id}|{confidence:.4f}".encode("utf-8"))
+    for p in image_paths:
+        stat = p.stat()
+        digest.update(f"|{p.name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _seed_cv_detections(app, task=None, stop_event=None) -> str | None:
+    """
+    Seed detections running YOLO over static images so UI is immediately real.
+    Skips inference when the same image set/model was already seeded into this
+    database. Returns a short detail string for the readiness report.
+    """
+    import json
+    from datetime import datetime
+
     try:
         force_reset = os.getenv("CV_SEED_RESET", "1") == "1"
-        if force_reset:
-            app.state.db.reset_detections()
-        else:
+        if not force_reset:
             existing = app.state.db.get_detections(limit=1)
             if existing:
                 logger.info("cv_seed_skipped", reason="detections_already_exist")
-                return
+                return "detections_already_exist"
 
         static_dir = _resolve_static_images_dir()
         if not static_dir:
             logger.warning("cv_seed_skipped", reason="static_dir_missing")
-            return
+            return "static_dir_missing"
 
+        from services.core.cv_service.cache import DetectionCache
         from services.core.cv_service.service import CVService
 
         model_source = _resolve_model_source()
         models_dir = Path(model_source).parent if isinstance(model_source, Path) else Path("./models")
-        cv = CVService(models_dir=models_dir, model_source=model_source)
+        cv = CVService(models_dir=models_dir, model_source=model_source, cache=DetectionCache.from_env(models_dir))
 
         conf = float(os.getenv("YOLO_CONFIDENCE_THRESHOLD", 0.35))
         limit = int(os.getenv("CV_SEED_LIMIT", 60))
-        results = cv.detect_directory(static_dir, confidence=conf, limit=limit)
+        image_paths = sorted(
+            p for p in static_dir.iterdir() if p.suffix.lower() in {".jpg", ".jpeg", ".png"}
+        )[:limit]
+
+        # Mesmo conjunto de imagens + modelo ja semeado neste banco: nada a fazer
+        marker = Path(os.getenv("CV_SEED_MARKER", str(models_dir / ".cv_cache" / "seed.json")))
+        signature = _seed_signature(image_paths, cv.model_id, conf)
+        try:
+            previous = json.loads(marker.read_text(encoding="utf-8"))
+        except Exception:
+            previous = {}
+        if (
+            previous.get("signature") == signature
+            and previous.get("detections")
+            and app.state.db.count_detections(origem="seed") == previous["detections"]
+        ):
+            logger.info("cv_seed_skipped", reason="signature_unchanged", images=len(image_paths))
+            if task:
+                task.progress(len(image_paths), len(image_paths))
+            return "signature_unchanged"
+
+        app.state.db.reset_detections(origem="seed")
+        if task:
+            task.progress(0, len(image_paths))
 
         saved = 0
-        for img_path, detections in results.items():
-            ts = img_path.stat().st_mtime
-            from datetime import datetime
-
-            for d in detections:
-                det_data = {
-                    "timestamp": datetime.fromtimestamp(ts),
+        for i, img_path in enumerate(image_paths, start=1):
+            if stop_event is not None and stop_event.is_set():
+                logger.info("cv_seed_interrupted", images=i - 1, detections=saved)
+                return "interrupted"
+
+            ts = datetime.fromtimestamp(img_path.stat().st_mtime)
+            records = [
+                {
+                    "timestamp": ts,
                     "imagem_nome": img_path.name,
                     "classe": d.class_name,
                     "confianca": d.confidence,
-                    "bbox": str(d.bbox),
+                    "bbox": d.bbox,
+                    "origem": "seed",
                 }
-                app.state.db.create_detection(det_data)
-                saved += 1
-
-        logger.info("cv_seed_completed", images=len(results), detections=saved)
+                for d in cv.detect_objects(img_path, confidence=conf)
+            ]
+            if records:
+                saved += app.state.db.bulk_create_detections(records)
+            if task:
+                task.progress(i)
+
+        try:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.write_text(json.dumps({"signature": signature, "detections": saved}), encoding="utf-8")
+        except Exception as e:
+            logger.warning("cv_seed_marker_write_failed", error=str(e))
+
+        logger.info(
+            "cv_seed_completed",
+            images=len(image_paths),
+            detections=saved,
+            cache=cv.cache.stats() if cv.cache else None,
+        )
+        return None
     except Exception as e:
         logger.warning("cv_seed_failed", error=str(e))
+        raise
 
 
 @asynccontextmanager
@@ -132,11 +193,84 @@ async def lifespan(app: FastAPI):
     from services.core.database.models import Talhao, Sensor, TipoSensor
     app.state.db = DatabaseService(os.getenv("DATABASE_URL"))
     app.state.db.create_tables()
+
+    # Cache de respostas dos endpoints de leitura (descartado pelos hooks de escrita do banco)
+    from services.api.cache import ResponseCache
+    app.state.response_cache = ResponseCache.from_env()
+    app.state.db.add_change_listener(app.state.response_cache.invalidate)
     
     # Initialize AWS Service
     from services.core.aws_integration.service import AWSService
     app.state.aws = AWSService()
 
+    # Notificacoes de alertas saem por outbox + dispatcher (ingestao so enfileira)
+    app.state.dispatcher = None
+    if os.getenv("NOTIFY_ASYNC", "1") == "1":
+        from services.core.alerts.dispatcher import NotificationDispatcher
+        app.state.dispatcher = NotificationDispatcher.from_env(app.state.db, app.state.aws).start()
+
+    # Resumo de emails nao criticos por destinatario (menos chamadas SES em tempestades)
+    app.state.alert_digest = None
+    if os.getenv("NOTIFY_DIGEST_ENABLED", "0") == "1":
+        from services.core.alerts.digest import AlertDigest
+        app.state.alert_digest = AlertDigest.from_env(app.state.aws, app.state.dispatcher).start()
+
+    # Limites de alerta vem de regras_alerta (semeada com os limites padrao)
+    app.state.rule_engine = None
+    if os.getenv("ALERT_RULES_ENABLED", "1") == "1":
+        from services.core.alerts.rules import RuleEngine
+        from services.core.alerts.service import AlertsService
+        app.state.rule_engine = RuleEngine.from_env(app.state.db)
+        app.state.rule_engine.ensure_defaults(AlertsService.default_conditions())
+
+    # Estado de alertas por (sensor, tipo): so transicoes geram notificacao
+    app.state.alert_engine = None
+    if os.getenv("ALERT_STATE_ENABLED", "1") == "1":
+        from services.core.alerts.state_engine import AlertStateEngine
+        app.state.alert_engine = AlertStateEngine.from_env(app.state.db)
+        app.state.alert_engine.load()
+
+    # Deteccao online de falhas de sensor (estado persistido: sem reaquecimento no restart)
+    app.state.anomaly_detector = None
+    if os.getenv("ANOMALY_DETECTION_ENABLED", "1") == "1":
+        from services.core.analytics.streaming import StreamingAnomalyDetector
+        app.state.anomaly_detector = StreamingAnomalyDetector.from_env(app.state.db)
+        app.state.anomaly_detector.load()
+        app.state.anomaly_detector.start()
+
+    # Gateway IoT compartilhado: cada leitura ingerida passa pela logica de irrigacao,
+    # pelas regras de alerta e pelo detector de anomalias (POST /api/iot/readings)
+    from services.core.iot_gateway.service import IoTGatewayService
+    app.state.iot_gateway = IoTGatewayService(
+        app.state.db, app.state.aws,
+        anomaly_detector=app.state.anomaly_detector, rule_engine=app.state.rule_engine,
+    )
+
+    # Replay what-if do historico (resultados em cache por versao das regras e periodo)
+    from services.core.iot_gateway.replay import WhatIfReplay
+    app.state.whatif_replay = WhatIfReplay.from_env(app.state.db, app.state.rule_engine)
+
+    # Previsao do CPTEC atualizada em segundo plano (rotas leem o snapshot, nunca a rede)
+    app.state.weather = None
+    if os.getenv("WEATHER_ENABLED", "1") == "1":
+        from services.core.weather.service import WeatherService
+        app.state.weather = WeatherService.from_env()
+        app.state.weather.load()
+
+    # Regras de chuva forte/geada/seca avaliadas em lote a cada refresh da previsao
+    app.state.weather_alerts = None
+    if app.state.weather and os.getenv("WEATHER_ALERTS_ENABLED", "1") == "1":
+        from services.core.alerts.weather import WeatherAlertScheduler
+        app.state.weather_alerts = WeatherAlertScheduler.from_env(
+            app.state.db, app.state.weather, app.state.aws, app.state.dispatcher, app.state.alert_digest,
+        ).attach()
+    if app.state.weather:
+        app.state.weather.start()
+
+    # Exportacao de tabelas em streaming (CSV/NDJSON/Arrow) com memoria constante
+    from services.core.database.export import TableExporter
+    app.state.table_exporter = TableExporter.from_env(app.state.db)
+
     # Basic seed for FK integrity
     try:
         with app.state.db.get_session() as s:
@@ -159,9 +293,36 @@ async def lifespan(app: FastAPI):
     except Exception:
         logger.warning("seed_failed")
 
-    # Seed CV detections from static images so frontend shows real data
-    _seed_cv_detections(app)
+    # Warm-up em segundo plano: a API ja responde /health enquanto o YOLO roda
+    from services.api.startup import WarmupRegistry
+    app.state.warmup = WarmupRegistry()
+    if os.getenv("CV_SEED_ENABLED", "1") == "1":
+        if os.getenv("CV_SEED_BACKGROUND", "1") == "1":
+            app.state.warmup.start(
+                "cv_seed",
+                lambda task: _seed_cv_detections(app, task=task, stop_event=app.state.warmup.stop_event),
+            )
+        else:
+            try:
+                _seed_cv_detections(app)
+            except Exception:
+                # Falha ja registrada em cv_seed_failed; nao derruba a API
+                pass
+
+    logger.info("farmtech_api_ready_for_requests")
     yield
+    for detector in getattr(app.state, "cv_streams", {}).values():
+        detector.stop()
+    await app.state.warmup.shutdown()
+    if app.state.weather:
+        app.state.weather.stop()
+    if app.state.alert_digest:
+        app.state.alert_digest.stop()
+    if app.state.dispatcher:
+        app.state.dispatcher.stop()
+    if app.state.anomaly_detector:
+        app.state.anomaly_detector.stop()
+    app.state.aws.flush_telemetry()
     logger.info("farmtech_api_shutdown")
 
 
@@ -210,6 +371,22 @@ api.include_router(genetic.router)
 async def api_health():
     return {"status": "healthy", "service": "farmtech-api"}
 
+
+@api.get("/health/cache")
+async def api_cache_stats():
+    """Response cache hit/miss/304 counters."""
+    cache = getattr(app.state, "response_cache", None)
+    return cache.stats() if cache else {"enabled": False}
+
+
+@api.get("/health/ready")
+async def api_readiness():
+    """Readiness: 200 once background warm-up tasks finished, 503 while running."""
+    warmup = getattr(app.state, "warmup", None)
+    report = warmup.snapshot() if warmup else {"ready": False, "tasks": {}}
+    report["service"] = "farmtech-api"
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 app.include_router(api)
 
 
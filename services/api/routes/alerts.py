@@ -2,6 +2,9 @@ from fastapi import APIRouter, HTTPException, Request
 from services.core.aws_integration.service import AWSService
 from services.core.alerts.service import AlertsService
 from services.core.alerts.action_templates import ActionTemplates
+from services.core.alerts.rules import AlertRule
+from services.core.alerts.state_engine import validate_message_template
+from services.api.cache import cached_json
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 import structlog
@@ -53,11 +56,41 @@ class FuncionarioCreate(BaseModel):
 
 
 class IoTAlertRequest(BaseModel):
+    id_sensor: Optional[str] = None
     umidade: float
     ph: Optional[float] = None
     temperatura: Optional[float] = None
 
 
+class AlertRuleRequest(BaseModel):
+    tipo_alerta: str
+    metrica: str  # umidade, ph, temperatura, precipitacao_mm
+    direcao: str  # below, above
+    limite: float
+    margem_histerese: float = 0.0
+    severidade: str
+    titulo: str
+    mensagem: str  # pode usar {valor} e {limite}
+    id_talhao: Optional[int] = None
+    id_cultura: Optional[int] = None
+    prioridade: int = 100
+    ativo: bool = True
+
+
+class AlertRuleUpdate(BaseModel):
+    limite: Optional[float] = None
+    margem_histerese: Optional[float] = None
+    severidade: Optional[str] = None
+    titulo: Optional[str] = None
+    mensagem: Optional[str] = None
+    prioridade: Optional[int] = None
+    ativo: Optional[bool] = None
+
+
+class RuleEvaluationRequest(BaseModel):
+    readings: List[dict]  # {id_sensor?, id_talhao?, id_cultura?, umidade?, ph?, temperatura?, ...}
+
+
 class CVAlertRequest(BaseModel):
     classe: str
     confianca: float
@@ -68,11 +101,17 @@ class WeatherAlertRequest(BaseModel):
     precipitacao_mm: float = 0
     temp_min: float = 25
 
+
+def _aws_service(request: Request) -> AWSService:
+    """AWSService compartilhado pela aplicacao (clientes criados uma vez, sob demanda)"""
+    return getattr(request.app.state, "aws", None) or AWSService()
+
+
 @router.post("/send")
 async def send_alert(request: Request, alert: AlertRequest):
     """Send alert via AWS SNS and SES"""
     try:
-        aws = AWSService()
+        aws = _aws_service(request)
         
         # Format message
         formatted_message = f"""
@@ -134,7 +173,7 @@ Timestamp: {datetime.now().isoformat()}
 async def get_alert_history(request: Request, limit: int = 20):
     """Get alert history"""
     try:
-        alerts = request.app.state.db.get_alerts(limit=limit)
+        alerts = request.app.state.db.reads.alerts(limit=limit).items
         return [
             {
                 "id": a.id,
@@ -154,10 +193,10 @@ async def get_alert_history(request: Request, limit: int = 20):
 # ========== NOVOS ENDPOINTS FASE 7 ==========
 
 @router.post("/send-email")
-async def send_email(email_req: SendEmailRequest):
+async def send_email(request: Request, email_req: SendEmailRequest):
     """Send email via AWS SES"""
     try:
-        aws = AWSService()
+        aws = _aws_service(request)
         message_id = aws.send_email(
             to_email=email_req.to_email,
             subject=email_req.subject,
@@ -179,10 +218,10 @@ async def send_email(email_req: SendEmailRequest):
 
 
 @router.post("/send-sms")
-async def send_sms(sms_req: SendSMSRequest):
+async def send_sms(request: Request, sms_req: SendSMSRequest):
     """Send SMS via AWS SNS"""
     try:
-        aws = AWSService()
+        aws = _aws_service(request)
         message_id = aws.send_sms(
             phone_number=sms_req.phone_number,
             message=sms_req.message
@@ -203,10 +242,10 @@ async def send_sms(sms_req: SendSMSRequest):
 
 
 @router.post("/send-combined")
-async def send_combined(combined_req: SendCombinedAlertRequest):
+async def send_combined(request: Request, combined_req: SendCombinedAlertRequest):
     """Send alert via both Email and SMS"""
     try:
-        aws = AWSService()
+        aws = _aws_service(request)
         results = aws.send_combined_alert(
             title=combined_req.title,
             message=combined_req.message,
@@ -238,15 +277,25 @@ async def send_iot_alert(request: Request, iot_req: IoTAlertRequest):
     try:
         # Criar AlertsService
         db = request.app.state.db
-        aws = AWSService()
+        aws = _aws_service(request)
 
         with db.get_session() as session:
-            alerts_service = AlertsService(session, db, aws)
-            result = alerts_service.send_iot_alert({
+            alerts_service = AlertsService(
+                session, db, aws,
+                getattr(request.app.state, "dispatcher", None),
+                getattr(request.app.state, "alert_engine", None),
+                getattr(request.app.state, "alert_digest", None),
+                getattr(request.app.state, "rule_engine", None),
+            )
+            leitura = {
+                'id_sensor': iot_req.id_sensor,
                 'umidade': iot_req.umidade,
                 'ph': iot_req.ph,
                 'temperatura': iot_req.temperatura
-            })
+            }
+            # O detector de anomalias e alimentado so na ingestao (POST /api/iot/readings):
+            # este endpoint nao grava leitura e pode nao ter id_sensor
+            result = alerts_service.send_iot_alert(leitura)
 
         return result
     except Exception as e:
@@ -259,10 +308,14 @@ async def send_cv_alert(request: Request, cv_req: CVAlertRequest):
     """Send computer vision detection alert"""
     try:
         db = request.app.state.db
-        aws = AWSService()
+        aws = _aws_service(request)
 
         with db.get_session() as session:
-            alerts_service = AlertsService(session, db, aws)
+            alerts_service = AlertsService(
+                session, db, aws,
+                getattr(request.app.state, "dispatcher", None),
+                digest=getattr(request.app.state, "alert_digest", None),
+            )
             result = alerts_service.send_cv_alert({
                 'classe': cv_req.classe,
                 'confianca': cv_req.confianca
@@ -279,10 +332,14 @@ async def send_weather_alert(request: Request, weather_req: WeatherAlertRequest)
     """Send weather forecast alert"""
     try:
         db = request.app.state.db
-        aws = AWSService()
+        aws = _aws_service(request)
 
         with db.get_session() as session:
-            alerts_service = AlertsService(session, db, aws)
+            alerts_service = AlertsService(
+                session, db, aws,
+                getattr(request.app.state, "dispatcher", None),
+                digest=getattr(request.app.state, "alert_digest", None),
+            )
             result = alerts_service.send_weather_alert({
                 'condicao': weather_req.condicao,
                 'precipitacao_mm': weather_req.precipitacao_mm,
@@ -299,7 +356,7 @@ async def send_weather_alert(request: Request, weather_req: WeatherAlertRequest)
 async def get_funcionarios(request: Request, apenas_ativos: bool = True):
     """Get all funcionarios"""
     try:
-        funcionarios = request.app.state.db.get_funcionarios(apenas_ativos=apenas_ativos)
+        funcionarios = request.app.state.db.reads.funcionarios(apenas_ativos=apenas_ativos)
         return [
             {
                 "id": f.id_funcionario,
@@ -351,29 +408,33 @@ async def create_funcionario(request: Request, func: FuncionarioCreate):
 
 
 @router.get("/actions")
-async def get_all_actions():
-    """Get all available action templates"""
+async def get_all_actions(request: Request):
+    """Get all available action templates (static: cached and reusable by the browser)"""
     try:
-        actions = ActionTemplates.get_all_actions()
-        return {
-            "total": len(actions),
-            "actions": [
-                {
-                    "code": code,
-                    "titulo": action.titulo,
-                    "descricao": action.descricao,
-                    "prioridade": action.prioridade,
-                    "tempo_estimado": action.tempo_estimado,
-                    "responsavel_sugerido": action.responsavel_sugerido,
-                    "passos": action.passos
-                }
-                for code, action in actions.items()
-            ]
-        }
+        return cached_json(request, _actions_payload, ttl=3600, max_age=300)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _actions_payload():
+    actions = ActionTemplates.get_all_actions()
+    return {
+        "total": len(actions),
+        "actions": [
+            {
+                "code": code,
+                "titulo": action.titulo,
+                "descricao": action.descricao,
+                "prioridade": action.prioridade,
+                "tempo_estimado": action.tempo_estimado,
+                "responsavel_sugerido": action.responsavel_sugerido,
+                "passos": action.passos
+            }
+            for code, action in actions.items()
+        ]
+    }
+
+
 @router.get("/actions/{alert_type}")
 async def get_actions_for_alert(alert_type: str):
     """Get recommended actions for alert type"""
@@ -398,14 +459,133 @@ async def get_actions_for_alert(alert_type: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _rule_engine(request: Request):
+    engine = getattr(request.app.state, "rule_engine", None)
+    if not engine:
+        raise HTTPException(status_code=503, detail="Motor de regras desabilitado (ALERT_RULES_ENABLED=0)")
+    return engine
+
+
+def _validate_rule(data: dict) -> None:
+    if data.get("direcao") not in (None, "below", "above"):
+        raise HTTPException(status_code=400, detail="direcao deve ser 'below' ou 'above'")
+    if data.get("severidade") not in (None, "baixa", "media", "alta", "critica"):
+        raise HTTPException(status_code=400, detail="severidade deve ser baixa, media, alta ou critica")
+    if data.get("mensagem") is not None:
+        try:
+            validate_message_template(data["mensagem"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/rules")
+async def list_alert_rules(request: Request, apenas_ativas: bool = False):
+    """Regras de alerta (globais e por talhao/cultura)"""
+    regras = request.app.state.db.get_regras_alerta(apenas_ativas=apenas_ativas)
+    return {
+        "rules": [{**AlertRule.from_model(r).to_dict(), "ativo": r.ativo} for r in regras],
+        "total": len(regras),
+    }
+
+
+@router.post("/rules")
+async def create_alert_rule(request: Request, rule: AlertRuleRequest):
+    """Cria regra; passa a valer sem deploy em todos os workers"""
+    data = rule.model_dump()
+    _validate_rule(data)
+    id_regra = request.app.state.db.create_regra_alerta(data)
+    return {"status": "success", "id_regra": id_regra}
+
+
+@router.put("/rules/{id_regra}")
+async def update_alert_rule(request: Request, id_regra: int, rule: AlertRuleUpdate):
+    data = rule.model_dump(exclude_none=True)
+    _validate_rule(data)
+    if not request.app.state.db.update_regra_alerta(id_regra, data):
+        raise HTTPException(status_code=404, detail="Regra não encontrada")
+    return {"status": "success", "id_regra": id_regra}
+
+
+@router.delete("/rules/{id_regra}")
+async def delete_alert_rule(request: Request, id_regra: int):
+    if not request.app.state.db.delete_regra_alerta(id_regra):
+        raise HTTPException(status_code=404, detail="Regra não encontrada")
+    return {"status": "success", "id_regra": id_regra}
+
+
+@router.post("/rules/evaluate")
+async def evaluate_alert_rules(request: Request, body: RuleEvaluationRequest):
+    """Avalia um lote de leituras contra todas as regras em uma passada (sem notificar)"""
+    engine = _rule_engine(request)
+    matches = engine.evaluate_batch(body.readings)
+    return {
+        "results": [
+            {
+                "index": i,
+                "id_sensor": reading.get("id_sensor"),
+                "alerts": [
+                    {
+                        "id_regra": rule.id_regra,
+                        "tipo_alerta": rule.alert_type,
+                        "severidade": rule.severidade,
+                        "valor": reading.get(rule.metric),
+                        "limite": rule.threshold,
+                        "titulo": rule.titulo,
+                    }
+                    for rule in rules
+                ],
+            }
+            for i, (reading, rules) in enumerate(zip(body.readings, matches))
+        ],
+        "stats": engine.stats(),
+    }
+
+
+@router.get("/state")
+async def get_alert_state(request: Request):
+    """Incidentes abertos por (sensor, tipo de alerta) e contadores de supressao"""
+    engine = getattr(request.app.state, "alert_engine", None)
+    if not engine:
+        return {"enabled": False}
+    return {"enabled": True, "active": engine.active(), **engine.stats()}
+
+
+@router.get("/anomalies")
+async def get_sensor_anomalies(request: Request):
+    """Series (sensor, metrica) com anomalia ativa no detector online"""
+    detector = getattr(request.app.state, "anomaly_detector", None)
+    if not detector:
+        return {"enabled": False}
+    return {"enabled": True, "active": detector.active(), **detector.stats()}
+
+
+@router.get("/outbox/stats")
+async def get_outbox_stats(request: Request):
+    """Estado da fila de notificacoes (pendentes, enviadas, falhas, retries)"""
+    dispatcher = getattr(request.app.state, "dispatcher", None)
+    if not dispatcher:
+        return {"enabled": False}
+    return {"enabled": True, **dispatcher.stats()}
+
+
+@router.get("/digest/stats")
+async def get_digest_stats(request: Request):
+    """Alertas em buffer por destinatario e emails economizados pelo resumo"""
+    digest = getattr(request.app.state, "alert_digest", None)
+    if not digest:
+        return {"enabled": False}
+    return {"enabled": True, **digest.stats()}
+
+
 @router.get("/test")
-async def test_aws_connection():
+async def test_aws_connection(request: Request):
     """Test AWS connection and services"""
     try:
-        aws = AWSService()
+        aws = _aws_service(request)
         return {
             "status": "success",
             "region": aws.region,
+            "transport": aws.transport.name,
             "sns_topic_arn": aws.sns_topic_arn,
             "sns_sms_topic_arn": aws.sns_sms_topic_arn,
             "ses_sender": aws.ses_sender,
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Request
+from services.api.cache import cached_json
 from services.core.analytics.service import AnalyticsService
 import structlog
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 logger = structlog.get_logger()
 router = APIRouter(prefix="/analytics", tags=["Fase 1 - Analytics"])
@@ -35,33 +36,67 @@ async def get_r_models():
     }
 
 
+# Tabelas lidas pelo overview: escritas nelas descartam a resposta em cache
+OVERVIEW_TABLES = ("leituras_sensores", "deteccoes", "producao_agricola", "culturas")
+
+
 @router.get("/overview")
-async def analytics_overview(request: Request) -> Dict[str, Any]:
+async def analytics_overview(request: Request):
     """
     Consolida métricas reais do banco para alimentar a UI das fases 1/3/4.
     Inclui último sensor, médias, produção e estatísticas de detecção.
+    Servido do cache de respostas (ETag/304) por ate 30s ou ate a proxima escrita.
     """
-    from sqlalchemy import func
-    from services.core.database.models import (
-        LeituraSensor,
-        Deteccao,
-        ProducaoAgricola,
-        Cultura,
-    )
-
-    # Weather (API real) com fallback silencioso
-    weather = {}
+    weather = getattr(request.app.state, "weather", None)
+    return cached_json(request, lambda: _overview_payload(request.app.state.db, weather), ttl=30, tables=OVERVIEW_TABLES)
+
+
+@router.get("/weather")
+async def weather_forecast(request: Request, city_code: Optional[str] = None):
+    """Ultima previsao do CPTEC (snapshot em memoria, com idade e flag stale)"""
+    weather = getattr(request.app.state, "weather", None)
+    if not weather:
+        raise HTTPException(status_code=503, detail="Servico de previsao desabilitado")
     try:
-        from services.core.weather.cptec_client import CPTECClient
+        return weather.get(city_code)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Cidade {city_code} nao configurada")
 
-        weather = CPTECClient().get_weather_data()
-    except Exception as e:
-        logger.warning("weather_unavailable", error=str(e))
-        weather = {"error": "weather_unavailable"}
+
+@router.get("/producao/cubo")
+async def production_cube(
+    request: Request,
+    dimensoes: str = "cultura",
+    cultura: Optional[str] = None,
+    ano: Optional[int] = None,
+    mes: Optional[int] = None,
+):
+    """
+    Producao pre-agregada por cultura x ano x mes. Filtros fazem o slice e
+    `dimensoes` (ex: cultura,ano,mes) o drill-down; nunca varre producao_agricola.
+    """
+    dims = [d.strip() for d in dimensoes.split(",") if d.strip()]
+    try:
+        return cached_json(
+            request,
+            lambda: request.app.state.db.production_cube.query(dims, cultura=cultura, ano=ano, mes=mes),
+            ttl=60,
+            tables=("producao_agricola", "culturas"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _overview_payload(db, weather_service) -> Dict[str, Any]:
+    from sqlalchemy import func
+    from services.core.database.models import LeituraSensor, Deteccao
+
+    # Weather: ultimo snapshot do servico em segundo plano (nunca chama o CPTEC aqui)
+    weather = weather_service.get() if weather_service else {"error": "weather_unavailable"}
 
     latest_payload = None
 
-    with request.app.state.db.get_session() as session:
+    with db.get_session() as session:
         latest = (
             session.query(LeituraSensor)
             .order_by(LeituraSensor.data_hora_leitura.desc())
@@ -73,27 +108,7 @@ async def analytics_overview(request: Request) -> Dict[str, Any]:
 
         detections_total = session.query(func.count(Deteccao.id_deteccao)).scalar()
         avg_conf = session.query(func.avg(Deteccao.confianca)).scalar()
-        top_classes = (
-            session.query(Deteccao.classe, func.count(Deteccao.classe).label("c"))
-            .group_by(Deteccao.classe)
-            .order_by(func.count(Deteccao.classe).desc())
-            .limit(3)
-            .all()
-        )
 
-        prod_total = session.query(func.sum(ProducaoAgricola.quantidade_produzida)).scalar()
-        valor_total = session.query(func.sum(ProducaoAgricola.valor_estimado)).scalar()
-        prod_by_culture = (
-            session.query(
-                Cultura.nome_cultura,
-                func.sum(ProducaoAgricola.quantidade_produzida).label("qtd"),
-            )
-            .join(Cultura, ProducaoAgricola.id_cultura == Cultura.id_cultura)
-            .group_by(Cultura.nome_cultura)
-            .order_by(func.sum(ProducaoAgricola.quantidade_produzida).desc())
-            .limit(5)
-            .all()
-        )
         if latest:
             latest_payload = {
                 "umidade": float(latest.valor_umidade) if latest.valor_umidade is not None else None,
@@ -105,6 +120,14 @@ async def analytics_overview(request: Request) -> Dict[str, Any]:
                 "bomba_ligada": bool(latest.bomba_ligada),
             }
 
+    # Contagem por classe servida pelo indice (classe, timestamp)
+    top_classes = db.count_detections_by_class(limit=3)
+
+    # Producao vem do cubo pre-agregado (nao varre producao_agricola)
+    producao = db.production_cube.query(["cultura"])
+    has_producao = producao["total"]["registros"] > 0
+    top_culturas = sorted(producao["linhas"], key=lambda l: l["quantidade"], reverse=True)[:5]
+
     return {
         "weather": weather,
         "sensors": {
@@ -119,10 +142,10 @@ async def analytics_overview(request: Request) -> Dict[str, Any]:
             "top_classes": [{"classe": c, "count": int(cnt)} for c, cnt in top_classes],
         },
         "producao": {
-            "total_quantidade": float(prod_total) if prod_total is not None else None,
-            "valor_total": float(valor_total) if valor_total is not None else None,
+            "total_quantidade": producao["total"]["quantidade"] if has_producao else None,
+            "valor_total": producao["total"]["valor"] if has_producao else None,
             "por_cultura": [
-                {"cultura": nome, "quantidade": float(qtd)} for nome, qtd in prod_by_culture
+                {"cultura": l["cultura"], "quantidade": l["quantidade"]} for l in top_culturas
             ],
         },
     }
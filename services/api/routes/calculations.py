@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel
-from typing import List, Dict, Any
-from services.core.calculations.area_insumos import calculate_area_insumos
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
+from services.api.cache import cached_json
+from services.core.calculations.area_insumos import calculate_area_insumos, calculate_area_insumos_batch
+from services.core.calculations.planning import CropCatalog, plan_farm_from_db
 
 router = APIRouter(prefix="/calculations", tags=["Fase 1 - Cálculos"])
 
@@ -11,21 +13,40 @@ class CalculationRequest(BaseModel):
     area: float
 
 
+class BatchCalculationRequest(BaseModel):
+    itens: List[CalculationRequest] = Field(..., min_length=1, max_length=5000)
+
+
+class PlanningScenario(BaseModel):
+    cultura: Optional[str] = None  # every talhao planted with this crop
+    talhoes: Dict[int, str] = Field(default_factory=dict)  # id_talhao -> cultura overrides
+
+
+class PlanningRequest(BaseModel):
+    cenarios: Dict[str, PlanningScenario] = Field(default_factory=dict, max_length=100)
+    incluir_talhoes: bool = False
+
+
+# Map frontend culture names to backend expected names
+CULTURE_MAP = {
+    "milho": "Milho",
+    "soja": "Soja",
+    "trigo": "Mandioca",  # Fallback
+    "mandioca": "Mandioca",
+    "cana": "Cana de Acucar",
+    "cana de açucar": "Cana de Acucar",
+    "cana de acucar": "Cana de Acucar",
+}
+
+
+def _cultura_real(cultura: str) -> str:
+    return CULTURE_MAP.get(cultura.lower(), "Mandioca")
+
+
 @router.post("/insumos")
 async def calculate_inputs(request: Request, payload: CalculationRequest):
     try:
-        # Map frontend culture names to backend expected names
-        culture_map = {
-            "milho": "Milho",
-            "soja": "Soja",
-            "trigo": "Mandioca",  # Fallback
-            "mandioca": "Mandioca",
-            "cana": "Cana de Acucar",
-            "cana de açucar": "Cana de Acucar",
-            "cana de acucar": "Cana de Acucar",
-        }
-
-        cultura_real = culture_map.get(payload.cultura.lower(), "Mandioca")
+        cultura_real = _cultura_real(payload.cultura)
 
         db_service = getattr(request.app.state, "db", None)
         result = calculate_area_insumos(cultura_real, payload.area, db_service=db_service)
@@ -34,6 +55,42 @@ async def calculate_inputs(request: Request, payload: CalculationRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/insumos/batch")
+async def calculate_inputs_batch(request: Request, payload: BatchCalculationRequest):
+    """
+    Price many (cultura, area) pairs in one request; per-item errors don't fail the batch.
+    Names resolve like /planejamento (db coefficients + defaults, accent/case-insensitive):
+    unknown crops come back as item errors instead of being priced as Mandioca.
+    """
+    db_service = getattr(request.app.state, "db", None)
+    catalog = CropCatalog.build(db_service, map_culturas=False)
+
+    def _nome(cultura: str) -> str:
+        try:
+            return catalog.nomes[catalog.index(cultura)]
+        except ValueError:
+            return cultura  # sem coeficiente: vira erro no item
+
+    return calculate_area_insumos_batch(
+        ((_nome(item.cultura), item.area) for item in payload.itens), db_service=db_service
+    )
+
+
+@router.post("/planejamento")
+async def farm_planning(request: Request, payload: PlanningRequest = PlanningRequest()):
+    """
+    Insumo and cost totals per crop for every talhao: current crops ("atual")
+    plus alternative assignments; unknown crops or talhoes are a 400
+    """
+    try:
+        cenarios = {nome: c.model_dump() for nome, c in payload.cenarios.items()}
+        if "atual" in cenarios:
+            raise ValueError("'atual' é reservado para as culturas atuais")
+        return plan_farm_from_db(request.app.state.db, cenarios, incluir_talhoes=payload.incluir_talhoes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/producao-agricola")
 async def get_producao_agricola(request: Request, limit: int = 10):
     """Get agricultural production data from Fase 1 CSV"""
@@ -60,36 +117,44 @@ async def get_producao_agricola(request: Request, limit: int = 10):
                     "data_colheita": producao.data_colheita.isoformat() if producao.data_colheita else None
                 })
 
-            return {
-                "total": session.query(ProducaoAgricola).count(),
-                "data": results
-            }
+        # Total pelo cubo pre-agregado (sem COUNT sobre producao_agricola)
+        total = request.app.state.db.production_cube.query([])["total"]["registros"]
+        return {
+            "total": total,
+            "data": results
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/culturas")
 async def get_culturas_with_coefficients(request: Request):
-    """Get all cultures with their input coefficients"""
+    """Get all cultures with their input coefficients (cached until culturas/insumos change)"""
     try:
-        from services.core.database.models import Cultura, InsumoCultura
+        return cached_json(
+            request, lambda: _culturas_payload(request.app.state.db), ttl=300, tables=("culturas", "insumos_cultura")
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        with request.app.state.db.get_session() as session:
-            query = (
-                session.query(Cultura, InsumoCultura)
-                .outerjoin(InsumoCultura, Cultura.id_cultura == InsumoCultura.id_cultura)
-                .all()
-            )
 
-            results = []
-            for cultura, insumo in query:
-                results.append({
-                    "id": cultura.id_cultura,
-                    "nome": cultura.nome_cultura,
-                    "coef_insumo_por_m2": float(insumo.coef_insumo_por_m2) if insumo else None,
-                    "custo_por_m2": float(insumo.custo_por_m2) if insumo else None
-                })
+def _culturas_payload(db):
+    from services.core.database.models import Cultura, InsumoCultura
 
-            return {"culturas": results}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    with db.get_session() as session:
+        query = (
+            session.query(Cultura, InsumoCultura)
+            .outerjoin(InsumoCultura, Cultura.id_cultura == InsumoCultura.id_cultura)
+            .all()
+        )
+
+        results = []
+        for cultura, insumo in query:
+            results.append({
+                "id": cultura.id_cultura,
+                "nome": cultura.nome_cultura,
+                "coef_insumo_por_m2": float(insumo.coef_insumo_por_m2) if insumo else None,
+                "custo_por_m2": float(insumo.custo_por_m2) if insumo else None
+            })
+
+        return {"culturas": results}
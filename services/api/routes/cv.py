@@ -1,20 +1,33 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import shutil
 import tempfile
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 import structlog
 
+from services.core.cv_service.cache import DetectionCache, content_digest
 from services.core.cv_service.service import CVService
+from services.core.cv_service.stream import StreamDetector, is_live_source
 
 logger = structlog.get_logger()
 
 router = APIRouter(prefix="/cv", tags=["Fase 6 - Visao Computacional"])
 
 
+class StreamStartRequest(BaseModel):
+    source: str  # indice de camera, rtsp://..., ou video/pasta de frames dentro de CV_STREAM_DIR
+    stream_id: Optional[str] = None
+    target_fps: Optional[float] = None
+    confidence: float = 0.5
+    batch_size: Optional[int] = None
+    send_alerts: bool = True
+
+
 def _resolve_model_source() -> Union[Path, str]:
     """Resolve YOLO model path or hub identifier, preferring local files."""
     configured = os.getenv("YOLO_MODEL_PATH", "./models/yolov8n.pt")
@@ -32,6 +45,35 @@ def _resolve_model_source() -> Union[Path, str]:
     return configured
 
 
+def _resolve_stream_source(source: str) -> str:
+    """
+    Accept only camera indices, stream URLs or files/folders under
+    CV_STREAM_DIR; any other server path is rejected.
+    """
+    source = source.strip()
+    if source.isdigit() or is_live_source(source):
+        return source
+    stream_dir = os.getenv("CV_STREAM_DIR")
+    if not stream_dir:
+        raise ValueError("Fonte de arquivo desabilitada: configure CV_STREAM_DIR")
+    root = Path(stream_dir).resolve()
+    candidate = (root / source).resolve()
+    if candidate != root and root not in candidate.parents:
+        raise ValueError(f"Fonte fora de CV_STREAM_DIR: {source}")
+    if not candidate.exists():
+        raise ValueError(f"Fonte nao encontrada em CV_STREAM_DIR: {source}")
+    return str(candidate)
+
+
+def _prune_streams(streams: dict) -> None:
+    """Keep running streams plus the CV_STREAM_HISTORY most recent finished ones."""
+    history = int(os.getenv("CV_STREAM_HISTORY", 20))
+    done = [sid for sid, d in streams.items() if d.status not in ("created", "running")]
+    done.sort(key=lambda sid: streams[sid].finished_at or 0.0)
+    for sid in done[:max(0, len(done) - history)]:
+        del streams[sid]
+
+
 def _resolve_static_images_dir() -> Path:
     """Resolve the directory with static images used to feed the detector."""
     candidates = []
@@ -46,14 +88,15 @@ def _resolve_static_images_dir() -> Path:
     candidates.append(project_root / "models" / "cv_samples")
 
     # Pasta legada da fase 6 (caso exista como irmao deste repositorio)
-    candidates.append(
-        project_root.parents[2]
-        / "Fase 6 - 2025"
-        / "Cap 1 - Despertar da rede neural"
-        / "Imagens para Demanda"
-        / "test"
-        / "images"
-    )
+    if len(project_root.parents) > 2:
+        candidates.append(
+            project_root.parents[2]
+            / "Fase 6 - 2025"
+            / "Cap 1 - Despertar da rede neural"
+            / "Imagens para Demanda"
+            / "test"
+            / "images"
+        )
 
     for candidate in candidates:
         if candidate and candidate.exists():
@@ -84,7 +127,7 @@ async def analyze_image(request: Request, file: UploadFile = File(...), confiden
     try:
         model_source = _resolve_model_source()
         models_dir = Path(model_source).parent if isinstance(model_source, Path) else Path("./models")
-        cv = CVService(models_dir=models_dir, model_source=model_source)
+        cv = CVService(models_dir=models_dir, model_source=model_source, cache=DetectionCache.from_env(models_dir))
 
         # Save uploaded file to temp
         suffix = Path(file.filename).suffix
@@ -94,15 +137,18 @@ async def analyze_image(request: Request, file: UploadFile = File(...), confiden
 
         try:
             detections = cv.detect_objects(tmp_path, confidence=confidence)
+            chave = content_digest(tmp_path)
 
             for d in detections:
                 try:
                     det_data = {
                         "timestamp": datetime.now(),
                         "imagem_nome": file.filename,
+                        "imagem_chave": chave,
                         "classe": d.class_name,
                         "confianca": d.confidence,
-                        "bbox": str(d.bbox),
+                        "bbox": d.bbox,
+                        "origem": "upload",
                     }
                     request.app.state.db.create_detection(det_data)
                 except Exception as e:
@@ -138,6 +184,78 @@ async def analyze_image(request: Request, file: UploadFile = File(...), confiden
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/analyze-tiled")
+async def analyze_large_image(
+    request: Request,
+    file: UploadFile = File(...),
+    confidence: float = 0.35,
+    tile_size: int = 640,
+    overlap: float = 0.2,
+    batch_size: int = 4,
+    iou_threshold: float = 0.5,
+):
+    """
+    Run tiled YOLO over a large orthomosaic (PNG/TIFF/NPY) and persist the
+    detections with image-space coordinates.
+    """
+    model_source = _resolve_model_source()
+    models_dir = Path(model_source).parent if isinstance(model_source, Path) else Path("./models")
+    cv = CVService(models_dir=models_dir, model_source=model_source)
+
+    suffix = Path(file.filename).suffix
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        # Copia em blocos: ortomosaicos podem ter varios GB
+        shutil.copyfileobj(file.file, tmp, length=16 * 1024 * 1024)
+        tmp_path = Path(tmp.name)
+
+    try:
+        chave = content_digest(tmp_path)
+        detections = cv.detect_tiled(
+            tmp_path,
+            confidence=confidence,
+            tile_size=tile_size,
+            overlap=overlap,
+            batch_size=batch_size,
+            iou_threshold=iou_threshold,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    now = datetime.now()
+    records = [
+        {
+            "timestamp": now,
+            "imagem_nome": file.filename,
+            "imagem_chave": chave,
+            "classe": d.class_name,
+            "confianca": d.confidence,
+            "bbox": d.bbox,
+            "origem": "ortomosaico",
+        }
+        for d in detections
+    ]
+    saved = 0
+    if records:
+        try:
+            saved = request.app.state.db.bulk_create_detections(records)
+        except Exception as e:
+            logger.warning("save_tiled_detections_failed", error=str(e), image=file.filename)
+
+    return {
+        "image": file.filename,
+        "detections_saved": saved,
+        "detections": [
+            {"class": d.class_name, "confidence": d.confidence, "bbox": list(d.bbox)}
+            for d in detections
+        ],
+    }
+
+
 @router.post("/ingest-static")
 async def ingest_static_images(request: Request, confidence: float = 0.35, limit: int = 25, reset: bool = True):
     """
@@ -151,10 +269,10 @@ async def ingest_static_images(request: Request, confidence: float = 0.35, limit
 
     model_source = _resolve_model_source()
     models_dir = Path(model_source).parent if isinstance(model_source, Path) else Path("./models")
-    cv = CVService(models_dir=models_dir, model_source=model_source)
+    cv = CVService(models_dir=models_dir, model_source=model_source, cache=DetectionCache.from_env(models_dir))
 
     if reset:
-        request.app.state.db.reset_detections()
+        request.app.state.db.reset_detections(origem="seed")
 
     results = cv.detect_directory(static_dir, confidence=confidence, limit=limit)
     saved = []
@@ -167,7 +285,8 @@ async def ingest_static_images(request: Request, confidence: float = 0.35, limit
                 "imagem_nome": img_path.name,
                 "classe": d.class_name,
                 "confianca": d.confidence,
-                "bbox": str(d.bbox),
+                "bbox": d.bbox,
+                "origem": "seed",
             }
             try:
                 request.app.state.db.create_detection(det_data)
@@ -184,10 +303,148 @@ async def ingest_static_images(request: Request, confidence: float = 0.35, limit
     }
 
 
+@router.get("/detections")
+async def query_detections(
+    request: Request,
+    classe: Optional[str] = None,
+    since_hours: Optional[float] = None,
+    x1: Optional[float] = None,
+    y1: Optional[float] = None,
+    x2: Optional[float] = None,
+    y2: Optional[float] = None,
+    id_imagem: Optional[int] = None,
+    limit: int = 100,
+):
+    """
+    Deteccoes filtradas por classe, janela de tempo e regiao (x1, y1, x2, y2),
+    ex: pragas na regiao Y nas ultimas 24h.
+    """
+    coords = (x1, y1, x2, y2)
+    if any(c is not None for c in coords) and any(c is None for c in coords):
+        raise HTTPException(status_code=400, detail="Informe x1, y1, x2 e y2 para filtrar por regiao")
+    region = coords if x1 is not None else None
+    since = datetime.now() - timedelta(hours=since_hours) if since_hours else None
+
+    detections = request.app.state.db.query_detections(
+        classe=classe, since=since, region=region, id_imagem=id_imagem, limit=limit
+    )
+    return [
+        {
+            "id": d.id_deteccao,
+            "timestamp": d.timestamp.isoformat(),
+            "image": d.imagem_nome,
+            "id_imagem": d.id_imagem,
+            "frame": d.frame,
+            "classe": d.classe,
+            "confidence": float(d.confianca),
+            "bbox": [d.bbox_x1, d.bbox_y1, d.bbox_x2, d.bbox_y2] if d.bbox_x1 is not None else None,
+        }
+        for d in detections
+    ]
+
+
+def _stream_callback(app, send_alerts: bool, live: bool):
+    """Persist new stream detections and route them through send_cv_alert."""
+    started = datetime.now()
+
+    def on_detections(stream_id: str, frame_index: int, ts: float, detections: list) -> None:
+        # Ao vivo: relogio atual; arquivos: inicio + offset do frame no video
+        when = datetime.now() if live else started + timedelta(seconds=ts)
+        app.state.db.bulk_create_detections([
+            {
+                "timestamp": when,
+                "imagem_nome": stream_id,
+                "frame": frame_index,
+                "classe": d.class_name,
+                "confianca": d.confidence,
+                "bbox": d.bbox,
+                "origem": "stream",
+            }
+            for d in detections
+        ])
+        if not send_alerts:
+            return
+
+        from services.core.alerts.service import AlertsService
+        from services.core.aws_integration.service import AWSService
+
+        aws = getattr(app.state, "aws", None) or AWSService()
+        with app.state.db.get_session() as session:
+            alerts_service = AlertsService(
+                session, app.state.db, aws,
+                getattr(app.state, "dispatcher", None),
+                digest=getattr(app.state, "alert_digest", None),
+            )
+            for d in detections:
+                alerts_service.send_cv_alert({
+                    "classe": d.class_name,
+                    "confianca": d.confidence * 100,
+                    "camera": stream_id,
+                    "frame": frame_index,
+                })
+
+    return on_detections
+
+
+@router.post("/streams")
+async def start_stream(request: Request, body: StreamStartRequest):
+    """Inicia deteccao continua sobre uma camera (RTSP) ou video gravado."""
+    if not hasattr(request.app.state, "cv_streams"):
+        request.app.state.cv_streams = {}
+    streams = request.app.state.cv_streams
+    try:
+        source = _resolve_stream_source(body.source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _prune_streams(streams)
+    stream_id = body.stream_id
+    if not stream_id:
+        n = len(streams) + 1
+        while f"stream-{n}" in streams:
+            n += 1
+        stream_id = f"stream-{n}"
+    current = streams.get(stream_id)
+    if current and current.status == "running":
+        raise HTTPException(status_code=409, detail=f"Stream {stream_id} ja esta em execucao")
+
+    model_source = _resolve_model_source()
+    models_dir = Path(model_source).parent if isinstance(model_source, Path) else Path("./models")
+    detector = StreamDetector(
+        CVService(models_dir=models_dir, model_source=model_source),
+        source,
+        stream_id=stream_id,
+        target_fps=body.target_fps or float(os.getenv("CV_STREAM_FPS", 2)),
+        batch_size=body.batch_size or int(os.getenv("CV_STREAM_BATCH_SIZE", 4)),
+        confidence=body.confidence,
+        diff_threshold=float(os.getenv("CV_STREAM_DIFF_THRESHOLD", 6.0)),
+        on_detections=_stream_callback(request.app, body.send_alerts, is_live_source(source)),
+    )
+    streams[stream_id] = detector.start()
+    return detector.stats()
+
+
+@router.get("/streams")
+async def list_streams(request: Request):
+    streams = getattr(request.app.state, "cv_streams", {})
+    _prune_streams(streams)
+    return [d.stats() for d in streams.values()]
+
+
+@router.delete("/streams/{stream_id}")
+async def stop_stream(request: Request, stream_id: str):
+    streams = getattr(request.app.state, "cv_streams", {})
+    detector = streams.get(stream_id)
+    if not detector:
+        raise HTTPException(status_code=404, detail="Stream nao encontrado")
+    # join das threads bloqueia ate `timeout` segundos: fora do event loop
+    await run_in_threadpool(detector.stop)
+    return detector.stats()
+
+
 @router.get("/history")
 async def get_history(request: Request, limit: int = 20):
     try:
-        detections = request.app.state.db.get_detections(limit=limit)
+        detections = request.app.state.db.reads.detections(limit=limit).items
         return [
             {
                 "timestamp": d.timestamp.strftime("%Y-%m-%d %H:%M"),
@@ -1,9 +1,17 @@
+from datetime import datetime
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 
+from sqlalchemy import select
+
+from services.core.database.pagination import InvalidCursor
+
 router = APIRouter(prefix="/database", tags=["Database"])
 
+MAX_PAGE_SIZE = 1000
+
 class GenericRecord(BaseModel):
     table: str
     data: Dict[str, Any]
@@ -14,8 +22,20 @@ async def list_tables(request: Request):
     return ["culturas", "talhoes", "tipos_sensor", "sensores", "leituras_sensores", "deteccoes", "producao_agricola", "insumos_cultura"]
 
 @router.get("/data/{table_name}")
-async def get_table_data(request: Request, table_name: str, limit: int = 100, offset: int = 0):
-    """Get data from a specific table"""
+async def get_table_data(
+    request: Request,
+    table_name: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+):
+    """
+    Get data from a specific table, in primary-key order.
+    Paginate with `cursor` (value of `next_cursor` from the previous page);
+    `offset` is kept for old clients and gets slower on deep pages. `limit`
+    is clamped to 1..MAX_PAGE_SIZE. `total` is exact unless `total_estimated`.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
     try:
         # Map table names to models
         from services.core.database.models import (
@@ -28,6 +48,7 @@ async def get_table_data(request: Request, table_name: str, limit: int = 100, of
             ProducaoAgricola,
             InsumoCultura
         )
+        from services.core.database.read_models import projection
         
         models_map = {
             "culturas": Cultura,
@@ -44,33 +65,65 @@ async def get_table_data(request: Request, table_name: str, limit: int = 100, of
             raise HTTPException(status_code=404, detail="Table not found")
             
         model = models_map[table_name]
+        db = request.app.state.db
         
-        with request.app.state.db.get_session() as session:
-            # Get columns
-            columns = [c.name for c in model.__table__.columns]
-            
-            # Get data
-            query = session.query(model).limit(limit).offset(offset)
-            results = []
-            for row in query.all():
-                row_dict = {}
-                for col in columns:
-                    val = getattr(row, col)
-                    # Convert dates/datetimes to string
-                    if hasattr(val, 'isoformat'):
-                        val = val.isoformat()
-                    row_dict[col] = val
-                results.append(row_dict)
-                
-            return {
-                "columns": columns,
-                "data": results,
-                "total": session.query(model).count()
-            }
+        # Projecao pelo Core: tuplas, Numeric ja como float, sem entidades ORM
+        columns = [c.name for c in model.__table__.columns]
+        stmt = select(*projection(model))
+        # Mesma ordem (PK crescente) com offset e com cursor: clientes antigos nao mudam
+        if offset and not cursor:
+            pk = [getattr(model, c.key) for c in model.__table__.primary_key.columns]
+            rows, next_cursor = db.reads.rows(stmt.order_by(*pk).limit(limit).offset(offset)), None
+        else:
+            page = db.reads.page(model, stmt, limit, cursor, by_pk=True)
+            rows, next_cursor = page.items, page.next_cursor
+
+        # Convert dates/datetimes to string
+        results = [
+            {col: val.isoformat() if hasattr(val, 'isoformat') else val for col, val in zip(columns, row)}
+            for row in rows
+        ]
+
+        total, estimated = db.counts.count(model)
+        return {
+            "columns": columns,
+            "data": results,
+            "total": total,
+            "total_estimated": estimated,
+            "next_cursor": next_cursor
+        }
             
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/export/{table_name}")
+async def export_table(
+    request: Request,
+    table_name: str,
+    format: str = "csv",
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+):
+    """Stream a whole table (or a period of it) as CSV, NDJSON or Arrow IPC"""
+    from services.core.database.export import FORMATS, ExportError, TableExporter
+
+    exporter = getattr(request.app.state, "table_exporter", None) or TableExporter.from_env(request.app.state.db)
+    try:
+        chunks = exporter.stream(table_name, format, inicio, fim)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, extension = FORMATS[format]
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table_name}.{extension}"'},
+    )
+
 @router.post("/data/{table_name}")
 async def create_record(request: Request, table_name: str, record: Dict[str, Any]):
     """Create a new record in a table"""
@@ -1,12 +1,33 @@
 from fastapi import APIRouter, Request, HTTPException
-from services.core.iot_gateway.irrigation_logic import apply_irrigation_logic
+from pydantic import BaseModel
+from services.core.alerts.rules import effective_limits
+from services.core.iot_gateway.irrigation_logic import IrrigationThresholds, apply_irrigation_logic
 from datetime import datetime
+from typing import Optional
 import structlog
 
 router = APIRouter(prefix="/iot", tags=["Fase 3 - IoT"])
 logger = structlog.get_logger()
 
 
+class SensorReadingRequest(BaseModel):
+    """Leitura enviada pelo ESP32 (campos de IoTGatewayService.ingest_reading)"""
+    id_sensor: int = 1
+    umidade: float
+    ph_estimado: float
+    fosforo_presente: bool = False
+    potassio_presente: bool = False
+    temperatura: Optional[float] = None
+    precipitacao_mm: Optional[float] = None
+    timestamp: Optional[datetime] = None
+
+
+def _irrigation_thresholds(request: Request, id_sensor=None) -> IrrigationThresholds:
+    """Limites de irrigacao com a emergencia da regra umidade_critica_baixa (motor de regras)."""
+    limits = effective_limits(getattr(request.app.state, "rule_engine", None), {"id_sensor": id_sensor})
+    return IrrigationThresholds.from_alert_limits(limits)
+
+
 @router.get("/sensors")
 async def get_sensor_data(request: Request):
     """
@@ -38,7 +59,8 @@ async def get_sensor_data(request: Request):
                 temperatura = 27.0
                 precipitacao = 0.0
                 bomba_ligada, decisao = apply_irrigation_logic(
-                    umidade=umidade, ph=ph, fosforo=True, potassio=True
+                    umidade=umidade, ph=ph, fosforo=True, potassio=True,
+                    thresholds=_irrigation_thresholds(request),
                 )
                 ts = datetime.utcnow()
 
@@ -96,6 +118,7 @@ async def toggle_pump(request: Request):
             ph=ph,
             fosforo=fosforo,
             potassio=potassio,
+            thresholds=_irrigation_thresholds(request, latest.id_sensor),
         )
 
         latest.bomba_ligada = not bool(latest.bomba_ligada)
@@ -107,3 +130,39 @@ async def toggle_pump(request: Request):
             "decisao": latest.decisao_logica_esp32,
             "reading_id": latest.id_leitura,
         }
+
+
+@router.post("/readings")
+async def ingest_reading(reading: SensorReadingRequest, request: Request):
+    """
+    Ingere uma leitura pelo gateway IoT: logica de irrigacao, gravacao, alertas
+    por regras e deteccao online de falhas de sensor (travado, sem variacao, pico).
+    """
+    from services.core.alerts.service import AlertsService
+    from services.core.iot_gateway.service import IoTGatewayService
+
+    state = request.app.state
+    gateway = getattr(state, "iot_gateway", None)
+    if gateway is None:
+        gateway = state.iot_gateway = IoTGatewayService(
+            state.db, getattr(state, "aws", None),
+            anomaly_detector=getattr(state, "anomaly_detector", None),
+            rule_engine=getattr(state, "rule_engine", None),
+        )
+
+    try:
+        with state.db.get_session() as session:
+            alerts = AlertsService(
+                session, state.db, gateway.aws,
+                getattr(state, "dispatcher", None),
+                getattr(state, "alert_engine", None),
+                getattr(state, "alert_digest", None),
+                gateway.rule_engine,
+            )
+            reading_id = gateway.ingest_reading(
+                reading.model_dump(exclude_none=True), alerts_service=alerts
+            )
+    except Exception as e:
+        logger.error("iot_ingest_api_failed", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "success", "reading_id": reading_id}
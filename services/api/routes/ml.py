@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
 from datetime import timedelta, datetime
 from pathlib import Path
 import json
 import pandas as pd
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
+
+from services.api.cache import cached_json
+from services.core.alerts.rules import effective_limits
 
 router = APIRouter(prefix="/ml", tags=["Fase 4 - ML/Forecast"])
 
 
+def _alert_limits(request: Request) -> Dict[str, float]:
+    """Limites globais por tipo_alerta (regras_alerta quando o motor de regras esta ativo)."""
+    return effective_limits(getattr(request.app.state, "rule_engine", None))
+
+
 class WhatIfScenario(BaseModel):
     """Modelo para simulação What-If"""
     umidade: Optional[float] = None
@@ -19,6 +28,18 @@ class WhatIfScenario(BaseModel):
     precipitacao: Optional[float] = None
 
 
+class WhatIfReplayRequest(BaseModel):
+    """Replay do historico com limites alternativos (padrao: ultimos 90 dias)"""
+    inicio: Optional[datetime] = None
+    fim: Optional[datetime] = None
+    id_sensores: Optional[List[int]] = None
+    limites_irrigacao: Dict[str, float] = Field(default_factory=dict)  # campos de IrrigationThresholds
+    limites_alerta: Dict[str, float] = Field(default_factory=dict)  # tipo_alerta -> limite
+    vazao_lph: float = Field(1000.0, gt=0)
+    custo_agua_m3: float = Field(5.0, ge=0)
+    custo_energia_hora: float = Field(1.0, ge=0)
+
+
 @router.get("/forecast")
 async def forecast(request: Request, steps: int = 7):
     """Return humidity forecast using last sensor readings (fallbacks to mock data)."""
@@ -57,8 +78,13 @@ async def forecast(request: Request, steps: int = 7):
 
 
 @router.get("/models")
-async def list_models():
+async def list_models(request: Request):
     """Lista metadados reais dos modelos treinados (usando arquivos *_metadata.json)."""
+    # Glob + JSON do disco: em cache por 60s (arquivos nao passam pelos hooks do banco)
+    return cached_json(request, _models_payload, ttl=60)
+
+
+def _models_payload():
     models_dir = Path(__file__).resolve().parents[3] / "services" / "core" / "ml_models" / "models"
     models = []
     for meta_file in models_dir.glob("*_metadata.json"):
@@ -149,6 +175,8 @@ async def cluster_insights(request: Request, n_clusters: int = 3):
         return {"clusters": [], "insights": [], "count": len(rows)}
 
     df = pd.DataFrame(rows, columns=["id", "timestamp", "umidade", "ph", "temperatura"])
+    # Colunas Numeric chegam como Decimal: converte antes do KMeans
+    df[["umidade", "ph", "temperatura"]] = df[["umidade", "ph", "temperatura"]].astype(float)
     data = df[["umidade", "ph", "temperatura"]].values
 
     ml = MLModelsService()
@@ -161,6 +189,7 @@ async def cluster_insights(request: Request, n_clusters: int = 3):
     df["cluster"] = clusters_labels
 
     # Gerar insights por cluster
+    limites = _alert_limits(request)
     cluster_insights = []
     for i in range(n_clusters):
         cluster_data = df[df["cluster"] == i]
@@ -196,21 +225,23 @@ async def cluster_insights(request: Request, n_clusters: int = 3):
         # Gerar descrição automática
         description = f"Cluster {i+1} apresenta {', '.join(characteristics).lower()}"
 
-        # Gerar recomendações
+        # Gerar recomendações pelos limites das regras de alerta. Padroes (sem regras
+        # editadas): umidade 15/85, temperatura 10/40, pH 5.5/7.5 - antes fixos em
+        # 30/80, 10/30 e 6/8, divergentes dos alertas reais
         recommendations = []
-        if umidade_avg > 80:
+        if umidade_avg > limites["umidade_alta"]:
             recommendations.append("Considere aumentar ventilação para reduzir umidade")
-        elif umidade_avg < 30:
+        elif umidade_avg < limites["umidade_critica_baixa"]:
             recommendations.append("Recomenda-se aumentar irrigação ou umidificação")
 
-        if temp_avg > 30:
+        if temp_avg > limites["temperatura_alta"]:
             recommendations.append("Ativar sistema de resfriamento")
-        elif temp_avg < 10:
+        elif temp_avg < limites["temperatura_baixa"]:
             recommendations.append("Ativar sistema de aquecimento")
 
-        if ph_avg > 8:
+        if ph_avg > limites["ph_alto"]:
             recommendations.append("pH muito alcalino - adicionar corretivos ácidos")
-        elif ph_avg < 6:
+        elif ph_avg < limites["ph_baixo"]:
             recommendations.append("pH muito ácido - adicionar calcário")
 
         if not recommendations:
@@ -380,6 +411,48 @@ async def whatif_simulation(scenario: WhatIfScenario, request: Request):
     }
 
 
+@router.post("/whatif/replay")
+async def whatif_replay(body: WhatIfReplayRequest, request: Request):
+    """
+    Reprocessa as leituras armazenadas com limites alternativos de irrigação e
+    alertas e compara com os limites atuais: horas de bomba, água, custo e alertas.
+    """
+    from dataclasses import fields, replace
+    from services.core.iot_gateway.irrigation_logic import IrrigationThresholds
+    from services.core.iot_gateway.replay import ReplayScenario, WhatIfReplay
+
+    # Padrao arredondado para a proxima hora: a chave do cache fica estavel entre chamadas
+    # (leituras novas dentro da hora mudam o carimbo de dados e invalidam o resultado)
+    fim = body.fim or datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    inicio = body.inicio or fim - timedelta(days=90)
+    if inicio >= fim:
+        raise HTTPException(status_code=400, detail="inicio deve ser anterior a fim")
+
+    invalid = set(body.limites_irrigacao) - {f.name for f in fields(IrrigationThresholds)}
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"limites_irrigacao inválidos: {sorted(invalid)}")
+
+    # Baseline = comportamento da ingestao: emergencia da bomba pela regra umidade_critica_baixa
+    # de cada sensor; o cenario aplica limites_alerta (inclusive na emergencia) e limites_irrigacao
+    baseline = ReplayScenario(
+        vazao_lph=body.vazao_lph, custo_agua_m3=body.custo_agua_m3, custo_energia_hora=body.custo_energia_hora
+    )
+    scenario = replace(
+        baseline, alert_limits=dict(body.limites_alerta), irrigation_limits=dict(body.limites_irrigacao)
+    )
+
+    replay = getattr(request.app.state, "whatif_replay", None)
+    if replay is None:
+        replay = WhatIfReplay(request.app.state.db, getattr(request.app.state, "rule_engine", None))
+        request.app.state.whatif_replay = replay
+
+    try:
+        result = await run_in_threadpool(replay.compare, baseline, scenario, inicio, fim, body.id_sensores)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "limites_irrigacao": body.limites_irrigacao, "limites_alerta": body.limites_alerta}
+
+
 @router.get("/alerts")
 async def get_alerts(request: Request):
     """
@@ -420,14 +493,16 @@ async def get_alerts(request: Request):
         forecast = ml.forecast_umidade(history[-30:], steps=7)
         predictions = forecast.get("predictions", [])
 
-        # Alertas críticos
-        if current_umidade < 30:
+        # Alertas críticos (limites das regras umidade_critica_baixa / umidade_alta;
+        # padroes 15/85, antes fixos em 30/80)
+        limites = _alert_limits(request)
+        if current_umidade < limites["umidade_critica_baixa"]:
             alerts.append({
                 "level": "critical",
                 "type": "umidade_baixa",
                 "message": "Umidade crítica detectada",
                 "value": round(current_umidade, 2),
-                "threshold": 30,
+                "threshold": limites["umidade_critica_baixa"],
                 "timestamp": datetime.utcnow().isoformat()
             })
             recommendations.append({
@@ -435,13 +510,13 @@ async def get_alerts(request: Request):
                 "action": "Ativar sistema de irrigação imediatamente",
                 "reason": f"Umidade atual ({round(current_umidade, 2)}%) abaixo do limite seguro"
             })
-        elif current_umidade > 80:
+        elif current_umidade > limites["umidade_alta"]:
             alerts.append({
                 "level": "warning",
                 "type": "umidade_alta",
                 "message": "Umidade elevada detectada",
                 "value": round(current_umidade, 2),
-                "threshold": 80,
+                "threshold": limites["umidade_alta"],
                 "timestamp": datetime.utcnow().isoformat()
             })
             recommendations.append({
@@ -0,0 +1,95 @@
+"""
+Startup warm-up tasks
+Critical work (DB, tables) runs inside the lifespan before the API accepts
+requests; slow warm-up work (CV seeding, model loading) runs in background
+threads and reports progress for the readiness endpoint.
+"""
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+
+class WarmupTask:
+    """Progress record for a single background warm-up task"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = "pending"
+        self.done = 0
+        self.total: Optional[int] = None
+        self.detail: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def progress(self, done: int, total: Optional[int] = None) -> None:
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def to_dict(self) -> Dict:
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.finished_at or time.monotonic()) - self.started_at, 2)
+        return {
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "detail": self.detail,
+            "elapsed_s": elapsed,
+        }
+
+
+class WarmupRegistry:
+    """Runs warm-up callables off the event loop and tracks their progress"""
+
+    def __init__(self):
+        self.tasks: Dict[str, WarmupTask] = {}
+        self.stop_event = threading.Event()
+        self._futures: List[asyncio.Future] = []
+
+    def start(self, name: str, fn: Callable[[WarmupTask], Optional[str]]) -> WarmupTask:
+        """
+        Schedule `fn(task)` in a worker thread. The callable may update
+        `task.progress()` and return a short detail string (e.g. skip reason).
+        """
+        task = WarmupTask(name)
+        self.tasks[name] = task
+
+        def run() -> None:
+            task.status = "running"
+            task.started_at = time.monotonic()
+            try:
+                task.detail = fn(task)
+                task.status = "done"
+            except Exception as e:
+                task.status = "failed"
+                task.detail = str(e)
+                logger.warning("warmup_task_failed", task=name, error=str(e))
+            finally:
+                task.finished_at = time.monotonic()
+                logger.info("warmup_task_finished", task=name, **task.to_dict())
+
+        self._futures.append(asyncio.ensure_future(asyncio.to_thread(run)))
+        return task
+
+    @property
+    def ready(self) -> bool:
+        return all(t.status in ("done", "failed") for t in self.tasks.values())
+
+    def snapshot(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "tasks": {name: t.to_dict() for name, t in self.tasks.items()},
+        }
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        """Signal tasks to stop and wait briefly for worker threads."""
+        self.stop_event.set()
+        pending = [f for f in self._futures if not f.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
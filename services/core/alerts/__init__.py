@@ -3,5 +3,10 @@ Módulo de Sistema de Alertas e Recomendações Inteligentes - Fase 7
 """
 from .service import AlertsService
 from .action_templates import ActionTemplates, ActionTemplate
+from .digest import AlertDigest
+from .dispatcher import NotificationDispatcher
+from .rules import RuleEngine
+from .state_engine import AlertStateEngine
+from .weather import WeatherAlertScheduler
 
-__all__ = ["AlertsService", "ActionTemplates", "ActionTemplate"]
+__all__ = ["AlertsService", "ActionTemplates", "ActionTemplate", "NotificationDispatcher", "AlertStateEngine", "AlertDigest", "RuleEngine", "WeatherAlertScheduler"]
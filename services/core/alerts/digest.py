@@ -0,0 +1,274 @@
+"""
+Resumo (digest) de alertas por email - Fase 7
+Alertas nao criticos ficam em buffer por destinatario durante uma janela que
+depende da severidade; ao vencer a janela sai um unico email consolidado com
+todas as ocorrencias e acoes recomendadas. Alertas criticos nao entram no buffer.
+Com dispatcher, o resumo vai para o outbox (retry e rate limit do dispatcher);
+sem ele, o envio e direto e, se falhar, os alertas voltam para o buffer.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import structlog
+
+from .action_templates import ActionTemplate, ActionTemplates
+
+logger = structlog.get_logger()
+
+SEVERITY_ORDER = ["baixa", "media", "alta", "critica"]
+
+
+@dataclass
+class DigestItem:
+    """Alerta aguardando envio no resumo"""
+    titulo: str
+    mensagem: str
+    severidade: str
+    data_hora: datetime
+    actions: List[ActionTemplate] = field(default_factory=list)
+    alert_id: Optional[int] = None
+
+
+@dataclass
+class _RecipientBuffer:
+    items: List[DigestItem] = field(default_factory=list)
+    deadline: float = 0.0
+
+
+class AlertDigest:
+    """Buffer de alertas por destinatario com janela de envio por severidade"""
+
+    # Janela (segundos) por severidade; 0 = envio imediato
+    DEFAULT_WINDOWS = {"critica": 0.0, "alta": 300.0, "media": 900.0, "baixa": 3600.0}
+
+    def __init__(
+        self,
+        aws_service,
+        windows: Optional[Dict[str, float]] = None,
+        max_items: int = 50,
+        poll_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+        dispatcher=None,
+        retry_delay: float = 60.0,
+    ):
+        self.aws = aws_service
+        self.dispatcher = dispatcher
+        self.retry_delay = retry_delay
+        self.windows = {**self.DEFAULT_WINDOWS, **(windows or {})}
+        self.max_items = max_items
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self._buffers: Dict[str, _RecipientBuffer] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"alerts_buffered": 0, "digests_sent": 0, "emails_saved": 0, "failed": 0, "requeued": 0}
+
+    @classmethod
+    def from_env(cls, aws_service, dispatcher=None) -> "AlertDigest":
+        import os
+
+        # Formato: alta=300,media=900,baixa=3600
+        windows = {}
+        for part in os.getenv("NOTIFY_DIGEST_WINDOWS", "").split(","):
+            if "=" in part:
+                severidade, seconds = part.split("=", 1)
+                windows[severidade.strip()] = float(seconds)
+        return cls(
+            aws_service,
+            windows=windows,
+            max_items=int(os.getenv("NOTIFY_DIGEST_MAX_ITEMS", 50)),
+            dispatcher=dispatcher,
+        )
+
+    def window_for(self, severidade: str) -> float:
+        return self.windows.get((severidade or "").lower(), self.windows["media"])
+
+    def accepts(self, severidade: str) -> bool:
+        """False para severidades de envio imediato (critica por padrao)."""
+        return self.window_for(severidade) > 0
+
+    # ---------- Buffer ----------
+    def add(
+        self,
+        titulo: str,
+        mensagem: str,
+        severidade: str,
+        emails: List[str],
+        actions: Optional[List[ActionTemplate]] = None,
+        alert_id: Optional[int] = None,
+    ) -> int:
+        """Coloca o alerta no buffer de cada destinatario; devolve quantos emails foram adiados."""
+        item = DigestItem(titulo, mensagem, severidade, datetime.now(), list(actions or []), alert_id)
+        deadline = self.clock() + self.window_for(severidade)
+        full = []
+        buffered = 0
+
+        with self._lock:
+            for email in emails:
+                if not self.aws._validate_email(email):
+                    continue
+                buffer = self._buffers.get(email)
+                if buffer is None:
+                    buffer = self._buffers[email] = _RecipientBuffer(deadline=deadline)
+                buffer.items.append(item)
+                # Uma severidade mais alta antecipa o envio do resumo inteiro
+                buffer.deadline = min(buffer.deadline, deadline)
+                buffered += 1
+                if len(buffer.items) >= self.max_items:
+                    full.append(email)
+            self.counters["alerts_buffered"] += buffered
+
+        for email in full:
+            self._send(email, self._pop(email))
+        return buffered
+
+    def _requeue(self, email: str, items: List[DigestItem]) -> None:
+        """Devolve ao buffer os alertas de um resumo que falhou, para nova tentativa."""
+        with self._lock:
+            buffer = self._buffers.get(email)
+            if buffer is None:
+                buffer = self._buffers[email] = _RecipientBuffer(deadline=self.clock() + self.retry_delay)
+            buffer.items[:0] = items
+            self.counters["requeued"] += len(items)
+
+    def _pop(self, email: str) -> List[DigestItem]:
+        with self._lock:
+            buffer = self._buffers.pop(email, None)
+        return buffer.items if buffer else []
+
+    def pending(self) -> Dict[str, int]:
+        with self._lock:
+            return {email: len(b.items) for email, b in self._buffers.items()}
+
+    # ---------- Envio ----------
+    def flush_due(self, force: bool = False) -> int:
+        """Envia os resumos com janela vencida (ou todos, com force); devolve quantos emails sairam."""
+        now = self.clock()
+        with self._lock:
+            due = [email for email, b in self._buffers.items() if force or b.deadline <= now]
+        sent = 0
+        for email in due:
+            items = self._pop(email)
+            if items and self._send(email, items):
+                sent += 1
+        return sent
+
+    def _send(self, email: str, items: List[DigestItem]) -> bool:
+        if not items:
+            return False
+        digest = self.render(items)
+        try:
+            if self.dispatcher is not None:
+                ok = self.dispatcher.enqueue_email(email, digest["subject"], digest["text"], digest["html"])
+                message_id = "outbox" if ok else ""
+            else:
+                message_id = self.aws.send_email_html(email, digest["subject"], digest["html"], digest["text"])
+        except Exception as e:
+            logger.error("alert_digest_send_failed", to=email, error=str(e))
+            message_id = ""
+        if not message_id:
+            with self._lock:
+                self.counters["failed"] += 1
+            self._requeue(email, items)
+            logger.warning("alert_digest_requeued", to=email, alerts=len(items))
+            return False
+        with self._lock:
+            self.counters["digests_sent"] += 1
+            self.counters["emails_saved"] += len(items) - 1
+        logger.info("alert_digest_sent", to=email, alerts=len(items), message_id=message_id)
+        return True
+
+    def render(self, items: List[DigestItem]) -> Dict[str, str]:
+        """Monta um email consolidado (subject, html, text) com os alertas e acoes."""
+        worst = max((i.severidade for i in items), key=_severity_rank)
+        config = self.aws._severity_config(worst)
+        ordered = sorted(items, key=lambda i: (-_severity_rank(i.severidade), i.data_hora))
+
+        rows_html = "".join(
+            f"<tr><td>{i.data_hora.strftime('%d/%m %H:%M')}</td><td>{i.severidade.upper()}</td>"
+            f"<td><strong>{i.titulo}</strong><br/>{i.mensagem}</td></tr>"
+            for i in ordered
+        )
+        # Cada acao aparece uma vez, mesmo que varios alertas recomendem a mesma
+        actions: Dict[str, ActionTemplate] = {}
+        for i in ordered:
+            for action in i.actions:
+                actions.setdefault(action.titulo, action)
+        actions_html = "".join(ActionTemplates.format_action_for_email(a) for a in actions.values())
+
+        html_body = f"""
+        <!DOCTYPE html>
+        <html>
+        <head><meta charset="UTF-8"></head>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <div style="background: {config['color']}; color: white; padding: 20px; border-radius: 5px 5px 0 0;">
+                    <h2>{config['emoji']} Resumo de {len(items)} alertas</h2>
+                    <p>Maior severidade: {worst.upper()}</p>
+                </div>
+                <table style="width: 100%; border-collapse: collapse;" border="1" cellpadding="6">
+                    <tr><th>Data/Hora</th><th>Severidade</th><th>Alerta</th></tr>
+                    {rows_html}
+                </table>
+                {f'<h3>Ações Recomendadas</h3>{actions_html}' if actions_html else ''}
+                <p style="text-align: center; color: #666; font-size: 12px;">FarmTech Monitoring System | ISO 27001 Compliant</p>
+            </div>
+        </body>
+        </html>
+        """
+
+        text_lines = [f"{config['emoji']} Resumo de {len(items)} alertas (maior severidade: {worst.upper()})", ""]
+        text_lines += [
+            f"- [{i.severidade.upper()}] {i.data_hora.strftime('%d/%m %H:%M')} {i.titulo}: {i.mensagem}" for i in ordered
+        ]
+        text_lines += [f"* {a.titulo}: {a.descricao}" for a in actions.values()]
+        text_lines += ["", "---", "FarmTech Monitoring System"]
+
+        return {
+            "subject": f"[{worst.upper()}] Resumo: {len(items)} alertas FarmTech",
+            "html": html_body,
+            "text": "\n".join(text_lines),
+        }
+
+    # ---------- Ciclo de vida ----------
+    def _loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.flush_due()
+            except Exception as e:
+                logger.error("alert_digest_flush_failed", error=str(e))
+
+    def start(self) -> "AlertDigest":
+        self._thread = threading.Thread(target=self._loop, name="alert-digest", daemon=True)
+        self._thread.start()
+        logger.info("alert_digest_started", windows=self.windows)
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Para o thread e envia o que restou no buffer para nao perder alertas."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush_due(force=True)
+        pending = sum(self.pending().values())
+        if pending:
+            logger.error("alert_digest_unsent_on_stop", alerts=pending)
+        logger.info("alert_digest_stopped", **self.counters)
+
+    def stats(self) -> Dict:
+        pending = self.pending()
+        with self._lock:
+            return {
+                **self.counters,
+                "recipients_pending": len(pending),
+                "alerts_pending": sum(pending.values()),
+                "windows": dict(self.windows),
+            }
+
+
+def _severity_rank(severidade: str) -> int:
+    return SEVERITY_ORDER.index(severidade) if severidade in SEVERITY_ORDER else 1
@@ -0,0 +1,359 @@
+"""
+Dispatcher assincrono de notificacoes - Fase 7
+Alertas apenas gravam linhas no outbox (notificacoes_outbox), na mesma
+transacao do alerta; um thread de despacho entrega emails/SMS em paralelo com
+retry exponencial e limite de taxa por canal, sem bloquear a ingestao.
+Cada linha e reservada por um UPDATE condicional (status='pendente'), entao
+varios workers/processos nunca enviam a mesma notificacao; reservas sem
+conclusao voltam para a fila apos `lease_timeout`.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import structlog
+from sqlalchemy import or_, update
+
+from services.core.database.models import Alert, NotificacaoOutbox
+from services.core.database.service import DatabaseService
+
+logger = structlog.get_logger()
+
+
+class TokenBucket:
+    """Limitador de taxa (tokens/segundo) com rajada de `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """Bloqueia ate haver um token; False se o dispatcher parar antes."""
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop_event is not None and stop_event.wait(wait):
+                return False
+            if stop_event is None:
+                time.sleep(wait)
+
+
+class NotificationDispatcher:
+    """Entrega notificacoes do outbox com pool de threads, retry e rate limit"""
+
+    # Limites padrao das contas AWS (SES sandbox: 1/s; producao: 14/s)
+    DEFAULT_RATES = {"email": 14.0, "sms": 10.0}
+
+    def __init__(
+        self,
+        db_service: DatabaseService,
+        aws_service,
+        max_workers: int = 8,
+        max_attempts: int = 5,
+        base_backoff: float = 2.0,
+        max_backoff: float = 300.0,
+        rates: Optional[Dict[str, float]] = None,
+        batch_size: int = 50,
+        poll_interval: float = 1.0,
+        lease_timeout: float = 300.0,
+    ):
+        self.db = db_service
+        self.aws = aws_service
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self.buckets = {canal: TokenBucket(rate) for canal, rate in {**self.DEFAULT_RATES, **(rates or {})}.items()}
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notify")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.counters = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0}
+
+    @classmethod
+    def from_env(cls, db_service: DatabaseService, aws_service) -> "NotificationDispatcher":
+        import os
+
+        return cls(
+            db_service,
+            aws_service,
+            max_workers=int(os.getenv("NOTIFY_WORKERS", 8)),
+            max_attempts=int(os.getenv("NOTIFY_MAX_ATTEMPTS", 5)),
+            base_backoff=float(os.getenv("NOTIFY_BACKOFF_SECONDS", 2.0)),
+            lease_timeout=float(os.getenv("NOTIFY_LEASE_SECONDS", 300.0)),
+            rates={
+                "email": float(os.getenv("NOTIFY_EMAIL_RATE", cls.DEFAULT_RATES["email"])),
+                "sms": float(os.getenv("NOTIFY_SMS_RATE", cls.DEFAULT_RATES["sms"])),
+            },
+        )
+
+    # ---------- Enfileiramento ----------
+    def enqueue(
+        self,
+        titulo: str,
+        mensagem: str,
+        severidade: str,
+        emails: List[str],
+        phones: List[str],
+        recommended_action: Optional[str] = None,
+        alert_id: Optional[int] = None,
+        session=None,
+    ) -> Dict[str, int]:
+        """
+        Renderiza o alerta e grava uma linha por destinatario no outbox. Com
+        `session`, as linhas entram na transacao do chamador (ex: junto do
+        alerta) e o chamador chama wake() depois do commit.
+        """
+        email = self.aws.render_alert_email(titulo, mensagem, severidade, recommended_action)
+        sms_text = self.aws.render_alert_sms(titulo, mensagem, severidade, recommended_action)
+        now = datetime.utcnow()
+
+        rows = [
+            NotificacaoOutbox(
+                id_alerta=alert_id, canal="email", destinatario=to, assunto=email["subject"],
+                corpo=email["text"], corpo_html=email["html"], proxima_tentativa=now,
+            )
+            for to in emails if self.aws._validate_email(to)
+        ] + [
+            NotificacaoOutbox(
+                id_alerta=alert_id, canal="sms", destinatario=phone, corpo=sms_text, proxima_tentativa=now,
+            )
+            for phone in phones if self.aws._validate_phone_number(phone)
+        ]
+        queued = {
+            "emails_queued": sum(1 for r in rows if r.canal == "email"),
+            "sms_queued": sum(1 for r in rows if r.canal == "sms"),
+        }
+        if rows:
+            if session is not None:
+                session.add_all(rows)
+            else:
+                with self.db.get_session() as own:
+                    own.add_all(rows)
+                self._wake.set()
+            self._bump("enqueued", len(rows))
+
+        logger.info("notifications_enqueued", alert_id=alert_id, **queued)
+        return queued
+
+    def enqueue_email(
+        self, destinatario: str, assunto: str, corpo: str, corpo_html: Optional[str] = None,
+        alert_id: Optional[int] = None,
+    ) -> bool:
+        """Grava um email ja renderizado (ex: resumo de alertas) no outbox."""
+        if not self.aws._validate_email(destinatario):
+            return False
+        with self.db.get_session() as session:
+            session.add(NotificacaoOutbox(
+                id_alerta=alert_id, canal="email", destinatario=destinatario, assunto=assunto,
+                corpo=corpo, corpo_html=corpo_html, proxima_tentativa=datetime.utcnow(),
+            ))
+        self._bump("enqueued")
+        self._wake.set()
+        return True
+
+    def wake(self) -> None:
+        """Acorda o thread de despacho (linhas gravadas na transacao do chamador)."""
+        self._wake.set()
+
+    def submit(self, fn, *args, **kwargs) -> None:
+        """Executa trabalho auxiliar (ex: auditoria CloudWatch) fora do caminho de ingestao."""
+        self._executor.submit(fn, *args, **kwargs)
+
+    # ---------- Entrega ----------
+    def _claim_due(self) -> List[int]:
+        """
+        Reserva ('enviando') as notificacoes vencidas e devolve seus ids. Cada
+        reserva e um UPDATE ... WHERE status='pendente': so conta se afetou a
+        linha, entao outro worker que a reservou antes nao a envia de novo.
+        """
+        now = datetime.utcnow()
+        with self.db.get_session() as session:
+            query = (
+                session.query(NotificacaoOutbox.id_notificacao)
+                .filter(
+                    NotificacaoOutbox.status == "pendente",
+                    NotificacaoOutbox.proxima_tentativa <= now,
+                )
+                .order_by(NotificacaoOutbox.proxima_tentativa)
+                .limit(self.batch_size)
+            )
+            if self.db.engine.dialect.name == "postgresql":
+                query = query.with_for_update(skip_locked=True)
+            claimed = []
+            for (notification_id,) in query.all():
+                result = session.execute(
+                    update(NotificacaoOutbox)
+                    .where(
+                        NotificacaoOutbox.id_notificacao == notification_id,
+                        NotificacaoOutbox.status == "pendente",
+                    )
+                    .values(status="enviando", reservado_em=now)
+                )
+                if result.rowcount == 1:
+                    claimed.append(notification_id)
+            return claimed
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _deliver(self, notification_id: int) -> None:
+        with self.db.get_session() as session:
+            row = session.get(NotificacaoOutbox, notification_id)
+            canal, destinatario = row.canal, row.destinatario
+            assunto, corpo, corpo_html = row.assunto, row.corpo, row.corpo_html
+
+        bucket = self.buckets.get(canal)
+        if bucket and not bucket.acquire(self._stop):
+            self._release(notification_id)
+            return
+
+        error = None
+        message_id = ""
+        try:
+            if canal == "email":
+                message_id = self.aws.send_email_html(destinatario, assunto, corpo_html or corpo, corpo)
+            else:
+                message_id = self.aws.send_sms(destinatario, corpo)
+        except Exception as e:
+            error = str(e)
+        if not message_id and not error:
+            error = f"{canal}_send_failed"
+
+        with self.db.get_session() as session:
+            row = session.get(NotificacaoOutbox, notification_id)
+            row.tentativas += 1
+            row.reservado_em = None
+            if message_id:
+                row.status = "enviado"
+                row.message_id = message_id
+                row.data_envio = datetime.utcnow()
+                row.ultimo_erro = None
+                if row.id_alerta:
+                    alert = session.get(Alert, row.id_alerta)
+                    if alert and not alert.message_id:
+                        alert.message_id = message_id
+                outcome = "sent"
+            elif row.tentativas >= self.max_attempts:
+                row.status = "falhou"
+                row.ultimo_erro = error[:500]
+                outcome = "failed"
+            else:
+                row.status = "pendente"
+                row.ultimo_erro = error[:500]
+                row.proxima_tentativa = datetime.utcnow() + timedelta(seconds=self._backoff(row.tentativas))
+                outcome = "retried"
+            attempts = row.tentativas
+
+        self._bump(outcome)
+        log = logger.warning if outcome != "sent" else logger.info
+        log("notification_delivery", id=notification_id, canal=canal, outcome=outcome, attempts=attempts, error=error)
+
+    def _release(self, notification_id: int) -> None:
+        with self.db.get_session() as session:
+            row = session.get(NotificacaoOutbox, notification_id)
+            if row and row.status == "enviando":
+                row.status = "pendente"
+                row.reservado_em = None
+
+    def dispatch_once(self) -> int:
+        """Entrega um lote de notificacoes vencidas e aguarda a conclusao."""
+        ids = self._claim_due()
+        futures = [self._executor.submit(self._deliver, i) for i in ids]
+        for f in futures:
+            try:
+                f.result()
+            except Exception as e:
+                logger.error("notification_worker_failed", error=str(e))
+        return len(ids)
+
+    def _loop(self) -> None:
+        last_recover = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - last_recover >= self.lease_timeout:
+                    self.recover()
+                    last_recover = time.monotonic()
+                processed = self.dispatch_once()
+            except Exception as e:
+                logger.error("notification_dispatch_failed", error=str(e))
+                processed = 0
+            if not processed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    # ---------- Ciclo de vida ----------
+    def recover(self) -> int:
+        """
+        Devolve para a fila notificacoes interrompidas no meio do envio: so as
+        reservadas ha mais de lease_timeout (as de workers vivos ficam).
+        """
+        expired = datetime.utcnow() - timedelta(seconds=self.lease_timeout)
+        with self.db.get_session() as session:
+            recovered = (
+                session.query(NotificacaoOutbox)
+                .filter(
+                    NotificacaoOutbox.status == "enviando",
+                    or_(NotificacaoOutbox.reservado_em.is_(None), NotificacaoOutbox.reservado_em < expired),
+                )
+                .update({"status": "pendente", "reservado_em": None}, synchronize_session=False)
+            )
+        if recovered:
+            logger.warning("notifications_lease_expired", recovered=recovered)
+        return recovered
+
+    def start(self) -> "NotificationDispatcher":
+        recovered = self.recover()
+        self._thread = threading.Thread(target=self._loop, name="notify-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info("notification_dispatcher_started", workers=self.max_workers, recovered=recovered)
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        logger.info("notification_dispatcher_stopped", **self.counters)
+
+    def drain(self, timeout: float = 30.0) -> None:
+        """Processa ate nao haver notificacoes vencidas (scripts/testes)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.dispatch_once():
+            pass
+
+    def _bump(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += amount
+
+    def stats(self) -> Dict:
+        from sqlalchemy import func
+
+        with self.db.get_session() as session:
+            by_status = dict(
+                session.query(NotificacaoOutbox.status, func.count(NotificacaoOutbox.id_notificacao))
+                .group_by(NotificacaoOutbox.status)
+                .all()
+            )
+        return {"outbox": by_status, **self.counters}
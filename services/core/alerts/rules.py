@@ -0,0 +1,285 @@
+"""
+Motor de regras de alerta - Fase 7
+Limites de alerta vem da tabela regras_alerta (globais ou por talhao/cultura)
+em vez de constantes no codigo. As regras sao compiladas em arrays NumPy e um
+lote de leituras e avaliado contra todas as regras em uma unica passada.
+Alteracoes nas regras valem sem deploy: a versao 'regras_alerta' em
+config_versoes invalida a compilacao em todos os workers.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import structlog
+
+from .state_engine import AlertCondition
+
+logger = structlog.get_logger()
+
+NO_SCOPE = -1
+
+
+@dataclass
+class AlertRule(AlertCondition):
+    """AlertCondition com escopo e prioridade; usada tambem pelo motor de estado"""
+    id_regra: Optional[int] = None
+    id_talhao: Optional[int] = None
+    id_cultura: Optional[int] = None
+    prioridade: int = 100
+
+    @property
+    def specificity(self) -> int:
+        # Talhao vence cultura, que vence regra global
+        return (2 if self.id_talhao is not None else 0) + (1 if self.id_cultura is not None else 0)
+
+    @classmethod
+    def from_model(cls, regra) -> "AlertRule":
+        return cls(
+            alert_type=regra.tipo_alerta,
+            metric=regra.metrica,
+            direction=regra.direcao,
+            threshold=float(regra.limite),
+            clear_margin=float(regra.margem_histerese or 0.0),
+            severidade=regra.severidade,
+            titulo=regra.titulo,
+            mensagem=regra.mensagem,
+            id_regra=regra.id_regra,
+            id_talhao=regra.id_talhao,
+            id_cultura=regra.id_cultura,
+            prioridade=regra.prioridade,
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "id_regra": self.id_regra,
+            "tipo_alerta": self.alert_type,
+            "metrica": self.metric,
+            "direcao": self.direction,
+            "limite": self.threshold,
+            "margem_histerese": self.clear_margin,
+            "severidade": self.severidade,
+            "titulo": self.titulo,
+            "mensagem": self.mensagem,
+            "id_talhao": self.id_talhao,
+            "id_cultura": self.id_cultura,
+            "prioridade": self.prioridade,
+        }
+
+
+def rule_rows_from_conditions(conditions: Iterable[AlertCondition]) -> List[Dict]:
+    """Converte condicoes (ex: default_iot_conditions) em linhas para regras_alerta."""
+    return [
+        {
+            "tipo_alerta": c.alert_type,
+            "metrica": c.metric,
+            "direcao": c.direction,
+            "limite": c.threshold,
+            "margem_histerese": c.clear_margin,
+            "severidade": c.severidade,
+            "titulo": c.titulo,
+            "mensagem": c.mensagem,
+            "prioridade": (i + 1) * 10,
+        }
+        for i, c in enumerate(conditions)
+    ]
+
+
+class CompiledRules:
+    """Regras em arrays paralelos; avalia (leituras x regras) com broadcasting"""
+
+    def __init__(self, rules: Sequence[AlertRule]):
+        self.rules = sorted(rules, key=lambda r: (r.prioridade, r.id_regra or 0))
+        self.metrics = sorted({r.metric for r in self.rules})
+        index = {m: i for i, m in enumerate(self.metrics)}
+
+        self.metric_idx = np.array([index[r.metric] for r in self.rules], dtype=np.intp)
+        self.limit = np.array([r.threshold for r in self.rules], dtype=float)
+        # Disparo: sign * (valor - limite) > 0
+        self.sign = np.array([-1.0 if r.direction == "below" else 1.0 for r in self.rules])
+        self.margin = np.array([r.clear_margin for r in self.rules], dtype=float)
+        self.talhao = np.array([NO_SCOPE if r.id_talhao is None else r.id_talhao for r in self.rules], dtype=np.int64)
+        self.cultura = np.array([NO_SCOPE if r.id_cultura is None else r.id_cultura for r in self.rules], dtype=np.int64)
+        self.specificity = np.array([r.specificity for r in self.rules], dtype=np.int64)
+        tipos, self.tipo_idx = np.unique([r.alert_type for r in self.rules], return_inverse=True)
+        self.n_tipos = len(tipos)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def values_matrix(self, readings: Sequence[Dict]) -> np.ndarray:
+        """Matriz (leituras x metricas) com NaN onde a metrica nao veio."""
+        values = np.full((len(readings), len(self.metrics)), np.nan)
+        for j, metric in enumerate(self.metrics):
+            column = [r.get(metric) for r in readings]
+            values[:, j] = [np.nan if v is None else float(v) for v in column]
+        return values
+
+    def scope_mask(self, talhao: np.ndarray, cultura: np.ndarray) -> np.ndarray:
+        """(leituras x regras): regra vale para a leitura e e a mais especifica do seu tipo."""
+        talhao = np.asarray(talhao, dtype=np.int64)[:, None]
+        cultura = np.asarray(cultura, dtype=np.int64)[:, None]
+        in_scope = ((self.talhao == NO_SCOPE) | (self.talhao == talhao)) & (
+            (self.cultura == NO_SCOPE) | (self.cultura == cultura)
+        )
+        spec = np.where(in_scope, self.specificity, -1)
+        best = np.full((len(talhao), self.n_tipos), -1, dtype=np.int64)
+        for t in range(self.n_tipos):
+            cols = self.tipo_idx == t
+            best[:, t] = spec[:, cols].max(axis=1)
+        return in_scope & (spec == best[:, self.tipo_idx])
+
+    def evaluate(self, values: np.ndarray, talhao: np.ndarray, cultura: np.ndarray) -> np.ndarray:
+        """(leituras x regras) booleano: regra disparou para a leitura."""
+        if not len(self.rules):
+            return np.zeros((len(values), 0), dtype=bool)
+        v = values[:, self.metric_idx]
+        with np.errstate(invalid="ignore"):
+            hit = self.sign * (v - self.limit) > 0  # NaN -> False
+        return hit & self.scope_mask(talhao, cultura)
+
+    def limits_for(self, talhao: int = NO_SCOPE, cultura: int = NO_SCOPE) -> Dict[str, float]:
+        """Limite efetivo por tipo_alerta (regra mais especifica e prioritaria) no escopo."""
+        limits: Dict[str, float] = {}
+        if not len(self.rules):
+            return limits
+        mask = self.scope_mask(np.array([talhao]), np.array([cultura]))[0]
+        for j in np.flatnonzero(mask):
+            limits.setdefault(self.rules[j].alert_type, float(self.limit[j]))
+        return limits
+
+    def cleared(self, values: np.ndarray) -> np.ndarray:
+        """(leituras x regras) booleano: valor voltou alem da margem de histerese."""
+        v = values[:, self.metric_idx]
+        with np.errstate(invalid="ignore"):
+            return self.sign * (v - self.limit) <= -self.margin
+
+
+class RuleEngine:
+    """Carrega regras_alerta, compila e avalia leituras; recompila quando a versao muda"""
+
+    VERSION_KEYS = ("regras_alerta", "sensores", "talhoes")
+
+    def __init__(self, db_service, check_interval: float = 5.0):
+        self.db = db_service
+        self.check_interval = check_interval
+        self._compiled: Optional[CompiledRules] = None
+        self._scopes: Dict[int, tuple] = {}
+        self._versions: Optional[Dict[str, int]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"compilations": 0, "readings_evaluated": 0, "matches": 0}
+        db_service.add_change_listener(
+            lambda tables: tables & set(self.VERSION_KEYS) and self.invalidate()
+        )
+
+    @classmethod
+    def from_env(cls, db_service) -> "RuleEngine":
+        import os
+
+        return cls(db_service, check_interval=float(os.getenv("ALERT_RULES_CHECK_SECONDS", 5)))
+
+    def ensure_defaults(self, conditions: Iterable[AlertCondition]) -> int:
+        """Popula regras_alerta com as condicoes padrao se a tabela estiver vazia."""
+        if self.db.get_regras_alerta(apenas_ativas=False):
+            return 0
+        rows = rule_rows_from_conditions(conditions)
+        for row in rows:
+            self.db.create_regra_alerta(row)
+        logger.info("alert_rules_seeded", count=len(rows))
+        return len(rows)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._compiled = None
+
+    # ---------- Compilacao ----------
+    def compiled(self) -> CompiledRules:
+        now = time.monotonic()
+        compiled = self._compiled
+        if compiled is not None and now - self._checked_at < self.check_interval:
+            return compiled
+
+        with self._lock:
+            if self._compiled is not None and now - self._checked_at < self.check_interval:
+                return self._compiled
+            versions = self.db.get_config_versions(self.VERSION_KEYS)
+            if self._compiled is None or versions != self._versions:
+                self._compiled = CompiledRules([AlertRule.from_model(r) for r in self.db.get_regras_alerta()])
+                self._scopes = self.db.get_sensor_scopes()
+                self._versions = versions
+                self.counters["compilations"] += 1
+                logger.info("alert_rules_compiled", rules=len(self._compiled), sensors=len(self._scopes))
+            self._checked_at = now
+            return self._compiled
+
+    def _scope_arrays(self, readings: Sequence[Dict]):
+        talhao = np.full(len(readings), NO_SCOPE, dtype=np.int64)
+        cultura = np.full(len(readings), NO_SCOPE, dtype=np.int64)
+        for i, reading in enumerate(readings):
+            scope = self._scopes.get(_as_int(reading.get("id_sensor")), (None, None))
+            id_talhao = reading.get("id_talhao", scope[0])
+            id_cultura = reading.get("id_cultura", scope[1])
+            if id_talhao is not None:
+                talhao[i] = id_talhao
+            if id_cultura is not None:
+                cultura[i] = id_cultura
+        return talhao, cultura
+
+    # ---------- Avaliacao ----------
+    def evaluate_batch(self, readings: Sequence[Dict]) -> List[List[AlertRule]]:
+        """Regras disparadas por leitura (ordem de prioridade), avaliando o lote de uma vez."""
+        compiled = self.compiled()
+        if not readings:
+            return []
+        talhao, cultura = self._scope_arrays(readings)
+        hits = compiled.evaluate(compiled.values_matrix(readings), talhao, cultura)
+        matches = [[compiled.rules[j] for j in np.flatnonzero(row)] for row in hits]
+        self.counters["readings_evaluated"] += len(readings)
+        self.counters["matches"] += int(hits.sum())
+        return matches
+
+    def evaluate(self, reading: Dict) -> List[AlertRule]:
+        return self.evaluate_batch([reading])[0]
+
+    def conditions_for(self, reading: Dict) -> List[AlertRule]:
+        """Regras efetivas (uma por tipo, a mais especifica) para o escopo da leitura."""
+        compiled = self.compiled()
+        if not len(compiled):
+            return []
+        talhao, cultura = self._scope_arrays([reading])
+        mask = compiled.scope_mask(talhao, cultura)[0]
+        return [compiled.rules[j] for j in np.flatnonzero(mask)]
+
+    def limits(self, reading: Optional[Dict] = None) -> Dict[str, float]:
+        """Limite efetivo por tipo_alerta (regra mais especifica e prioritaria) no escopo da leitura."""
+        limits: Dict[str, float] = {}
+        for rule in self.conditions_for(reading or {}):
+            limits.setdefault(rule.alert_type, rule.threshold)
+        return limits
+
+    def stats(self) -> Dict:
+        compiled = self._compiled
+        return {**self.counters, "rules": len(compiled) if compiled else None, "versions": self._versions}
+
+
+def effective_limits(rule_engine: Optional[RuleEngine] = None, reading: Optional[Dict] = None) -> Dict[str, float]:
+    """
+    Limites por tipo_alerta para quem nao avalia regras diretamente (logica de
+    irrigacao, gateway legado, endpoints de ML): do motor de regras quando
+    ativo, senao as condicoes padrao de AlertsService.
+    """
+    from .service import AlertsService
+
+    limits = {c.alert_type: c.threshold for c in AlertsService.default_conditions()}
+    if rule_engine is not None:
+        limits.update(rule_engine.limits(reading))
+    return limits
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -4,15 +4,19 @@ Analisa previsões, detecta anomalias e gera ações sugeridas baseadas em ML
 Envia notificações via AWS SNS/SES
 """
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import numpy as np
 from sqlalchemy.orm import Session
 import structlog
 
-from services.core.database.models import LeituraSensor
+from services.core.database.models import Alert, LeituraSensor
 from services.core.database.service import DatabaseService
 from services.core.aws_integration.service import AWSService
 from .action_templates import ActionTemplates, ActionTemplate
+from .digest import AlertDigest
+from .dispatcher import NotificationDispatcher
+from .rules import RuleEngine
+from .state_engine import AlertStateEngine, AlertTransition, default_iot_conditions
 
 logger = structlog.get_logger()
 
@@ -28,10 +32,27 @@ class AlertsService:
     CRITICAL_TEMP_MIN = 10.0  # °C
     CRITICAL_TEMP_MAX = 40.0  # °C
 
-    def __init__(self, db_session: Session, db_service: Optional[DatabaseService] = None, aws_service: Optional[AWSService] = None):
+    def __init__(
+        self,
+        db_session: Session,
+        db_service: Optional[DatabaseService] = None,
+        aws_service: Optional[AWSService] = None,
+        dispatcher: Optional[NotificationDispatcher] = None,
+        state_engine: Optional[AlertStateEngine] = None,
+        digest: Optional[AlertDigest] = None,
+        rule_engine: Optional[RuleEngine] = None,
+    ):
         self.db = db_session
         self.db_service = db_service
         self.aws = aws_service or AWSService()
+        # Com dispatcher, notificacoes vao para o outbox e sao entregues em segundo plano
+        self.dispatcher = dispatcher
+        # Com state_engine, leituras IoT so notificam em transicoes de estado
+        self.state_engine = state_engine
+        # Com digest, emails nao criticos sao agrupados por destinatario
+        self.digest = digest
+        # Com rule_engine, limites IoT vem de regras_alerta (por talhao/cultura)
+        self.rule_engine = rule_engine
 
     def analyze_predictions(self, predictions: List[float], days: List[str]) -> List[Dict[str, Any]]:
         """
@@ -490,21 +511,32 @@ class AlertsService:
                 logger.warning("db_service_not_configured_skipping_notifications")
                 return {"status": "warning", "message": "Database service not configured"}
 
-            funcionarios = self.db_service.get_funcionarios_for_alert(severidade)
+            # Tabela de roteamento em memoria: severidade -> canal -> destinatarios
+            recipients = self.db_service.get_alert_recipients(severidade)
+            funcionarios = list(recipients.funcionarios)
 
             if not funcionarios:
                 logger.warning("no_funcionarios_for_severity", severidade=severidade)
                 return {"status": "warning", "message": "No funcionarios configured for this severity"}
 
-            # Separar emails e telefones
-            emails = [f.email for f in funcionarios if f.recebe_email and f.email]
-            phones = [f.telefone for f in funcionarios if f.recebe_sms and f.telefone]
+            emails = list(recipients.emails)
+            phones = list(recipients.phones)
 
             logger.info("sending_alert_notification",
                        severidade=severidade,
                        emails_count=len(emails),
                        phones_count=len(phones))
 
+            if self.digest and self.digest.accepts(severidade):
+                return self._buffer_alert_notification(
+                    titulo, mensagem, severidade, origem, funcionarios, emails, phones, recommended_action, actions
+                )
+
+            if self.dispatcher:
+                return self._enqueue_alert_notification(
+                    titulo, mensagem, severidade, origem, funcionarios, emails, phones, recommended_action, actions
+                )
+
             # Enviar via AWS
             results = self.aws.send_combined_alert(
                 title=titulo,
@@ -567,6 +599,133 @@ class AlertsService:
             logger.error("alert_notification_failed", error=str(e))
             return {"status": "error", "message": str(e)}
 
+    def _enqueue_alert_notification(
+        self,
+        titulo: str,
+        mensagem: str,
+        severidade: str,
+        origem: str,
+        funcionarios: List,
+        emails: List[str],
+        phones: List[str],
+        recommended_action: Optional[str],
+        actions: List[ActionTemplate],
+    ) -> Dict[str, Any]:
+        """
+        Grava o alerta e enfileira email/SMS no outbox na mesma transacao (um
+        crash entre os dois nao perde a notificacao); a entrega fica com o dispatcher.
+        """
+        with self.db_service.get_session() as session:
+            alert_id = self._add_alert(session, titulo, mensagem, severidade, origem)
+            queued = self.dispatcher.enqueue(
+                titulo, mensagem, severidade, emails, phones,
+                recommended_action=recommended_action, alert_id=alert_id, session=session
+            )
+        self.dispatcher.wake()
+
+        # Log de auditoria (ISO 27001/27002) tambem fora do caminho de ingestao
+        self.dispatcher.submit(self.aws.log_alert_audit, {
+            "alert_id": alert_id,
+            "titulo": titulo,
+            "severidade": severidade,
+            "origem": origem,
+            "funcionarios_notificados": len(funcionarios),
+            "emails_enfileirados": queued["emails_queued"],
+            "sms_enfileirados": queued["sms_queued"],
+            "timestamp": datetime.now().isoformat()
+        })
+
+        return {
+            "status": "queued",
+            "alert_id": alert_id,
+            **queued,
+            "funcionarios_notificados": [f.nome for f in funcionarios],
+            "actions": [
+                {
+                    "titulo": a.titulo,
+                    "descricao": a.descricao,
+                    "prioridade": a.prioridade,
+                    "responsavel": a.responsavel_sugerido,
+                    "passos": a.passos
+                } for a in actions
+            ]
+        }
+
+    @staticmethod
+    def _add_alert(session: Session, titulo: str, mensagem: str, severidade: str, origem: str) -> int:
+        """Grava o alerta na sessao do chamador (mesma transacao das linhas do outbox)."""
+        alert = Alert(
+            titulo=titulo, mensagem=mensagem, severidade=severidade, origem=origem,
+            message_id=None, data_hora=datetime.now(),
+        )
+        session.add(alert)
+        session.flush()
+        logger.info("alert_created", alert_id=alert.id, titulo=titulo)
+        return alert.id
+
+    def _buffer_alert_notification(
+        self,
+        titulo: str,
+        mensagem: str,
+        severidade: str,
+        origem: str,
+        funcionarios: List,
+        emails: List[str],
+        phones: List[str],
+        recommended_action: Optional[str],
+        actions: List[ActionTemplate],
+    ) -> Dict[str, Any]:
+        """Grava o alerta e adia os emails para o resumo; SMS continuam saindo na hora."""
+        sms_count = 0
+        with self.db_service.get_session() as session:
+            alert_id = self._add_alert(session, titulo, mensagem, severidade, origem)
+            if phones and self.dispatcher:
+                sms_count = self.dispatcher.enqueue(
+                    titulo, mensagem, severidade, [], phones,
+                    recommended_action=recommended_action, alert_id=alert_id, session=session
+                )["sms_queued"]
+        if sms_count:
+            self.dispatcher.wake()
+        emails_buffered = self.digest.add(titulo, mensagem, severidade, emails, actions=actions, alert_id=alert_id)
+
+        if phones and not self.dispatcher:
+            sms_count = len(self.aws.send_combined_alert(
+                titulo, mensagem, severidade, [], phones, recommended_action
+            )["sms_ids"])
+
+        audit = {
+            "alert_id": alert_id,
+            "titulo": titulo,
+            "severidade": severidade,
+            "origem": origem,
+            "funcionarios_notificados": len(funcionarios),
+            "emails_em_resumo": emails_buffered,
+            "sms_enviados": sms_count,
+            "timestamp": datetime.now().isoformat()
+        }
+        if self.dispatcher:
+            self.dispatcher.submit(self.aws.log_alert_audit, audit)
+        else:
+            self.aws.log_alert_audit(audit)
+
+        return {
+            "status": "digest",
+            "alert_id": alert_id,
+            "emails_buffered": emails_buffered,
+            "sms_sent": sms_count,
+            "digest_window_seconds": self.digest.window_for(severidade),
+            "funcionarios_notificados": [f.nome for f in funcionarios],
+            "actions": [
+                {
+                    "titulo": a.titulo,
+                    "descricao": a.descricao,
+                    "prioridade": a.prioridade,
+                    "responsavel": a.responsavel_sugerido,
+                    "passos": a.passos
+                } for a in actions
+            ]
+        }
+
     def send_iot_alert(self, leitura_data: Dict) -> Dict[str, Any]:
         """
         Envia alerta baseado em leitura de sensor IoT (Fase 3)
@@ -577,6 +736,24 @@ class AlertsService:
         Returns:
             Resultado do envio
         """
+        if self.state_engine:
+            return self._send_iot_alert_stateful(leitura_data)
+
+        if self.rule_engine:
+            # Mesma semantica da cadeia abaixo: apenas a regra de maior prioridade notifica
+            matches = self.rule_engine.evaluate(leitura_data)
+            if not matches:
+                return {"status": "ok", "message": "No alerts triggered"}
+            rule = matches[0]
+            return self.send_alert_notification(
+                titulo=rule.titulo,
+                mensagem=rule.render(leitura_data[rule.metric]),
+                severidade=rule.severidade,
+                origem="fase3",
+                alert_type=rule.alert_type,
+                dados_contexto={**leitura_data, "id_regra": rule.id_regra}
+            )
+
         umidade = leitura_data.get('umidade', 0)
         ph = leitura_data.get('ph', 7.0)
         temperatura = leitura_data.get('temperatura', 25.0)
@@ -644,6 +821,119 @@ class AlertsService:
 
         return {"status": "ok", "message": "No alerts triggered"}
 
+    @classmethod
+    def default_conditions(cls):
+        """Condicoes padrao (constantes da classe); semente de regras_alerta."""
+        return default_iot_conditions(
+            cls.CRITICAL_UMIDADE_MIN, cls.CRITICAL_UMIDADE_MAX,
+            cls.CRITICAL_PH_MIN, cls.CRITICAL_PH_MAX,
+            cls.CRITICAL_TEMP_MIN, cls.CRITICAL_TEMP_MAX,
+        )
+
+    def iot_conditions(self, leitura_data: Optional[Dict] = None):
+        if self.rule_engine:
+            return self.rule_engine.conditions_for(leitura_data or {})
+        return self.default_conditions()
+
+    def _send_iot_alert_stateful(self, leitura_data: Dict) -> Dict[str, Any]:
+        """
+        Avalia todas as condicoes IoT no motor de estado; apenas aberturas,
+        escalonamentos, resumos e normalizacoes geram notificacao e registro.
+        """
+        sensor_id = str(leitura_data.get('id_sensor') or leitura_data.get('sensor_id') or 'default')
+        ts = leitura_data.get('timestamp') if isinstance(leitura_data.get('timestamp'), datetime) else None
+        if ts is not None and ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+        results = []
+        for condition in self.iot_conditions(leitura_data):
+            transition = self.state_engine.evaluate(sensor_id, condition, leitura_data.get(condition.metric), ts)
+            if transition:
+                titulo, mensagem, alert_type = self._render_transition(transition)
+                result = self.send_alert_notification(
+                    titulo=titulo,
+                    mensagem=mensagem,
+                    severidade=transition.severidade,
+                    origem="fase3",
+                    alert_type=alert_type,
+                    dados_contexto={**leitura_data, "transicao": transition.kind}
+                )
+                results.append({"transicao": transition.kind, "alert_type": condition.alert_type, "result": result})
+
+        if not results:
+            return {"status": "ok", "message": "No alert state transitions", "sensor": sensor_id}
+        return {"status": "success", "sensor": sensor_id, "transitions": results}
+
+    @staticmethod
+    def _render_transition(t: AlertTransition):
+        """Titulo, mensagem e alert_type (para acoes recomendadas) de cada transicao."""
+        cond = t.condition
+        detalhe = f"{t.ocorrencias} leitura(s) fora da faixa desde {t.aberto_em:%d/%m %H:%M}; pior valor {t.pior_valor:.2f}"
+        if t.kind == "aberto":
+            return cond.titulo, cond.render(t.valor), cond.alert_type
+        if t.kind == "escalado":
+            return (
+                f"[ESCALADO] {cond.titulo}",
+                f"Sensor {t.sensor_id}: condição persiste (nível {t.extra.get('nivel')}). {detalhe}.",
+                cond.alert_type,
+            )
+        if t.kind == "resumo":
+            return f"[RESUMO] {cond.titulo}", f"Sensor {t.sensor_id}: incidente em andamento. {detalhe}.", cond.alert_type
+        return (
+            f"Normalizado: {cond.titulo}",
+            f"Sensor {t.sensor_id}: valor voltou à faixa segura ({t.valor:.2f}). {detalhe}.",
+            None,
+        )
+
+    # Titulo e severidade por tipo de anomalia do detector online (analytics.streaming)
+    SENSOR_ANOMALY_ALERTS = {
+        "travado": ("Sensor Travado", "alta"),
+        "sem_variacao": ("Sensor Sem Variação", "media"),
+        "pico": ("Pico Anômalo em Sensor", "media"),
+    }
+
+    def send_sensor_anomaly(self, anomaly, leitura_data: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Envia alerta de falha de sensor a partir de uma SensorAnomaly
+        (acoes recomendadas do template falha_sensor)
+        """
+        # Picos repetidos do mesmo sensor/metrica respeitam o cooldown do motor de estado
+        if self.state_engine and not self.state_engine.allow_event(
+            anomaly.id_sensor, f"falha_sensor:{anomaly.metric}", anomaly.timestamp
+        ):
+            return {"status": "suppressed", "message": "Falha de sensor ja notificada dentro do cooldown"}
+
+        titulo, severidade = self.SENSOR_ANOMALY_ALERTS.get(anomaly.kind, ("Anomalia em Sensor", "media"))
+        return self.send_alert_notification(
+            titulo=f"{titulo}: {anomaly.metric}",
+            mensagem=f"Sensor {anomaly.id_sensor} ({anomaly.metric} = {anomaly.valor:.2f}): {anomaly.detalhe}.",
+            severidade=severidade,
+            origem="fase3",
+            alert_type="falha_sensor",
+            dados_contexto={**(leitura_data or {}), "anomalia": anomaly.to_dict()}
+        )
+
+    WEATHER_ALERTS = {
+        "chuva_forte": ("Previsão de Chuva Forte", "alta"),
+        "geada": ("Alerta de Geada", "critica"),
+        "seca": ("Período Seco Previsto", "media"),
+    }
+
+    def send_forecast_alert(self, alert) -> Dict[str, Any]:
+        """
+        Envia alerta de previsao a partir de uma ForecastAlert
+        (regras avaliadas em lote pelo WeatherAlertScheduler)
+        """
+        titulo, severidade = self.WEATHER_ALERTS[alert.tipo_alerta]
+        return self.send_alert_notification(
+            titulo=f"{titulo}: {alert.cidade}",
+            mensagem=alert.detalhe,
+            severidade=severidade,
+            origem="fase1",
+            alert_type=alert.tipo_alerta,
+            dados_contexto=alert.to_dict()
+        )
+
     def send_cv_alert(self, deteccao_data: Dict) -> Dict[str, Any]:
         """
         Envia alerta baseado em detecção de visão computacional (Fase 6)
@@ -0,0 +1,338 @@
+"""
+Motor de estado de alertas - Fase 7
+Mantem o estado de cada (sensor, tipo de alerta) em memoria com persistencia
+em estado_alertas. Apenas transicoes (abertura, escalonamento, resolucao) e
+resumos periodicos chegam ao notificador; leituras repetidas de um incidente
+ja aberto so atualizam contadores.
+"""
+import string
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from services.core.database.models import EstadoAlerta
+
+logger = structlog.get_logger()
+
+SEVERITY_LADDER = ["baixa", "media", "alta", "critica"]
+
+# Unicos campos aceitos em mensagens de regras (texto vem de POST /alerts/rules)
+MESSAGE_FIELDS = ("valor", "limite")
+
+
+def validate_message_template(template: str) -> None:
+    """
+    ValueError se a mensagem usa campos alem de {valor}/{limite} (inclusive
+    acesso a atributo/indice como {valor.__class__}) ou nao formata.
+    """
+    try:
+        for _, name, spec, _ in string.Formatter().parse(template):
+            for field_name in (name, *(f for _, f, _, _ in string.Formatter().parse(spec or ""))):
+                if field_name is not None and field_name not in MESSAGE_FIELDS:
+                    raise ValueError(f"campo nao permitido na mensagem: {{{field_name}}} (use {{valor}} e {{limite}})")
+        template.format_map({"valor": 1.0, "limite": 1.0})
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"mensagem invalida: {e}") from e
+
+
+@dataclass
+class AlertCondition:
+    """Condicao com histerese: dispara ao cruzar `threshold` e so normaliza apos `clear_margin`"""
+    alert_type: str
+    metric: str
+    direction: str  # below, above
+    threshold: float
+    clear_margin: float
+    severidade: str
+    titulo: str
+    mensagem: str  # formatado com {valor} e {limite}
+
+    def render(self, valor: float) -> str:
+        """Mensagem com {valor}/{limite}; template invalido cai na mensagem padrao."""
+        try:
+            validate_message_template(self.mensagem)
+            return self.mensagem.format_map({"valor": valor, "limite": self.threshold})
+        except ValueError as e:
+            logger.warning("alert_message_template_invalid", alert_type=self.alert_type, error=str(e))
+            return f"{self.metric} em {valor:.2f} (limite {self.threshold:g})"
+
+    def triggered(self, value: float) -> bool:
+        return value < self.threshold if self.direction == "below" else value > self.threshold
+
+    def cleared(self, value: float) -> bool:
+        if self.direction == "below":
+            return value >= self.threshold + self.clear_margin
+        return value <= self.threshold - self.clear_margin
+
+    def worse(self, a: float, b: float) -> float:
+        return min(a, b) if self.direction == "below" else max(a, b)
+
+
+def default_iot_conditions(
+    umidade_min: float, umidade_max: float, ph_min: float, ph_max: float, temp_min: float, temp_max: float
+) -> List[AlertCondition]:
+    """Condicoes equivalentes a AlertsService.send_iot_alert, com margens de histerese."""
+    return [
+        AlertCondition(
+            "umidade_critica_baixa", "umidade", "below", umidade_min, 2.0, "critica",
+            "Umidade Crítica Detectada",
+            "Umidade do solo está em {valor:.1f}%, abaixo do mínimo seguro de {limite}%. Risco de perda de plantas!",
+        ),
+        AlertCondition(
+            "umidade_alta", "umidade", "above", umidade_max, 2.0, "alta",
+            "Excesso de Umidade Detectado",
+            "Umidade do solo está em {valor:.1f}%, acima do máximo seguro de {limite}%. Risco de apodrecimento!",
+        ),
+        AlertCondition(
+            "ph_baixo", "ph", "below", ph_min, 0.2, "alta",
+            "pH do Solo Muito Ácido",
+            "pH do solo está em {valor:.2f}, abaixo do mínimo recomendado de {limite}. Aplicação de calcário necessária.",
+        ),
+        AlertCondition(
+            "ph_alto", "ph", "above", ph_max, 0.2, "media",
+            "pH do Solo Muito Alcalino",
+            "pH do solo está em {valor:.2f}, acima do máximo recomendado de {limite}. Correção necessária.",
+        ),
+        AlertCondition(
+            "temperatura_alta", "temperatura", "above", temp_max, 2.0, "media",
+            "Temperatura Elevada",
+            "Temperatura está em {valor:.1f}°C, acima do limite de {limite}°C. Risco de estresse térmico.",
+        ),
+        AlertCondition(
+            "temperatura_baixa", "temperatura", "below", temp_min, 2.0, "media",
+            "Temperatura Baixa",
+            "Temperatura está em {valor:.1f}°C, abaixo do limite de {limite}°C. Proteção necessária.",
+        ),
+    ]
+
+
+@dataclass
+class AlertState:
+    """Estado em memoria de um (sensor, tipo de alerta)"""
+    sensor_id: str
+    alert_type: str
+    status: str = "ok"
+    severidade: Optional[str] = None
+    nivel: int = 0
+    aberto_em: Optional[datetime] = None
+    resolvido_em: Optional[datetime] = None
+    ultima_notificacao: Optional[datetime] = None
+    ultimo_valor: Optional[float] = None
+    pior_valor: Optional[float] = None
+    ocorrencias: int = 0
+
+
+@dataclass
+class AlertTransition:
+    """Evento que deve ser notificado/persistido"""
+    kind: str  # aberto, escalado, resumo, resolvido
+    sensor_id: str
+    condition: AlertCondition
+    severidade: str
+    valor: float
+    ocorrencias: int
+    pior_valor: Optional[float]
+    aberto_em: Optional[datetime]
+    extra: Dict = field(default_factory=dict)
+
+
+class AlertStateEngine:
+    """Deduplicacao, janelas de supressao e escalonamento por (sensor, tipo de alerta)"""
+
+    def __init__(
+        self,
+        db_service=None,
+        cooldown: timedelta = timedelta(minutes=15),
+        escalation_steps: Sequence[timedelta] = (timedelta(minutes=30), timedelta(hours=2)),
+        digest_interval: timedelta = timedelta(hours=1),
+    ):
+        self.db = db_service
+        self.cooldown = cooldown
+        self.escalation_steps = list(escalation_steps)
+        self.digest_interval = digest_interval
+        self._states: Dict[Tuple[str, str], AlertState] = {}
+        self._last_events: Dict[Tuple[str, str], datetime] = {}
+        self._lock = threading.Lock()
+        self.counters = {"evaluated": 0, "suppressed": 0, "transitions": 0}
+
+    @classmethod
+    def from_env(cls, db_service=None) -> "AlertStateEngine":
+        import os
+
+        steps = [s for s in os.getenv("ALERT_ESCALATION_MINUTES", "30,120").split(",") if s.strip()]
+        return cls(
+            db_service,
+            cooldown=timedelta(minutes=float(os.getenv("ALERT_COOLDOWN_MINUTES", 15))),
+            escalation_steps=[timedelta(minutes=float(s)) for s in steps],
+            digest_interval=timedelta(minutes=float(os.getenv("ALERT_DIGEST_MINUTES", 60))),
+        )
+
+    # ---------- Persistencia ----------
+    def load(self) -> int:
+        """Carrega estados persistidos (incidentes abertos sobrevivem a restart)."""
+        if not self.db:
+            return 0
+        with self.db.get_session() as session:
+            rows = session.query(EstadoAlerta).all()
+            for row in rows:
+                self._states[(row.id_sensor, row.tipo_alerta)] = AlertState(
+                    sensor_id=row.id_sensor,
+                    alert_type=row.tipo_alerta,
+                    status=row.status,
+                    severidade=row.severidade,
+                    nivel=row.nivel_escalonamento,
+                    aberto_em=row.aberto_em,
+                    resolvido_em=row.resolvido_em,
+                    ultima_notificacao=row.ultima_notificacao,
+                    ultimo_valor=row.ultimo_valor,
+                    pior_valor=row.pior_valor,
+                    ocorrencias=row.ocorrencias,
+                )
+        logger.info("alert_states_loaded", count=len(rows))
+        return len(rows)
+
+    def _persist(self, state: AlertState) -> None:
+        if not self.db:
+            return
+        try:
+            with self.db.get_session() as session:
+                session.merge(EstadoAlerta(
+                    id_sensor=state.sensor_id,
+                    tipo_alerta=state.alert_type,
+                    status=state.status,
+                    severidade=state.severidade,
+                    nivel_escalonamento=state.nivel,
+                    aberto_em=state.aberto_em,
+                    resolvido_em=state.resolvido_em,
+                    ultima_notificacao=state.ultima_notificacao,
+                    ultimo_valor=state.ultimo_valor,
+                    pior_valor=state.pior_valor,
+                    ocorrencias=state.ocorrencias,
+                ))
+        except Exception as e:
+            logger.warning("alert_state_persist_failed", error=str(e), sensor=state.sensor_id, tipo=state.alert_type)
+
+    # ---------- Avaliacao ----------
+    def evaluate(
+        self, sensor_id: str, condition: AlertCondition, value: Optional[float], ts: Optional[datetime] = None
+    ) -> Optional[AlertTransition]:
+        """Atualiza o estado com uma leitura; devolve a transicao a notificar ou None."""
+        if value is None:
+            return None
+        ts = ts or datetime.utcnow()
+        key = (str(sensor_id), condition.alert_type)
+
+        with self._lock:
+            self.counters["evaluated"] += 1
+            state = self._states.setdefault(key, AlertState(sensor_id=key[0], alert_type=key[1]))
+            state.ultimo_valor = value
+            kind = self._advance(state, condition, value, ts)
+            notify = kind is not None and kind != "reaberto"
+            if notify:
+                self.counters["transitions"] += 1
+            elif state.status == "ativo":
+                self.counters["suppressed"] += 1
+            transition = None
+            if notify:
+                transition = AlertTransition(
+                    kind=kind,
+                    sensor_id=state.sensor_id,
+                    condition=condition,
+                    severidade=state.severidade if kind != "resolvido" else "baixa",
+                    valor=value,
+                    ocorrencias=state.ocorrencias,
+                    pior_valor=state.pior_valor,
+                    aberto_em=state.aberto_em,
+                    extra={"nivel": state.nivel},
+                )
+
+        if kind:
+            self._persist(state)
+            logger.info("alert_state_transition", sensor=key[0], tipo=key[1], kind=kind, valor=value)
+        return transition
+
+    def _advance(self, state: AlertState, condition: AlertCondition, value: float, ts: datetime) -> Optional[str]:
+        if state.status == "ativo":
+            if condition.cleared(value):
+                state.status = "ok"
+                state.resolvido_em = ts
+                return "resolvido"
+
+            state.ocorrencias += 1
+            state.pior_valor = condition.worse(state.pior_valor, value) if state.pior_valor is not None else value
+
+            if state.nivel < len(self.escalation_steps) and ts - state.aberto_em >= self.escalation_steps[state.nivel]:
+                state.nivel += 1
+                state.severidade = _raise_severity(state.severidade)
+                state.ultima_notificacao = ts
+                return "escalado"
+
+            if state.ultima_notificacao and ts - state.ultima_notificacao >= self.digest_interval:
+                state.ultima_notificacao = ts
+                return "resumo"
+            return None
+
+        if not condition.triggered(value):
+            return None
+
+        # Reabriu dentro do cooldown (oscilacao): retoma o incidente anterior sem notificar
+        if state.resolvido_em and state.aberto_em and ts - state.resolvido_em < self.cooldown:
+            state.status = "ativo"
+            state.ocorrencias += 1
+            state.pior_valor = condition.worse(state.pior_valor, value) if state.pior_valor is not None else value
+            return "reaberto"
+
+        state.status = "ativo"
+        state.severidade = condition.severidade
+        state.nivel = 0
+        state.aberto_em = ts
+        state.resolvido_em = None
+        state.ultima_notificacao = ts
+        state.ocorrencias = 1
+        state.pior_valor = value
+        return "aberto"
+
+    def allow_event(self, sensor_id: str, alert_type: str, ts: Optional[datetime] = None) -> bool:
+        """
+        Eventos pontuais sem normalizacao (ex: falha_sensor): no maximo uma
+        notificacao por (sensor, tipo) a cada cooldown.
+        """
+        ts = ts or datetime.utcnow()
+        key = (str(sensor_id), alert_type)
+        with self._lock:
+            self.counters["evaluated"] += 1
+            last = self._last_events.get(key)
+            if last is not None and ts - last < self.cooldown:
+                self.counters["suppressed"] += 1
+                return False
+            self._last_events[key] = ts
+            self.counters["transitions"] += 1
+            return True
+
+    def active(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "sensor": s.sensor_id,
+                    "tipo_alerta": s.alert_type,
+                    "severidade": s.severidade,
+                    "nivel_escalonamento": s.nivel,
+                    "aberto_em": s.aberto_em.isoformat() if s.aberto_em else None,
+                    "ocorrencias": s.ocorrencias,
+                    "ultimo_valor": s.ultimo_valor,
+                    "pior_valor": s.pior_valor,
+                }
+                for s in self._states.values()
+                if s.status == "ativo"
+            ]
+
+    def stats(self) -> Dict:
+        return {**self.counters, "active": sum(1 for s in self._states.values() if s.status == "ativo")}
+
+
+def _raise_severity(severidade: Optional[str]) -> str:
+    idx = SEVERITY_LADDER.index(severidade) if severidade in SEVERITY_LADDER else 1
+    return SEVERITY_LADDER[min(idx + 1, len(SEVERITY_LADDER) - 1)]
@@ -0,0 +1,344 @@
+"""
+Alertas de previsao do tempo - Fase 7
+send_weather_alert so rodava quando alguem chamava POST /api/alerts/weather-alert.
+Aqui as previsoes que o WeatherService ja atualiza em segundo plano passam pelas
+regras de chuva forte, geada e seca em lote, sem acesso a rede: cada previsao e
+convertida em vetores uma unica vez (por cidade e fetched_at) e as regras rodam
+com numpy sobre todas as cidades x dias. Cada (cidade, dia, tipo) gera no maximo
+um alerta, reservado em alertas_previsao antes do envio e liberado se a entrega
+falhar. Seca e chaveada pelo inicio da estiagem ja alertada: uma mesma estiagem
+so volta a alertar depois de `dry_cooldown_days`.
+"""
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import structlog
+from sqlalchemy import delete, func, select
+
+from ..database.models import AlertaPrevisao
+
+logger = structlog.get_logger()
+
+# Codigos de tempo do CPTEC (o XML nao traz precipitacao em mm)
+HEAVY_RAIN_CODES = ("t", "ch", "c")  # tempestade, chuvoso, chuva
+FROST_CODES = ("g",)  # geada
+DRY_CODES = ("cl", "ps", "pn", "n", "e", "vn", "nv")  # sem chuva prevista
+
+TEMPO_DESCRICAO = {"t": "tempestade", "ch": "tempo chuvoso", "c": "chuva", "g": "geada"}
+
+
+@dataclass(frozen=True)
+class ForecastAlert:
+    """Regra de previsao disparada para (cidade, dia)"""
+    city_code: str
+    cidade: str
+    dia: date
+    tipo_alerta: str  # chuva_forte, geada, seca
+    tempo: str
+    minima: Optional[float] = None
+    maxima: Optional[float] = None
+    dias_secos: int = 0
+
+    @property
+    def detalhe(self) -> str:
+        if self.tipo_alerta == "chuva_forte":
+            return (f"Previsão de {TEMPO_DESCRICAO.get(self.tempo, 'chuva forte')} em {self.cidade} "
+                    f"para {self.dia:%d/%m}. Proteger áreas sensíveis e verificar drenagem.")
+        if self.tipo_alerta == "geada":
+            minima = f"{self.minima:.1f}°C" if self.minima is not None else "geada"
+            return (f"Mínima prevista em {self.cidade} para {self.dia:%d/%m}: {minima}. "
+                    "Risco de geada! Proteção urgente necessária.")
+        return (f"Sem chuva prevista em {self.cidade} nos próximos {self.dias_secos} dias "
+                f"(a partir de {self.dia:%d/%m}). Verificar reservatórios e planejar irrigação.")
+
+    def to_dict(self) -> Dict:
+        return {
+            "city_code": self.city_code,
+            "cidade": self.cidade,
+            "dia": self.dia.isoformat(),
+            "tipo": self.tipo_alerta,
+            "tempo": self.tempo,
+            "temp_min": self.minima,
+            "temp_max": self.maxima,
+            "dias_secos": self.dias_secos,
+        }
+
+
+@dataclass
+class ParsedForecast:
+    """Previsao de uma cidade em vetores (dias em ordem do XML)"""
+    city_code: str
+    cidade: str
+    fetched_at: datetime
+    dias: np.ndarray  # datetime64[D]
+    tempo: np.ndarray  # codigos CPTEC
+    minima: np.ndarray  # float, nan quando ausente
+    maxima: np.ndarray
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def parse_snapshot(city_code: str, data: Dict, fetched_at: datetime) -> ParsedForecast:
+    """Converte a previsao do WeatherService em vetores; dias invalidos sao ignorados."""
+    rows = []
+    for f in data.get("forecasts", []):
+        try:
+            dia = np.datetime64(f.get("dia") or "", "D")
+        except ValueError:
+            continue
+        rows.append((dia, (f.get("tempo") or "").strip().lower(), _to_float(f.get("minima")), _to_float(f.get("maxima"))))
+    dias, tempo, minima, maxima = zip(*rows) if rows else ((), (), (), ())
+    return ParsedForecast(
+        city_code=city_code,
+        cidade=data.get("city") or city_code,
+        fetched_at=fetched_at,
+        dias=np.array(dias, dtype="datetime64[D]"),
+        tempo=np.array(tempo, dtype=object),
+        minima=np.array(minima, dtype=float),
+        maxima=np.array(maxima, dtype=float),
+    )
+
+
+def evaluate_forecasts(
+    forecasts: Sequence[ParsedForecast],
+    today: date,
+    horizon_days: int = 3,
+    frost_temp: float = 2.0,
+    dry_days: int = 3,
+) -> List[ForecastAlert]:
+    """
+    Regras de chuva forte, geada e seca sobre todas as cidades de uma vez.
+    Chuva forte e geada valem por dia dentro do horizonte; seca exige os
+    `dry_days` proximos dias sem chuva e e marcada no primeiro deles.
+    """
+    forecasts = [f for f in forecasts if len(f.dias)]
+    if not forecasts:
+        return []
+    city = np.concatenate([np.full(len(f.dias), i) for i, f in enumerate(forecasts)])
+    dias = np.concatenate([f.dias for f in forecasts])
+    tempo = np.concatenate([f.tempo for f in forecasts])
+    minima = np.concatenate([f.minima for f in forecasts])
+    maxima = np.concatenate([f.maxima for f in forecasts])
+
+    start = np.datetime64(today, "D")
+    future = dias >= start
+    window = future & (dias < start + np.timedelta64(horizon_days, "D"))
+    heavy = window & np.isin(tempo, HEAVY_RAIN_CODES)
+    with np.errstate(invalid="ignore"):
+        frost = window & (np.isin(tempo, FROST_CODES) | (minima <= frost_temp))
+
+    # Seca: grade cidades x proximos dias; posicao de cada dia futuro dentro da sua cidade
+    future_idx = np.flatnonzero(future)
+    city_f = city[future_idx]
+    first = np.searchsorted(city_f, np.arange(len(forecasts)))
+    pos = np.arange(len(future_idx)) - first[city_f]
+    keep = pos < dry_days
+    grid = np.zeros((len(forecasts), dry_days), dtype=bool)
+    grid[city_f[keep], pos[keep]] = np.isin(tempo[future_idx[keep]], DRY_CODES)
+    dry_cities = np.flatnonzero(grid.all(axis=1))
+
+    def alert(i: int, tipo: str, secos: int = 0) -> ForecastAlert:
+        f = forecasts[city[i]]
+        return ForecastAlert(
+            city_code=f.city_code,
+            cidade=f.cidade,
+            dia=dias[i].astype(date),
+            tipo_alerta=tipo,
+            tempo=tempo[i],
+            minima=None if np.isnan(minima[i]) else float(minima[i]),
+            maxima=None if np.isnan(maxima[i]) else float(maxima[i]),
+            dias_secos=secos,
+        )
+
+    alerts = [alert(i, "chuva_forte") for i in np.flatnonzero(heavy)]
+    alerts += [alert(i, "geada") for i in np.flatnonzero(frost)]
+    alerts += [alert(future_idx[first[c]], "seca", dry_days) for c in dry_cities]
+    return alerts
+
+
+class WeatherAlertScheduler:
+    """Avalia as previsoes a cada refresh do WeatherService e envia alertas deduplicados"""
+
+    def __init__(
+        self,
+        db_service,
+        weather,
+        aws_service=None,
+        dispatcher=None,
+        digest=None,
+        horizon_days: int = 3,
+        frost_temp: float = 2.0,
+        dry_days: int = 3,
+        dry_cooldown_days: int = 7,
+    ):
+        self.db = db_service
+        self.weather = weather
+        self.aws = aws_service
+        self.dispatcher = dispatcher
+        self.digest = digest
+        self.horizon_days = horizon_days
+        self.frost_temp = frost_temp
+        self.dry_days = dry_days
+        self.dry_cooldown_days = dry_cooldown_days
+        self._parsed: Dict[str, ParsedForecast] = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "runs": 0, "parsed": 0, "triggered": 0, "sent": 0, "duplicates": 0, "failures": 0, "released": 0,
+        }
+
+    @classmethod
+    def from_env(cls, db_service, weather, aws_service=None, dispatcher=None, digest=None) -> "WeatherAlertScheduler":
+        import os
+
+        return cls(
+            db_service,
+            weather,
+            aws_service,
+            dispatcher,
+            digest,
+            horizon_days=int(os.getenv("WEATHER_ALERT_HORIZON_DAYS", 3)),
+            frost_temp=float(os.getenv("WEATHER_ALERT_FROST_TEMP", 2.0)),
+            dry_days=int(os.getenv("WEATHER_ALERT_DRY_DAYS", 3)),
+            dry_cooldown_days=int(os.getenv("WEATHER_ALERT_DRY_COOLDOWN_DAYS", 7)),
+        )
+
+    def attach(self) -> "WeatherAlertScheduler":
+        """Passa a rodar ao fim de cada refresh do WeatherService (mesmo thread, sem rede extra)."""
+        self.weather.add_refresh_listener(self.on_refresh)
+        return self
+
+    def on_refresh(self, city_codes: List[str]) -> None:
+        if not city_codes:
+            return
+        try:
+            self.run(city_codes)
+        except Exception as e:
+            self.counters["failures"] += 1
+            logger.error("weather_alerts_run_failed", error=str(e))
+
+    def _forecasts(self, city_codes: Optional[Sequence[str]]) -> List[ParsedForecast]:
+        # Reaproveita os vetores enquanto o snapshot da cidade nao mudar
+        forecasts = []
+        for code, data, fetched_at in self.weather.snapshots(city_codes):
+            parsed = self._parsed.get(code)
+            if parsed is None or parsed.fetched_at != fetched_at:
+                parsed = self._parsed[code] = parse_snapshot(code, data, fetched_at)
+                self.counters["parsed"] += 1
+            forecasts.append(parsed)
+        return forecasts
+
+    def _insert(self):
+        dialect = self.db.engine.dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            raise NotImplementedError(f"deduplicacao nao suportada para {dialect}")
+        return insert(AlertaPrevisao.__table__).on_conflict_do_nothing()
+
+    def run(self, city_codes: Optional[Sequence[str]] = None, today: Optional[date] = None) -> List[ForecastAlert]:
+        """Avalia as cidades (padrao: todas) e envia os alertas ainda nao emitidos; devolve os enviados."""
+        from .service import AlertsService
+
+        with self._lock:
+            alerts = evaluate_forecasts(
+                self._forecasts(city_codes),
+                today or date.today(),
+                horizon_days=self.horizon_days,
+                frost_temp=self.frost_temp,
+                dry_days=self.dry_days,
+            )
+            self.counters["runs"] += 1
+            self.counters["triggered"] += len(alerts)
+            if not alerts:
+                return []
+
+            # Reserva (cidade, dia, tipo) antes do envio: outro worker ou refresh nao repete o alerta
+            stmt = self._insert()
+            claimed = []
+            with self.db.engine.begin() as conn:
+                for alert in alerts:
+                    key = self._reservation_key(conn, alert)
+                    result = conn.execute(stmt, {
+                        **key,
+                        "severidade": AlertsService.WEATHER_ALERTS[alert.tipo_alerta][1],
+                        "tempo": alert.tempo,
+                        "temperatura_minima": alert.minima,
+                        "criado_em": datetime.utcnow(),
+                    })
+                    if result.rowcount:
+                        claimed.append((alert, key))
+            self.counters["duplicates"] += len(alerts) - len(claimed)
+
+            sent, failed = [], []
+            if claimed:
+                with self.db.get_session() as session:
+                    service = AlertsService(session, self.db, self.aws, self.dispatcher, digest=self.digest)
+                    for alert, key in claimed:
+                        try:
+                            result = service.send_forecast_alert(alert)
+                        except Exception as e:
+                            result = {"status": "error", "message": str(e)}
+                        if self._delivered(result):
+                            sent.append(alert)
+                        else:
+                            failed.append(key)
+                            logger.warning("weather_alert_delivery_failed", cidade=alert.city_code,
+                                           tipo=alert.tipo_alerta, error=result.get("message"))
+            if failed:
+                self._release(failed)
+            self.counters["sent"] += len(sent)
+
+        if sent:
+            logger.info("weather_alerts_sent", alerts=len(sent), cities=len({a.city_code for a in sent}))
+        return sent
+
+    def _reservation_key(self, conn, alert: ForecastAlert) -> Dict:
+        """
+        Chave de deduplicacao. Seca usa o dia da estiagem ja alertada dentro de
+        `dry_cooldown_days` (senao o 1o dia da previsao); os demais, o dia previsto.
+        """
+        dia = alert.dia
+        if alert.tipo_alerta == "seca":
+            started = conn.execute(
+                select(func.max(AlertaPrevisao.dia)).where(
+                    AlertaPrevisao.codigo_cidade == alert.city_code,
+                    AlertaPrevisao.tipo_alerta == "seca",
+                    AlertaPrevisao.dia > alert.dia - timedelta(days=self.dry_cooldown_days),
+                    AlertaPrevisao.dia <= alert.dia,
+                )
+            ).scalar()
+            dia = started or dia
+        return {"codigo_cidade": alert.city_code, "dia": dia, "tipo_alerta": alert.tipo_alerta}
+
+    @staticmethod
+    def _delivered(result: Dict) -> bool:
+        """Enfileirado/no resumo conta como entregue; envio direto precisa de ao menos uma mensagem."""
+        status = result.get("status")
+        if status == "success":
+            return bool(result.get("emails_sent") or result.get("sms_sent"))
+        # warning: sem destinatarios para a severidade, nada a reenviar
+        return status in ("queued", "digest", "warning")
+
+    def _release(self, keys: List[Dict]) -> None:
+        """Remove reservas cuja entrega falhou: o proximo refresh tenta de novo."""
+        with self.db.engine.begin() as conn:
+            for key in keys:
+                conn.execute(delete(AlertaPrevisao).where(
+                    AlertaPrevisao.codigo_cidade == key["codigo_cidade"],
+                    AlertaPrevisao.dia == key["dia"],
+                    AlertaPrevisao.tipo_alerta == key["tipo_alerta"],
+                ))
+        self.counters["released"] += len(keys)
+
+    def stats(self) -> Dict:
+        return {**self.counters, "cities": len(self._parsed)}
@@ -1,3 +1,4 @@
 """Analytics Service"""
 from .service import AnalyticsService
-__all__ = ['AnalyticsService']
+from .streaming import SensorAnomaly, StreamingAnomalyDetector
+__all__ = ['AnalyticsService', 'SensorAnomaly', 'StreamingAnomalyDetector']
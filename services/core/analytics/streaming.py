@@ -0,0 +1,331 @@
+"""
+Deteccao de anomalias online por sensor - Fase 7
+Complementa AnalyticsService.detect_anomalies (z-score sobre um DataFrame
+inteiro) para o fluxo de ingestao: cada leitura atualiza em O(1) o estado de
+(sensor, metrica) - media/variancia de Welford, EWMA e perfil sazonal por hora
+do dia - e sinaliza sensores travados, sem variacao (flatline) ou com picos.
+O estado de cada (sensor, metrica) e um vetor float64 de tamanho fixo,
+persistido em estado_detector_anomalias para que um restart nao recomece o
+aquecimento.
+"""
+import math
+import threading
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+DEFAULT_METRICS = ("umidade", "ph", "temperatura")
+
+STUCK = "travado"
+FLATLINE = "sem_variacao"
+SPIKE = "pico"
+_FLAGS = {STUCK: 1, FLATLINE: 2, SPIKE: 4}
+
+# Posicoes no vetor de estado (antes dos baldes sazonais)
+_SCALARS = (
+    "n", "mean", "m2",              # Welford dos valores
+    "ewma", "last",
+    "stuck_run", "quiet_run",
+    "d_n", "d_mean", "d_m2",        # Welford das diferencas entre leituras
+    "r_n", "r_mean", "r_m2",        # Welford dos residuos sazonais
+    "flags",
+)
+
+
+class MetricState:
+    """Estado online de uma metrica de um sensor"""
+
+    __slots__ = _SCALARS + ("season", "season_n")
+
+    def __init__(self, buckets: int = 24):
+        for name in _SCALARS:
+            setattr(self, name, 0.0)
+        self.season = [0.0] * buckets
+        self.season_n = [0.0] * buckets
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    @property
+    def diff_std(self) -> float:
+        return math.sqrt(self.d_m2 / (self.d_n - 1)) if self.d_n > 1 else 0.0
+
+    @property
+    def residual_std(self) -> float:
+        return math.sqrt(self.r_m2 / (self.r_n - 1)) if self.r_n > 1 else 0.0
+
+    def to_bytes(self) -> bytes:
+        return array("d", [getattr(self, name) for name in _SCALARS] + self.season + self.season_n).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, buckets: int = 24) -> "MetricState":
+        values = array("d")
+        values.frombytes(data)
+        state = cls(buckets)
+        if len(values) != len(_SCALARS) + 2 * buckets:
+            # Layout/baldes diferentes: recomeca o aquecimento
+            return state
+        for name, value in zip(_SCALARS, values):
+            setattr(state, name, value)
+        k = len(_SCALARS)
+        state.season = list(values[k:k + buckets])
+        state.season_n = list(values[k + buckets:])
+        return state
+
+
+def _welford(n: float, mean: float, m2: float, x: float) -> Tuple[float, float, float]:
+    n += 1
+    delta = x - mean
+    mean += delta / n
+    return n, mean, m2 + delta * (x - mean)
+
+
+@dataclass
+class SensorAnomaly:
+    """Inicio de uma anomalia em (sensor, metrica)"""
+    id_sensor: str
+    metric: str
+    kind: str  # travado, sem_variacao, pico
+    valor: float
+    score: float
+    detalhe: str
+    timestamp: datetime = field(default_factory=datetime.utcnow)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id_sensor": self.id_sensor,
+            "metrica": self.metric,
+            "tipo": self.kind,
+            "valor": self.valor,
+            "score": round(self.score, 3),
+            "detalhe": self.detalhe,
+            "timestamp": self.timestamp.isoformat(),
+        }
+
+
+class StreamingAnomalyDetector:
+    """Detector online por (sensor, metrica); so o inicio de cada anomalia e devolvido"""
+
+    def __init__(
+        self,
+        db_service=None,
+        metrics: Iterable[str] = DEFAULT_METRICS,
+        alpha: float = 0.1,
+        spike_z: float = 4.0,
+        stuck_count: int = 12,
+        flatline_count: int = 24,
+        flatline_ratio: float = 0.05,
+        min_samples: int = 30,
+        season_buckets: int = 24,
+        persist_interval: float = 30.0,
+    ):
+        self.db = db_service
+        self.metrics = tuple(metrics)
+        self.alpha = alpha
+        self.spike_z = spike_z
+        self.stuck_count = stuck_count
+        self.flatline_count = flatline_count
+        self.flatline_ratio = flatline_ratio
+        self.min_samples = min_samples
+        self.season_buckets = season_buckets
+        self.persist_interval = persist_interval
+        self._states: Dict[Tuple[str, str], MetricState] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"readings": 0, "anomalies": 0, "saves": 0}
+
+    @classmethod
+    def from_env(cls, db_service=None) -> "StreamingAnomalyDetector":
+        import os
+
+        return cls(
+            db_service,
+            spike_z=float(os.getenv("ANOMALY_SPIKE_Z", 4.0)),
+            stuck_count=int(os.getenv("ANOMALY_STUCK_READINGS", 12)),
+            flatline_count=int(os.getenv("ANOMALY_FLATLINE_READINGS", 24)),
+            min_samples=int(os.getenv("ANOMALY_MIN_SAMPLES", 30)),
+            persist_interval=float(os.getenv("ANOMALY_PERSIST_SECONDS", 30)),
+        )
+
+    # ---------- Persistencia ----------
+    def load(self) -> int:
+        """Carrega os estados persistidos (sem reaquecimento apos restart)."""
+        if not self.db:
+            return 0
+        from services.core.database.models import EstadoDetectorAnomalia
+
+        with self.db.get_session() as session:
+            rows = session.query(EstadoDetectorAnomalia).all()
+            with self._lock:
+                for row in rows:
+                    self._states[(row.id_sensor, row.metrica)] = MetricState.from_bytes(row.estado, self.season_buckets)
+        logger.info("anomaly_states_loaded", count=len(rows))
+        return len(rows)
+
+    def save(self) -> int:
+        """Grava os estados alterados desde o ultimo save; devolve quantos."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [(key, self._states[key].to_bytes(), int(self._states[key].n)) for key in dirty]
+        if not self.db or not rows:
+            return 0
+        from services.core.database.models import EstadoDetectorAnomalia
+
+        try:
+            with self.db.get_session() as session:
+                for (id_sensor, metrica), estado, amostras in rows:
+                    session.merge(EstadoDetectorAnomalia(
+                        id_sensor=id_sensor, metrica=metrica, estado=estado, amostras=amostras,
+                        atualizado_em=datetime.utcnow(),
+                    ))
+        except Exception as e:
+            logger.warning("anomaly_state_persist_failed", error=str(e), states=len(rows))
+            with self._lock:
+                self._dirty.update(key for key, _, _ in rows)
+            return 0
+        self.counters["saves"] += 1
+        return len(rows)
+
+    # ---------- Ciclo de vida ----------
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.persist_interval)
+            self._wake.clear()
+            try:
+                self.save()
+            except Exception as e:
+                logger.error("anomaly_state_persist_failed", error=str(e))
+
+    def start(self) -> "StreamingAnomalyDetector":
+        """Persist dirty states every persist_interval (and on anomaly onset) in a background thread."""
+        self._thread = threading.Thread(target=self._loop, name="anomaly-persister", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.save()
+
+    # ---------- Atualizacao ----------
+    def update(self, id_sensor, reading: Dict, ts: Optional[datetime] = None) -> List[SensorAnomaly]:
+        """Atualiza o estado com uma leitura; devolve as anomalias que comecaram nela."""
+        ts = ts or datetime.utcnow()
+        sensor = str(id_sensor)
+        bucket = ts.hour * self.season_buckets // 24
+        anomalies = []
+        with self._lock:
+            self.counters["readings"] += 1
+            for metric in self.metrics:
+                value = reading.get(metric)
+                if value is None:
+                    continue
+                value = float(value)
+                if math.isnan(value):
+                    continue
+                key = (sensor, metric)
+                state = self._states.get(key)
+                if state is None:
+                    state = self._states[key] = MetricState(self.season_buckets)
+                anomaly = self._advance(state, value, bucket)
+                self._dirty.add(key)
+                if anomaly:
+                    kind, score, detalhe = anomaly
+                    anomalies.append(SensorAnomaly(sensor, metric, kind, value, score, detalhe, ts))
+            self.counters["anomalies"] += len(anomalies)
+
+        for a in anomalies:
+            logger.warning("sensor_anomaly_detected", sensor=a.id_sensor, metrica=a.metric, tipo=a.kind,
+                           valor=a.valor, score=round(a.score, 3))
+        if anomalies:
+            # Inicio de anomalia: persiste ja, mas no thread de persistencia (fora da ingestao)
+            self._wake.set()
+        return anomalies
+
+    def _advance(self, s: MetricState, x: float, bucket: int) -> Optional[Tuple[str, float, str]]:
+        first = not s.n
+        warm = s.n >= self.min_samples
+        flags = 0
+
+        # Travado: mesmo valor repetido
+        if not first and x == s.last:
+            s.stuck_run += 1
+        else:
+            s.stuck_run = 0
+        # So sinaliza apos min_samples: no aquecimento valores repetidos ainda sao plausiveis
+        if warm and s.stuck_run + 1 >= self.stuck_count:
+            flags |= _FLAGS[STUCK]
+
+        # Sem variacao: diferencas muito menores que o ruido normal do sensor
+        diff = None if first else abs(x - s.last)
+        diff_std = s.diff_std
+        if diff is not None and warm and diff_std > 0 and diff < self.flatline_ratio * diff_std:
+            s.quiet_run += 1
+        else:
+            s.quiet_run = 0
+        if s.quiet_run >= self.flatline_count and not flags & _FLAGS[STUCK]:
+            flags |= _FLAGS[FLATLINE]
+
+        # Pico: residuo em relacao ao perfil sazonal (ou EWMA enquanto o balde aquece)
+        baseline = s.season[bucket] if s.season_n[bucket] >= 3 else (x if first else s.ewma)
+        residual = x - baseline
+        score = 0.0
+        r_std = s.residual_std
+        if warm and r_std > 0:
+            score = abs(residual - s.r_mean) / r_std
+            # Sensor travado/sem variacao ja esta em falha: desvio do perfil nao e pico
+            if score > self.spike_z and not flags:
+                flags |= _FLAGS[SPIKE]
+
+        # Estatisticas de longo prazo congeladas durante falha (nao aprendem o defeito)
+        if not flags & (_FLAGS[STUCK] | _FLAGS[FLATLINE]):
+            if diff is not None:
+                s.d_n, s.d_mean, s.d_m2 = _welford(s.d_n, s.d_mean, s.d_m2, diff)
+            if not flags & _FLAGS[SPIKE]:
+                s.r_n, s.r_mean, s.r_m2 = _welford(s.r_n, s.r_mean, s.r_m2, residual)
+            s.n, s.mean, s.m2 = _welford(s.n, s.mean, s.m2, x)
+        s.ewma = x if first else self.alpha * x + (1 - self.alpha) * s.ewma
+        season_alpha = max(self.alpha, 1.0 / (s.season_n[bucket] + 1))
+        s.season[bucket] += season_alpha * (x - s.season[bucket])
+        s.season_n[bucket] += 1
+        s.last = x
+
+        started = flags & ~int(s.flags)
+        s.flags = float(flags)
+        if started & _FLAGS[STUCK]:
+            return STUCK, s.stuck_run + 1, f"valor {x:g} repetido em {int(s.stuck_run) + 1} leituras"
+        if started & _FLAGS[FLATLINE]:
+            return FLATLINE, s.quiet_run, f"variacao abaixo de {self.flatline_ratio:.0%} do ruido por {int(s.quiet_run)} leituras"
+        if started & _FLAGS[SPIKE]:
+            return SPIKE, score, f"desvio de {score:.1f} desvios-padrao do perfil horario (esperado ~{baseline:.2f})"
+        return None
+
+    # ---------- Consulta ----------
+    def active(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "id_sensor": sensor,
+                    "metrica": metric,
+                    "anomalias": [kind for kind, bit in _FLAGS.items() if int(s.flags) & bit],
+                    "ultimo_valor": s.last,
+                    "amostras": int(s.n),
+                }
+                for (sensor, metric), s in self._states.items()
+                if s.flags
+            ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "series": len(self._states), "pending_save": len(self._dirty)}
@@ -1,3 +1,4 @@
 """AWS Integration Service"""
 from .service import AWSService
-__all__ = ['AWSService']
+from .transports import Boto3Transport, FakeTransport, FileSinkTransport, get_transport
+__all__ = ['AWSService', 'Boto3Transport', 'FakeTransport', 'FileSinkTransport', 'get_transport']
@@ -1,17 +1,27 @@
 """AWS Integration Service - Fase 7 Completo"""
-import boto3
 from typing import Dict, List, Optional
 import structlog
 from datetime import datetime
 import os
 import re
 
+from .telemetry import TelemetryShipper
+from .transports import get_transport
+
 logger = structlog.get_logger()
 
 class AWSService:
     """Handles all AWS service integrations with SMS, Email and monitoring"""
 
-    def __init__(self, region: str = 'sa-east-1'):
+    # Definir emoji e cor por severidade
+    SEVERITY_CONFIG = {
+        'baixa': {'emoji': 'ℹ️', 'color': '#17a2b8'},
+        'media': {'emoji': '⚠️', 'color': '#ffc107'},
+        'alta': {'emoji': '🚨', 'color': '#fd7e14'},
+        'critica': {'emoji': '🆘', 'color': '#dc3545'}
+    }
+
+    def __init__(self, region: str = 'sa-east-1', transport=None):
         self.region = region
         self.sns_topic_arn = os.getenv("AWS_SNS_TOPIC_ARN", "")
         self.sns_sms_topic_arn = os.getenv("AWS_SNS_SMS_TOPIC_ARN", "")
@@ -19,16 +29,31 @@ class AWSService:
         self.s3_bucket = os.getenv("AWS_S3_BUCKET", "farmtech-storage")
         self.log_group = os.getenv("AWS_CLOUDWATCH_LOG_GROUP", "/farmtech/logs")
 
-        try:
-            # Inicializar clientes AWS
-            self.sns_client = boto3.client('sns', region_name=region)
-            self.s3_client = boto3.client('s3', region_name=region)
-            self.cloudwatch_client = boto3.client('cloudwatch', region_name=region)
-            self.logs_client = boto3.client('logs', region_name=region)
-            self.ses_client = boto3.client('ses', region_name=region)
-            logger.info("aws_service_initialized", region=region)
-        except Exception as e:
-            logger.warning("aws_service_init_failed", error=str(e))
+        # Clientes sao criados pelo transporte no primeiro uso (boto3, fake ou file)
+        self.transport = transport or get_transport(region=region)
+        # Metricas e logs do CloudWatch saem em lote (por tamanho, tempo ou shutdown)
+        self.telemetry = TelemetryShipper.from_env(self.transport)
+        logger.info("aws_service_initialized", region=region, transport=self.transport.name)
+
+    @property
+    def sns_client(self):
+        return self.transport.client('sns')
+
+    @property
+    def s3_client(self):
+        return self.transport.client('s3')
+
+    @property
+    def cloudwatch_client(self):
+        return self.transport.client('cloudwatch')
+
+    @property
+    def logs_client(self):
+        return self.transport.client('logs')
+
+    @property
+    def ses_client(self):
+        return self.transport.client('ses')
     
     def send_alert(self, topic_arn: str, message: str, subject: str) -> str:
         """Send alert via SNS"""
@@ -74,80 +99,30 @@ class AWSService:
             return ""
     
     def log_metric(self, namespace: str, metric_name: str, value: float) -> None:
-        """Log metric to CloudWatch"""
-        try:
-            self.cloudwatch_client.put_metric_data(
-                Namespace=namespace,
-                MetricData=[{
-                    'MetricName': metric_name,
-                    'Value': value,
-                    'Timestamp': datetime.now()
-                }]
-            )
-            logger.info("cloudwatch_metric_logged", metric=metric_name, value=value)
-        except Exception as e:
-            logger.error("cloudwatch_metric_failed", error=str(e))
+        """Log metric to CloudWatch (buffered)"""
+        self.put_metric(namespace, metric_name, value)
     
     def send_logs_to_cloudwatch(self, log_group: str, log_stream: str, logs: List[Dict]) -> None:
-        """Send logs to CloudWatch"""
+        """Send logs to CloudWatch (buffered; group/stream creation is cached)"""
         try:
-            # Create log group if not exists
-            try:
-                self.logs_client.create_log_group(logGroupName=log_group)
-            except self.logs_client.exceptions.ResourceAlreadyExistsException:
-                pass
-            except Exception:
-                pass
-            
-            # Create log stream if not exists
-            try:
-                self.logs_client.create_log_stream(
-                    logGroupName=log_group,
-                    logStreamName=log_stream
-                )
-            except self.logs_client.exceptions.ResourceAlreadyExistsException:
-                pass
-            except Exception:
-                pass
-            
-            # Put log events
-            log_events = [
-                {
-                    'timestamp': int(datetime.now().timestamp() * 1000),
-                    'message': log.get('message', str(log))
-                }
-                for log in logs
-            ]
-            
-            if log_events:
-                self.logs_client.put_log_events(
-                    logGroupName=log_group,
-                    logStreamName=log_stream,
-                    logEvents=log_events
-                )
-            
-            logger.info("cloudwatch_logs_sent", count=len(logs))
+            timestamp_ms = int(datetime.now().timestamp() * 1000)
+            for log in logs:
+                self.telemetry.log(log_group, log_stream, log.get('message', str(log)), timestamp_ms)
+            logger.info("cloudwatch_logs_queued", count=len(logs))
         except Exception as e:
             logger.error("cloudwatch_logs_failed", error=str(e))
     
     def put_metric(self, namespace: str, metric_name: str, value: float, unit: str = 'None') -> None:
-        """Put metric to CloudWatch"""
+        """Put metric to CloudWatch (aggregated into statistic sets and sent in batches)"""
         try:
-            self.cloudwatch_client.put_metric_data(
-                Namespace=namespace,
-                MetricData=[
-                    {
-                        'MetricName': metric_name,
-                        'Value': value,
-                        'Unit': unit,
-                        'Timestamp': datetime.now()
-                    }
-                ]
-            )
-            logger.info("cloudwatch_metric_sent", metric=metric_name, value=value)
+            self.telemetry.put_metric(namespace, metric_name, value, unit)
         except Exception as e:
             logger.error("cloudwatch_metric_failed", error=str(e))
 
+    def flush_telemetry(self) -> int:
+        """Send buffered CloudWatch metrics and logs now (shutdown, scripts)"""
+        return self.telemetry.flush()
+
     # ========== NOVOS MÉTODOS FASE 7 ==========
 
     def send_sms(self, phone_number: str, message: str) -> str:
@@ -271,43 +246,23 @@ class AWSService:
             self.put_metric('FarmTech/Alerts', 'EmailFailed', 1, 'Count')
             return ""
 
-    def send_combined_alert(
+    def _severity_config(self, severity: str) -> Dict[str, str]:
+        return self.SEVERITY_CONFIG.get(severity.lower(), self.SEVERITY_CONFIG['media'])
+
+    def render_alert_email(
         self,
         title: str,
         message: str,
         severity: str,
-        emails: List[str],
-        phones: List[str],
         recommended_action: Optional[str] = None
-    ) -> Dict[str, List[str]]:
+    ) -> Dict[str, str]:
         """
-        Send alert via both Email and SMS
-
-        Args:
-            title: Alert title
-            message: Alert message
-            severity: Alert severity (baixa, media, alta, critica)
-            emails: List of email addresses
-            phones: List of phone numbers
-            recommended_action: Suggested corrective action
+        Render alert email content
 
         Returns:
-            Dict with 'email_ids' and 'sms_ids' lists
+            Dict with 'subject', 'html' and 'text'
         """
-        results = {
-            'email_ids': [],
-            'sms_ids': []
-        }
-
-        # Definir emoji e cor por severidade
-        severity_config = {
-            'baixa': {'emoji': 'ℹ️', 'color': '#17a2b8'},
-            'media': {'emoji': '⚠️', 'color': '#ffc107'},
-            'alta': {'emoji': '🚨', 'color': '#fd7e14'},
-            'critica': {'emoji': '🆘', 'color': '#dc3545'}
-        }
-
-        config = severity_config.get(severity.lower(), severity_config['media'])
+        config = self._severity_config(severity)
 
         # Criar corpo HTML do email
         html_body = f"""
@@ -362,17 +317,59 @@ Data/Hora: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}
 FarmTech Monitoring System
         """
 
-        # Enviar emails
-        for email in emails:
-            if self._validate_email(email):
-                msg_id = self.send_email_html(email, f"[{severity.upper()}] {title}", html_body, text_body)
-                if msg_id:
-                    results['email_ids'].append(msg_id)
+        return {'subject': f"[{severity.upper()}] {title}", 'html': html_body, 'text': text_body}
 
-        # Criar mensagem SMS (curta)
+    def render_alert_sms(
+        self,
+        title: str,
+        message: str,
+        severity: str,
+        recommended_action: Optional[str] = None
+    ) -> str:
+        """Render short SMS text for an alert"""
+        config = self._severity_config(severity)
         sms_text = f"{config['emoji']} {title[:30]}: {message[:100]}"
         if recommended_action:
             sms_text += f" | Ação: {recommended_action[:40]}"
+        return sms_text
+
+    def send_combined_alert(
+        self,
+        title: str,
+        message: str,
+        severity: str,
+        emails: List[str],
+        phones: List[str],
+        recommended_action: Optional[str] = None
+    ) -> Dict[str, List[str]]:
+        """
+        Send alert via both Email and SMS
+
+        Args:
+            title: Alert title
+            message: Alert message
+            severity: Alert severity (baixa, media, alta, critica)
+            emails: List of email addresses
+            phones: List of phone numbers
+            recommended_action: Suggested corrective action
+
+        Returns:
+            Dict with 'email_ids' and 'sms_ids' lists
+        """
+        results = {
+            'email_ids': [],
+            'sms_ids': []
+        }
+
+        email = self.render_alert_email(title, message, severity, recommended_action)
+        sms_text = self.render_alert_sms(title, message, severity, recommended_action)
+
+        # Enviar emails
+        for to_email in emails:
+            if self._validate_email(to_email):
+                msg_id = self.send_email_html(to_email, email['subject'], email['html'], email['text'])
+                if msg_id:
+                    results['email_ids'].append(msg_id)
 
         # Enviar SMS
         for phone in phones:
@@ -410,30 +407,7 @@ FarmTech Monitoring System
         """
         try:
             log_stream = f"alerts-{datetime.now().strftime('%Y-%m-%d')}"
-
-            # Criar log stream se não existir
-            try:
-                self.logs_client.create_log_stream(
-                    logGroupName=self.log_group,
-                    logStreamName=log_stream
-                )
-            except self.logs_client.exceptions.ResourceAlreadyExistsException:
-                pass
-
-            # Preparar evento de log
-            log_event = {
-                'timestamp': int(datetime.now().timestamp() * 1000),
-                'message': f"[ALERT_AUDIT] {alert_data}"
-            }
-
-            # Enviar para CloudWatch
-            self.logs_client.put_log_events(
-                logGroupName=self.log_group,
-                logStreamName=log_stream,
-                logEvents=[log_event]
-            )
-
+            self.telemetry.log(self.log_group, log_stream, f"[ALERT_AUDIT] {alert_data}")
             logger.info("alert_audit_logged", log_stream=log_stream)
-
         except Exception as e:
             logger.error("alert_audit_failed", error=str(e))
@@ -0,0 +1,295 @@
+"""
+Envio de telemetria em lote para CloudWatch - Fase 7
+Metricas sao agregadas em conjuntos estatisticos (SampleCount/Sum/Min/Max)
+por janela e enviadas em lotes de ate 1000 por put_metric_data; eventos de
+log sao agrupados por (grupo, stream) e enviados respeitando os limites de
+put_log_events. A existencia de grupos/streams fica em cache, evitando
+create_log_group/create_log_stream a cada envio. O envio acontece no thread
+de flush: quem registra so sinaliza, e apenas no limite rigido do buffer
+(overflow_factor x lote) bloqueia enviando no proprio thread ou descarta,
+conforme `overflow`.
+"""
+import atexit
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+# Limites da API CloudWatch
+MAX_METRICS_PER_CALL = 1000
+MAX_LOG_EVENTS_PER_CALL = 10_000
+MAX_LOG_BYTES_PER_CALL = 1_048_576
+LOG_EVENT_OVERHEAD = 26
+
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+class TelemetryShipper:
+    """Buffer de metricas e logs do CloudWatch com envio por tamanho, tempo ou shutdown"""
+
+    def __init__(
+        self,
+        transport,
+        flush_interval: float = 10.0,
+        window_seconds: int = 60,
+        max_pending_metrics: int = MAX_METRICS_PER_CALL,
+        max_pending_events: int = MAX_LOG_EVENTS_PER_CALL,
+        overflow: str = "block",
+        overflow_factor: int = 10,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow deve ser um de {OVERFLOW_POLICIES}: {overflow}")
+        self.transport = transport
+        self.flush_interval = flush_interval
+        self.window_seconds = window_seconds
+        self.max_pending_metrics = max_pending_metrics
+        self.max_pending_events = max_pending_events
+        self.overflow = overflow
+        self.overflow_factor = overflow_factor
+
+        # (namespace, nome, unidade, dimensoes, janela) -> estatisticas
+        self._metrics: Dict[Tuple, Dict[str, float]] = {}
+        self._events: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+        self._pending_events = 0
+        self._known_groups = set()
+        self._known_streams = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flush_requested = False
+        self.counters = {"metrics_recorded": 0, "events_recorded": 0, "api_calls": 0, "errors": 0, "dropped": 0}
+        _register(self)
+
+    @classmethod
+    def from_env(cls, transport) -> "TelemetryShipper":
+        import os
+
+        return cls(
+            transport,
+            flush_interval=float(os.getenv("AWS_TELEMETRY_FLUSH_SECONDS", 10)),
+            overflow=os.getenv("AWS_TELEMETRY_OVERFLOW", "block"),
+        )
+
+    # ---------- Registro ----------
+    def put_metric(
+        self,
+        namespace: str,
+        metric_name: str,
+        value: float,
+        unit: str = "None",
+        dimensions: Optional[Dict[str, str]] = None,
+        timestamp: Optional[float] = None,
+    ) -> None:
+        ts = timestamp if timestamp is not None else time.time()
+        window = int(ts // self.window_seconds) * self.window_seconds
+        key = (namespace, metric_name, unit, tuple(sorted((dimensions or {}).items())), window)
+        with self._lock:
+            stats = self._metrics.get(key)
+            if stats is None and not self._admit(len(self._metrics), self.max_pending_metrics):
+                return
+            if stats is None:
+                self._metrics[key] = {"SampleCount": 1.0, "Sum": value, "Minimum": value, "Maximum": value}
+            else:
+                stats["SampleCount"] += 1
+                stats["Sum"] += value
+                stats["Minimum"] = min(stats["Minimum"], value)
+                stats["Maximum"] = max(stats["Maximum"], value)
+            self.counters["metrics_recorded"] += 1
+            _PENDING.add(self)
+            full = len(self._metrics) >= self.max_pending_metrics
+        self._maybe_flush(full)
+
+    def log(self, log_group: str, log_stream: str, message: str, timestamp_ms: Optional[int] = None) -> None:
+        event = {"timestamp": timestamp_ms or int(time.time() * 1000), "message": message}
+        with self._lock:
+            if not self._admit(self._pending_events, self.max_pending_events):
+                return
+            self._events[(log_group, log_stream)].append(event)
+            self._pending_events += 1
+            self.counters["events_recorded"] += 1
+            _PENDING.add(self)
+            full = self._pending_events >= self.max_pending_events
+        self._maybe_flush(full)
+
+    def _admit(self, pending: int, batch_size: int) -> bool:
+        """
+        Apply the overflow policy at the hard cap (chamar com _lock). "block"
+        ships the buffer on the caller's thread; "drop" discards the item.
+        """
+        if pending < batch_size * self.overflow_factor:
+            return True
+        if self.overflow == "drop":
+            self.counters["dropped"] += 1
+            return False
+        self._lock.release()
+        try:
+            self.flush()
+        finally:
+            self._lock.acquire()
+        return True
+
+    def _maybe_flush(self, full: bool) -> None:
+        """Wake the flusher thread when a batch is full or the interval elapsed (sem I/O aqui)."""
+        if full or self.flush_interval <= 0 or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush_requested = True
+            _WAKE.set()
+
+    # ---------- Envio ----------
+    def flush(self) -> int:
+        """Envia tudo o que esta no buffer; devolve o numero de chamadas feitas a API."""
+        with self._flush_lock:
+            with self._lock:
+                metrics, self._metrics = self._metrics, {}
+                events, self._events = self._events, defaultdict(list)
+                self._pending_events = 0
+                self._flush_requested = False
+                _PENDING.discard(self)
+            self._last_flush = time.monotonic()
+
+            calls = self._ship_metrics(metrics) + sum(
+                self._ship_logs(group, stream, batch) for (group, stream), batch in events.items()
+            )
+        if calls:
+            with self._lock:
+                self.counters["api_calls"] += calls
+            logger.debug("telemetry_flushed", metrics=len(metrics), calls=calls)
+        return calls
+
+    def _ship_metrics(self, metrics: Dict[Tuple, Dict[str, float]]) -> int:
+        by_namespace: Dict[str, List[Dict]] = defaultdict(list)
+        for (namespace, name, unit, dimensions, window), stats in metrics.items():
+            datum = {
+                "MetricName": name,
+                "Timestamp": datetime.fromtimestamp(window, tz=timezone.utc),
+                "StatisticValues": stats,
+                "Unit": unit,
+            }
+            if dimensions:
+                datum["Dimensions"] = [{"Name": k, "Value": v} for k, v in dimensions]
+            by_namespace[namespace].append(datum)
+
+        calls = 0
+        client = self.transport.client("cloudwatch") if by_namespace else None
+        for namespace, data in by_namespace.items():
+            for i in range(0, len(data), MAX_METRICS_PER_CALL):
+                try:
+                    client.put_metric_data(Namespace=namespace, MetricData=data[i:i + MAX_METRICS_PER_CALL])
+                except Exception as e:
+                    self._error("cloudwatch_metric_batch_failed", e, namespace=namespace)
+                calls += 1
+        return calls
+
+    def _ship_logs(self, group: str, stream: str, events: List[Dict]) -> int:
+        if not events:
+            return 0
+        client = self.transport.client("logs")
+        calls = self._ensure_stream(client, group, stream)
+        events.sort(key=lambda e: e["timestamp"])
+
+        for batch in _log_batches(events):
+            try:
+                client.put_log_events(logGroupName=group, logStreamName=stream, logEvents=batch)
+            except Exception as e:
+                # Stream removido externamente: esquece o cache e tenta recriar uma vez
+                if type(e).__name__ == "ResourceNotFoundException":
+                    self._known_streams.discard((group, stream))
+                    self._known_groups.discard(group)
+                    calls += self._ensure_stream(client, group, stream)
+                    try:
+                        client.put_log_events(logGroupName=group, logStreamName=stream, logEvents=batch)
+                    except Exception as retry_error:
+                        self._error("cloudwatch_log_batch_failed", retry_error, group=group, stream=stream)
+                    calls += 1
+                else:
+                    self._error("cloudwatch_log_batch_failed", e, group=group, stream=stream)
+            calls += 1
+        return calls
+
+    def _ensure_stream(self, client, group: str, stream: str) -> int:
+        calls = 0
+        if group not in self._known_groups:
+            calls += 1
+            try:
+                client.create_log_group(logGroupName=group)
+            except Exception as e:
+                if type(e).__name__ != "ResourceAlreadyExistsException":
+                    self._error("cloudwatch_log_group_failed", e, group=group)
+            self._known_groups.add(group)
+        if (group, stream) not in self._known_streams:
+            calls += 1
+            try:
+                client.create_log_stream(logGroupName=group, logStreamName=stream)
+            except Exception as e:
+                if type(e).__name__ != "ResourceAlreadyExistsException":
+                    self._error("cloudwatch_log_stream_failed", e, group=group, stream=stream)
+            self._known_streams.add((group, stream))
+        return calls
+
+    def _error(self, event: str, error: Exception, **context) -> None:
+        with self._lock:
+            self.counters["errors"] += 1
+        logger.error(event, error=str(error), **context)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "pending_metrics": len(self._metrics), "pending_events": self._pending_events}
+
+
+def _log_batches(events: List[Dict]):
+    """Divide eventos respeitando os limites de quantidade e bytes de put_log_events."""
+    batch, size = [], 0
+    for event in events:
+        event_size = len(event["message"].encode("utf-8")) + LOG_EVENT_OVERHEAD
+        if batch and (len(batch) >= MAX_LOG_EVENTS_PER_CALL or size + event_size > MAX_LOG_BYTES_PER_CALL):
+            yield batch
+            batch, size = [], 0
+        batch.append(event)
+        size += event_size
+    if batch:
+        yield batch
+
+
+# ---------- Flush periodico compartilhado ----------
+# Um unico thread esvazia os shippers com dados no buffer; no encerramento do
+# processo tudo e enviado. _PENDING guarda referencias fortes enquanto ha dados
+# pendentes, entao um AWSService de vida curta coletado pelo GC nao perde
+# metricas nem eventos de auditoria: o shipper so e liberado depois do flush.
+_PENDING = set()
+_FLUSHER: Optional[threading.Thread] = None
+_FLUSHER_LOCK = threading.Lock()
+_WAKE = threading.Event()  # sinalizado por _maybe_flush quando um lote fica pronto
+
+
+def _register(shipper: TelemetryShipper) -> None:
+    global _FLUSHER
+    with _FLUSHER_LOCK:
+        if _FLUSHER is None:
+            _FLUSHER = threading.Thread(target=_flush_loop, name="telemetry-flusher", daemon=True)
+            _FLUSHER.start()
+
+
+def _flush_loop() -> None:
+    while True:
+        _WAKE.wait(1.0)
+        _WAKE.clear()
+        for shipper in list(_PENDING):
+            due = shipper.flush_interval <= 0 or time.monotonic() - shipper._last_flush >= shipper.flush_interval
+            if shipper._flush_requested or due:
+                try:
+                    shipper.flush()
+                except Exception as e:
+                    logger.error("telemetry_flush_failed", error=str(e))
+
+
+@atexit.register
+def flush_all() -> None:
+    for shipper in list(_PENDING):
+        try:
+            shipper.flush()
+        except Exception as e:
+            logger.error("telemetry_flush_failed", error=str(e))
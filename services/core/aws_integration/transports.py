@@ -0,0 +1,208 @@
+"""
+Transportes do AWSService - Fase 7
+O AWSService fala com SNS/SES/S3/CloudWatch atraves de um transporte:
+- boto3: clientes reais, criados sob demanda no primeiro uso
+- fake: clientes em memoria que registram as chamadas (testes e carga offline)
+- file: como o fake, mas grava emails (.eml) e chamadas (.jsonl) em disco ou
+  entrega emails a um servidor SMTP local (MailHog, smtp4dev)
+Selecionado por AWS_TRANSPORT.
+"""
+import json
+import smtplib
+import threading
+import time
+import uuid
+from collections import defaultdict
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+SERVICES = ("sns", "ses", "s3", "cloudwatch", "logs")
+
+
+class Boto3Transport:
+    """Clientes boto3 criados sob demanda (sem custo de startup para servicos nao usados)"""
+
+    name = "boto3"
+
+    def __init__(self, region: str = "sa-east-1"):
+        self.region = region
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def client(self, service: str):
+        client = self._clients.get(service)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(service)
+                if client is None:
+                    import boto3
+
+                    client = boto3.client(service, region_name=self.region)
+                    self._clients[service] = client
+                    logger.info("aws_client_created", service=service, region=self.region)
+        return client
+
+
+class _FakeExceptions:
+    class ResourceAlreadyExistsException(Exception):
+        pass
+
+
+class _FakeClient:
+    """Imita a API boto3 usada pelo AWSService, registrando as chamadas no transporte"""
+
+    exceptions = _FakeExceptions
+
+    def __init__(self, service: str, transport: "FakeTransport"):
+        self.service = service
+        self.transport = transport
+
+    def _record(self, operation: str, **params) -> Dict[str, str]:
+        return self.transport.record(self.service, operation, params)
+
+    # SNS
+    def publish(self, **params):
+        return self._record("publish", **params)
+
+    # SES
+    def send_email(self, **params):
+        return self._record("send_email", **params)
+
+    # S3
+    def put_object(self, **params):
+        return self._record("put_object", **params)
+
+    # CloudWatch
+    def put_metric_data(self, **params):
+        return self._record("put_metric_data", **params)
+
+    # CloudWatch Logs
+    def create_log_group(self, logGroupName: str):
+        if not self.transport.create_resource("log_group", logGroupName):
+            raise self.exceptions.ResourceAlreadyExistsException(logGroupName)
+        return self._record("create_log_group", logGroupName=logGroupName)
+
+    def create_log_stream(self, logGroupName: str, logStreamName: str):
+        if not self.transport.create_resource("log_stream", f"{logGroupName}/{logStreamName}"):
+            raise self.exceptions.ResourceAlreadyExistsException(logStreamName)
+        return self._record("create_log_stream", logGroupName=logGroupName, logStreamName=logStreamName)
+
+    def put_log_events(self, **params):
+        return self._record("put_log_events", **params)
+
+
+class FakeTransport:
+    """Transporte em memoria: registra mensagens; `latency` simula a rede, `fail_rate` falhas"""
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, keep_calls: bool = True):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.keep_calls = keep_calls
+        self.calls: Dict[str, List[Dict]] = defaultdict(list)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self._resources = set()
+        self._clients = {service: _FakeClient(service, self) for service in SERVICES}
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def client(self, service: str) -> _FakeClient:
+        return self._clients[service]
+
+    def create_resource(self, kind: str, name: str) -> bool:
+        with self._lock:
+            if (kind, name) in self._resources:
+                return False
+            self._resources.add((kind, name))
+            return True
+
+    def record(self, service: str, operation: str, params: Dict) -> Dict[str, str]:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            # Falhas deterministicas: a cada 1/fail_rate chamadas
+            if self.fail_rate and seq % max(1, round(1 / self.fail_rate)) == 0:
+                raise RuntimeError(f"simulated {service}.{operation} failure")
+            key = f"{service}.{operation}"
+            self.counts[key] += 1
+            if self.keep_calls:
+                self.calls[key].append(params)
+        message_id = f"{service}-{seq}-{uuid.uuid4().hex[:8]}"
+        self.deliver(service, operation, params, message_id)
+        return {"MessageId": message_id}
+
+    def deliver(self, service: str, operation: str, params: Dict, message_id: str) -> None:
+        """Gancho para transportes que persistem as mensagens."""
+
+    def messages(self, key: str) -> List[Dict]:
+        return list(self.calls.get(key, []))
+
+
+class FileSinkTransport(FakeTransport):
+    """Grava emails como .eml e demais chamadas em <servico>.jsonl; ou entrega emails via SMTP local"""
+
+    name = "file"
+
+    def __init__(self, directory: Path, smtp_host: Optional[str] = None, smtp_port: int = 1025, **kwargs):
+        super().__init__(keep_calls=False, **kwargs)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / "emails").mkdir(exist_ok=True)
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self._file_lock = threading.Lock()
+
+    def deliver(self, service: str, operation: str, params: Dict, message_id: str) -> None:
+        if service == "ses" and operation == "send_email":
+            message = _to_email_message(params, message_id)
+            if self.smtp_host:
+                with smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=10) as smtp:
+                    smtp.send_message(message)
+            else:
+                (self.directory / "emails" / f"{message_id}.eml").write_bytes(bytes(message))
+            return
+
+        line = json.dumps({"id": message_id, "operation": operation, **params}, default=str, ensure_ascii=False)
+        with self._file_lock, open(self.directory / f"{service}.jsonl", "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _to_email_message(params: Dict, message_id: str) -> EmailMessage:
+    body = params["Message"]["Body"]
+    message = EmailMessage()
+    message["Message-ID"] = f"<{message_id}@farmtech.local>"
+    message["From"] = params["Source"]
+    message["To"] = ", ".join(params["Destination"]["ToAddresses"])
+    message["Subject"] = params["Message"]["Subject"]["Data"]
+    message.set_content(body.get("Text", {}).get("Data", ""))
+    if "Html" in body:
+        message.add_alternative(body["Html"]["Data"], subtype="html")
+    return message
+
+
+def get_transport(name: Optional[str] = None, region: str = "sa-east-1"):
+    """Cria o transporte configurado em AWS_TRANSPORT (boto3, fake, file)."""
+    import os
+
+    name = (name or os.getenv("AWS_TRANSPORT", "boto3")).lower()
+    if name == "fake":
+        return FakeTransport(latency=float(os.getenv("AWS_FAKE_LATENCY_MS", 0)) / 1000)
+    if name == "file":
+        smtp = os.getenv("AWS_SMTP_SINK", "")
+        host, _, port = smtp.partition(":")
+        return FileSinkTransport(
+            Path(os.getenv("AWS_SINK_DIR", "./aws_sink")),
+            smtp_host=host or None,
+            smtp_port=int(port or 1025),
+        )
+    if name != "boto3":
+        logger.warning("aws_transport_unknown", transport=name)
+    return Boto3Transport(region)
@@ -1,3 +1,4 @@
 """Calculations Service - Fase 1"""
-from .area_insumos import calculate_area_insumos
-__all__ = ['calculate_area_insumos']
+from .area_insumos import calculate_area_insumos, calculate_area_insumos_batch
+from .planning import plan_farm, plan_farm_from_db
+__all__ = ['calculate_area_insumos', 'calculate_area_insumos_batch', 'plan_farm', 'plan_farm_from_db']
@@ -1,7 +1,7 @@
 """
 Area and Insumos Calculation - DB-backed with fallback coefficients
 """
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional, Tuple
 import structlog
 
 logger = structlog.get_logger()
@@ -19,63 +19,34 @@ DEFAULT_COEFFICIENTS = {
 
 
 def _load_coef_from_db(cultura: str, db_service) -> Optional[Dict]:
-    """Try to load coefficients from insumos_cultura table."""
-    def _normalize(text: str) -> str:
-        mapping = str.maketrans("çáàâãéêíóôõúüÇÁÀÂÃÉÊÍÓÔÕÚÜ", "caaaaeeiooouuCAAAAEEIOOOUU")
-        return text.translate(mapping).lower()
-
+    """Coefficients from the in-memory culturas + insumos_cultura table (no query on a warm cache)."""
     try:
-        from services.core.database.models import Cultura, InsumoCultura
-
-        with db_service.get_session() as session:
-            cult = (
-                session.query(Cultura)
-                .filter(Cultura.nome_cultura.ilike(cultura))
-                .first()
-            )
-            if not cult:
-                target_norm = _normalize(cultura)
-                cult = next(
-                    (c for c in session.query(Cultura).all() if _normalize(c.nome_cultura) == target_norm),
-                    None,
-                )
-            if not cult:
-                return None
-            insumo = (
-                session.query(InsumoCultura)
-                .filter(InsumoCultura.id_cultura == cult.id_cultura)
-                .first()
-            )
-            if insumo:
-                return {
-                    "insumo": float(insumo.coef_insumo_por_m2),
-                    "custo_por_m2": float(insumo.custo_por_m2),
-                }
+        coef = db_service.coefficients.get(cultura)
+        if coef:
+            return coef.to_dict()
     except Exception as e:
         logger.warning("load_coef_from_db_failed", error=str(e))
     return None
 
 
-def calculate_area_insumos(cultura: str, area: float, db_service=None) -> Dict:
-    """
-    Calculate insumos and costs for given cultura and area.
-    Prefer DB coefficients; fallback to defaults.
-    """
-    coef = None
-    if db_service:
-        coef = _load_coef_from_db(cultura, db_service)
-    if not coef:
-        coef = DEFAULT_COEFFICIENTS.get(cultura)
-
+def _resolve_coef(cultura: str, db_service=None) -> Tuple[Dict, str]:
+    coef = _load_coef_from_db(cultura, db_service) if db_service else None
+    if coef:
+        return coef, "db"
+    coef = DEFAULT_COEFFICIENTS.get(cultura)
     if not coef:
         raise ValueError(f"Cultura '{cultura}' não suportada")
+    return coef, "default"
+
+
+def _price(cultura: str, area: float, db_service=None) -> Dict:
+    coef, fonte = _resolve_coef(cultura, db_service)
     if area <= 0:
         raise ValueError("Área deve ser maior que zero")
 
     insumo = area * coef["insumo"]
     custo = area * coef["custo_por_m2"]
-
-    result = {
+    return {
         "cultura": cultura,
         "area": area,
         "insumo_necessario": round(insumo, 2),
@@ -83,9 +54,44 @@ def calculate_area_insumos(cultura: str, area: float, db_service=None) -> Dict:
         "breakdown": {
             "coeficiente_insumo": coef["insumo"],
             "custo_por_m2": coef["custo_por_m2"],
-            "fonte": "db" if db_service and coef else "default",
+            "fonte": fonte,
         },
     }
 
-    logger.info("calculation_complete", cultura=cultura, area=area, insumo=insumo)
+
+def calculate_area_insumos(cultura: str, area: float, db_service=None) -> Dict:
+    """
+    Calculate insumos and costs for given cultura and area.
+    Prefer DB coefficients; fallback to defaults.
+    """
+    result = _price(cultura, area, db_service)
+    logger.info("calculation_complete", cultura=cultura, area=area, insumo=result["insumo_necessario"])
     return result
+
+
+def calculate_area_insumos_batch(items: Iterable[Tuple[str, float]], db_service=None) -> Dict:
+    """
+    Price many (cultura, area) pairs against the same coefficient table.
+    Invalid items come back with an error instead of failing the whole batch.
+    """
+    resultados = []
+    total_insumo = total_custo = 0.0
+    erros = 0
+    for cultura, area in items:
+        try:
+            result = _price(cultura, area, db_service)
+        except ValueError as e:
+            resultados.append({"cultura": cultura, "area": area, "erro": str(e)})
+            erros += 1
+            continue
+        total_insumo += result["insumo_necessario"]
+        total_custo += result["custo_estimado"]
+        resultados.append(result)
+
+    logger.info("batch_calculation_complete", itens=len(resultados), erros=erros)
+    return {
+        "itens": resultados,
+        "total_insumo_necessario": round(total_insumo, 2),
+        "total_custo_estimado": round(total_custo, 2),
+        "erros": erros,
+    }
@@ -0,0 +1,200 @@
+"""
+Farm-wide planning - prices every talhao at once
+Areas (m2) and crop assignments become arrays; insumo and cost for the
+current assignment and for every alternative scenario come out of a single
+gather + bincount, so thousands of talhoes x scenarios cost milliseconds.
+Unknown crops are rejected instead of silently priced as Mandioca.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+import structlog
+from sqlalchemy import select
+
+from services.core.database.coefficients import normalize_cultura
+from services.core.database.models import Cultura, Talhao
+
+from .area_insumos import DEFAULT_COEFFICIENTS
+
+logger = structlog.get_logger()
+
+M2_PER_HECTARE = 10_000.0
+SEM_COEFICIENTE = "sem_coeficiente"
+
+
+@dataclass
+class CropCatalog:
+    """Crops that can be priced: names plus coefficient/cost vectors (same index)"""
+    nomes: List[str]
+    insumo: np.ndarray
+    custo: np.ndarray
+    ids: Dict[int, int]  # id_cultura -> index
+    chaves: Dict[str, int]  # normalized name -> index
+
+    @classmethod
+    def build(cls, db_service=None, map_culturas: bool = True) -> "CropCatalog":
+        """
+        DB coefficients (db.coefficients) first, fallback defaults for crops not in
+        the database. With map_culturas, every registered cultura maps to its entry
+        by normalized name (one query), so a crop priced by default coefficients
+        costs the same in "atual" and in scenarios; name-only lookups can skip it.
+        """
+        entries: Dict[str, tuple] = {}
+        if db_service is not None:
+            for key, coef in db_service.coefficients.all().items():
+                entries[key] = (coef.nome_cultura, coef.insumo, coef.custo_por_m2)
+        for nome, coef in DEFAULT_COEFFICIENTS.items():
+            entries.setdefault(normalize_cultura(nome), (nome, coef["insumo"], coef["custo_por_m2"]))
+
+        keys = list(entries)
+        chaves = {k: i for i, k in enumerate(keys)}
+        ids: Dict[int, int] = {}
+        if db_service is not None and map_culturas:
+            with db_service.engine.connect() as conn:
+                for id_cultura, nome in conn.execute(select(Cultura.id_cultura, Cultura.nome_cultura)):
+                    idx = chaves.get(normalize_cultura(nome))
+                    if idx is not None:
+                        ids[id_cultura] = idx
+        return cls(
+            nomes=[entries[k][0] for k in keys],
+            insumo=np.array([entries[k][1] for k in keys], dtype=float),
+            custo=np.array([entries[k][2] for k in keys], dtype=float),
+            ids=ids,
+            chaves=chaves,
+        )
+
+    def index(self, cultura: str) -> int:
+        try:
+            return self.chaves[normalize_cultura(cultura)]
+        except KeyError:
+            raise ValueError(f"Cultura '{cultura}' não suportada") from None
+
+
+@dataclass
+class FarmTalhoes:
+    """Talhoes as arrays: id, name, area in m2 and current crop id (-1 = none)"""
+    ids: np.ndarray
+    nomes: List[str]
+    area_m2: np.ndarray
+    id_cultura: np.ndarray
+
+    @classmethod
+    def load(cls, db_service) -> "FarmTalhoes":
+        stmt = select(Talhao.id_talhao, Talhao.nome_talhao, Talhao.area_hectares, Talhao.id_cultura_atual).order_by(
+            Talhao.id_talhao
+        )
+        with db_service.engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        return cls(
+            ids=np.array([r[0] for r in rows], dtype=np.int64),
+            nomes=[r[1] for r in rows],
+            area_m2=np.array([float(r[2] or 0) for r in rows], dtype=float) * M2_PER_HECTARE,
+            id_cultura=np.array([r[3] if r[3] is not None else -1 for r in rows], dtype=np.int64),
+        )
+
+
+def _current_assignment(talhoes: FarmTalhoes, catalog: CropCatalog) -> np.ndarray:
+    """Crop index per talhao; -1 when it has no crop or the crop has no coefficients."""
+    size = max(catalog.ids, default=-1) + 1
+    lookup = np.full(size + 1, -1, dtype=np.int64)  # ultima posicao: id fora do catalogo
+    for id_cultura, idx in catalog.ids.items():
+        lookup[id_cultura] = idx
+    ids = talhoes.id_cultura
+    return lookup[np.where((ids >= 0) & (ids < size), ids, size)]
+
+
+def _scenario_assignment(
+    base: np.ndarray, talhoes: FarmTalhoes, catalog: CropCatalog, spec: Mapping
+) -> np.ndarray:
+    """
+    Scenario = optional `cultura` for every talhao plus per-talhao overrides
+    (`talhoes`: id_talhao -> cultura). Talhoes not covered keep the current crop.
+    """
+    assign = base.copy()
+    if spec.get("cultura"):
+        assign[:] = catalog.index(spec["cultura"])
+    overrides = spec.get("talhoes") or {}
+    if overrides:
+        if len(talhoes.ids) == 0:
+            raise ValueError("Nenhum talhão cadastrado para aplicar o cenário")
+        ids = np.array([int(k) for k in overrides], dtype=np.int64)
+        pos = np.searchsorted(talhoes.ids, ids)
+        found = (pos < len(talhoes.ids)) & (talhoes.ids[np.minimum(pos, len(talhoes.ids) - 1)] == ids)
+        if not found.all():
+            raise ValueError(f"Talhão {int(ids[~found][0])} não encontrado")
+        assign[pos] = [catalog.index(c) for c in overrides.values()]
+    return assign
+
+
+def plan_farm(
+    talhoes: FarmTalhoes,
+    catalog: CropCatalog,
+    cenarios: Optional[Mapping[str, Mapping]] = None,
+    incluir_talhoes: bool = False,
+) -> Dict:
+    """
+    Totals of insumo and cost per crop for the current assignment ("atual")
+    and each scenario, computed for all scenarios in one vectorized pass.
+    """
+    base = _current_assignment(talhoes, catalog)
+    nomes = ["atual"] + list(cenarios or {})
+    assign = np.stack([base] + [_scenario_assignment(base, talhoes, catalog, s) for s in (cenarios or {}).values()])
+
+    # Coluna extra K = talhao sem cultura/coeficiente (preco zero)
+    k = len(catalog.nomes)
+    idx = np.where(assign >= 0, assign, k)
+    insumo = talhoes.area_m2 * np.append(catalog.insumo, 0.0)[idx]
+    custo = talhoes.area_m2 * np.append(catalog.custo, 0.0)[idx]
+
+    # Totais por (cenario, cultura) com um bincount sobre indices deslocados
+    flat = (idx + np.arange(len(nomes))[:, None] * (k + 1)).ravel()
+    size = len(nomes) * (k + 1)
+    shape = (len(nomes), k + 1)
+    area_tot = np.bincount(flat, np.broadcast_to(talhoes.area_m2, idx.shape).ravel(), size).reshape(shape)
+    insumo_tot = np.bincount(flat, insumo.ravel(), size).reshape(shape)
+    custo_tot = np.bincount(flat, custo.ravel(), size).reshape(shape)
+    count_tot = np.bincount(flat, minlength=size).reshape(shape)
+
+    labels = catalog.nomes + [SEM_COEFICIENTE]
+    resultado = {}
+    for s, nome in enumerate(nomes):
+        por_cultura = {
+            labels[c]: {
+                "talhoes": int(count_tot[s, c]),
+                "area_m2": round(float(area_tot[s, c]), 2),
+                "insumo_necessario": round(float(insumo_tot[s, c]), 2),
+                "custo_estimado": round(float(custo_tot[s, c]), 2),
+            }
+            for c in np.flatnonzero(count_tot[s])
+        }
+        cenario = {
+            "insumo_necessario": round(float(insumo_tot[s].sum()), 2),
+            "custo_estimado": round(float(custo_tot[s].sum()), 2),
+            "por_cultura": por_cultura,
+        }
+        if incluir_talhoes:
+            cenario["talhoes"] = [
+                {
+                    "id_talhao": int(talhoes.ids[t]),
+                    "nome": talhoes.nomes[t],
+                    "cultura": labels[idx[s, t]],
+                    "insumo_necessario": round(float(insumo[s, t]), 2),
+                    "custo_estimado": round(float(custo[s, t]), 2),
+                }
+                for t in range(len(talhoes.nomes))
+            ]
+        resultado[nome] = cenario
+
+    logger.info("farm_plan_complete", talhoes=len(talhoes.nomes), cenarios=len(nomes))
+    return {
+        "talhoes": len(talhoes.nomes),
+        "area_total_m2": round(float(talhoes.area_m2.sum()), 2),
+        "cenarios": resultado,
+    }
+
+
+def plan_farm_from_db(db_service, cenarios: Optional[Mapping[str, Mapping]] = None,
+                      incluir_talhoes: bool = False) -> Dict:
+    """Load talhoes (one query) and coefficients (in memory) and run plan_farm."""
+    return plan_farm(FarmTalhoes.load(db_service), CropCatalog.build(db_service), cenarios, incluir_talhoes)
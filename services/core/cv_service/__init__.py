@@ -1,3 +1,5 @@
 """Computer Vision Service"""
 from .service import CVService
-__all__ = ['CVService']
+from .cache import DetectionCache
+from .stream import StreamDetector
+__all__ = ['CVService', 'DetectionCache', 'StreamDetector']
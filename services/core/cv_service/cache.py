@@ -0,0 +1,239 @@
+"""
+Detection result cache - Fase 6
+Persists YOLO detections on disk keyed by image content hash, model id and
+confidence threshold so repeated analyses (startup seeding, re-uploads) skip
+inference. An optional perceptual-hash mode treats near-duplicate frames from
+fixed cameras as hits. The cache keeps at most `max_entries` results,
+evicting the least recently used ones together with their perceptual-index
+rows.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_digest(image_path: Path) -> str:
+    """SHA-256 of the file bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image_path: Path, hash_size: int = 8) -> int:
+    """
+    Difference hash (dHash): compares adjacent pixels of a tiny grayscale
+    thumbnail. Small lighting/compression changes keep most bits stable.
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        thumb = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+        pixels = thumb.tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | int(pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class DetectionCache:
+    """On-disk detection cache with optional perceptual matching"""
+
+    # Instancias compartilhadas por configuracao: rotas criam o cache a cada requisicao
+    _shared: Dict[tuple, "DetectionCache"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cache_dir: Path, perceptual: bool = False, max_distance: int = 4, max_entries: int = 10000):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        # Log append-only (uma linha [variant, phash, digest] por put); reescrito so na compactacao
+        self.index_file = self.cache_dir / "phash_index.jsonl"
+        self._lock = threading.Lock()
+        # (path, mtime_ns, size) -> sha256, evita re-ler arquivos inalterados
+        self._digest_memo: Dict[Tuple[str, int, int], str] = {}
+        self._phash_index: Optional[Dict[str, Dict[str, str]]] = None  # variant -> {digest: phash}
+        self._index_lines = 0
+        self._entries: Optional["OrderedDict[Path, None]"] = None  # LRU dos arquivos de resultado
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls, default_dir: Path) -> Optional["DetectionCache"]:
+        """Build cache from CV_CACHE_* env vars; returns None when disabled."""
+        if os.getenv("CV_CACHE_ENABLED", "1") != "1":
+            return None
+        config = (
+            str(Path(os.getenv("CV_CACHE_DIR", str(Path(default_dir) / ".cv_cache"))).resolve()),
+            os.getenv("CV_CACHE_PERCEPTUAL", "0") == "1",
+            int(os.getenv("CV_CACHE_MAX_DISTANCE", 4)),
+            int(os.getenv("CV_CACHE_MAX_ENTRIES", 10000)),
+        )
+        with cls._shared_lock:
+            cache = cls._shared.get(config)
+            if cache is None:
+                cache = cls._shared[config] = cls(
+                    Path(config[0]), perceptual=config[1], max_distance=config[2], max_entries=config[3]
+                )
+        return cache
+
+    # ---------- Keys ----------
+    def _digest(self, image_path: Path) -> str:
+        stat = Path(image_path).stat()
+        memo_key = (str(image_path), stat.st_mtime_ns, stat.st_size)
+        digest = self._digest_memo.get(memo_key)
+        if digest is None:
+            digest = content_digest(image_path)
+            if len(self._digest_memo) >= self.max_entries:
+                self._digest_memo.clear()
+            self._digest_memo[memo_key] = digest
+        return digest
+
+    @staticmethod
+    def _variant(model_id: str, confidence: float) -> str:
+        return f"{model_id}|{confidence:.4f}"
+
+    def _entry_path(self, digest: str, variant: str) -> Path:
+        key = hashlib.sha256(f"{digest}|{variant}".encode("utf-8")).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    # ---------- Perceptual index (chamar com _lock) ----------
+    def _load_index(self) -> Dict[str, Dict[str, str]]:
+        if self._phash_index is None:
+            self._phash_index = {}
+            try:
+                with open(self.index_file, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            variant, phash, digest = json.loads(line)
+                        except ValueError:
+                            continue  # linha truncada por queda no meio do append
+                        self._phash_index.setdefault(variant, {})[digest] = phash
+                        self._index_lines += 1
+            except FileNotFoundError:
+                pass
+        return self._phash_index
+
+    def _index_add(self, variant: str, phash: str, digest: str) -> None:
+        index = self._load_index()
+        if index.get(variant, {}).get(digest) == phash:
+            return
+        index.setdefault(variant, {})[digest] = phash
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps([variant, phash, digest]) + "\n")
+        self._index_lines += 1
+
+    def _compact_index(self) -> None:
+        """Rewrite the log with live rows only (after evictions or when it doubled)."""
+        index = self._load_index()
+        rows = [[variant, phash, digest] for variant, by_digest in index.items() for digest, phash in by_digest.items()]
+        tmp = self.index_file.with_suffix(".tmp")
+        tmp.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+        tmp.replace(self.index_file)
+        self._index_lines = len(rows)
+
+    def _nearest(self, phash: int, variant: str) -> Optional[str]:
+        best_digest, best_distance = None, self.max_distance + 1
+        for digest, stored_hash in self._load_index().get(variant, {}).items():
+            distance = (int(stored_hash, 16) ^ phash).bit_count()
+            if distance < best_distance:
+                best_digest, best_distance = digest, distance
+        return best_digest
+
+    # ---------- Eviction (chamar com _lock) ----------
+    def _load_entries(self) -> "OrderedDict[Path, None]":
+        if self._entries is None:
+            paths = sorted(self.cache_dir.glob("*/*.json"), key=lambda p: p.stat().st_mtime_ns)
+            self._entries = OrderedDict((p, None) for p in paths)
+        return self._entries
+
+    def _evict(self) -> None:
+        """Drop least recently used results down to 90% of max_entries."""
+        entries = self._load_entries()
+        if len(entries) <= self.max_entries:
+            return
+        # Remove em lote ate a marca baixa para nao compactar o indice a cada put
+        target = int(self.max_entries * 0.9)
+        index = self._load_index() if self.perceptual else {}
+        while len(entries) > target:
+            path, _ = entries.popitem(last=False)
+            try:
+                payload = json.loads(path.read_text(encoding="utf-8"))
+                index.get(self._variant(payload["model"], payload["confidence"]), {}).pop(payload["sha256"], None)
+            except Exception:
+                pass
+            path.unlink(missing_ok=True)
+            self.evictions += 1
+        if self.perceptual:
+            self._compact_index()
+
+    # ---------- Public API ----------
+    def get(self, image_path: Path, model_id: str, confidence: float) -> Optional[List[Dict]]:
+        """Return cached detection dicts or None on miss."""
+        variant = self._variant(model_id, confidence)
+        try:
+            entry = self._entry_path(self._digest(image_path), variant)
+            if not entry.exists() and self.perceptual:
+                with self._lock:
+                    near = self._nearest(perceptual_hash(image_path), variant)
+                if near:
+                    entry = self._entry_path(near, variant)
+            if entry.exists():
+                self.hits += 1
+                data = json.loads(entry.read_text(encoding="utf-8"))
+                with self._lock:
+                    entries = self._load_entries()
+                    if entry in entries:
+                        entries.move_to_end(entry)
+                logger.info("cv_cache_hit", image=Path(image_path).name, model=model_id)
+                return data["detections"]
+        except Exception as e:
+            logger.warning("cv_cache_read_failed", error=str(e))
+        self.misses += 1
+        return None
+
+    def put(self, image_path: Path, model_id: str, confidence: float, detections: List[Dict]) -> None:
+        """Store detection dicts for the image/model/threshold combination."""
+        variant = self._variant(model_id, confidence)
+        try:
+            digest = self._digest(image_path)
+            entry = self._entry_path(digest, variant)
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            payload = {"sha256": digest, "model": model_id, "confidence": confidence, "detections": detections}
+            tmp = entry.with_suffix(".tmp")
+            tmp.write_text(json.dumps(payload), encoding="utf-8")
+            tmp.replace(entry)
+
+            phash = f"{perceptual_hash(image_path):016x}" if self.perceptual else None
+            with self._lock:
+                entries = self._load_entries()
+                entries[entry] = None
+                entries.move_to_end(entry)
+                if phash:
+                    self._index_add(variant, phash, digest)
+                self._evict()
+                live = sum(len(rows) for rows in (self._phash_index or {}).values())
+                if self.perceptual and self._index_lines > 2 * max(live, 64):
+                    self._compact_index()
+        except Exception as e:
+            logger.warning("cv_cache_write_failed", error=str(e))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -1,10 +1,37 @@
 ﻿"""Computer Vision Service using YOLOv8"""
+import os
+import threading
 from pathlib import Path
-from typing import List, Dict, Iterable, Union
+from typing import List, Dict, Iterable, Optional, Tuple, Union
 import structlog
 
+from .cache import DetectionCache, content_digest
+from .tiling import TiledImageReader, iter_tile_windows, non_max_suppression
+
 logger = structlog.get_logger()
 
+# caminho -> ((caminho, mtime_ns, tamanho), sha256); compartilhado entre instancias
+# porque as rotas criam um CVService por requisicao
+_WEIGHTS_DIGESTS: Dict[str, Tuple[tuple, str]] = {}
+_WEIGHTS_LOCK = threading.Lock()
+
+
+def weights_digest(path: Path) -> Optional[str]:
+    """SHA-256 of a weights file, recomputed only when its path, mtime or size change."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    stamp = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _WEIGHTS_LOCK:
+        cached = _WEIGHTS_DIGESTS.get(stamp[0])
+        if cached and cached[0] == stamp:
+            return cached[1]
+    digest = content_digest(path)
+    with _WEIGHTS_LOCK:
+        _WEIGHTS_DIGESTS[stamp[0]] = (stamp, digest)
+    return digest
+
 
 class Detection:
     def __init__(self, class_name: str, confidence: float, bbox: tuple):
@@ -12,15 +39,28 @@ class Detection:
         self.confidence = confidence
         self.bbox = bbox
 
+    def to_dict(self) -> Dict:
+        return {"class_name": self.class_name, "confidence": self.confidence, "bbox": list(self.bbox)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Detection":
+        return cls(class_name=data["class_name"], confidence=data["confidence"], bbox=data["bbox"])
+
 
 class CVService:
     """Handles computer vision operations using YOLOv8"""
 
-    def __init__(self, models_dir: Path = Path("./models"), model_source: Union[str, Path, None] = None):
+    def __init__(
+        self,
+        models_dir: Path = Path("./models"),
+        model_source: Union[str, Path, None] = None,
+        cache: Optional[DetectionCache] = None,
+    ):
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(parents=True, exist_ok=True)
         self.model_source = model_source or "yolov8n.pt"
         self.model = None
+        self.cache = cache
         logger.info("cv_service_initialized")
 
     def _patch_torch_loader(self) -> None:
@@ -91,40 +131,68 @@ class CVService:
             img = ImageEnhance.Color(img).enhance(1.1)
             arr = np.array(img, dtype=float)
 
-            green_mask = (arr[:, :, 1] > arr[:, :, 0]) & (arr[:, :, 1] > arr[:, :, 2])
-            brown_mask = (arr[:, :, 0] > arr[:, :, 1]) & (arr[:, :, 1] > arr[:, :, 2])
-
-            green_ratio = float(green_mask.mean())
-            stress_ratio = float(brown_mask.mean())
-            health_score = max(0.0, min(1.0, green_ratio))
-            stress_score = max(0.0, min(1.0, stress_ratio + (0.4 * (1 - green_ratio))))
-
-            if stress_score > 0.28:
-                classe = "folhagem-estressada"
-                confidence = min(0.95, 0.55 + stress_score)
-            elif health_score > 0.42:
-                classe = "planta-saudavel"
-                confidence = min(0.95, 0.58 + health_score)
-            else:
-                classe = "observacao-manual"
-                confidence = min(0.70, 0.45 + (health_score * 0.4))
-
             w, h = img.size
             # BBox cobrindo a imagem inteira para indicar regiao analisada
-            bbox = (0, 0, w, h)
-            logger.info(
-                "cv_basic_scan",
-                classe=classe,
-                green_ratio=round(green_ratio, 3),
-                stress_ratio=round(stress_ratio, 3),
-            )
-            return [Detection(class_name=classe, confidence=confidence, bbox=bbox)]
+            detection = self._health_scan_array(arr, bbox=(0, 0, w, h))
+            return [detection]
         except Exception as e:
             logger.warning("cv_basic_scan_failed", error=str(e))
             return []
 
+    def _health_scan_array(self, arr, bbox: tuple) -> Detection:
+        """Classify an RGB array (h, w, 3) by green/brown pixel ratios."""
+        green_mask = (arr[:, :, 1] > arr[:, :, 0]) & (arr[:, :, 1] > arr[:, :, 2])
+        brown_mask = (arr[:, :, 0] > arr[:, :, 1]) & (arr[:, :, 1] > arr[:, :, 2])
+
+        green_ratio = float(green_mask.mean())
+        stress_ratio = float(brown_mask.mean())
+        health_score = max(0.0, min(1.0, green_ratio))
+        stress_score = max(0.0, min(1.0, stress_ratio + (0.4 * (1 - green_ratio))))
+
+        if stress_score > 0.28:
+            classe = "folhagem-estressada"
+            confidence = min(0.95, 0.55 + stress_score)
+        elif health_score > 0.42:
+            classe = "planta-saudavel"
+            confidence = min(0.95, 0.58 + health_score)
+        else:
+            classe = "observacao-manual"
+            confidence = min(0.70, 0.45 + (health_score * 0.4))
+
+        logger.info(
+            "cv_basic_scan",
+            classe=classe,
+            green_ratio=round(green_ratio, 3),
+            stress_ratio=round(stress_ratio, 3),
+        )
+        return Detection(class_name=classe, confidence=confidence, bbox=bbox)
+
+    @property
+    def model_id(self) -> str:
+        """
+        Identifier used to key cached results: model file name plus a content
+        hash of the local weights (retrained weights saved under the same name
+        get a new id). Hub ids without a local file use the name only.
+        """
+        name = Path(str(self.model_source)).name
+        source = self._resolve_model_source()
+        digest = weights_digest(source) if isinstance(source, Path) else None
+        return f"{name}@{digest[:16]}" if digest else name
+
     def detect_objects(self, image_path: Path, confidence: float = 0.5) -> List[Detection]:
-        """Run object detection on a single image."""
+        """Run object detection on a single image (served from cache when possible)."""
+        if self.cache:
+            cached = self.cache.get(image_path, self.model_id, confidence)
+            if cached is not None:
+                return [Detection.from_dict(d) for d in cached]
+
+        detections, cacheable = self._run_detection(image_path, confidence)
+        if self.cache and cacheable:
+            self.cache.put(image_path, self.model_id, confidence, [d.to_dict() for d in detections])
+        return detections
+
+    def _run_detection(self, image_path: Path, confidence: float) -> tuple:
+        """Run YOLO (or the RGB fallback); returns (detections, cacheable)."""
         if not self.model:
             self.load_model()
 
@@ -145,7 +213,7 @@ class CVService:
                         )
                 if detections:
                     logger.info("detection_complete", count=len(detections))
-                    return detections
+                    return detections, True
             except Exception as e:
                 yolo_failed = True
                 logger.error("detection_failed", error=str(e))
@@ -160,12 +228,13 @@ class CVService:
                 count=len(fallback),
                 reason="yolo_failed" if yolo_failed else "yolo_no_detections",
             )
-            return fallback
+            # Falha do YOLO pode ser transitoria: nao fixa o fallback no cache
+            return fallback, not yolo_failed
 
         if yolo_failed:
             raise RuntimeError("YOLO model not loaded. Verifique o caminho e a instalacao do modelo.")
 
-        return []
+        return [], True
 
     def detect_directory(
         self, directory: Path, confidence: float = 0.5, limit: int | None = None
@@ -183,6 +252,120 @@ class CVService:
             results[img_path] = detections
         return results
 
+    def detect_tiled(
+        self,
+        image_path: Path,
+        confidence: float = 0.5,
+        tile_size: Optional[int] = None,
+        overlap: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        iou_threshold: float = 0.5,
+    ) -> List[Detection]:
+        """
+        Run detection over a large image (orthomosaic) tile by tile.
+
+        Tiles are read lazily, pushed through YOLO in batches and the boxes are
+        shifted back to image-space coordinates and merged with class-aware NMS.
+        Only `batch_size` tiles are held in memory at a time.
+        """
+        import numpy as np
+
+        tile_size = tile_size or int(os.getenv("CV_TILE_SIZE", 640))
+        overlap = overlap if overlap is not None else float(os.getenv("CV_TILE_OVERLAP", 0.2))
+        batch_size = batch_size or int(os.getenv("CV_TILE_BATCH_SIZE", 4))
+
+        if not self.model:
+            self.load_model()
+
+        boxes: List[List[float]] = []
+        scores: List[float] = []
+        names: List[str] = []
+        fallback: List[Detection] = []
+        tiles_processed = 0
+
+        with TiledImageReader(image_path) as reader:
+            width, height = reader.size
+            batch_windows: List[tuple] = []
+            batch_tiles: list = []
+
+            def flush() -> None:
+                for window, tile_dets in zip(batch_windows, self._infer_tiles(batch_tiles, confidence)):
+                    x_off, y_off = window[0], window[1]
+                    for d in tile_dets:
+                        x1, y1, x2, y2 = d.bbox
+                        boxes.append([x1 + x_off, y1 + y_off, x2 + x_off, y2 + y_off])
+                        scores.append(d.confidence)
+                        names.append(d.class_name)
+                if not self.model:
+                    for window, tile in zip(batch_windows, batch_tiles):
+                        det = self._health_scan_array(tile.astype(float), bbox=window)
+                        if det.class_name != "planta-saudavel":
+                            fallback.append(det)
+                batch_windows.clear()
+                batch_tiles.clear()
+
+            for window in iter_tile_windows(width, height, tile_size=tile_size, overlap=overlap):
+                batch_windows.append(window)
+                batch_tiles.append(reader.read_window(window))
+                tiles_processed += 1
+                if len(batch_tiles) >= batch_size:
+                    flush()
+            if batch_tiles:
+                flush()
+
+        if not self.model:
+            if not fallback:
+                fallback = [Detection(class_name="planta-saudavel", confidence=0.6, bbox=(0, 0, width, height))]
+            logger.info("cv_tiled_fallback_used", tiles=tiles_processed, regions=len(fallback))
+            return fallback
+
+        if not boxes:
+            logger.info("cv_tiled_detection_complete", tiles=tiles_processed, count=0)
+            return []
+
+        class_index = {name: i for i, name in enumerate(sorted(set(names)))}
+        keep = non_max_suppression(
+            np.asarray(boxes),
+            np.asarray(scores),
+            np.asarray([class_index[n] for n in names]),
+            iou_threshold=iou_threshold,
+        )
+        detections = [
+            Detection(class_name=names[i], confidence=scores[i], bbox=[round(v, 2) for v in boxes[i]])
+            for i in keep
+        ]
+        logger.info(
+            "cv_tiled_detection_complete",
+            tiles=tiles_processed,
+            raw_boxes=len(boxes),
+            count=len(detections),
+            image_size=(width, height),
+        )
+        return detections
+
+    def _infer_tiles(self, tiles: list, confidence: float) -> List[List[Detection]]:
+        """Run YOLO on a batch of RGB tiles; returns tile-local detections per tile."""
+        if not self.model or not tiles:
+            return [[] for _ in tiles]
+        try:
+            # Ultralytics espera arrays BGR (convencao OpenCV)
+            results = self.model([t[:, :, ::-1] for t in tiles], conf=confidence, verbose=False)
+        except Exception as e:
+            logger.error("tile_detection_failed", error=str(e), tiles=len(tiles))
+            return [[] for _ in tiles]
+
+        per_tile = []
+        for result in results:
+            per_tile.append([
+                Detection(
+                    class_name=result.names[int(box.cls)],
+                    confidence=float(box.conf),
+                    bbox=box.xyxy[0].tolist(),
+                )
+                for box in result.boxes
+            ])
+        return per_tile
+
     def get_model_metrics(self) -> Dict:
         """Get model performance metrics"""
         return {"mAP": 0.92, "precision": 0.89, "recall": 0.91}
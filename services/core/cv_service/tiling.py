@@ -0,0 +1,237 @@
+"""
+Tiled reading helpers for large orthomosaic images - Fase 6
+Splits huge drone images into overlapping windows so YOLO sees small pests at
+native resolution, and merges the per-tile boxes back with NMS.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+TIFF_SUFFIXES = {".tif", ".tiff"}
+
+# Formatos sem leitura por janela (PNG/JPG) sao decodificados inteiros: acima
+# deste limite (pixels) sao rejeitados para manter o pico de memoria limitado
+DEFAULT_MAX_DECODE_PIXELS = 250_000_000
+
+_PIL_LIMIT_LOCK = threading.Lock()
+
+Window = Tuple[int, int, int, int]
+
+
+def iter_tile_windows(width: int, height: int, tile_size: int = 640, overlap: float = 0.2) -> Iterator[Window]:
+    """
+    Yield (x1, y1, x2, y2) windows covering the whole image.
+
+    Consecutive tiles overlap by `overlap` (fraction of tile_size) and the last
+    row/column is snapped to the image border so no pixel is left out.
+    """
+    if tile_size <= 0:
+        raise ValueError("tile_size deve ser maior que zero")
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap deve estar no intervalo [0, 1)")
+
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length: int) -> list:
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size + 1, stride))
+        if positions[-1] + tile_size < length:
+            positions.append(length - tile_size)
+        return positions
+
+    for y in starts(height):
+        for x in starts(width):
+            yield x, y, min(x + tile_size, width), min(y + tile_size, height)
+
+
+class TiledImageReader:
+    """
+    Windowed image reader.
+
+    - .npy files are memory-mapped (np.load mmap_mode="r")
+    - uncompressed TIFFs are memory-mapped through tifffile when installed
+    - compressed/tiled TIFFs are read chunk by chunk through tifffile + zarr
+    - other formats (PNG/JPG) are decoded by PIL, only up to `max_decode_pixels`
+
+    Only the requested window is copied into RAM, so peak memory stays at
+    `batch_size` tiles (plus one bounded decoded source for PIL formats).
+    """
+
+    def __init__(self, image_path: Path, max_decode_pixels: Optional[int] = None):
+        self.path = Path(image_path)
+        self.max_decode_pixels = max_decode_pixels or int(
+            os.getenv("CV_TILE_MAX_DECODE_PIXELS", DEFAULT_MAX_DECODE_PIXELS)
+        )
+        self._array = None
+        self._image = None
+        self._store = None
+
+    def __enter__(self) -> "TiledImageReader":
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def open(self) -> "TiledImageReader":
+        suffix = self.path.suffix.lower()
+        if suffix == ".npy":
+            self._array = np.load(self.path, mmap_mode="r")
+        elif suffix in TIFF_SUFFIXES:
+            self._array = self._try_tiff_memmap()
+            if self._array is None:
+                self._array = self._try_tiff_zarr()
+
+        if self._array is None:
+            self._open_pil()
+
+        logger.info("tiled_reader_opened", path=str(self.path), size=self.size, windowed=self._array is not None)
+        return self
+
+    def _try_tiff_memmap(self) -> Optional[np.ndarray]:
+        try:
+            import tifffile
+
+            return tifffile.memmap(str(self.path), mode="r")
+        except Exception as e:
+            logger.info("tiff_memmap_unavailable", path=str(self.path), reason=str(e))
+            return None
+
+    def _try_tiff_zarr(self):
+        """Compressed/tiled TIFF: zarr array that decodes only the chunks a window touches."""
+        try:
+            import tifffile
+            import zarr
+
+            store = tifffile.imread(str(self.path), aszarr=True)
+            array = zarr.open(store, mode="r")
+            if not hasattr(array, "shape"):
+                array = array[0]  # piramide multi-resolucao: nivel de resolucao maxima
+            self._store = store
+            return array
+        except Exception as e:
+            logger.info("tiff_zarr_unavailable", path=str(self.path), reason=str(e))
+            return None
+
+    def _open_pil(self) -> None:
+        from PIL import Image
+
+        with _pil_pixel_limit(self.max_decode_pixels):
+            try:
+                image = Image.open(self.path)
+            except Image.DecompressionBombError:
+                image = None
+        if image is None or image.width * image.height > self.max_decode_pixels:
+            if image is not None:
+                image.close()
+            raise ValueError(
+                f"Imagem excede {self.max_decode_pixels} pixels e nao pode ser lida por janelas; "
+                "converta para .npy ou TIFF (tifffile) antes da deteccao em tiles"
+            )
+        self._image = image
+
+    def close(self) -> None:
+        if self._image is not None:
+            self._image.close()
+        if self._store is not None:
+            self._store.close()
+        self._image = None
+        self._store = None
+        self._array = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(width, height) of the source image"""
+        if self._array is not None:
+            return int(self._array.shape[1]), int(self._array.shape[0])
+        if self._image is not None:
+            return self._image.size
+        raise RuntimeError("Leitor nao foi aberto")
+
+    def read_window(self, window: Window) -> np.ndarray:
+        """Return the window as a contiguous RGB uint8 array (h, w, 3)."""
+        x1, y1, x2, y2 = window
+        if self._array is not None:
+            tile = np.asarray(self._array[y1:y2, x1:x2])
+        else:
+            tile = np.asarray(self._image.crop((x1, y1, x2, y2)).convert("RGB"))
+        return _to_rgb_uint8(tile)
+
+
+@contextmanager
+def _pil_pixel_limit(max_pixels: int):
+    """Troca o limite anti "decompression bomb" do PIL so durante o open deste leitor."""
+    from PIL import Image
+
+    with _PIL_LIMIT_LOCK:
+        previous = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = max_pixels
+        try:
+            yield
+        finally:
+            Image.MAX_IMAGE_PIXELS = previous
+
+
+def _to_rgb_uint8(tile: np.ndarray) -> np.ndarray:
+    """Normalize grayscale/RGBA/16-bit tiles to contiguous RGB uint8."""
+    if tile.ndim == 2:
+        tile = np.stack([tile] * 3, axis=-1)
+    elif tile.shape[2] > 3:
+        tile = tile[:, :, :3]
+
+    if tile.dtype != np.uint8:
+        max_val = float(np.iinfo(tile.dtype).max) if np.issubdtype(tile.dtype, np.integer) else 1.0
+        tile = np.clip(tile.astype(np.float32) / max_val * 255.0, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(tile)
+
+
+def non_max_suppression(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    iou_threshold: float = 0.5,
+) -> np.ndarray:
+    """
+    Class-aware greedy NMS.
+
+    Args:
+        boxes: (N, 4) array of x1, y1, x2, y2 in image coordinates
+        scores: (N,) confidences
+        class_ids: (N,) integer class ids; boxes of different classes never suppress each other
+        iou_threshold: overlap above which the lower-score box is dropped
+
+    Returns:
+        Indices of kept boxes, highest score first
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=int)
+
+    boxes = np.asarray(boxes, dtype=np.float64)
+    # Desloca cada classe para uma regiao disjunta: NMS unico continua class-aware
+    offset = (boxes.max() + 1.0) * np.asarray(class_ids, dtype=np.float64)
+    shifted = boxes + offset[:, None]
+
+    x1, y1, x2, y2 = shifted.T
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    order = np.argsort(np.asarray(scores))[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        inter_h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = inter_w * inter_h
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        order = rest[iou <= iou_threshold]
+
+    return np.asarray(keep, dtype=int)
@@ -0,0 +1,352 @@
+"""
+Importacao em massa (producao, insumos, leituras) - Fase 7
+Le CSV/NDJSON em lotes (sem carregar o arquivo), resolve chaves estrangeiras
+por dicionarios pre-carregados e grava cada lote com um INSERT ... ON
+CONFLICT do Core em uma unica transacao. Reimportar o mesmo arquivo atualiza
+as linhas em vez de duplica-las:
+  producao - chave_importacao (hash de id_origem, ou de cultura + talhao/area
+             + data_registro); corrigir valores de uma linha a atualiza
+  insumos  - id_cultura
+  leituras - data_hora_leitura
+"""
+import csv
+import hashlib
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import structlog
+from sqlalchemy import select
+
+from .models import Cultura, InsumoCultura, LeituraSensor, ProducaoAgricola, Sensor
+
+logger = structlog.get_logger()
+
+KINDS = ("producao", "insumos", "leituras")
+
+# Ajustes de SQLite para cargas grandes (durabilidade relaxada so durante a
+# importacao; valores originais restaurados antes de devolver a conexao ao pool)
+SQLITE_FAST_PRAGMAS = {
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": "-200000",
+}
+
+_LEITURA_VALUES = (
+    "valor_umidade", "valor_ph", "valor_fosforo_p", "valor_potassio_k", "temperatura", "precipitacao_mm",
+)
+
+
+class ImportRowError(ValueError):
+    """Linha que nao pode ser importada (contada como rejeitada)"""
+
+
+@dataclass
+class ImportReport:
+    kind: str
+    read: int = 0
+    written: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "tipo": self.kind,
+            "lidas": self.read,
+            "gravadas": self.written,
+            "rejeitadas": self.rejected,
+            "segundos": round(self.elapsed, 3),
+            "linhas_por_segundo": round(self.rows_per_second, 1),
+        }
+
+
+# ---------- Leitura do arquivo ----------
+def iter_records(path: Path) -> Iterator[Dict]:
+    """Registros de um CSV ou NDJSON/JSONL, um por vez."""
+    path = Path(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.suffix.lower() in (".ndjson", ".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def chunked(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(record: Dict, *names) -> Optional[str]:
+    for name in names:
+        value = record.get(name)
+        if value is not None and str(value).strip() != "":
+            return str(value).strip()
+    return None
+
+
+def _float(record: Dict, *names) -> Optional[float]:
+    value = _text(record, *names)
+    if value is None:
+        return None
+    if "," in value and "." not in value:
+        value = value.replace(",", ".")  # decimal brasileiro
+    try:
+        return float(value)
+    except ValueError as e:
+        raise ImportRowError(f"{names[0]} invalido: {value}") from e
+
+
+def _datetime(record: Dict, *names) -> Optional[datetime]:
+    value = _text(record, *names)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as e:
+        raise ImportRowError(f"{names[0]} invalido: {value}") from e
+
+
+def _bool(record: Dict, *names) -> bool:
+    value = _text(record, *names)
+    return value is not None and value.lower() in ("1", "true", "t", "sim", "s", "on", "ligada")
+
+
+class BulkImporter:
+    """Importa arquivos em lotes com upsert do Core; devolve um ImportReport"""
+
+    def __init__(self, db_service, chunk_size: int = 20000, fast_pragmas: bool = False):
+        self.db = db_service
+        self.chunk_size = chunk_size
+        self.fast_pragmas = fast_pragmas
+        self._culturas: Dict[str, int] = {}
+        self._cultura_ids = set()
+        self._sensores: Dict[str, int] = {}
+        self._producao_keys = set()
+
+    @classmethod
+    def from_env(cls, db_service) -> "BulkImporter":
+        import os
+
+        return cls(
+            db_service,
+            chunk_size=int(os.getenv("IMPORT_CHUNK_ROWS", 20000)),
+            fast_pragmas=os.getenv("IMPORT_FAST_PRAGMAS", "0") == "1",
+        )
+
+    # ---------- Upsert por dialeto ----------
+    def _insert(self, table):
+        dialect = self.db.engine.dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            raise NotImplementedError(f"upsert nao suportado para {dialect}")
+        return insert(table)
+
+    def _upsert(self, conn, table, rows: List[Dict], key: str) -> int:
+        if not rows:
+            return 0
+        # Um mesmo ON CONFLICT nao pode tocar a mesma linha duas vezes no lote
+        rows = list({row[key]: row for row in rows}.values())
+        stmt = self._insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[key],
+            set_={c: stmt.excluded[c] for c in rows[0] if c != key},
+        )
+        conn.execute(stmt, rows)
+        return len(rows)
+
+    # ---------- Chaves estrangeiras ----------
+    def _load_lookups(self) -> None:
+        with self.db.engine.connect() as conn:
+            self._culturas = dict(conn.execute(select(Cultura.nome_cultura, Cultura.id_cultura)).all())
+            self._cultura_ids = set(self._culturas.values())
+            self._sensores = {}
+            for id_sensor, fabricante in conn.execute(select(Sensor.id_sensor, Sensor.identificacao_fabricante)):
+                self._sensores[str(id_sensor)] = id_sensor
+                if fabricante:
+                    self._sensores[fabricante] = id_sensor
+
+    def _ensure_culturas(self, conn, nomes: Iterable[str]) -> None:
+        missing = sorted({n for n in nomes if n and n not in self._culturas})
+        if not missing:
+            return
+        conn.execute(self._insert(Cultura.__table__).on_conflict_do_nothing(), [{"nome_cultura": n} for n in missing])
+        rows = conn.execute(
+            select(Cultura.nome_cultura, Cultura.id_cultura).where(Cultura.nome_cultura.in_(missing))
+        ).all()
+        self._culturas.update(dict(rows))
+        self._cultura_ids.update(id_cultura for _, id_cultura in rows)
+        logger.info("import_culturas_created", culturas=missing)
+
+    def _cultura_id(self, record: Dict) -> int:
+        id_cultura = _text(record, "id_cultura")
+        if id_cultura is not None:
+            if int(id_cultura) not in self._cultura_ids:
+                raise ImportRowError(f"cultura desconhecida: {id_cultura}")
+            return int(id_cultura)
+        nome = _text(record, "cultura", "nome_cultura")
+        if nome is None or nome not in self._culturas:
+            raise ImportRowError(f"cultura desconhecida: {nome}")
+        return self._culturas[nome]
+
+    # ---------- Conversao de linhas ----------
+    def _producao_row(self, record: Dict) -> Dict:
+        row = {
+            "id_cultura": self._cultura_id(record),
+            # Fase 1: area/insumo/custo_estimado/data_registro
+            "area_plantada": _float(record, "area_plantada", "area"),
+            "quantidade_produzida": _float(record, "quantidade_produzida", "insumo"),
+            "valor_estimado": _float(record, "valor_estimado", "custo_estimado"),
+            "data_colheita": _datetime(record, "data_colheita", "data_registro"),
+        }
+        row["chave_importacao"] = self._producao_key(record, row)
+        return row
+
+    def _producao_key(self, record: Dict, row: Dict) -> str:
+        """
+        Chave de origem da linha: id_origem quando o arquivo tem um, senao os
+        campos naturais (cultura, talhao ou area, data_registro). Valores
+        medidos (insumo, custo) ficam fora para que uma correcao atualize a linha.
+        """
+        origem = _text(record, "id_origem", "id_registro")
+        if origem is not None:
+            content = f"origem|{origem}"
+        elif row["data_colheita"] is None:
+            raise ImportRowError("data_registro ou id_origem obrigatorio")
+        else:
+            local = _text(record, "id_talhao", "talhao")
+            if local is None:
+                local = "" if row["area_plantada"] is None else f"area:{row['area_plantada']}"
+            content = f"natural|{row['id_cultura']}|{local}|{row['data_colheita'].isoformat()}"
+        key = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        # Duas linhas com a mesma chave no mesmo arquivo nao sao uma correcao: rejeita em vez de fundir
+        if key in self._producao_keys:
+            raise ImportRowError(f"linha repetida no arquivo (informe id_origem): {content}")
+        self._producao_keys.add(key)
+        return key
+
+    def _insumo_row(self, record: Dict) -> Dict:
+        coef = _float(record, "coef_insumo_por_m2")
+        custo = _float(record, "custo_por_m2")
+        if coef is None or custo is None:
+            raise ImportRowError("coef_insumo_por_m2 e custo_por_m2 sao obrigatorios")
+        return {"id_cultura": self._cultura_id(record), "coef_insumo_por_m2": coef, "custo_por_m2": custo}
+
+    def _leitura_row(self, record: Dict) -> Dict:
+        ts = _datetime(record, "data_hora_leitura", "timestamp")
+        if ts is None:
+            raise ImportRowError("data_hora_leitura obrigatoria")
+        sensor = _text(record, "id_sensor", "identificacao_fabricante", "sensor")
+        if sensor not in self._sensores:
+            raise ImportRowError(f"sensor desconhecido: {sensor}")
+        row = {"data_hora_leitura": ts, "id_sensor": self._sensores[sensor]}
+        for name in _LEITURA_VALUES:
+            row[name] = _float(record, name)
+        row["bomba_ligada"] = _bool(record, "bomba_ligada")
+        row["decisao_logica_esp32"] = _text(record, "decisao_logica_esp32")
+        return row
+
+    # ---------- Importacao ----------
+    @contextmanager
+    def _connect(self):
+        with self.db.engine.connect() as conn:
+            if not (self.fast_pragmas and self.db.engine.dialect.name == "sqlite"):
+                yield conn
+                return
+            original = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in SQLITE_FAST_PRAGMAS}
+            for name, value in SQLITE_FAST_PRAGMAS.items():
+                conn.exec_driver_sql(f"PRAGMA {name}={value}")
+            conn.commit()
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+                for name, value in original.items():
+                    conn.exec_driver_sql(f"PRAGMA {name}={value}")
+                conn.commit()
+
+    def import_file(self, kind: str, path, derive_insumos: bool = False,
+                    progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+        """
+        Importa `path` (CSV ou NDJSON) como `kind`. Com derive_insumos, uma
+        importacao de producao da Fase 1 tambem grava os coeficientes de insumo
+        por cultura (total de insumo e custo / area total).
+        """
+        return self.import_records(kind, iter_records(path), derive_insumos, progress)
+
+    def import_records(self, kind: str, records: Iterable[Dict], derive_insumos: bool = False,
+                       progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+        if kind not in KINDS:
+            raise ValueError(f"tipo de importacao invalido: {kind} (use {', '.join(KINDS)})")
+        convert, table, key = {
+            "producao": (self._producao_row, ProducaoAgricola.__table__, "chave_importacao"),
+            "insumos": (self._insumo_row, InsumoCultura.__table__, "id_cultura"),
+            "leituras": (self._leitura_row, LeituraSensor.__table__, "data_hora_leitura"),
+        }[kind]
+
+        report = ImportReport(kind)
+        totals: Dict[int, List[float]] = {}
+        start = time.perf_counter()
+        self._load_lookups()
+        self._producao_keys = set()
+        with self._connect() as conn:
+            for chunk in chunked(records, self.chunk_size):
+                with conn.begin():
+                    if kind != "leituras":
+                        self._ensure_culturas(conn, (_text(r, "cultura", "nome_cultura") for r in chunk))
+                    rows = []
+                    for record in chunk:
+                        try:
+                            rows.append(convert(record))
+                        except (ImportRowError, ValueError) as e:
+                            report.rejected += 1
+                            logger.debug("import_row_rejected", kind=kind, error=str(e))
+                    report.read += len(chunk)
+                    report.written += self._upsert(conn, table, rows, key)
+                if derive_insumos and kind == "producao":
+                    for row in rows:
+                        acc = totals.setdefault(row["id_cultura"], [0.0, 0.0, 0.0])
+                        acc[0] += row["area_plantada"] or 0.0
+                        acc[1] += row["quantidade_produzida"] or 0.0
+                        acc[2] += row["valor_estimado"] or 0.0
+                if progress:
+                    report.elapsed = time.perf_counter() - start
+                    progress(report)
+
+            if totals:
+                with conn.begin():
+                    self._upsert(conn, InsumoCultura.__table__, [
+                        {
+                            "id_cultura": id_cultura,
+                            "coef_insumo_por_m2": round(insumo / area, 4),
+                            "custo_por_m2": round(custo / area, 2),
+                        }
+                        for id_cultura, (area, insumo, custo) in totals.items()
+                        if area > 0
+                    ], "id_cultura")
+
+        report.elapsed = time.perf_counter() - start
+        changed = {table.name} | ({InsumoCultura.__tablename__} if totals else set())
+        if kind != "leituras":
+            changed.add(Cultura.__tablename__)
+        self.db.notify_changes(changed)
+        logger.info("bulk_import_finished", **report.to_dict())
+        return report
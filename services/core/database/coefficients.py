@@ -0,0 +1,98 @@
+"""
+Tabela de coeficientes de insumo por cultura - Fase 7
+Cada /api/calculations/insumos abria uma sessao, rodava ilike e, sem acerto,
+carregava todas as culturas para comparar nomes sem acento em Python. Aqui
+nome normalizado -> (coeficiente, custo) fica em memoria, montado com uma
+unica consulta culturas + insumos_cultura e descartado pelos hooks de escrita;
+o TTL cobre escritas de outros processos (importacao em massa, outros workers).
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import structlog
+from sqlalchemy import select
+
+from .models import Cultura, InsumoCultura
+
+logger = structlog.get_logger()
+
+TABLES = {"culturas", "insumos_cultura"}
+
+_ACCENTS = str.maketrans("çáàâãéêíóôõúüÇÁÀÂÃÉÊÍÓÔÕÚÜ", "caaaaeeiooouuCAAAAEEIOOOUU")
+
+
+def normalize_cultura(nome: str) -> str:
+    """Chave de busca: sem acentos, minusculas e espacos simples."""
+    return " ".join(nome.translate(_ACCENTS).lower().split())
+
+
+@dataclass(frozen=True)
+class Coefficient:
+    """Coeficientes de uma cultura cadastrada"""
+    id_cultura: int
+    nome_cultura: str
+    insumo: float
+    custo_por_m2: float
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"insumo": self.insumo, "custo_por_m2": self.custo_por_m2}
+
+
+class CoefficientTable:
+    """Cache nome normalizado -> coeficientes, invalidado por alteracoes em culturas/insumos"""
+
+    def __init__(self, db_service, ttl: float = 300.0):
+        self.db = db_service
+        self.ttl = ttl
+        self._table: Optional[Dict[str, Coefficient]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"builds": 0, "hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, cultura: str) -> Optional[Coefficient]:
+        """Coeficientes da cultura (consulta a dict; recarrega se invalidado ou vencido)."""
+        coef = self._current().get(normalize_cultura(cultura))
+        self.counters["hits" if coef else "misses"] += 1
+        return coef
+
+    def all(self) -> Dict[str, Coefficient]:
+        return dict(self._current())
+
+    def invalidate(self, tables=None) -> None:
+        """Descarta a tabela se `tables` (todas, se None) inclui culturas ou insumos; usado como change listener."""
+        if tables is not None and not TABLES & set(tables):
+            return
+        with self._lock:
+            if self._table is not None:
+                self.counters["invalidations"] += 1
+            self._table = None
+
+    def _current(self) -> Dict[str, Coefficient]:
+        table = self._table
+        if table is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return table
+        with self._lock:
+            if self._table is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._table = self._build()
+                self._loaded_at = time.monotonic()
+            return self._table
+
+    def _build(self) -> Dict[str, Coefficient]:
+        stmt = (
+            select(Cultura.id_cultura, Cultura.nome_cultura, InsumoCultura.coef_insumo_por_m2, InsumoCultura.custo_por_m2)
+            .join(InsumoCultura, InsumoCultura.id_cultura == Cultura.id_cultura)
+            .order_by(Cultura.id_cultura)
+        )
+        table: Dict[str, Coefficient] = {}
+        with self.db.engine.connect() as conn:
+            for id_cultura, nome, coef, custo in conn.execute(stmt):
+                # Nomes que so diferem por acento: vale a primeira cultura cadastrada
+                table.setdefault(normalize_cultura(nome), Coefficient(id_cultura, nome, float(coef), float(custo)))
+        self.counters["builds"] += 1
+        logger.info("coefficient_table_built", culturas=len(table))
+        return table
+
+    def stats(self) -> Dict:
+        return {**self.counters, "culturas": len(self._table) if self._table is not None else None}
@@ -0,0 +1,175 @@
+"""
+Exportacao em streaming de tabelas - Fase 7
+/api/database/data monta uma pagina inteira em memoria; para baixar um ano de
+leituras a consulta roda com cursor do lado do servidor (yield_per /
+stream_results) e cada lote de linhas vira um pedaco de CSV, NDJSON ou Arrow
+IPC enviado ao cliente, com memoria constante no processo da API.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+import structlog
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, select
+
+from .models import Base
+from .read_models import projection
+
+logger = structlog.get_logger()
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+# Estado interno e dados pessoais nao saem por exportacao
+EXCLUDED_TABLES = {
+    "funcionarios",
+    "notificacoes_outbox",
+    "estado_alertas",
+    "estado_detector_anomalias",
+    "alertas_previsao",
+    "config_versoes",
+}
+
+
+class ExportError(ValueError):
+    """Tabela, formato ou filtro invalido para exportacao"""
+
+
+def exportable_tables() -> List[str]:
+    return sorted(name for name in Base.metadata.tables if name not in EXCLUDED_TABLES)
+
+
+def time_column(table):
+    """Primeira coluna DateTime/Date da tabela (filtro de periodo), ou None."""
+    for column in table.columns:
+        if isinstance(column.type, (DateTime, Date)):
+            return column
+    return None
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _arrow_schema(pa, table):
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, (Float, Numeric)):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column.type, Date):
+            arrow_type = pa.date32()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+class TableExporter:
+    """Gera os bytes de uma exportacao lote a lote a partir de um cursor do servidor"""
+
+    def __init__(self, db_service, chunk_size: int = 5000):
+        self.db = db_service
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_env(cls, db_service) -> "TableExporter":
+        import os
+
+        return cls(db_service, chunk_size=int(os.getenv("EXPORT_CHUNK_ROWS", 5000)))
+
+    def prepare(self, table_name: str, fmt: str, inicio: Optional[datetime] = None, fim: Optional[datetime] = None):
+        """
+        Valida o pedido e monta o select (antes de abrir a resposta, para que
+        erros virem 4xx e nao um download truncado).
+        """
+        if table_name not in exportable_tables():
+            raise ExportError(f"tabela nao exportavel: {table_name}")
+        if fmt not in FORMATS:
+            raise ExportError(f"formato invalido: {fmt} (use {', '.join(FORMATS)})")
+        if fmt == "arrow":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ExportError("pyarrow nao instalado: necessario para exportar em Arrow") from e
+
+        table = Base.metadata.tables[table_name]
+        ts = time_column(table)
+        if (inicio or fim) and ts is None:
+            raise ExportError(f"tabela {table_name} nao tem coluna de data para filtrar periodo")
+        stmt = select(*projection(table))
+        if inicio:
+            stmt = stmt.where(ts >= inicio)
+        if fim:
+            stmt = stmt.where(ts < fim)
+        order = ([ts] if ts is not None else []) + list(table.primary_key.columns)
+        return table, stmt.order_by(*order)
+
+    def _chunks(self, stmt) -> Iterator[list]:
+        with self.db.engine.connect() as conn:
+            result = conn.execution_options(yield_per=self.chunk_size).execute(stmt)
+            for partition in result.partitions():
+                yield partition
+
+    def stream(self, table_name: str, fmt: str, inicio: Optional[datetime] = None,
+               fim: Optional[datetime] = None) -> Iterator[bytes]:
+        table, stmt = self.prepare(table_name, fmt, inicio, fim)
+        encode = {"csv": self._csv, "ndjson": self._ndjson, "arrow": self._arrow}[fmt]
+        return self._logged(table_name, fmt, encode(table, self._chunks(stmt)))
+
+    def _logged(self, table_name: str, fmt: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        total = 0
+        for data in chunks:
+            total += len(data)
+            yield data
+        logger.info("table_exported", table=table_name, format=fmt, bytes=total)
+
+    # ---------- Formatos ----------
+    def _csv(self, table, chunks) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([c.name for c in table.columns])
+        for rows in chunks:
+            writer.writerows(
+                ["" if v is None else _json_value(v) for v in row] for row in rows
+            )
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def _ndjson(self, table, chunks) -> Iterator[bytes]:
+        names = [c.name for c in table.columns]
+        for rows in chunks:
+            lines = [
+                json.dumps({k: _json_value(v) for k, v in zip(names, row)}, ensure_ascii=False, default=str)
+                for row in rows
+            ]
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _arrow(self, table, chunks) -> Iterator[bytes]:
+        import pyarrow as pa
+
+        schema = _arrow_schema(pa, table)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for rows in chunks:
+                columns = list(zip(*rows))
+                writer.write_batch(pa.record_batch(
+                    [pa.array(col, type=f.type) for col, f in zip(columns, schema)], schema=schema
+                ))
+                yield sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+        yield sink.getvalue()
@@ -1,7 +1,7 @@
 """
 SQLAlchemy models based on Fase 2 MER
 """
-from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, Float, Text, Date, DateTime, Boolean, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -78,6 +78,12 @@ class Sensor(Base):
 class LeituraSensor(Base):
     """LeituraSensor model - Fase 2 + Fase 3 enhancements"""
     __tablename__ = 'leituras_sensores'
+    __table_args__ = (
+        # Leituras de um sensor em ordem temporal (replay what-if, series por sensor)
+        Index('ix_leituras_sensor_data', 'id_sensor', 'data_hora_leitura'),
+        # Paginacao por cursor (data_hora_leitura, id)
+        Index('ix_leituras_data_id', 'data_hora_leitura', 'id_leitura'),
+    )
     
     id_leitura = Column(Integer, primary_key=True, autoincrement=True)
     data_hora_leitura = Column(DateTime, nullable=False, unique=True, index=True, default=datetime.utcnow)
@@ -135,16 +141,51 @@ class AjusteAplicacao(Base):
         return f"<AjusteAplicacao(id={self.id_aplicacao}, tipo='{self.tipo_ajuste}')>"
 
 
+class ImagemCV(Base):
+    """ImagemCV model - Fase 6: origem das deteccoes (upload, seed, ortomosaico, camera)"""
+    __tablename__ = 'imagens_cv'
+    # Identidade pela chave (hash do conteudo em uploads), nao pelo nome: dois
+    # arquivos "foto.jpg" diferentes sao imagens distintas
+    __table_args__ = (Index('uq_imagens_cv_origem_chave', 'origem', 'chave', unique=True),)
+
+    id_imagem = Column(Integer, primary_key=True, autoincrement=True)
+    nome_arquivo = Column(String(255), nullable=False)
+    origem = Column(String(50), nullable=False, default='upload')
+    chave = Column(String(255), nullable=True)  # sha256 do upload; nome do arquivo/stream nas demais origens
+    data_registro = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    deteccoes = relationship("Deteccao", back_populates="imagem")
+
+    def __repr__(self):
+        return f"<ImagemCV(id={self.id_imagem}, nome='{self.nome_arquivo}', origem='{self.origem}')>"
+
+
 class Deteccao(Base):
     """Deteccao model - Fase 6"""
     __tablename__ = 'deteccoes'
+    __table_args__ = (
+        Index('ix_deteccoes_timestamp', 'timestamp'),
+        Index('ix_deteccoes_classe_timestamp', 'classe', 'timestamp'),
+        # Paginacao por cursor (timestamp, id)
+        Index('ix_deteccoes_timestamp_id', 'timestamp', 'id_deteccao'),
+    )
     
     id_deteccao = Column(Integer, primary_key=True, autoincrement=True)
     timestamp = Column(DateTime, nullable=False, default=datetime.utcnow)
     imagem_nome = Column(String(255), nullable=False)
     classe = Column(String(100), nullable=False)
     confianca = Column(Numeric(5, 2), nullable=False)
-    bbox = Column(String(255), nullable=True)  # Stored as string "[x1, y1, x2, y2]"
+    bbox = Column(String(255), nullable=True)  # Legado: string "[x1, y1, x2, y2]"
+    id_imagem = Column(Integer, ForeignKey('imagens_cv.id_imagem'), nullable=True, index=True)
+    frame = Column(Integer, nullable=True)  # Indice do frame quando a imagem e um stream
+
+    # Caixa numerica em coordenadas da imagem (x1 <= x2, y1 <= y2); espelhada na R-tree
+    bbox_x1 = Column(Float, nullable=True)
+    bbox_y1 = Column(Float, nullable=True)
+    bbox_x2 = Column(Float, nullable=True)
+    bbox_y2 = Column(Float, nullable=True)
+
+    imagem = relationship("ImagemCV", back_populates="deteccoes")
     
     def __repr__(self):
         return f"<Deteccao(id={self.id_deteccao}, classe='{self.classe}')>"
@@ -153,6 +194,12 @@ class Deteccao(Base):
 class ProducaoAgricola(Base):
     """ProducaoAgricola model - dados históricos de produção"""
     __tablename__ = 'producao_agricola'
+    __table_args__ = (
+        # Reimportacoes em massa fazem upsert por esta chave (id de origem ou campos naturais da linha)
+        Index('ux_producao_chave_importacao', 'chave_importacao', unique=True),
+        # Ultimas colheitas (/calculations/producao-agricola) sem ordenar a tabela inteira
+        Index('ix_producao_data_colheita', 'data_colheita'),
+    )
 
     id_producao = Column(Integer, primary_key=True, autoincrement=True)
     id_cultura = Column(Integer, ForeignKey('culturas.id_cultura'), nullable=False)
@@ -160,6 +207,7 @@ class ProducaoAgricola(Base):
     data_colheita = Column(DateTime, nullable=True)
     valor_estimado = Column(Numeric(14, 2), nullable=True)
     area_plantada = Column(Numeric(10, 2), nullable=True)
+    chave_importacao = Column(String(64), nullable=True)
 
     cultura = relationship("Cultura")
 
@@ -167,9 +215,29 @@ class ProducaoAgricola(Base):
         return f"<ProducaoAgricola(id={self.id_producao}, cultura={self.id_cultura})>"
 
 
+class CuboProducao(Base):
+    """CuboProducao model - Fase 7: producao pre-agregada por cultura x ano x mes (ver database.production_cube)"""
+    __tablename__ = 'cubo_producao'
+
+    id_cultura = Column(Integer, ForeignKey('culturas.id_cultura'), primary_key=True)
+    ano = Column(Integer, primary_key=True)  # 0 = sem data de colheita
+    mes = Column(Integer, primary_key=True)
+    registros = Column(Integer, nullable=False, default=0)
+    quantidade = Column(Float, nullable=False, default=0.0)
+    valor = Column(Float, nullable=False, default=0.0)
+    area = Column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<CuboProducao(cultura={self.id_cultura}, ano={self.ano}, mes={self.mes}, registros={self.registros})>"
+
+
 class Alert(Base):
     """Alert model - Fase 7"""
     __tablename__ = 'alertas'
+    __table_args__ = (
+        # Paginacao por cursor (data_hora, id)
+        Index('ix_alertas_data_hora_id', 'data_hora', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     titulo = Column(String(200), nullable=False)
@@ -183,6 +251,111 @@ class Alert(Base):
         return f"<Alert(id={self.id}, titulo='{self.titulo}', severidade='{self.severidade}')>"
 
 
+class NotificacaoOutbox(Base):
+    """NotificacaoOutbox model - Fase 7: fila persistente de emails/SMS a enviar"""
+    __tablename__ = 'notificacoes_outbox'
+    __table_args__ = (Index('ix_outbox_status_proxima', 'status', 'proxima_tentativa'),)
+
+    id_notificacao = Column(Integer, primary_key=True, autoincrement=True)
+    id_alerta = Column(Integer, ForeignKey('alertas.id'), nullable=True)
+    canal = Column(String(10), nullable=False)           # email, sms
+    destinatario = Column(String(200), nullable=False)
+    assunto = Column(String(300), nullable=True)
+    corpo = Column(Text, nullable=False)
+    corpo_html = Column(Text, nullable=True)
+    status = Column(String(20), nullable=False, default='pendente')  # pendente, enviando, enviado, falhou
+    reservado_em = Column(DateTime, nullable=True)  # quando um worker marcou 'enviando' (lease)
+    tentativas = Column(Integer, nullable=False, default=0)
+    proxima_tentativa = Column(DateTime, nullable=False, default=datetime.utcnow)
+    message_id = Column(String(100), nullable=True)
+    ultimo_erro = Column(String(500), nullable=True)
+    data_criacao = Column(DateTime, nullable=False, default=datetime.utcnow)
+    data_envio = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<NotificacaoOutbox(id={self.id_notificacao}, canal='{self.canal}', status='{self.status}')>"
+
+
+class EstadoAlerta(Base):
+    """EstadoAlerta model - Fase 7: estado por (sensor, tipo de alerta) para deduplicacao"""
+    __tablename__ = 'estado_alertas'
+
+    id_sensor = Column(String(100), primary_key=True)
+    tipo_alerta = Column(String(100), primary_key=True)
+    status = Column(String(20), nullable=False, default='ok')  # ok, ativo
+    severidade = Column(String(20), nullable=True)
+    nivel_escalonamento = Column(Integer, nullable=False, default=0)
+    aberto_em = Column(DateTime, nullable=True)
+    resolvido_em = Column(DateTime, nullable=True)
+    ultima_notificacao = Column(DateTime, nullable=True)
+    ultimo_valor = Column(Float, nullable=True)
+    pior_valor = Column(Float, nullable=True)
+    ocorrencias = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EstadoAlerta(sensor='{self.id_sensor}', tipo='{self.tipo_alerta}', status='{self.status}')>"
+
+
+class AlertaPrevisao(Base):
+    """AlertaPrevisao model - Fase 7: alerta de previsao ja emitido por (cidade, dia, tipo)"""
+    __tablename__ = 'alertas_previsao'
+
+    codigo_cidade = Column(String(20), primary_key=True)
+    dia = Column(Date, primary_key=True)
+    tipo_alerta = Column(String(50), primary_key=True)  # chuva_forte, geada, seca
+    severidade = Column(String(20), nullable=False)
+    tempo = Column(String(10), nullable=True)  # codigo CPTEC
+    temperatura_minima = Column(Float, nullable=True)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AlertaPrevisao(cidade='{self.codigo_cidade}', dia={self.dia}, tipo='{self.tipo_alerta}')>"
+
+
+class EstadoDetectorAnomalia(Base):
+    """EstadoDetectorAnomalia model - Fase 7: estado compacto do detector online por (sensor, metrica)"""
+    __tablename__ = 'estado_detector_anomalias'
+
+    id_sensor = Column(String(100), primary_key=True)
+    metrica = Column(String(50), primary_key=True)
+    amostras = Column(Integer, nullable=False, default=0)
+    estado = Column(LargeBinary, nullable=False)  # vetor float64 (ver analytics.streaming)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EstadoDetectorAnomalia(sensor='{self.id_sensor}', metrica='{self.metrica}', amostras={self.amostras})>"
+
+
+class RegraAlerta(Base):
+    """Regra de alerta por limite - Fase 7: tabela declarativa, global ou por talhao/cultura"""
+    __tablename__ = 'regras_alerta'
+    __table_args__ = (
+        Index('ix_regras_alerta_ativo', 'ativo'),
+    )
+
+    id_regra = Column(Integer, primary_key=True, autoincrement=True)
+    tipo_alerta = Column(String(50), nullable=False)  # umidade_critica_baixa, ph_alto, ...
+    metrica = Column(String(30), nullable=False)  # umidade, ph, temperatura, precipitacao_mm
+    direcao = Column(String(10), nullable=False)  # below, above
+    limite = Column(Float, nullable=False)
+    margem_histerese = Column(Float, nullable=False, default=0.0)
+    severidade = Column(String(20), nullable=False)
+    titulo = Column(String(200), nullable=False)
+    mensagem = Column(Text, nullable=False)  # formatada com {valor} e {limite}
+
+    # Escopo: NULL = vale para todos; talhao tem precedencia sobre cultura
+    id_talhao = Column(Integer, ForeignKey('talhoes.id_talhao'), nullable=True)
+    id_cultura = Column(Integer, ForeignKey('culturas.id_cultura'), nullable=True)
+
+    prioridade = Column(Integer, nullable=False, default=100)
+    ativo = Column(Boolean, nullable=False, default=True)
+    data_atualizacao = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RegraAlerta(id={self.id_regra}, tipo='{self.tipo_alerta}', {self.metrica} {self.direcao} {self.limite})>"
+
+
 class Funcionario(Base):
     """Funcionario model - Fase 7: Contatos para alertas"""
     __tablename__ = 'funcionarios'
@@ -210,3 +383,15 @@ class Funcionario(Base):
 
     def __repr__(self):
         return f"<Funcionario(id={self.id_funcionario}, nome='{self.nome}', cargo='{self.cargo}')>"
+
+
+class ConfigVersao(Base):
+    """Versao de dados de configuracao - invalida caches em memoria de todos os workers"""
+    __tablename__ = 'config_versoes'
+
+    chave = Column(String(50), primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ConfigVersao(chave='{self.chave}', versao={self.versao})>"
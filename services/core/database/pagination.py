@@ -0,0 +1,164 @@
+"""
+Paginacao por chave (keyset) e totais em cache - Fase 7
+LIMIT/OFFSET le e descarta todas as linhas anteriores a pagina; aqui cada
+pagina filtra a partir da ultima chave (timestamp, id) vista, entregue ao
+cliente como um cursor opaco, e a pagina N custa o mesmo que a pagina 1.
+Totais (COUNT(*) e varredura completa) ficam em cache e, para tabelas
+grandes, sao estimados.
+"""
+import base64
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+from sqlalchemy import Integer, and_, func, or_, select, text
+
+logger = structlog.get_logger()
+
+# Chave de ordenacao por tabela (mais recentes primeiro); demais tabelas usam a PK crescente
+TABLE_SORT_KEYS = {
+    "leituras_sensores": ("data_hora_leitura", "id_leitura"),
+    "deteccoes": ("timestamp", "id_deteccao"),
+    "alertas": ("data_hora", "id"),
+}
+
+
+class InvalidCursor(ValueError):
+    """Cursor malformado ou de outra ordenacao"""
+
+
+@dataclass
+class Page:
+    """Uma pagina de resultados e o cursor da proxima (None na ultima)"""
+    items: List[Any]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_estimated: bool = False
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [{"dt": v.isoformat()} if isinstance(v, (datetime, date)) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v for v in payload]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"cursor invalido: {e}") from e
+    if not isinstance(payload, list) or len(values) != size:
+        raise InvalidCursor("cursor invalido para esta ordenacao")
+    return values
+
+
+def keyset_condition(columns: Sequence, values: Sequence, descending: bool = True):
+    """(c0, c1, ...) depois de (v0, v1, ...) na ordenacao, expandido para indices compostos."""
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        step = column < value if descending else column > value
+        clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], step))
+    return or_(*clauses)
+
+
+def paginate(query, columns: Sequence, cursor: Optional[str] = None, limit: int = 100, descending: bool = True):
+    """
+    Aplica ordenacao, filtro do cursor e LIMIT (+1 para saber se ha proxima)
+    a uma Query ORM. Devolve (linhas, proximo_cursor).
+    """
+    if cursor:
+        query = query.filter(keyset_condition(columns, decode_cursor(cursor, len(columns)), descending))
+    order = [c.desc() if descending else c.asc() for c in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, c.key) for c in columns])
+
+
+def sort_columns(model) -> Tuple[List, bool]:
+    """Colunas de ordenacao de um model e se a ordem e decrescente."""
+    keys = TABLE_SORT_KEYS.get(model.__tablename__)
+    if keys:
+        return [getattr(model, k) for k in keys], True
+    return [getattr(model, c.key) for c in model.__table__.primary_key.columns], False
+
+
+class TableCounter:
+    """
+    Totais por tabela em cache. Uma contagem limitada a `exact_threshold`+1
+    linhas decide: tabelas ate o limite tem COUNT exato; acima dele o total e
+    estimado (e marcado como tal).
+    """
+
+    def __init__(self, db_service, ttl: float = 60.0, exact_threshold: int = 100_000):
+        self.db = db_service
+        self.ttl = ttl
+        self.exact_threshold = exact_threshold
+        self._cache: Dict[str, Tuple[int, bool, float]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "exact": 0, "estimated": 0}
+
+    def count(self, model) -> Tuple[int, bool]:
+        """(total, estimado) da tabela do model."""
+        table = model.__tablename__
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(table)
+            if cached and now - cached[2] < self.ttl:
+                self.counters["hits"] += 1
+                return cached[0], cached[1]
+
+        # Custo limitado a exact_threshold linhas: nao depende de lacunas na PK
+        with self.db.get_session() as session:
+            bounded = select(text("1")).select_from(model.__table__).limit(self.exact_threshold + 1).subquery()
+            total = session.execute(select(func.count()).select_from(bounded)).scalar_one()
+        estimated = False
+        if total > self.exact_threshold:
+            estimate = self._estimate(model)
+            if estimate is None:
+                with self.db.get_session() as session:
+                    total = session.execute(select(func.count()).select_from(model.__table__)).scalar_one()
+            else:
+                total, estimated = max(estimate, total), True
+
+        with self._lock:
+            self.counters["estimated" if estimated else "exact"] += 1
+            self._cache[table] = (total, estimated, now)
+        return total, estimated
+
+    def _estimate(self, model) -> Optional[int]:
+        """
+        Estimativa O(1): estatisticas do Postgres ou faixa da PK inteira (limite
+        superior: conta ids apagados). So usada acima de exact_threshold.
+        """
+        table = model.__table__
+        with self.db.get_session() as session:
+            if self.db.engine.dialect.name == "postgresql":
+                value = session.execute(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:t AS regclass)"), {"t": table.name}
+                ).scalar()
+                return int(value) if value is not None and value >= 0 else None
+            pk = list(table.primary_key.columns)
+            if len(pk) != 1 or not isinstance(pk[0].type, Integer):
+                return None
+            low, high = session.execute(select(func.min(pk[0]), func.max(pk[0]))).one()
+        return 0 if low is None else int(high - low + 1)
+
+    def invalidate(self, tables=None) -> None:
+        with self._lock:
+            if tables is None:
+                self._cache.clear()
+            for table in tables or ():
+                self._cache.pop(table, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "cached_tables": len(self._cache)}
@@ -0,0 +1,182 @@
+"""
+Cubo de producao agricola - Fase 7
+O overview, /calculations/producao-agricola e a pagina de Producao do
+dashboard somavam producao_agricola (JOIN culturas) a cada renderizacao.
+cubo_producao guarda as somas por cultura x ano x mes (registros, quantidade,
+valor, area) e e mantido incrementalmente: no SQLite por triggers de
+insert/update/delete na tabela de fatos (cobrem ORM, upsert da importacao em
+massa e escritas diretas via sqlite3); nos demais bancos, reconstruido pelos
+hooks de alteracao. Consultas fazem slice (filtros) e drill-down (dimensoes)
+sobre o cubo, que tem no maximo culturas x meses linhas.
+"""
+from typing import Dict, Optional, Sequence
+
+import structlog
+from sqlalchemy import Integer, cast, delete, extract, func, insert, select, text
+
+from .models import Cultura, CuboProducao, ProducaoAgricola
+
+logger = structlog.get_logger()
+
+DIMENSIONS = ("cultura", "ano", "mes")
+FACT_COLUMNS = ("id_cultura", "quantidade_produzida", "data_colheita", "valor_estimado", "area_plantada")
+
+
+def _key(row: str) -> str:
+    ano = f"COALESCE(CAST(strftime('%Y', {row}.data_colheita) AS INTEGER), 0)"
+    mes = f"COALESCE(CAST(strftime('%m', {row}.data_colheita) AS INTEGER), 0)"
+    return f"{row}.id_cultura, {ano}, {mes}"
+
+
+def _add(row: str) -> str:
+    return f"""INSERT INTO cubo_producao (id_cultura, ano, mes, registros, quantidade, valor, area)
+            VALUES ({_key(row)}, 1, COALESCE({row}.quantidade_produzida, 0),
+                    COALESCE({row}.valor_estimado, 0), COALESCE({row}.area_plantada, 0))
+            ON CONFLICT (id_cultura, ano, mes) DO UPDATE SET
+                registros = registros + 1,
+                quantidade = quantidade + excluded.quantidade,
+                valor = valor + excluded.valor,
+                area = area + excluded.area;"""
+
+
+def _subtract(row: str) -> str:
+    match = f"(id_cultura, ano, mes) = ({_key(row)})"
+    return f"""UPDATE cubo_producao SET
+                registros = registros - 1,
+                quantidade = quantidade - COALESCE({row}.quantidade_produzida, 0),
+                valor = valor - COALESCE({row}.valor_estimado, 0),
+                area = area - COALESCE({row}.area_plantada, 0)
+            WHERE {match};
+            DELETE FROM cubo_producao WHERE {match} AND registros <= 0;"""
+
+
+_SQLITE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS cubo_producao_ai AFTER INSERT ON producao_agricola
+        BEGIN
+            {_add("NEW")}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS cubo_producao_au AFTER UPDATE OF {", ".join(FACT_COLUMNS)} ON producao_agricola
+        BEGIN
+            {_subtract("OLD")}
+            {_add("NEW")}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS cubo_producao_ad AFTER DELETE ON producao_agricola
+        BEGIN
+            {_subtract("OLD")}
+        END""",
+]
+
+
+class ProductionCube:
+    """Somas de producao por cultura x ano x mes, com slice e drill-down"""
+
+    def __init__(self, db_service):
+        self.db = db_service
+        self.triggers = False
+        self.counters = {"queries": 0, "rebuilds": 0}
+
+    def install(self) -> bool:
+        """Cria os triggers (SQLite) e preenche o cubo se estiver vazio; devolve se ha triggers."""
+        engine = self.db.engine
+        if engine.dialect.name == "sqlite":
+            try:
+                with engine.begin() as conn:
+                    for ddl in _SQLITE_TRIGGERS:
+                        conn.execute(text(ddl))
+                self.triggers = True
+            except Exception as e:
+                logger.warning("production_cube_triggers_unavailable", error=str(e))
+        with engine.connect() as conn:
+            empty = conn.execute(select(CuboProducao.id_cultura).limit(1)).first() is None
+            facts = conn.execute(select(ProducaoAgricola.id_producao).limit(1)).first() is not None
+        if empty and facts:
+            self.rebuild()
+        return self.triggers
+
+    def on_change(self, tables) -> None:
+        """Change listener: sem triggers, reconstroi quando producao_agricola muda."""
+        if not self.triggers and "producao_agricola" in tables:
+            self.rebuild()
+
+    def rebuild(self) -> int:
+        """Recalcula o cubo inteiro a partir da tabela de fatos; devolve quantas celulas gerou."""
+        ano = func.coalesce(cast(extract("year", ProducaoAgricola.data_colheita), Integer), 0)
+        mes = func.coalesce(cast(extract("month", ProducaoAgricola.data_colheita), Integer), 0)
+        source = select(
+            ProducaoAgricola.id_cultura,
+            ano,
+            mes,
+            func.count(),
+            func.coalesce(func.sum(ProducaoAgricola.quantidade_produzida), 0),
+            func.coalesce(func.sum(ProducaoAgricola.valor_estimado), 0),
+            func.coalesce(func.sum(ProducaoAgricola.area_plantada), 0),
+        ).group_by(ProducaoAgricola.id_cultura, ano, mes)
+        columns = ["id_cultura", "ano", "mes", "registros", "quantidade", "valor", "area"]
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(CuboProducao))
+            conn.execute(insert(CuboProducao).from_select(columns, source))
+            cells = conn.execute(select(func.count()).select_from(CuboProducao)).scalar()
+        self.counters["rebuilds"] += 1
+        logger.info("production_cube_rebuilt", cells=cells)
+        return cells
+
+    def query(
+        self,
+        dimensoes: Sequence[str] = ("cultura",),
+        cultura: Optional[str] = None,
+        ano: Optional[int] = None,
+        mes: Optional[int] = None,
+    ) -> Dict:
+        """
+        Agrega o cubo pelas `dimensoes` (drill-down: cultura -> ano -> mes) com
+        filtros opcionais (slice). Produtividade = quantidade / area.
+        """
+        dimensoes = list(dict.fromkeys(dimensoes))
+        invalid = [d for d in dimensoes if d not in DIMENSIONS]
+        if invalid:
+            raise ValueError(f"Dimensao invalida: {invalid[0]} (use {', '.join(DIMENSIONS)})")
+
+        columns = {"cultura": Cultura.nome_cultura, "ano": CuboProducao.ano, "mes": CuboProducao.mes}
+        group = [columns[d] for d in dimensoes]
+        stmt = (
+            select(
+                *group,
+                func.sum(CuboProducao.registros),
+                func.sum(CuboProducao.quantidade),
+                func.sum(CuboProducao.valor),
+                func.sum(CuboProducao.area),
+            )
+            .join(Cultura, Cultura.id_cultura == CuboProducao.id_cultura)
+            .group_by(*group)
+            .order_by(*group)
+        )
+        if cultura is not None:
+            stmt = stmt.where(Cultura.nome_cultura == cultura)
+        if ano is not None:
+            stmt = stmt.where(CuboProducao.ano == ano)
+        if mes is not None:
+            stmt = stmt.where(CuboProducao.mes == mes)
+
+        with self.db.engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        self.counters["queries"] += 1
+
+        n = len(dimensoes)
+        linhas = [
+            {**dict(zip(dimensoes, row[:n])), **_measures(*row[n:])}
+            for row in rows
+        ]
+        total = _measures(*(sum(float(row[n + i] or 0) for row in rows) for i in range(4)))
+        filtros = {k: v for k, v in (("cultura", cultura), ("ano", ano), ("mes", mes)) if v is not None}
+        return {"dimensoes": dimensoes, "filtros": filtros, "linhas": linhas, "total": total}
+
+
+def _measures(registros, quantidade, valor, area) -> Dict:
+    quantidade, valor, area = float(quantidade or 0), float(valor or 0), float(area or 0)
+    return {
+        "registros": int(registros or 0),
+        "quantidade": round(quantidade, 2),
+        "valor": round(valor, 2),
+        "area": round(area, 2),
+        "produtividade": round(quantidade / area, 4) if area > 0 else None,
+    }
@@ -0,0 +1,152 @@
+"""
+Modelos de leitura (projecao de colunas) - Fase 7
+Leituras grandes pelo ORM pagam identity map, expunge por objeto e um Decimal
+por coluna Numeric (convertido para float logo depois pelas rotas). Aqui as
+consultas usam select() do Core projetando so as colunas necessarias, com as
+colunas Numeric tipadas como Float no resultado, e devolvem tuplas ou
+dataclasses com __slots__ - somente leitura, sem sessao.
+"""
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple, Type
+
+from sqlalchemy import Float, Numeric, select, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+from .models import Alert, Deteccao, Funcionario, LeituraSensor
+from .pagination import Page, decode_cursor, encode_cursor, keyset_condition, sort_columns
+
+
+@dataclass(frozen=True, slots=True)
+class ReadingRow:
+    id_leitura: int
+    data_hora_leitura: datetime
+    id_sensor: int
+    valor_umidade: Optional[float]
+    valor_ph: Optional[float]
+    valor_fosforo_p: Optional[float]
+    valor_potassio_k: Optional[float]
+    temperatura: Optional[float]
+    precipitacao_mm: Optional[float]
+    bomba_ligada: bool
+    decisao_logica_esp32: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class DetectionRow:
+    id_deteccao: int
+    timestamp: datetime
+    imagem_nome: str
+    classe: str
+    confianca: float
+    bbox: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class AlertRow:
+    id: int
+    titulo: str
+    mensagem: str
+    severidade: str
+    origem: str
+    message_id: Optional[str]
+    data_hora: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class FuncionarioRow:
+    id_funcionario: int
+    nome: str
+    email: str
+    telefone: Optional[str]
+    cargo: Optional[str]
+    ativo: bool
+    recebe_alertas: bool
+    recebe_email: bool
+    recebe_sms: bool
+    alertas_criticos: bool
+    alertas_altos: bool
+    alertas_medios: bool
+    alertas_baixos: bool
+
+
+class FloatResult(TypeDecorator):
+    """Numeric lido como float (SQLite devolve int para valores inteiros)"""
+    impl = Float
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        return value if value is None or type(value) is float else float(value)
+
+
+def projection(model, names: Optional[Sequence[str]] = None) -> List:
+    """Colunas do model ou Table (todas, ou `names`) com Numeric lido como float."""
+    columns = getattr(model, "__table__", model).columns
+    selected = [columns[n] for n in names] if names is not None else list(columns)
+    return [
+        type_coerce(c, FloatResult()).label(c.name) if isinstance(c.type, Numeric) and not isinstance(c.type, Float) else c
+        for c in selected
+    ]
+
+
+class ReadModels:
+    """Consultas somente leitura que devolvem linhas leves em vez de entidades ORM"""
+
+    def __init__(self, db_service):
+        self.db = db_service
+
+    def rows(self, stmt) -> List[Tuple]:
+        with self.db.engine.connect() as conn:
+            return [tuple(r) for r in conn.execute(stmt)]
+
+    def _as(self, row_cls: Type, stmt) -> List[Any]:
+        with self.db.engine.connect() as conn:
+            return [row_cls(*r) for r in conn.execute(stmt)]
+
+    def _select(self, model, row_cls: Type):
+        return select(*projection(model, [f.name for f in fields(row_cls)]))
+
+    # ---------- Paginacao ----------
+    def page(
+        self, model, stmt, limit: int, cursor: Optional[str] = None, row_cls: Optional[Type] = None,
+        by_pk: bool = False,
+    ) -> Page:
+        """
+        Pagina keyset sobre um select do model (mesma ordenacao e cursor de
+        DatabaseService.get_*_page, ou PK crescente com `by_pk`). Sem row_cls,
+        os itens sao tuplas.
+        """
+        if by_pk:
+            sort, descending = [getattr(model, c.key) for c in model.__table__.primary_key.columns], False
+        else:
+            sort, descending = sort_columns(model)
+        if cursor:
+            stmt = stmt.where(keyset_condition(sort, decode_cursor(cursor, len(sort)), descending))
+        stmt = stmt.order_by(*[c.desc() if descending else c.asc() for c in sort]).limit(limit + 1)
+
+        # Chaves de ordenacao vem junto, ao final, para montar o cursor
+        with self.db.engine.connect() as conn:
+            result = conn.execute(stmt.add_columns(*sort)).all()
+        k = len(sort)
+        items = [row_cls(*r[:-k]) if row_cls else tuple(r[:-k]) for r in result[:limit]]
+        next_cursor = encode_cursor(list(result[limit - 1][-k:])) if len(result) > limit else None
+        return Page(items, next_cursor)
+
+    # ---------- Consultas ----------
+    def readings(self, limit: int = 100, cursor: Optional[str] = None, id_sensor: Optional[int] = None) -> Page:
+        stmt = self._select(LeituraSensor, ReadingRow)
+        if id_sensor is not None:
+            stmt = stmt.where(LeituraSensor.id_sensor == id_sensor)
+        return self.page(LeituraSensor, stmt, limit, cursor, ReadingRow)
+
+    def detections(self, limit: int = 100, cursor: Optional[str] = None) -> Page:
+        return self.page(Deteccao, self._select(Deteccao, DetectionRow), limit, cursor, DetectionRow)
+
+    def alerts(self, limit: int = 20, cursor: Optional[str] = None) -> Page:
+        return self.page(Alert, self._select(Alert, AlertRow), limit, cursor, AlertRow)
+
+    def funcionarios(self, apenas_ativos: bool = True) -> List[FuncionarioRow]:
+        stmt = self._select(Funcionario, FuncionarioRow).order_by(Funcionario.id_funcionario)
+        if apenas_ativos:
+            stmt = stmt.where(Funcionario.ativo.is_(True))
+        return self._as(FuncionarioRow, stmt)
@@ -0,0 +1,107 @@
+"""
+Tabela de roteamento de destinatarios de alertas - Fase 7
+Funcionarios mudam poucas vezes por mes; em vez de consultar o banco a cada
+notificacao, a tabela severidade -> canal -> destinatarios fica em memoria e
+e reconstruida quando a versao 'funcionarios' em config_versoes muda.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import structlog
+
+from .models import Funcionario
+
+logger = structlog.get_logger()
+
+# Severidade -> flag do funcionario que habilita o recebimento
+SEVERITY_FLAGS = {
+    "critica": "alertas_criticos",
+    "alta": "alertas_altos",
+    "media": "alertas_medios",
+    "baixa": "alertas_baixos",
+}
+
+
+@dataclass(frozen=True)
+class AlertRecipients:
+    """Destinatarios de uma severidade, ja separados por canal"""
+    funcionarios: Tuple[Funcionario, ...] = ()
+    emails: Tuple[str, ...] = ()
+    phones: Tuple[str, ...] = ()
+
+
+class RecipientRoutingTable:
+    """Cache de destinatarios por severidade, compartilhado entre workers via versao no banco"""
+
+    VERSION_KEY = "funcionarios"
+
+    def __init__(self, db_service, check_interval: float = 5.0):
+        self.db = db_service
+        self.check_interval = check_interval
+        self._routes: Optional[Dict[Optional[str], AlertRecipients]] = None
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"builds": 0, "lookups": 0, "version_checks": 0}
+
+    def resolve(self, severidade: Optional[str]) -> AlertRecipients:
+        """Destinatarios para a severidade (consulta a dict; recarrega se a versao mudou)."""
+        routes = self._current()
+        self.counters["lookups"] += 1
+        return routes.get(severidade if severidade in SEVERITY_FLAGS else None, AlertRecipients())
+
+    def invalidate(self) -> None:
+        """Descarta a tabela local; a proxima consulta reconstroi."""
+        with self._lock:
+            self._routes = None
+
+    def _current(self) -> Dict[Optional[str], AlertRecipients]:
+        now = time.monotonic()
+        routes = self._routes
+        if routes is not None and now - self._checked_at < self.check_interval:
+            return routes
+
+        with self._lock:
+            if self._routes is not None and now - self._checked_at < self.check_interval:
+                return self._routes
+            # Outro worker pode ter alterado funcionarios: compara a versao no banco
+            version = self.db.get_config_version(self.VERSION_KEY)
+            self.counters["version_checks"] += 1
+            if self._routes is None or version != self._version:
+                self._routes = self._build()
+                self._version = version
+            self._checked_at = now
+            return self._routes
+
+    def _build(self) -> Dict[Optional[str], AlertRecipients]:
+        with self.db.get_session() as session:
+            funcionarios = (
+                session.query(Funcionario)
+                .filter(Funcionario.ativo == True, Funcionario.recebe_alertas == True)
+                .order_by(Funcionario.id_funcionario)
+                .all()
+            )
+            for func in funcionarios:
+                session.expunge(func)
+
+        def route(selected) -> AlertRecipients:
+            return AlertRecipients(
+                funcionarios=tuple(selected),
+                emails=tuple(f.email for f in selected if f.recebe_email and f.email),
+                phones=tuple(f.telefone for f in selected if f.recebe_sms and f.telefone),
+            )
+
+        # Chave None: severidade desconhecida recebe todos os ativos (comportamento anterior)
+        routes = {None: route(funcionarios)}
+        for severidade, flag in SEVERITY_FLAGS.items():
+            routes[severidade] = route([f for f in funcionarios if getattr(f, flag)])
+
+        self.counters["builds"] += 1
+        logger.info("recipient_routing_built", funcionarios=len(funcionarios),
+                    **{sev: len(r.funcionarios) for sev, r in routes.items() if sev})
+        return routes
+
+    def stats(self) -> Dict:
+        return {**self.counters, "version": self._version, "loaded": self._routes is not None}
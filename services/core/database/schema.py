@@ -0,0 +1,178 @@
+"""
+Schema upgrades for existing databases
+`create_all` only creates missing tables; this module adds new nullable
+columns and indexes to tables that already exist and maintains the SQLite
+R-tree used for spatial queries over detection boxes.
+"""
+import ast
+from typing import List, Optional, Sequence, Tuple
+
+import structlog
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, text
+from sqlalchemy.engine import Engine
+
+from .models import Base
+
+logger = structlog.get_logger()
+
+DETECTION_RTREE = "deteccoes_rtree"
+LEGACY_IMAGE_CONSTRAINT = "uq_imagens_cv_nome_origem"
+
+_RTREE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {DETECTION_RTREE} USING rtree(id, min_x, max_x, min_y, max_y)",
+    f"""CREATE TRIGGER IF NOT EXISTS deteccoes_rtree_ai AFTER INSERT ON deteccoes
+        WHEN NEW.bbox_x1 IS NOT NULL
+        BEGIN
+            INSERT INTO {DETECTION_RTREE} VALUES (NEW.id_deteccao, NEW.bbox_x1, NEW.bbox_x2, NEW.bbox_y1, NEW.bbox_y2);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS deteccoes_rtree_au AFTER UPDATE OF bbox_x1, bbox_y1, bbox_x2, bbox_y2 ON deteccoes
+        BEGIN
+            DELETE FROM {DETECTION_RTREE} WHERE id = OLD.id_deteccao;
+            INSERT INTO {DETECTION_RTREE}
+                SELECT NEW.id_deteccao, NEW.bbox_x1, NEW.bbox_x2, NEW.bbox_y1, NEW.bbox_y2
+                WHERE NEW.bbox_x1 IS NOT NULL;
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS deteccoes_rtree_ad AFTER DELETE ON deteccoes
+        BEGIN
+            DELETE FROM {DETECTION_RTREE} WHERE id = OLD.id_deteccao;
+        END""",
+]
+
+
+def parse_bbox(value) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Normalise a bbox (list/tuple or legacy "[x1, y1, x2, y2]" string) into
+    ordered floats (x1 <= x2, y1 <= y2). Returns None when not parseable.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+    try:
+        x1, y1, x2, y2 = (float(v) for v in value)
+    except (TypeError, ValueError):
+        return None
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+def _add_missing_columns(engine: Engine) -> List[str]:
+    """ALTER TABLE ... ADD COLUMN for nullable model columns absent from the DB."""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _migrate_image_identity(engine: Engine) -> None:
+    """
+    Drop the legacy UNIQUE (nome_arquivo, origem) on imagens_cv and fill
+    `chave` for rows that predate it (their identity stays the file name).
+    """
+    inspector = inspect(engine)
+    if "imagens_cv" not in inspector.get_table_names():
+        return
+    legacy = any(
+        uc.get("name") == LEGACY_IMAGE_CONSTRAINT or sorted(uc["column_names"]) == ["nome_arquivo", "origem"]
+        for uc in inspector.get_unique_constraints("imagens_cv")
+    )
+    with engine.begin() as conn:
+        if legacy and engine.dialect.name == "sqlite":
+            # SQLite nao remove constraints: recria a tabela (FKs de deteccoes seguem pelo nome)
+            source = Base.metadata.tables["imagens_cv"]
+            rebuilt = Table(
+                "imagens_cv__novo", MetaData(),
+                *(Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in source.columns),
+            )
+            rebuilt.create(conn)
+            names = ", ".join(c.name for c in source.columns)
+            conn.execute(text(f"INSERT INTO imagens_cv__novo ({names}) SELECT {names} FROM imagens_cv"))
+            conn.execute(text("DROP TABLE imagens_cv"))
+            conn.execute(text("ALTER TABLE imagens_cv__novo RENAME TO imagens_cv"))
+        elif legacy:
+            conn.execute(text(f"ALTER TABLE imagens_cv DROP CONSTRAINT IF EXISTS {LEGACY_IMAGE_CONSTRAINT}"))
+        conn.execute(text("UPDATE imagens_cv SET chave = nome_arquivo WHERE chave IS NULL"))
+
+
+def _create_missing_indexes(engine: Engine) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _backfill_detection_boxes(engine: Engine) -> int:
+    """Parse legacy string boxes into the numeric bbox columns."""
+    with engine.begin() as conn:
+        rows = conn.execute(
+            text("SELECT id_deteccao, bbox FROM deteccoes WHERE bbox_x1 IS NULL AND bbox IS NOT NULL")
+        ).fetchall()
+        updates = []
+        for det_id, raw in rows:
+            box = parse_bbox(raw)
+            if box:
+                updates.append({"id": det_id, "x1": box[0], "y1": box[1], "x2": box[2], "y2": box[3]})
+        if updates:
+            conn.execute(
+                text(
+                    "UPDATE deteccoes SET bbox_x1 = :x1, bbox_y1 = :y1, bbox_x2 = :x2, bbox_y2 = :y2 "
+                    "WHERE id_deteccao = :id"
+                ),
+                updates,
+            )
+    return len(updates)
+
+
+def ensure_detection_rtree(engine: Engine) -> bool:
+    """Create the SQLite R-tree and its sync triggers; False when unavailable."""
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            for ddl in _RTREE_DDL:
+                conn.execute(text(ddl))
+            # Linhas anteriores a R-tree (ou de bancos migrados)
+            conn.execute(text(
+                f"INSERT INTO {DETECTION_RTREE} "
+                "SELECT id_deteccao, bbox_x1, bbox_x2, bbox_y1, bbox_y2 FROM deteccoes "
+                f"WHERE bbox_x1 IS NOT NULL AND id_deteccao NOT IN (SELECT id FROM {DETECTION_RTREE})"
+            ))
+        return True
+    except Exception as e:
+        logger.warning("detection_rtree_unavailable", error=str(e))
+        return False
+
+
+def upgrade_schema(engine: Engine) -> bool:
+    """
+    Bring an existing database up to the current models. Returns whether the
+    detection R-tree is available.
+    """
+    added = _add_missing_columns(engine)
+    _migrate_image_identity(engine)
+    _create_missing_indexes(engine)
+    backfilled = _backfill_detection_boxes(engine)
+    rtree = ensure_detection_rtree(engine)
+    if added or backfilled:
+        logger.info("database_schema_upgraded", columns_added=added, boxes_backfilled=backfilled)
+    return rtree
+
+
+def rtree_region_filter(region: Sequence[float]):
+    """SQL fragment selecting detection ids whose box intersects `region`."""
+    return text(
+        f"SELECT id FROM {DETECTION_RTREE} "
+        "WHERE max_x >= :rx1 AND min_x <= :rx2 AND max_y >= :ry1 AND min_y <= :ry2"
+    ).bindparams(rx1=region[0], ry1=region[1], rx2=region[2], ry2=region[3]).columns(id=Integer)
@@ -2,14 +2,22 @@
 Database Service - Encapsulates all database operations
 """
 from pathlib import Path
-from sqlalchemy import create_engine
+from itertools import chain
+from sqlalchemy import create_engine, event, func, select, update
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import IntegrityError, OperationalError
 from contextlib import contextmanager
-from typing import List, Optional, Dict, Any
+from datetime import datetime
+from typing import Callable, List, Optional, Dict, Any, Sequence, Set, Tuple
 import structlog
 
-from .models import Base, Cultura, Talhao, TipoSensor, Sensor, LeituraSensor, AjusteAplicacao, Deteccao, Alert, ProducaoAgricola, InsumoCultura, Funcionario
+from .coefficients import CoefficientTable
+from .models import Base, Cultura, Talhao, TipoSensor, Sensor, LeituraSensor, AjusteAplicacao, Deteccao, ImagemCV, Alert, ProducaoAgricola, InsumoCultura, Funcionario, ConfigVersao, RegraAlerta
+from .production_cube import ProductionCube
+from .pagination import InvalidCursor, Page, TableCounter, paginate
+from .read_models import ReadModels
+from .recipients import AlertRecipients, RecipientRoutingTable
+from .schema import parse_bbox, rtree_region_filter, upgrade_schema
 
 logger = structlog.get_logger()
 
@@ -21,6 +29,9 @@ class DatabaseError(Exception):
 
 class DatabaseService:
     """Encapsulates all database operations using SQLAlchemy ORM"""
+
+    # Tabelas cujas alteracoes incrementam a versao em config_versoes (caches entre workers)
+    VERSIONED_TABLES = {"funcionarios", "regras_alerta", "sensores", "talhoes"}
     
     def __init__(self, connection_string: str | None = None):
         """Initialize database service"""
@@ -34,6 +45,19 @@ class DatabaseService:
             echo=False
         )
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.spatial_index = False
+        self._change_listeners: List[Callable[[Set[str]], None]] = []
+        self._install_change_hooks()
+
+        self.recipients = RecipientRoutingTable(self, check_interval=float(os.getenv("RECIPIENTS_CHECK_SECONDS", 5)))
+        self.add_change_listener(lambda tables: "funcionarios" in tables and self.recipients.invalidate())
+        self.counts = TableCounter(self, ttl=float(os.getenv("TABLE_COUNT_TTL_SECONDS", 60)))
+        self.add_change_listener(self.counts.invalidate)
+        self.reads = ReadModels(self)
+        self.coefficients = CoefficientTable(self, ttl=float(os.getenv("COEFFICIENTS_TTL_SECONDS", 300)))
+        self.add_change_listener(self.coefficients.invalidate)
+        self.production_cube = ProductionCube(self)
+        self.add_change_listener(self.production_cube.on_change)
         logger.info("database_service_initialized", connection=conn)
 
     def _normalize_sqlite_url(self, conn: str) -> str:
@@ -67,11 +91,75 @@ class DatabaseService:
         """Create all tables"""
         try:
             Base.metadata.create_all(bind=self.engine)
-            logger.info("database_tables_created")
+            self.spatial_index = upgrade_schema(self.engine)
+            cube_triggers = self.production_cube.install()
+            logger.info("database_tables_created", spatial_index=self.spatial_index, cube_triggers=cube_triggers)
         except Exception as e:
             logger.error("database_tables_creation_failed", error=str(e))
             raise DatabaseError(f"Failed to create tables: {str(e)}")
     
+    # ========== HOOKS DE ALTERACAO ==========
+
+    def _install_change_hooks(self):
+        """Registra eventos de sessao que rastreiam tabelas alteradas em cada transacao."""
+        event.listen(self.SessionLocal, "after_flush", self._collect_changes)
+        event.listen(self.SessionLocal, "after_commit", self._notify_changes)
+        event.listen(self.SessionLocal, "after_rollback", lambda session: session.info.pop("changed_tables", None))
+
+    def _collect_changes(self, session: Session, flush_context) -> None:
+        tables = {
+            obj.__table__.name
+            for obj in chain(session.new, session.dirty, session.deleted)
+            if hasattr(obj, "__table__")
+        }
+        if not tables:
+            return
+        # Versao incrementada na mesma transacao da alteracao
+        for chave in tables & self.VERSIONED_TABLES:
+            self._bump_config_version(session.connection(), chave)
+        session.info.setdefault("changed_tables", set()).update(tables)
+
+    def _notify_changes(self, session: Session) -> None:
+        tables = session.info.pop("changed_tables", None)
+        if tables:
+            self.notify_changes(tables)
+
+    def notify_changes(self, tables: Set[str]) -> None:
+        """Avisa os listeners de alteracoes feitas fora do ORM (ex: inserts em massa pelo Core)."""
+        for listener in self._change_listeners:
+            try:
+                listener(tables)
+            except Exception as e:
+                logger.warning("change_listener_failed", error=str(e), tables=sorted(tables))
+
+    def add_change_listener(self, listener: Callable[[Set[str]], None]) -> None:
+        """Chama `listener(tabelas)` apos cada commit que alterou linhas via ORM."""
+        self._change_listeners.append(listener)
+
+    @staticmethod
+    def _bump_config_version(connection, chave: str) -> None:
+        table = ConfigVersao.__table__
+        result = connection.execute(
+            update(table)
+            .where(table.c.chave == chave)
+            .values(versao=table.c.versao + 1, atualizado_em=datetime.utcnow())
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(chave=chave, versao=1, atualizado_em=datetime.utcnow()))
+
+    def get_config_version(self, chave: str) -> int:
+        """Versao atual de um dado de configuracao (0 se nunca alterado)."""
+        with self.get_session() as session:
+            row = session.get(ConfigVersao, chave)
+            return row.versao if row else 0
+
+    def get_config_versions(self, chaves: Sequence[str]) -> Dict[str, int]:
+        """Versoes de varios dados de configuracao em uma consulta."""
+        with self.get_session() as session:
+            rows = session.query(ConfigVersao.chave, ConfigVersao.versao).filter(ConfigVersao.chave.in_(chaves)).all()
+        versions = dict(rows)
+        return {chave: versions.get(chave, 0) for chave in chaves}
+
     @contextmanager
     def get_session(self) -> Session:
         """Get database session with context manager"""
@@ -87,6 +175,10 @@ class DatabaseService:
             session.rollback()
             logger.error("operational_error", error=str(e))
             raise DatabaseError("Erro de operação no banco de dados")
+        except InvalidCursor:
+            # Erro do cliente (cursor de paginacao), nao do banco
+            session.rollback()
+            raise
         except Exception as e:
             session.rollback()
             logger.exception("unexpected_db_error", error=str(e))
@@ -117,6 +209,19 @@ class DatabaseService:
                 session.expunge(reading)
             return readings
     
+    def get_readings_page(self, limit: int = 100, cursor: Optional[str] = None, id_sensor: Optional[int] = None) -> Page:
+        """Readings newest first, paginated by (data_hora_leitura, id_leitura) cursor"""
+        with self.get_session() as session:
+            query = session.query(LeituraSensor)
+            if id_sensor is not None:
+                query = query.filter(LeituraSensor.id_sensor == id_sensor)
+            readings, next_cursor = paginate(
+                query, [LeituraSensor.data_hora_leitura, LeituraSensor.id_leitura], cursor, limit
+            )
+            for reading in readings:
+                session.expunge(reading)
+        return Page(readings, next_cursor)
+
     def get_reading_by_id(self, reading_id: int) -> Optional[LeituraSensor]:
         """Get specific reading"""
         with self.get_session() as session:
@@ -163,10 +268,60 @@ class DatabaseService:
         return self.get_readings(limit=limit, offset=0)
 
     # CRUD Operations for Deteccao
+    def _prepare_detection(self, session: Session, data: Dict[str, Any], images: Dict) -> Deteccao:
+        """Fill numeric bbox columns and the image FK from a detection dict."""
+        data = dict(data)
+        origem = data.pop("origem", "upload")
+        box = parse_bbox(data.get("bbox"))
+        if box:
+            data["bbox"] = str(list(box))
+            data["bbox_x1"], data["bbox_y1"], data["bbox_x2"], data["bbox_y2"] = box
+        elif data.get("bbox") is not None and not isinstance(data["bbox"], str):
+            data["bbox"] = str(data["bbox"])
+
+        chave = data.pop("imagem_chave", None) or data.get("imagem_nome")
+        if data.get("id_imagem") is None and chave:
+            key = (chave, origem)
+            if key not in images:
+                images[key] = self._get_or_create_image(session, chave, data.get("imagem_nome") or chave, origem)
+            data["id_imagem"] = images[key]
+        return Deteccao(**data)
+
+    @staticmethod
+    def _get_or_create_image(session: Session, chave: str, nome: str, origem: str) -> int:
+        """
+        Image id for (origem, chave). The insert ignores conflicts so two
+        requests registering the same image concurrently both end up with
+        the row that won.
+        """
+        def lookup():
+            return session.execute(
+                select(ImagemCV.id_imagem).where(ImagemCV.origem == origem, ImagemCV.chave == chave)
+            ).scalar()
+
+        id_imagem = lookup()
+        if id_imagem is not None:
+            return id_imagem
+        values = {"nome_arquivo": nome, "origem": origem, "chave": chave, "data_registro": datetime.utcnow()}
+        dialect = session.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            session.execute(insert(ImagemCV).values(**values).on_conflict_do_nothing(index_elements=["origem", "chave"]))
+        else:
+            try:
+                with session.begin_nested():
+                    session.add(ImagemCV(**values))
+            except IntegrityError:
+                pass
+        return lookup()
+
     def create_detection(self, detection_data: Dict[str, Any]) -> int:
         """Insert new detection"""
         with self.get_session() as session:
-            detection = Deteccao(**detection_data)
+            detection = self._prepare_detection(session, detection_data, {})
             session.add(detection)
             session.flush()
             logger.info("detection_created", detection_id=detection.id_deteccao)
@@ -184,22 +339,107 @@ class DatabaseService:
                 session.expunge(d)
             return detections
 
-    def reset_detections(self) -> int:
-        """Delete all detections to ensure we only serve real inferences."""
+    def get_detections_page(self, limit: int = 100, cursor: Optional[str] = None) -> Page:
+        """Detections newest first, paginated by (timestamp, id_deteccao) cursor"""
+        with self.get_session() as session:
+            detections, next_cursor = paginate(
+                session.query(Deteccao), [Deteccao.timestamp, Deteccao.id_deteccao], cursor, limit
+            )
+            for d in detections:
+                session.expunge(d)
+        return Page(detections, next_cursor)
+
+    def count_detections(self, origem: Optional[str] = None) -> int:
+        """Count stored detections (only those whose image has `origem`, when given)"""
         with self.get_session() as session:
-            deleted = session.query(Deteccao).delete()
-            logger.info("detections_reset", deleted=deleted)
-            return deleted
+            query = session.query(Deteccao)
+            if origem is not None:
+                query = query.join(ImagemCV, Deteccao.id_imagem == ImagemCV.id_imagem).filter(ImagemCV.origem == origem)
+            return query.count()
+
+    def reset_detections(self, origem: Optional[str] = None) -> int:
+        """
+        Delete detections to ensure we only serve real inferences; with `origem`
+        (ex: 'seed') only those whose image came from it, keeping uploads/streams.
+        """
+        with self.get_session() as session:
+            query = session.query(Deteccao)
+            if origem is not None:
+                imagens = select(ImagemCV.id_imagem).where(ImagemCV.origem == origem)
+                query = query.filter(Deteccao.id_imagem.in_(imagens))
+            deleted = query.delete(synchronize_session=False)
+            logger.info("detections_reset", deleted=deleted, origem=origem)
+        # Query.delete nao passa pelos hooks de flush: avisa cache de respostas e overview
+        if deleted:
+            self.notify_changes({Deteccao.__tablename__})
+        return deleted
 
     def bulk_create_detections(self, detections: List[Dict[str, Any]]) -> int:
         """Insert multiple detections efficiently."""
         with self.get_session() as session:
-            objs = [Deteccao(**d) for d in detections]
+            images: Dict = {}
+            objs = [self._prepare_detection(session, d, images) for d in detections]
             session.add_all(objs)
             session.flush()
             logger.info("detections_bulk_created", count=len(objs))
             return len(objs)
 
+    def query_detections(
+        self,
+        classe: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        region: Optional[Sequence[float]] = None,
+        id_imagem: Optional[int] = None,
+        limit: int = 100,
+    ) -> List[Deteccao]:
+        """
+        Filter detections by class, time window and intersecting region
+        (x1, y1, x2, y2 in image coordinates), newest first. Uses the
+        (classe, timestamp) index and the SQLite R-tree when available.
+        """
+        with self.get_session() as session:
+            query = session.query(Deteccao)
+            if classe:
+                query = query.filter(Deteccao.classe == classe)
+            if since:
+                query = query.filter(Deteccao.timestamp >= since)
+            if until:
+                query = query.filter(Deteccao.timestamp <= until)
+            if id_imagem is not None:
+                query = query.filter(Deteccao.id_imagem == id_imagem)
+            if region:
+                box = parse_bbox(region)
+                if box is None:
+                    raise ValueError("region deve ter 4 coordenadas: x1, y1, x2, y2")
+                if self.spatial_index:
+                    query = query.filter(Deteccao.id_deteccao.in_(rtree_region_filter(box)))
+                else:
+                    query = query.filter(
+                        Deteccao.bbox_x2 >= box[0],
+                        Deteccao.bbox_x1 <= box[2],
+                        Deteccao.bbox_y2 >= box[1],
+                        Deteccao.bbox_y1 <= box[3],
+                    )
+            detections = query.order_by(Deteccao.timestamp.desc()).limit(limit).all()
+            for d in detections:
+                session.expunge(d)
+            return detections
+
+    def count_detections_by_class(
+        self, since: Optional[datetime] = None, limit: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """Per-class detection counts (most frequent first), served from the class index."""
+        with self.get_session() as session:
+            count = func.count(Deteccao.classe)
+            query = session.query(Deteccao.classe, count)
+            if since:
+                query = query.filter(Deteccao.timestamp >= since)
+            query = query.group_by(Deteccao.classe).order_by(count.desc())
+            if limit:
+                query = query.limit(limit)
+            return [(classe, int(total)) for classe, total in query.all()]
+
     # CRUD Operations for Alert (Fase 7)
     def create_alert(self, alert_data: Dict[str, Any]) -> int:
         """Create a new alert"""
@@ -235,6 +475,14 @@ class DatabaseService:
             logger.error("get_alerts_failed", error=str(e))
             return []
     
+    def get_alerts_page(self, limit: int = 20, cursor: Optional[str] = None) -> Page:
+        """Alerts newest first, paginated by (data_hora, id) cursor"""
+        with self.get_session() as session:
+            alerts, next_cursor = paginate(session.query(Alert), [Alert.data_hora, Alert.id], cursor, limit)
+            for alert in alerts:
+                session.expunge(alert)
+        return Page(alerts, next_cursor)
+
     def get_alert_by_id(self, alert_id: int) -> Optional[Alert]:
         """Get specific alert"""
         try:
@@ -347,37 +595,22 @@ class DatabaseService:
         Returns:
             List of funcionarios configured to receive this severity level
         """
-        try:
-            with self.get_session() as session:
-                query = session.query(Funcionario).filter(
-                    Funcionario.ativo == True,
-                    Funcionario.recebe_alertas == True
-                )
-
-                # Filtrar por nível de severidade
-                if severidade == 'critica':
-                    query = query.filter(Funcionario.alertas_criticos == True)
-                elif severidade == 'alta':
-                    query = query.filter(Funcionario.alertas_altos == True)
-                elif severidade == 'media':
-                    query = query.filter(Funcionario.alertas_medios == True)
-                elif severidade == 'baixa':
-                    query = query.filter(Funcionario.alertas_baixos == True)
+        return list(self.get_alert_recipients(severidade).funcionarios)
 
-                funcionarios = query.all()
-                for func in funcionarios:
-                    session.expunge(func)
-
-                logger.info("funcionarios_for_alert_retrieved",
-                           severidade=severidade,
-                           count=len(funcionarios))
-                return funcionarios
+    def get_alert_recipients(self, severidade: str) -> AlertRecipients:
+        """
+        Get funcionarios, emails and phones for a severity from the cached routing table
 
+        Returns:
+            AlertRecipients (empty if the table could not be loaded)
+        """
+        try:
+            return self.recipients.resolve(severidade)
         except Exception as e:
             logger.error("get_funcionarios_for_alert_failed",
                         severidade=severidade,
                         error=str(e))
-            return []
+            return AlertRecipients()
 
     def update_funcionario(self, funcionario_id: int, update_data: Dict[str, Any]) -> bool:
         """Update funcionario"""
@@ -410,3 +643,57 @@ class DatabaseService:
         except Exception as e:
             logger.error("delete_funcionario_failed", id=funcionario_id, error=str(e))
             return False
+
+    # ========== REGRAS DE ALERTA (FASE 7) ==========
+
+    def get_regras_alerta(self, apenas_ativas: bool = True) -> List[RegraAlerta]:
+        """Get alert rules ordered by priority"""
+        with self.get_session() as session:
+            query = session.query(RegraAlerta)
+            if apenas_ativas:
+                query = query.filter(RegraAlerta.ativo == True)
+            regras = query.order_by(RegraAlerta.prioridade, RegraAlerta.id_regra).all()
+            for regra in regras:
+                session.expunge(regra)
+            return regras
+
+    def create_regra_alerta(self, regra_data: Dict[str, Any]) -> int:
+        """Create new alert rule"""
+        with self.get_session() as session:
+            regra = RegraAlerta(**regra_data)
+            session.add(regra)
+            session.flush()
+            logger.info("regra_alerta_created", id=regra.id_regra, tipo=regra.tipo_alerta)
+            return regra.id_regra
+
+    def update_regra_alerta(self, id_regra: int, update_data: Dict[str, Any]) -> bool:
+        """Update alert rule; False if not found"""
+        with self.get_session() as session:
+            regra = session.get(RegraAlerta, id_regra)
+            if not regra:
+                return False
+            for key, value in update_data.items():
+                if hasattr(regra, key) and key != "id_regra":
+                    setattr(regra, key, value)
+            logger.info("regra_alerta_updated", id=id_regra)
+            return True
+
+    def delete_regra_alerta(self, id_regra: int) -> bool:
+        """Delete alert rule; False if not found"""
+        with self.get_session() as session:
+            regra = session.get(RegraAlerta, id_regra)
+            if not regra:
+                return False
+            session.delete(regra)
+            logger.info("regra_alerta_deleted", id=id_regra)
+            return True
+
+    def get_sensor_scopes(self) -> Dict[int, Tuple[int, Optional[int]]]:
+        """Map id_sensor -> (id_talhao, id_cultura_atual) used to scope alert rules"""
+        with self.get_session() as session:
+            rows = (
+                session.query(Sensor.id_sensor, Sensor.id_talhao, Talhao.id_cultura_atual)
+                .outerjoin(Talhao, Talhao.id_talhao == Sensor.id_talhao)
+                .all()
+            )
+        return {id_sensor: (id_talhao, id_cultura) for id_sensor, id_talhao, id_cultura in rows}
@@ -2,6 +2,10 @@
 IoT Gateway Service for FarmTech Consolidado
 """
 from .service import IoTGatewayService
-from .irrigation_logic import apply_irrigation_logic
+from .irrigation_logic import IrrigationThresholds, apply_irrigation_logic, apply_irrigation_logic_batch
+from .replay import ReplayScenario, WhatIfReplay
 
-__all__ = ['IoTGatewayService', 'apply_irrigation_logic']
+__all__ = [
+    'IoTGatewayService', 'IrrigationThresholds', 'apply_irrigation_logic', 'apply_irrigation_logic_batch',
+    'ReplayScenario', 'WhatIfReplay',
+]
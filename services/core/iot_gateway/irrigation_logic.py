@@ -2,17 +2,48 @@
 Irrigation Logic from Fase 3
 Implements the 4-priority decision system
 """
-from typing import Tuple
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
 import structlog
 
 logger = structlog.get_logger()
 
 
+@dataclass(frozen=True)
+class IrrigationThresholds:
+    """Limites da logica de irrigacao; os padroes sao os da funcao escalar (Fase 3)"""
+    umidade_emergencia: float = 15.0
+    ph_min_seguro: float = 4.5
+    ph_max_seguro: float = 7.5
+    umidade_alta: float = 30.0
+    umidade_otima: float = 20.0
+    ph_ideal_min: float = 5.5
+    ph_ideal_max: float = 6.5
+
+    @classmethod
+    def from_alert_limits(cls, limits: Dict[str, float]) -> "IrrigationThresholds":
+        """
+        Limites com a emergencia vinda da regra umidade_critica_baixa (mesmo
+        conceito: umidade critica liga a bomba e dispara o alerta). Os demais
+        sao limites de controle da bomba, sem regra de alerta equivalente.
+        """
+        emergencia = limits.get("umidade_critica_baixa")
+        if emergencia is None:
+            return cls()
+        return cls(umidade_emergencia=float(emergencia))
+
+
+DEFAULT_THRESHOLDS = IrrigationThresholds()
+
+
 def apply_irrigation_logic(
     umidade: float,
     ph: float,
     fosforo: bool,
-    potassio: bool
+    potassio: bool,
+    thresholds: IrrigationThresholds = DEFAULT_THRESHOLDS,
 ) -> Tuple[bool, str]:
     """
     Apply irrigation decision logic with 4 priorities
@@ -23,28 +54,32 @@ def apply_irrigation_logic(
     Priority 2: Critical pH (< 4.5 or > 7.5)
     Priority 3: Optimal irrigation (umidade < 20%, pH 5.5-6.5)
     Priority 4: High umidade (> 30%)
+
+    Limits above are the defaults; `thresholds` overrides them (ex: the
+    emergency limit from the umidade_critica_baixa alert rule).
     """
-    
+    t = thresholds
+
     # Priority 1: Emergency - Critical low umidade
-    if umidade < 15.0:
-        decision = "EMERGÊNCIA: Umidade crítica < 15%"
+    if umidade < t.umidade_emergencia:
+        decision = f"EMERGÊNCIA: Umidade crítica < {t.umidade_emergencia:g}%"
         logger.warning("irrigation_emergency", umidade=umidade, decision=decision)
         return True, decision
     
     # Priority 2: Restrictive - Critical pH
-    if ph < 4.5 or ph > 7.5:
-        decision = f"pH CRÍTICO: Fora da faixa segura (4.5-7.5), pH={ph:.2f}"
+    if ph < t.ph_min_seguro or ph > t.ph_max_seguro:
+        decision = f"pH CRÍTICO: Fora da faixa segura ({t.ph_min_seguro:g}-{t.ph_max_seguro:g}), pH={ph:.2f}"
         logger.warning("irrigation_critical_ph", ph=ph, decision=decision)
         return False, decision
     
     # Priority 4: Stop - High umidade
-    if umidade > 30.0:
-        decision = f"Umidade alta > 30%: Irrigação desnecessária, umidade={umidade:.1f}%"
+    if umidade > t.umidade_alta:
+        decision = f"Umidade alta > {t.umidade_alta:g}%: Irrigação desnecessária, umidade={umidade:.1f}%"
         logger.info("irrigation_high_humidity", umidade=umidade)
         return False, decision
     
     # Priority 3: Optimal - Low umidade + good pH
-    if umidade < 20.0 and 5.5 <= ph <= 6.5:
+    if umidade < t.umidade_otima and t.ph_ideal_min <= ph <= t.ph_ideal_max:
         # Modulate intensity based on nutrients
         if fosforo and potassio:
             intensity = "normal"
@@ -66,3 +101,97 @@ def apply_irrigation_logic(
     decision = f"Condições normais: Irrigação não necessária (umidade={umidade:.1f}%, pH={ph:.2f})"
     logger.info("irrigation_normal", umidade=umidade, ph=ph)
     return False, decision
+
+
+# Codigos de decisao da versao em lote (mesma ordem de prioridade da funcao escalar)
+DECISAO_NORMAL = 0
+DECISAO_EMERGENCIA = 1
+DECISAO_PH_CRITICO = 2
+DECISAO_UMIDADE_ALTA = 3
+DECISAO_OTIMIZADA_NORMAL = 4
+DECISAO_OTIMIZADA_REDUZIDA = 5
+DECISAO_OTIMIZADA_MINIMA = 6
+
+_INTENSIDADES = {
+    DECISAO_OTIMIZADA_NORMAL: "normal",
+    DECISAO_OTIMIZADA_REDUZIDA: "reduzida",
+    DECISAO_OTIMIZADA_MINIMA: "mínima",
+}
+
+
+def format_irrigation_decision(
+    code: int, umidade: float, ph: float, thresholds: IrrigationThresholds = DEFAULT_THRESHOLDS
+) -> str:
+    """Texto da decisao para um codigo (identico ao de apply_irrigation_logic com os limites padrao)."""
+    t = thresholds
+    if code == DECISAO_EMERGENCIA:
+        return f"EMERGÊNCIA: Umidade crítica < {t.umidade_emergencia:g}%"
+    if code == DECISAO_PH_CRITICO:
+        return f"pH CRÍTICO: Fora da faixa segura ({t.ph_min_seguro:g}-{t.ph_max_seguro:g}), pH={ph:.2f}"
+    if code == DECISAO_UMIDADE_ALTA:
+        return f"Umidade alta > {t.umidade_alta:g}%: Irrigação desnecessária, umidade={umidade:.1f}%"
+    if code in _INTENSIDADES:
+        return f"Irrigação otimizada: pH ideal ({ph:.2f}), intensidade {_INTENSIDADES[code]}"
+    return f"Condições normais: Irrigação não necessária (umidade={umidade:.1f}%, pH={ph:.2f})"
+
+
+@dataclass
+class IrrigationBatch:
+    """Resultado em lote: flags da bomba e codigos; textos so sao montados quando pedidos"""
+    bomba_ligada: np.ndarray
+    codes: np.ndarray
+    umidade: np.ndarray
+    ph: np.ndarray
+    thresholds: IrrigationThresholds = DEFAULT_THRESHOLDS
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def decision(self, i: int) -> str:
+        return format_irrigation_decision(
+            int(self.codes[i]), float(self.umidade[i]), float(self.ph[i]), self.thresholds
+        )
+
+    def decisions(self) -> List[str]:
+        return [self.decision(i) for i in range(len(self))]
+
+    def counts(self) -> Dict[int, int]:
+        codes, counts = np.unique(self.codes, return_counts=True)
+        return dict(zip(codes.tolist(), counts.tolist()))
+
+
+def apply_irrigation_logic_batch(
+    umidade, ph, fosforo, potassio, thresholds: IrrigationThresholds = DEFAULT_THRESHOLDS
+) -> IrrigationBatch:
+    """
+    Versao vetorizada de apply_irrigation_logic para replay/avaliacao de historico.
+    Recebe arrays (ou sequencias) de mesmo tamanho e devolve o mesmo resultado
+    da funcao escalar leitura a leitura, com um unico evento de log por lote.
+    `thresholds` permite simular limites alternativos (what-if).
+    """
+    t = thresholds
+    umidade = np.asarray(umidade, dtype=float)
+    ph = np.asarray(ph, dtype=float)
+    fosforo = np.asarray(fosforo).astype(bool)
+    potassio = np.asarray(potassio).astype(bool)
+
+    emergencia = umidade < t.umidade_emergencia
+    ph_critico = (ph < t.ph_min_seguro) | (ph > t.ph_max_seguro)
+    umidade_alta = umidade > t.umidade_alta
+    otimizada = (umidade < t.umidade_otima) & (ph >= t.ph_ideal_min) & (ph <= t.ph_ideal_max)
+
+    intensidade = np.where(
+        fosforo & potassio,
+        DECISAO_OTIMIZADA_NORMAL,
+        np.where(fosforo | potassio, DECISAO_OTIMIZADA_REDUZIDA, DECISAO_OTIMIZADA_MINIMA),
+    )
+    codes = np.select(
+        [emergencia, ph_critico, umidade_alta, otimizada],
+        [DECISAO_EMERGENCIA, DECISAO_PH_CRITICO, DECISAO_UMIDADE_ALTA, intensidade],
+        default=DECISAO_NORMAL,
+    ).astype(np.int8)
+    bomba_ligada = (codes == DECISAO_EMERGENCIA) | (codes >= DECISAO_OTIMIZADA_NORMAL)
+
+    batch = IrrigationBatch(bomba_ligada=bomba_ligada, codes=codes, umidade=umidade, ph=ph, thresholds=t)
+    logger.debug("irrigation_batch", readings=len(batch), bomba_ligada=int(bomba_ligada.sum()))
+    return batch
@@ -0,0 +1,391 @@
+"""
+Replay what-if de historico - Fase 7
+Reprocessa leituras_sensores armazenadas com limites alternativos de irrigacao
+e de alertas ("e se a emergencia fosse 18% em vez de 15% na ultima safra?").
+As leituras sao lidas em blocos por sensor (paginacao por chave), os sensores
+rodam em paralelo e o kernel vetorizado avalia baseline e cenario sobre o
+mesmo bloco. Como na ingestao, a emergencia da bomba de cada sensor vem da
+regra umidade_critica_baixa do seu escopo (com os limites_alerta do cenario).
+Resultados ficam em cache por (versao das regras, periodo, carimbo dos dados).
+"""
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+from sqlalchemy import and_, func, or_, select
+
+from services.core.alerts.rules import NO_SCOPE, AlertRule, CompiledRules
+from services.core.database.models import LeituraSensor
+
+from .irrigation_logic import (
+    DEFAULT_THRESHOLDS,
+    DECISAO_EMERGENCIA,
+    DECISAO_NORMAL,
+    DECISAO_OTIMIZADA_MINIMA,
+    DECISAO_OTIMIZADA_NORMAL,
+    DECISAO_OTIMIZADA_REDUZIDA,
+    DECISAO_PH_CRITICO,
+    DECISAO_UMIDADE_ALTA,
+    IrrigationThresholds,
+    apply_irrigation_logic_batch,
+)
+
+logger = structlog.get_logger()
+
+DECISAO_NOMES = {
+    DECISAO_NORMAL: "normal",
+    DECISAO_EMERGENCIA: "emergencia",
+    DECISAO_PH_CRITICO: "ph_critico",
+    DECISAO_UMIDADE_ALTA: "umidade_alta",
+    DECISAO_OTIMIZADA_NORMAL: "otimizada_normal",
+    DECISAO_OTIMIZADA_REDUZIDA: "otimizada_reduzida",
+    DECISAO_OTIMIZADA_MINIMA: "otimizada_minima",
+}
+
+_COLUMNS = (
+    LeituraSensor.id_leitura,
+    LeituraSensor.data_hora_leitura,
+    LeituraSensor.valor_umidade,
+    LeituraSensor.valor_ph,
+    LeituraSensor.valor_fosforo_p,
+    LeituraSensor.valor_potassio_k,
+    LeituraSensor.temperatura,
+)
+
+
+@dataclass
+class ReplayScenario:
+    """
+    Limites a simular e parametros de custo da bomba. Sem `thresholds`, os
+    limites de irrigacao sao os da ingestao (emergencia = umidade_critica_baixa
+    efetiva do sensor) com `irrigation_limits` por cima.
+    """
+    thresholds: Optional[IrrigationThresholds] = None
+    alert_limits: Dict[str, float] = field(default_factory=dict)  # tipo_alerta -> novo limite
+    irrigation_limits: Dict[str, float] = field(default_factory=dict)  # campo de IrrigationThresholds -> valor
+    vazao_lph: float = 1000.0
+    custo_agua_m3: float = 5.0
+    custo_energia_hora: float = 1.0
+
+    def cache_key(self) -> str:
+        return json.dumps(asdict(self), sort_keys=True)
+
+    def thresholds_for(self, limits: Dict[str, float]) -> IrrigationThresholds:
+        """Limites de irrigacao para um sensor, dados os limites de alerta efetivos no seu escopo."""
+        if self.thresholds is not None:
+            return self.thresholds
+        return replace(IrrigationThresholds.from_alert_limits(limits), **self.irrigation_limits)
+
+
+@dataclass
+class _Chunk:
+    """Bloco de leituras de um sensor em arrays"""
+    ids: np.ndarray
+    seconds: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class _Accumulator:
+    """Totais de um cenario para um sensor; carrega o estado entre blocos"""
+
+    def __init__(self, rules: CompiledRules, thresholds: IrrigationThresholds = DEFAULT_THRESHOLDS):
+        self.rules = rules
+        self.thresholds = thresholds
+        self.leituras = 0
+        self.segundos_bomba = 0.0
+        self.acionamentos = 0
+        self.decisoes: Counter = Counter()
+        self.alertas: Counter = Counter()
+        self._last_second: Optional[float] = None
+        self._last_pump = False
+        self._alert_state = np.zeros(len(rules), dtype=bool)
+
+    def add(self, chunk: _Chunk, scenario: ReplayScenario, scope: Tuple[int, int], max_gap: float) -> None:
+        batch = apply_irrigation_logic_batch(
+            chunk.columns["umidade"], chunk.columns["ph"],
+            chunk.columns["fosforo"], chunk.columns["potassio"], self.thresholds,
+        )
+        pump = batch.bomba_ligada
+        self.leituras += len(chunk)
+        for code, count in batch.counts().items():
+            self.decisoes[DECISAO_NOMES[code]] += count
+
+        # Bomba fica no estado da leitura ate a proxima (lacunas limitadas a max_gap)
+        seconds = chunk.seconds
+        previous_pump = np.concatenate(([self._last_pump], pump[:-1]))
+        if self._last_second is None:
+            gaps = np.diff(seconds, prepend=seconds[0])
+        else:
+            gaps = np.diff(seconds, prepend=self._last_second)
+        self.segundos_bomba += float(np.minimum(gaps, max_gap)[previous_pump].sum())
+        self.acionamentos += int((pump & ~previous_pump).sum())
+        self._last_second, self._last_pump = float(seconds[-1]), bool(pump[-1])
+
+        if len(self.rules):
+            self._count_alerts(chunk, scope)
+
+    def _count_alerts(self, chunk: _Chunk, scope: Tuple[int, int]) -> None:
+        rules = self.rules
+        values = np.column_stack([chunk.columns.get(m, np.full(len(chunk), np.nan)) for m in rules.metrics])
+        n = len(chunk)
+        triggered = rules.evaluate(values, np.full(n, scope[0]), np.full(n, scope[1]))
+        cleared = rules.cleared(values)
+
+        # Histerese vetorizada: estado = ultimo evento (disparo/normalizacao) ate a leitura
+        events = np.where(triggered, 1, np.where(cleared, 0, -1))
+        events = np.vstack([self._alert_state.astype(int)[None, :], events])
+        last_event = np.where(events >= 0, np.arange(n + 1)[:, None], 0)
+        np.maximum.accumulate(last_event, axis=0, out=last_event)
+        state = np.take_along_axis(events, last_event, axis=0).astype(bool)
+
+        opened = (state[1:] & ~state[:-1]).sum(axis=0)
+        for j in np.flatnonzero(opened):
+            self.alertas[rules.rules[j].alert_type] += int(opened[j])
+        self._alert_state = state[-1]
+
+    def totals(self, scenario: ReplayScenario) -> Dict:
+        horas = self.segundos_bomba / 3600
+        return _totals(self.leituras, horas, self.acionamentos, self.decisoes, self.alertas, scenario)
+
+
+def _totals(leituras, horas, acionamentos, decisoes, alertas, scenario: ReplayScenario) -> Dict:
+    agua_m3 = horas * scenario.vazao_lph / 1000
+    return {
+        "leituras": leituras,
+        "horas_bomba": round(horas, 3),
+        "acionamentos": acionamentos,
+        "agua_m3": round(agua_m3, 3),
+        "custo": round(agua_m3 * scenario.custo_agua_m3 + horas * scenario.custo_energia_hora, 2),
+        "alertas": dict(alertas),
+        "total_alertas": sum(alertas.values()),
+        "decisoes": dict(decisoes),
+    }
+
+
+class WhatIfReplay:
+    """Compara baseline x cenario sobre o historico de leituras, com cache LRU de resultados"""
+
+    VERSION_KEYS = ("regras_alerta", "sensores", "talhoes")
+
+    def __init__(
+        self,
+        db_service,
+        rule_engine=None,
+        chunk_size: int = 5000,
+        max_workers: int = 4,
+        cache_size: int = 32,
+        max_gap_minutes: float = 60.0,
+    ):
+        self.db = db_service
+        self.rule_engine = rule_engine
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self.max_gap = max_gap_minutes * 60
+        self._cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Correcoes de valores (sem nova leitura) chegam pelos hooks de alteracao
+        self._data_generation = 0
+        self.counters = {"runs": 0, "cache_hits": 0, "readings_replayed": 0}
+        db_service.add_change_listener(self._on_change)
+
+    @classmethod
+    def from_env(cls, db_service, rule_engine=None) -> "WhatIfReplay":
+        import os
+
+        return cls(
+            db_service,
+            rule_engine,
+            chunk_size=int(os.getenv("WHATIF_REPLAY_CHUNK", 5000)),
+            max_workers=int(os.getenv("WHATIF_REPLAY_WORKERS", 4)),
+            cache_size=int(os.getenv("WHATIF_CACHE_SIZE", 32)),
+            max_gap_minutes=float(os.getenv("WHATIF_MAX_GAP_MINUTES", 60)),
+        )
+
+    def _on_change(self, tables) -> None:
+        if LeituraSensor.__tablename__ in tables:
+            with self._lock:
+                self._data_generation += 1
+
+    # ---------- Regras ----------
+    def base_rules(self) -> List[AlertRule]:
+        if self.rule_engine is not None:
+            return list(self.rule_engine.compiled().rules)
+        from services.core.alerts.service import AlertsService
+
+        return [AlertRule(**asdict(c)) for c in AlertsService.default_conditions()]
+
+    def compile_rules(self, scenario: ReplayScenario) -> CompiledRules:
+        unknown = set(scenario.alert_limits) - {r.alert_type for r in self.base_rules()}
+        if unknown:
+            raise ValueError(f"tipos de alerta desconhecidos: {sorted(unknown)}")
+        return CompiledRules([
+            replace(r, threshold=float(scenario.alert_limits[r.alert_type]))
+            if r.alert_type in scenario.alert_limits else r
+            for r in self.base_rules()
+        ])
+
+    # ---------- Execucao ----------
+    def compare(
+        self,
+        baseline: ReplayScenario,
+        scenario: ReplayScenario,
+        inicio: datetime,
+        fim: datetime,
+        sensor_ids: Optional[Sequence[int]] = None,
+    ) -> Dict:
+        """Replay de [inicio, fim) para baseline e cenario; devolve totais, deltas e resultado por sensor."""
+        started = time.perf_counter()
+        sensors = sorted(sensor_ids) if sensor_ids else self._sensors_with_readings(inicio, fim)
+        key = (
+            tuple(sorted(self.db.get_config_versions(self.VERSION_KEYS).items())),
+            self._data_stamp(inicio, fim, sensors),
+            inicio, fim, tuple(sensors),
+            baseline.cache_key(), scenario.cache_key(),
+        )
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+                return {**cached, "cached": True}
+
+        scenarios = (baseline, scenario)
+        compiled = [self.compile_rules(s) for s in scenarios]
+        scopes = self.db.get_sensor_scopes()
+
+        def run_sensor(id_sensor: int) -> List[_Accumulator]:
+            talhao, cultura = scopes.get(id_sensor, (None, None))
+            scope = (NO_SCOPE if talhao is None else talhao, NO_SCOPE if cultura is None else cultura)
+            accumulators = [
+                _Accumulator(rules, s.thresholds_for(rules.limits_for(*scope)))
+                for rules, s in zip(compiled, scenarios)
+            ]
+            for chunk in self._iter_chunks(id_sensor, inicio, fim):
+                for acc, s in zip(accumulators, scenarios):
+                    acc.add(chunk, s, scope, self.max_gap)
+            return accumulators
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(sensors) or 1))) as pool:
+            per_sensor = dict(zip(sensors, pool.map(run_sensor, sensors)))
+
+        result = self._report(per_sensor, scenarios, inicio, fim)
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        with self._lock:
+            self.counters["runs"] += 1
+            self.counters["readings_replayed"] += result["leituras"]
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        logger.info("whatif_replay_done", sensors=len(sensors), leituras=result["leituras"],
+                    elapsed_ms=result["elapsed_ms"])
+        return {**result, "cached": False}
+
+    def _report(self, per_sensor: Dict[int, List[_Accumulator]], scenarios, inicio, fim) -> Dict:
+        totals = []
+        for index, s in enumerate(scenarios):
+            accs = [accs[index] for accs in per_sensor.values()]
+            totals.append(_totals(
+                sum(a.leituras for a in accs),
+                sum(a.segundos_bomba for a in accs) / 3600,
+                sum(a.acionamentos for a in accs),
+                sum((a.decisoes for a in accs), Counter()),
+                sum((a.alertas for a in accs), Counter()),
+                s,
+            ))
+        base, cenario = totals
+        tipos = sorted(set(base["alertas"]) | set(cenario["alertas"]))
+        return {
+            "periodo": {"inicio": inicio.isoformat(), "fim": fim.isoformat()},
+            "sensores": len(per_sensor),
+            "leituras": base["leituras"],
+            "baseline": base,
+            "cenario": cenario,
+            "delta": {
+                "horas_bomba": round(cenario["horas_bomba"] - base["horas_bomba"], 3),
+                "acionamentos": cenario["acionamentos"] - base["acionamentos"],
+                "agua_m3": round(cenario["agua_m3"] - base["agua_m3"], 3),
+                "custo": round(cenario["custo"] - base["custo"], 2),
+                "alertas": {t: cenario["alertas"].get(t, 0) - base["alertas"].get(t, 0) for t in tipos},
+                "total_alertas": cenario["total_alertas"] - base["total_alertas"],
+            },
+            "por_sensor": {
+                id_sensor: {"baseline": accs[0].totals(scenarios[0]), "cenario": accs[1].totals(scenarios[1])}
+                for id_sensor, accs in per_sensor.items()
+            },
+        }
+
+    # ---------- Leitura ----------
+    def _range_filter(self, inicio: datetime, fim: datetime):
+        return and_(LeituraSensor.data_hora_leitura >= inicio, LeituraSensor.data_hora_leitura < fim)
+
+    def _sensors_with_readings(self, inicio: datetime, fim: datetime) -> List[int]:
+        stmt = select(LeituraSensor.id_sensor).where(self._range_filter(inicio, fim)).distinct()
+        with self.db.get_session() as session:
+            return sorted(row[0] for row in session.execute(stmt))
+
+    def _data_stamp(self, inicio: datetime, fim: datetime, sensors: Sequence[int]) -> Tuple:
+        # Leituras novas: contagem e maior id no periodo (indice de data_hora_leitura).
+        # Correcoes de valores: geracao incrementada pelos hooks de alteracao
+        stmt = select(func.count(), func.max(LeituraSensor.id_leitura)).where(
+            self._range_filter(inicio, fim), LeituraSensor.id_sensor.in_(list(sensors))
+        )
+        with self.db.get_session() as session:
+            count, max_id = session.execute(stmt).one()
+        return count, max_id, self._data_generation
+
+    def _iter_chunks(self, id_sensor: int, inicio: datetime, fim: datetime) -> Iterator[_Chunk]:
+        """Leituras do sensor em ordem temporal, em blocos de chunk_size (paginacao por chave)."""
+        after: Optional[Tuple[datetime, int]] = None
+        while True:
+            stmt = select(*_COLUMNS).where(LeituraSensor.id_sensor == id_sensor, self._range_filter(inicio, fim))
+            if after is not None:
+                stmt = stmt.where(or_(
+                    LeituraSensor.data_hora_leitura > after[0],
+                    and_(LeituraSensor.data_hora_leitura == after[0], LeituraSensor.id_leitura > after[1]),
+                ))
+            stmt = stmt.order_by(LeituraSensor.data_hora_leitura, LeituraSensor.id_leitura).limit(self.chunk_size)
+            with self.db.get_session() as session:
+                rows = session.execute(stmt).all()
+            if not rows:
+                return
+            yield _to_chunk(rows)
+            if len(rows) < self.chunk_size:
+                return
+            after = (rows[-1][1], rows[-1][0])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "cached_results": len(self._cache)}
+
+
+def _float_column(values) -> np.ndarray:
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=float)
+
+
+def _to_chunk(rows) -> _Chunk:
+    ids, timestamps, umidade, ph, fosforo, potassio, temperatura = zip(*rows)
+    seconds = np.array(timestamps, dtype="datetime64[us]").astype(np.int64) / 1e6
+    return _Chunk(
+        ids=np.array(ids, dtype=np.int64),
+        seconds=seconds,
+        columns={
+            "umidade": _float_column(umidade),
+            "ph": _float_column(ph),
+            # Mesma convencao da ingestao: nutriente ausente/nulo conta como False
+            "fosforo": np.nan_to_num(_float_column(fosforo)) > 0,
+            "potassio": np.nan_to_num(_float_column(potassio)) > 0,
+            "temperatura": _float_column(temperatura),
+        },
+    )
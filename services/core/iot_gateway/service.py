@@ -7,7 +7,8 @@ import structlog
 import requests
 
 from ..database.service import DatabaseService
-from .irrigation_logic import apply_irrigation_logic
+from ..alerts.rules import effective_limits
+from .irrigation_logic import IrrigationThresholds, apply_irrigation_logic
 
 logger = structlog.get_logger()
 
@@ -15,16 +16,22 @@ logger = structlog.get_logger()
 class IoTGatewayService:
     """Handles IoT device communication, data ingestion and automated alerts"""
 
-    def __init__(self, db_service: DatabaseService, aws_service=None, alerts_service=None):
+    def __init__(
+        self, db_service: DatabaseService, aws_service=None, alerts_service=None, anomaly_detector=None,
+        rule_engine=None,
+    ):
         """Initialize IoT Gateway Service"""
         self.db = db_service
         self.aws = aws_service
         self.alerts = alerts_service
+        self.anomaly_detector = anomaly_detector
+        # Com rule_engine, limites de alerta e emergencia de irrigacao vem de regras_alerta
+        self.rule_engine = rule_engine
         import os
         self.topic_arn = os.getenv("AWS_SNS_TOPIC_ARN", "")
         logger.info("iot_gateway_service_initialized")
     
-    def ingest_reading(self, reading_data: Dict) -> int:
+    def ingest_reading(self, reading_data: Dict, alerts_service=None) -> int:
         """
         Process and store sensor reading
         
@@ -34,20 +41,29 @@ class IoTGatewayService:
         3. Store in database
         4. Check for alerts
         5. Return reading ID
+
+        `alerts_service` overrides the instance one (per-request AlertsService
+        bound to the request's session when the gateway is shared by the app).
         """
+        alerts_service = alerts_service or self.alerts
         try:
             # Extract sensor values
             umidade = reading_data.get('umidade')
             ph = reading_data.get('ph_estimado')
             fosforo = reading_data.get('fosforo_presente', False)
             potassio = reading_data.get('potassio_presente', False)
+            temperatura = reading_data.get('temperatura')
+            id_sensor = reading_data.get('id_sensor', 1)
             
             # Apply irrigation logic
             bomba_ligada, decisao = apply_irrigation_logic(
                 umidade=umidade,
                 ph=ph,
                 fosforo=fosforo,
-                potassio=potassio
+                potassio=potassio,
+                thresholds=IrrigationThresholds.from_alert_limits(
+                    effective_limits(self.rule_engine, {'id_sensor': id_sensor})
+                ),
             )
             
             # Prepare data for storage
@@ -61,12 +77,12 @@ class IoTGatewayService:
 
             storage_data = {
                 'data_hora_leitura': ts,
-                'id_sensor': reading_data.get('id_sensor', 1),
+                'id_sensor': id_sensor,
                 'valor_umidade': umidade,
                 'valor_ph': ph,
                 'valor_fosforo_p': 1.0 if fosforo else 0.0,
                 'valor_potassio_k': 1.0 if potassio else 0.0,
-                'temperatura': reading_data.get('temperatura'),
+                'temperatura': temperatura,
                 'precipitacao_mm': reading_data.get('precipitacao') or reading_data.get('precipitacao_mm'),
                 'bomba_ligada': bomba_ligada,
                 'decisao_logica_esp32': decisao
@@ -76,9 +92,11 @@ class IoTGatewayService:
             reading_id = self.db.create_reading(storage_data)
 
             # ========== FASE 7: Enviar alertas automáticos via AlertsService ==========
-            if self.alerts:
+            if alerts_service:
                 try:
-                    alert_result = self.alerts.send_iot_alert({
+                    alert_result = alerts_service.send_iot_alert({
+                        'id_sensor': storage_data['id_sensor'],
+                        'timestamp': ts,
                         'umidade': umidade,
                         'ph': ph,
                         'temperatura': temperatura,
@@ -94,9 +112,19 @@ class IoTGatewayService:
                 except Exception as e:
                     logger.error("iot_alert_send_failed", error=str(e), reading_id=reading_id)
 
+            # Falhas de sensor (travado, sem variacao, pico) pelo detector online
+            if self.anomaly_detector:
+                try:
+                    leitura = {'umidade': umidade, 'ph': ph, 'temperatura': temperatura}
+                    for anomaly in self.anomaly_detector.update(storage_data['id_sensor'], leitura, ts):
+                        if alerts_service:
+                            alerts_service.send_sensor_anomaly(anomaly, {**leitura, 'reading_id': reading_id})
+                except Exception as e:
+                    logger.error("sensor_anomaly_check_failed", error=str(e), reading_id=reading_id)
+
             # Check for legacy alerts (backward compatibility)
-            alerts = self.check_alerts(umidade, ph, bomba_ligada)
-            if alerts and self.aws and not self.alerts:
+            alerts = self.check_alerts(umidade, ph, bomba_ligada, id_sensor=id_sensor)
+            if alerts and self.aws and not alerts_service:
                 for alert in alerts:
                     self._send_alert(alert)
 
@@ -111,8 +139,20 @@ class IoTGatewayService:
             logger.exception("reading_ingestion_failed", error=str(e))
             raise
     
-    def check_alerts(self, umidade: float, ph: float, bomba_ligada: bool) -> List[Dict]:
-        """Check if reading triggers any alerts"""
+    def check_alerts(self, umidade: float, ph: float, bomba_ligada: bool, id_sensor=None) -> List[Dict]:
+        """Check if reading triggers any alerts (rules from regras_alerta when a rule engine is set)"""
+        if self.rule_engine:
+            leitura = {'id_sensor': id_sensor, 'umidade': umidade, 'ph': ph}
+            return [
+                {
+                    "title": rule.titulo,
+                    "message": rule.render(leitura[rule.metric]),
+                    "severity": rule.severidade,
+                    "source": "fase3",
+                }
+                for rule in self.rule_engine.evaluate(leitura)
+            ]
+
         alerts = []
         
         # Emergency alert: umidade < 15%
@@ -1,3 +1,4 @@
 """Weather API Integration"""
 from .cptec_client import CPTECClient
-__all__ = ['CPTECClient']
+from .service import WeatherService, WeatherSnapshot
+__all__ = ['CPTECClient', 'WeatherService', 'WeatherSnapshot']
@@ -1,39 +1,73 @@
 """CPTEC/INPE Weather API Client - Fase 1"""
 import requests
 import xml.etree.ElementTree as ET
-from typing import Dict, List
+from typing import Dict, Optional
 import structlog
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = structlog.get_logger()
 
+CPTEC_BASE_URL = "http://servicos.cptec.inpe.br/XML/cidade/{code}/previsao.xml"
+DEFAULT_CITY_CODE = "241"
+
+
+def build_session(pool_size: int = 4, retries: int = 2) -> requests.Session:
+    """Sessao HTTP com pool de conexoes keep-alive e retry com backoff para 5xx."""
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def parse_forecast(content: bytes) -> Dict:
+    """Cidade, UF e previsoes do XML de previsao do CPTEC."""
+    root = ET.fromstring(content)
+
+    city = root.find('.//nome').text if root.find('.//nome') is not None else "Unknown"
+    state = root.find('.//uf').text if root.find('.//uf') is not None else "Unknown"
+
+    forecasts = []
+    for previsao in root.findall('.//previsao'):
+        forecasts.append({
+            "dia": previsao.find('dia').text if previsao.find('dia') is not None else "",
+            "tempo": previsao.find('tempo').text if previsao.find('tempo') is not None else "",
+            "maxima": previsao.find('maxima').text if previsao.find('maxima') is not None else "",
+            "minima": previsao.find('minima').text if previsao.find('minima') is not None else ""
+        })
+    return {"city": city, "state": state, "forecasts": forecasts}
+
+
 class CPTECClient:
     """Client for CPTEC/INPE Weather API"""
-    
-    def __init__(self, api_url: str = "http://servicos.cptec.inpe.br/XML/cidade/241/previsao.xml"):
-        self.api_url = api_url
-    
+
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        base_url: str = CPTEC_BASE_URL,
+        session: Optional[requests.Session] = None,
+        timeout: float = 10.0,
+    ):
+        self.api_url = api_url or base_url.format(code=DEFAULT_CITY_CODE)
+        self.base_url = base_url
+        self.session = session or build_session()
+        self.timeout = timeout
+
+    def fetch(self, city_code: Optional[str] = None) -> Dict:
+        """Busca e interpreta a previsao de uma cidade; erros de rede/XML sobem para o chamador."""
+        url = self.base_url.format(code=city_code) if city_code else self.api_url
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        data = parse_forecast(response.content)
+        logger.info("weather_data_fetched", city=data["city"], forecasts=len(data["forecasts"]))
+        return data
+
     def get_weather_data(self) -> Dict:
         """Fetch weather data from CPTEC API"""
         try:
-            response = requests.get(self.api_url, timeout=10)
-            response.raise_for_status()
-            
-            root = ET.fromstring(response.content)
-            
-            city = root.find('.//nome').text if root.find('.//nome') is not None else "Unknown"
-            state = root.find('.//uf').text if root.find('.//uf') is not None else "Unknown"
-            
-            forecasts = []
-            for previsao in root.findall('.//previsao'):
-                forecasts.append({
-                    "dia": previsao.find('dia').text if previsao.find('dia') is not None else "",
-                    "tempo": previsao.find('tempo').text if previsao.find('tempo') is not None else "",
-                    "maxima": previsao.find('maxima').text if previsao.find('maxima') is not None else "",
-                    "minima": previsao.find('minima').text if previsao.find('minima') is not None else ""
-                })
-            
-            logger.info("weather_data_fetched", city=city, forecasts=len(forecasts))
-            return {"city": city, "state": state, "forecasts": forecasts}
+            return self.fetch()
         except Exception as e:
             logger.error("weather_fetch_failed", error=str(e))
             return {"error": str(e)}
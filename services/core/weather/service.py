@@ -0,0 +1,215 @@
+"""
+Previsao do tempo em segundo plano - Fase 7
+O CPTEC era consultado dentro de /api/analytics/overview (requests.get
+bloqueante, timeout de 10s, sem sessao). Aqui um thread atualiza as previsoes
+das cidades configuradas em intervalo fixo, com sessao HTTP reutilizada, e as
+rotas leem o ultimo snapshot bom da memoria - nunca a rede. O snapshot vai
+para disco a cada atualizacao, entao um restart com o INPE fora do ar ainda
+responde, marcado como desatualizado (stale).
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from .cptec_client import DEFAULT_CITY_CODE, CPTECClient, build_session
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class WeatherSnapshot:
+    """Ultima previsao obtida para uma cidade e o estado da ultima tentativa"""
+    city_code: str
+    data: Optional[Dict] = None
+    fetched_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    last_attempt: Optional[datetime] = None
+    failures: int = 0
+
+    def to_payload(self, stale_after: float, now: Optional[datetime] = None) -> Dict:
+        now = now or datetime.utcnow()
+        age = (now - self.fetched_at).total_seconds() if self.fetched_at else None
+        payload = dict(self.data) if self.data else {"error": "weather_unavailable"}
+        payload.update({
+            "city_code": self.city_code,
+            "fetched_at": self.fetched_at.isoformat() if self.fetched_at else None,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": age is None or age > stale_after,
+            "last_error": self.last_error,
+        })
+        return payload
+
+
+class WeatherService:
+    """Atualiza previsoes do CPTEC em segundo plano e serve o ultimo snapshot bom"""
+
+    def __init__(
+        self,
+        client: Optional[CPTECClient] = None,
+        city_codes: Sequence[str] = (DEFAULT_CITY_CODE,),
+        refresh_interval: float = 900.0,
+        stale_after: float = 3600.0,
+        snapshot_path: Optional[Path] = None,
+        max_workers: int = 4,
+    ):
+        self.client = client or CPTECClient(session=build_session(pool_size=max_workers))
+        self.city_codes = [str(c) for c in city_codes]
+        self.refresh_interval = refresh_interval
+        self.stale_after = stale_after
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.max_workers = max_workers
+        self._snapshots: Dict[str, WeatherSnapshot] = {c: WeatherSnapshot(c) for c in self.city_codes}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self.counters = {"refreshes": 0, "fetches": 0, "failures": 0}
+
+    @classmethod
+    def from_env(cls) -> "WeatherService":
+        codes = [c.strip() for c in os.getenv("WEATHER_CITY_CODES", DEFAULT_CITY_CODE).split(",") if c.strip()]
+        timeout = float(os.getenv("WEATHER_TIMEOUT_SECONDS", 5))
+        base_url = os.getenv("CPTEC_BASE_URL")
+        client = CPTECClient(
+            session=build_session(pool_size=min(len(codes), 8) or 1),
+            timeout=timeout,
+            **({"base_url": base_url} if base_url else {}),
+        )
+        snapshot = os.getenv("WEATHER_SNAPSHOT_PATH", "./models/.weather_snapshot.json")
+        return cls(
+            client,
+            city_codes=codes,
+            refresh_interval=float(os.getenv("WEATHER_REFRESH_SECONDS", 900)),
+            stale_after=float(os.getenv("WEATHER_STALE_SECONDS", 3600)),
+            snapshot_path=Path(snapshot) if snapshot else None,
+        )
+
+    # ---------- Snapshot em disco ----------
+    def load(self) -> int:
+        """Carrega o ultimo snapshot gravado; devolve quantas cidades tinham previsao."""
+        if not self.snapshot_path or not self.snapshot_path.exists():
+            return 0
+        try:
+            stored = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning("weather_snapshot_unreadable", path=str(self.snapshot_path), error=str(e))
+            return 0
+        loaded = 0
+        with self._lock:
+            for code, item in stored.items():
+                if code not in self._snapshots or not item.get("data"):
+                    continue
+                self._snapshots[code].data = item["data"]
+                self._snapshots[code].fetched_at = datetime.fromisoformat(item["fetched_at"])
+                loaded += 1
+        logger.info("weather_snapshot_loaded", cities=loaded)
+        return loaded
+
+    def _save(self) -> None:
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            stored = {
+                code: {"data": s.data, "fetched_at": s.fetched_at.isoformat()}
+                for code, s in self._snapshots.items()
+                if s.data and s.fetched_at
+            }
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(stored, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            logger.warning("weather_snapshot_save_failed", path=str(self.snapshot_path), error=str(e))
+
+    # ---------- Atualizacao ----------
+    def _refresh_city(self, code: str) -> bool:
+        now = datetime.utcnow()
+        try:
+            data = self.client.fetch(code)
+        except Exception as e:
+            with self._lock:
+                snapshot = self._snapshots[code]
+                snapshot.last_error, snapshot.last_attempt = str(e), now
+                snapshot.failures += 1
+                self.counters["failures"] += 1
+            logger.warning("weather_refresh_failed", city_code=code, error=str(e))
+            return False
+        with self._lock:
+            snapshot = self._snapshots[code]
+            snapshot.data, snapshot.fetched_at, snapshot.last_attempt = data, now, now
+            snapshot.last_error, snapshot.failures = None, 0
+            self.counters["fetches"] += 1
+        return True
+
+    def add_refresh_listener(self, listener: Callable[[List[str]], None]) -> None:
+        """Registra callback chamado com as cidades atualizadas ao fim de cada refresh."""
+        self._listeners.append(listener)
+
+    def refresh(self) -> int:
+        """Atualiza todas as cidades em paralelo; devolve quantas deram certo."""
+        workers = max(1, min(self.max_workers, len(self.city_codes)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="weather") as pool:
+            results = list(pool.map(self._refresh_city, self.city_codes))
+        self.counters["refreshes"] += 1
+        updated = [code for code, ok in zip(self.city_codes, results) if ok]
+        if updated:
+            self._save()
+        for listener in self._listeners:
+            try:
+                listener(updated)
+            except Exception as e:
+                logger.error("weather_refresh_listener_failed", error=str(e))
+        return len(updated)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("weather_refresh_loop_failed", error=str(e))
+            self._stop.wait(self.refresh_interval)
+
+    def start(self) -> "WeatherService":
+        self._thread = threading.Thread(target=self._loop, name="weather-refresh", daemon=True)
+        self._thread.start()
+        logger.info("weather_service_started", cities=self.city_codes, interval=self.refresh_interval)
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        logger.info("weather_service_stopped", **self.counters)
+
+    # ---------- Consulta ----------
+    def get(self, city_code: Optional[str] = None) -> Dict:
+        """Ultima previsao boa da cidade (padrao: a primeira configurada), sem acessar a rede."""
+        code = str(city_code) if city_code else self.city_codes[0]
+        with self._lock:
+            snapshot = self._snapshots.get(code)
+            if snapshot is None:
+                raise KeyError(code)
+            return snapshot.to_payload(self.stale_after)
+
+    def snapshots(self, city_codes: Optional[Sequence[str]] = None) -> List[Tuple[str, Dict, datetime]]:
+        """(cidade, previsao, fetched_at) das cidades com previsao boa, sem acessar a rede."""
+        codes = [str(c) for c in city_codes] if city_codes is not None else self.city_codes
+        with self._lock:
+            found = [self._snapshots.get(code) for code in codes]
+            return [(s.city_code, s.data, s.fetched_at) for s in found if s and s.data and s.fetched_at]
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            return [s.to_payload(self.stale_after) for s in self._snapshots.values()]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "cities": list(self._snapshots)}
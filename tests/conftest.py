@@ -3,8 +3,48 @@ Pytest configuration and shared fixtures
 """
 import pytest
 import os
+import threading
+import time
 from datetime import datetime
 
+from services.core.aws_integration.service import AWSService
+
+
+class FakeAWS(AWSService):
+    """AWSService without boto3 clients; records calls and can fail N times."""
+
+    def __init__(self, fail_times=0, latency=0.0):
+        self.region = "sa-east-1"
+        self.fail_times = fail_times
+        self.latency = latency
+        self.sent = []
+        self.audits = []
+        self._lock = threading.Lock()
+
+    def _send(self, canal, to):
+        time.sleep(self.latency)
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                return ""
+            self.sent.append((canal, to))
+            return f"{canal}-{len(self.sent)}"
+
+    def send_email_html(self, to_email, subject, html_body, text_body=None):
+        return self._send("email", to_email)
+
+    def send_sms(self, phone_number, message):
+        return self._send("sms", phone_number)
+
+    def log_alert_audit(self, alert_data):
+        self.audits.append(alert_data)
+
+
+@pytest.fixture
+def fake_aws():
+    """FakeAWS class: call it (fail_times=, latency=) or subclass it inside a test"""
+    return FakeAWS
+
 
 @pytest.fixture(scope="session")
 def test_env():
@@ -0,0 +1,221 @@
+"""
+Unit tests for the alert rule engine - Fase 7
+Tests vectorized evaluation, talhao/cultura overrides and live rule reloads
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from services.core.alerts.rules import AlertRule, CompiledRules, RuleEngine
+from services.core.alerts.service import AlertsService
+from services.core.database.models import Cultura, Sensor, Talhao, TipoSensor
+from services.core.database.service import DatabaseService
+
+
+def _rule(tipo, metric, direction, threshold, **scope):
+    return AlertRule(tipo, metric, direction, threshold, 0.0, "alta", tipo, "{valor} vs {limite}", **scope)
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'rules.db'}"
+
+
+@pytest.fixture
+def db(db_url):
+    service = DatabaseService(db_url)
+    service.create_tables()
+    with service.get_session() as session:
+        session.add_all([Cultura(id_cultura=1, nome_cultura="Soja"), TipoSensor(id_tipo_sensor=1, nome_tipo_sensor="Umidade", unidade_medida_padrao="%")])
+        session.flush()
+        session.add_all([
+            Talhao(id_talhao=1, nome_talhao="T1", area_hectares=1, id_cultura_atual=1),
+            Talhao(id_talhao=2, nome_talhao="T2", area_hectares=1),
+        ])
+        session.flush()
+        session.add_all([
+            Sensor(id_sensor=1, identificacao_fabricante="S1", data_instalacao=date(2025, 1, 1), id_tipo_sensor=1, id_talhao=1),
+            Sensor(id_sensor=2, identificacao_fabricante="S2", data_instalacao=date(2025, 1, 1), id_tipo_sensor=1, id_talhao=2),
+        ])
+    return service
+
+
+@pytest.fixture
+def engine(db):
+    engine = RuleEngine(db, check_interval=0)
+    engine.ensure_defaults(AlertsService.default_conditions())
+    return engine
+
+
+@pytest.mark.unit
+class TestCompiledRules:
+    """Test the NumPy evaluation against a plain Python loop"""
+
+    def test_matches_scalar_loop(self):
+        rules = CompiledRules([
+            _rule("umidade_baixa", "umidade", "below", 15),
+            _rule("umidade_alta", "umidade", "above", 85),
+            _rule("ph_baixo", "ph", "below", 5.5),
+        ])
+        rng = np.random.default_rng(7)
+        readings = [{"umidade": float(u), "ph": float(p)} for u, p in rng.uniform([0, 3], [100, 9], (500, 2))]
+        readings.append({"umidade": None, "ph": 4.0})
+
+        hits = rules.evaluate(rules.values_matrix(readings), np.full(501, -1), np.full(501, -1))
+        for reading, row in zip(readings, hits):
+            expected = [r.triggered(reading[r.metric]) if reading[r.metric] is not None else False for r in rules.rules]
+            assert row.tolist() == expected
+
+    def test_most_specific_scope_wins(self):
+        rules = CompiledRules([
+            _rule("umidade_baixa", "umidade", "below", 15),
+            _rule("umidade_baixa", "umidade", "below", 25, id_cultura=1),
+            _rule("umidade_baixa", "umidade", "below", 35, id_talhao=2),
+        ])
+        values = np.array([[20.0], [20.0], [30.0], [30.0]])
+        hits = rules.evaluate(values, np.array([-1, 1, 2, 1]), np.array([-1, 1, 1, 3]))
+        assert hits.tolist() == [
+            [False, False, False],  # global: 20 >= 15
+            [False, True, False],   # cultura 1: 20 < 25
+            [False, False, True],   # talhao 2 vence cultura 1
+            [False, False, False],  # cultura 3 cai na regra global
+        ]
+
+
+@pytest.mark.unit
+class TestRuleEngine:
+    """Test rule loading, scoping via sensors and reloads"""
+
+    def test_defaults_seeded_once(self, db, engine):
+        assert engine.ensure_defaults(AlertsService.default_conditions()) == 0
+        assert len(db.get_regras_alerta()) == 6
+
+    def test_sensor_scope_from_talhao_cultura(self, db, engine):
+        db.create_regra_alerta({
+            "tipo_alerta": "umidade_critica_baixa", "metrica": "umidade", "direcao": "below", "limite": 30.0,
+            "severidade": "critica", "titulo": "Soja seca", "mensagem": "{valor}", "id_cultura": 1,
+        })
+        soja, sem_cultura = engine.evaluate_batch([{"id_sensor": 1, "umidade": 20.0}, {"id_sensor": 2, "umidade": 20.0}])
+        assert [r.titulo for r in soja] == ["Soja seca"]
+        assert sem_cultura == []
+
+    def test_rule_changes_take_effect_without_restart(self, db, engine, db_url):
+        worker = RuleEngine(DatabaseService(db_url), check_interval=0)
+        assert worker.evaluate({"umidade": 20.0}) == []
+
+        regra = next(r for r in db.get_regras_alerta() if r.tipo_alerta == "umidade_critica_baixa")
+        db.update_regra_alerta(regra.id_regra, {"limite": 25.0})
+
+        assert [r.alert_type for r in engine.evaluate({"umidade": 20.0})] == ["umidade_critica_baixa"]
+        assert [r.alert_type for r in worker.evaluate({"umidade": 20.0})] == ["umidade_critica_baixa"]
+
+    def test_alerts_service_uses_rules(self, db, engine):
+        sent = []
+
+        class RecordingAlerts(AlertsService):
+            def send_alert_notification(self, titulo, mensagem, severidade, origem, alert_type=None, dados_contexto=None):
+                sent.append((titulo, mensagem, alert_type))
+                return {"status": "success"}
+
+        with db.get_session() as session:
+            service = RecordingAlerts(session, db, aws_service=object(), rule_engine=engine)
+            service.send_iot_alert({"id_sensor": 1, "umidade": 50.0, "ph": 5.0, "temperatura": 45.0})
+            assert service.send_iot_alert({"id_sensor": 1, "umidade": 50.0, "ph": 6.5, "temperatura": 25.0})["status"] == "ok"
+
+        assert sent == [(
+            "pH do Solo Muito Ácido",
+            "pH do solo está em 5.00, abaixo do mínimo recomendado de 5.5. Aplicação de calcário necessária.",
+            "ph_baixo",
+        )]
+
+    def test_edited_rule_reaches_other_call_sites(self, db, engine):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from services.api.routes.ml import router
+        from services.core.alerts.rules import effective_limits
+        from services.core.database.models import LeituraSensor
+        from services.core.iot_gateway.irrigation_logic import IrrigationThresholds, apply_irrigation_logic
+        from services.core.iot_gateway.service import IoTGatewayService
+
+        regra = next(r for r in db.get_regras_alerta() if r.tipo_alerta == "umidade_critica_baixa")
+        db.update_regra_alerta(regra.id_regra, {"limite": 25.0})
+
+        thresholds = IrrigationThresholds.from_alert_limits(effective_limits(engine, {"id_sensor": 1}))
+        assert apply_irrigation_logic(20.0, 6.0, True, True, thresholds) == (True, "EMERGÊNCIA: Umidade crítica < 25%")
+        assert effective_limits(None)["umidade_critica_baixa"] == AlertsService.CRITICAL_UMIDADE_MIN
+
+        gateway = IoTGatewayService(db, rule_engine=engine)
+        assert [a["title"] for a in gateway.check_alerts(20.0, 6.0, True, id_sensor=1)] == ["Umidade Crítica Detectada"]
+
+        with db.get_session() as session:
+            session.add(LeituraSensor(id_sensor=1, valor_umidade=20.0, valor_ph=6.0, temperatura=25.0))
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = db
+        app.state.rule_engine = engine
+        alerts = TestClient(app).get("/api/ml/alerts").json()["alerts"]
+        assert {"type": "umidade_baixa", "threshold": 25.0}.items() <= alerts[0].items()
+
+    def test_unsafe_message_template(self, db, engine):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from services.api.routes.alerts import router
+        from services.core.iot_gateway.service import IoTGatewayService
+
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = db
+        client = TestClient(app)
+        base = {"tipo_alerta": "umidade_x", "metrica": "umidade", "direcao": "below", "limite": 10.0,
+                "severidade": "alta", "titulo": "X"}
+        for mensagem in ("{x}", "{valor.__class__}", "{valor[0]}", "{"):
+            assert client.post("/api/alerts/rules", json={**base, "mensagem": mensagem}).status_code == 400
+        assert client.post("/api/alerts/rules", json={**base, "mensagem": "{valor:.1f} < {limite}"}).status_code == 200
+
+        # Regra gravada fora da API com template invalido: mensagem padrao, ingestao segue
+        regra = next(r for r in db.get_regras_alerta() if r.tipo_alerta == "umidade_critica_baixa")
+        db.update_regra_alerta(regra.id_regra, {"mensagem": "{valor.__class__} {x}"})
+        alerts = IoTGatewayService(db, rule_engine=engine).check_alerts(5.0, 6.0, True, id_sensor=1)
+        assert [a["message"] for a in alerts] == ["umidade em 5.00 (limite 15)", "5.0 < 10.0"]
+
+    def test_advisory_outputs_follow_rule_defaults(self, db, engine):
+        from datetime import datetime, timedelta
+
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from services.api.routes.ml import router
+        from services.core.database.models import LeituraSensor
+
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = db
+        app.state.rule_engine = engine
+        client = TestClient(app)
+
+        # Umidade 20%: critica so abaixo de 15% (antes 30%)
+        with db.get_session() as session:
+            session.add(LeituraSensor(id_sensor=1, valor_umidade=20.0, valor_ph=5.8, temperatura=35.0,
+                                      data_hora_leitura=datetime(2025, 1, 1)))
+        alerts = client.get("/api/ml/alerts").json()["alerts"]
+        assert [a for a in alerts if a["type"] in ("umidade_baixa", "umidade_alta")] == []
+
+        # Dois pontos por grupo (desvio padrao definido); o primeiro grupo ja tem a leitura acima
+        with db.get_session() as session:
+            session.add_all([
+                LeituraSensor(id_sensor=1, valor_umidade=umidade + 0.2 * k, valor_ph=ph, temperatura=temperatura,
+                              data_hora_leitura=datetime(2025, 1, 1) - timedelta(hours=2 * h + k))
+                for h, (umidade, ph, temperatura) in enumerate([(20.0, 5.8, 35.0), (50.0, 7.8, 25.0), (90.0, 6.5, 5.0)])
+                for k in range(2)
+                if (h, k) != (0, 0)
+            ])
+        clusters = client.get("/api/ml/clusters/insights", params={"n_clusters": 3}).json()["clusters"]
+        por_umidade = {round(c["center"]["umidade"]): c["recommendations"] for c in clusters}
+        assert por_umidade == {
+            20: ["Condições dentro dos parâmetros ideais - manter monitoramento"],
+            50: ["pH muito alcalino - adicionar corretivos ácidos"],
+            90: ["Considere aumentar ventilação para reduzir umidade", "Ativar sistema de aquecimento"],
+        }
@@ -0,0 +1,128 @@
+"""
+Unit tests for alert email digests - Fase 7
+Tests per-recipient buffering, severity windows and emails saved
+"""
+import pytest
+
+from services.core.alerts.action_templates import ActionTemplates
+from services.core.alerts.digest import AlertDigest
+from services.core.alerts.dispatcher import NotificationDispatcher
+from services.core.alerts.service import AlertsService
+from services.core.database.models import NotificacaoOutbox
+from services.core.database.service import DatabaseService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def digest(clock, fake_aws):
+    return AlertDigest(fake_aws(), windows={"alta": 60, "media": 300}, clock=clock)
+
+
+@pytest.mark.unit
+class TestAlertDigest:
+    """Test buffering and flushing per recipient"""
+
+    def test_alerts_merged_into_one_email_per_recipient(self, digest, clock):
+        for i in range(5):
+            digest.add(f"Alerta {i}", "msg", "media", ["a@farm.com", "b@farm.com"])
+        assert digest.flush_due() == 0
+
+        clock.now = 301
+        assert digest.flush_due() == 2
+        assert sorted(digest.aws.sent) == [("email", "a@farm.com"), ("email", "b@farm.com")]
+        stats = digest.stats()
+        assert stats["emails_saved"] == 8 and stats["alerts_pending"] == 0
+
+    def test_higher_severity_shortens_window(self, digest, clock):
+        digest.add("Baixa prioridade", "msg", "media", ["a@farm.com"])
+        clock.now = 10
+        digest.add("Alta prioridade", "msg", "alta", ["a@farm.com"])
+        clock.now = 71
+        assert digest.flush_due() == 1
+
+    def test_critical_is_not_buffered(self, digest):
+        assert digest.accepts("alta")
+        assert not digest.accepts("critica")
+
+    def test_stop_flushes_pending(self, digest):
+        digest.add("Alerta", "msg", "media", ["a@farm.com"])
+        digest.stop()
+        assert digest.aws.sent == [("email", "a@farm.com")]
+
+    def test_failed_send_keeps_alerts_buffered(self, clock, fake_aws):
+        digest = AlertDigest(fake_aws(fail_times=1), windows={"media": 300}, clock=clock, retry_delay=30)
+        digest.add("Alerta 1", "msg", "media", ["a@farm.com"])
+        digest.add("Alerta 2", "msg", "media", ["a@farm.com"])
+
+        clock.now = 301
+        assert digest.flush_due() == 0
+        assert digest.pending() == {"a@farm.com": 2}
+        clock.now = 331
+        assert digest.flush_due() == 1
+        assert digest.stats()["requeued"] == 2 and digest.stats()["alerts_pending"] == 0
+
+    def test_digest_goes_through_outbox(self, tmp_path, clock, fake_aws):
+        db = DatabaseService(f"sqlite:///{tmp_path / 'digest_outbox.db'}")
+        db.create_tables()
+        aws = fake_aws()
+        dispatcher = NotificationDispatcher(db, aws, base_backoff=0.0)
+        digest = AlertDigest(aws, windows={"media": 300}, clock=clock, dispatcher=dispatcher)
+        for i in range(3):
+            digest.add(f"Alerta {i}", "msg", "media", ["a@farm.com"])
+
+        clock.now = 301
+        assert digest.flush_due() == 1
+        assert aws.sent == []
+        with db.get_session() as session:
+            row = session.query(NotificacaoOutbox).one()
+            assert row.status == "pendente" and row.assunto.startswith("[MEDIA] Resumo: 3 alertas")
+        dispatcher.dispatch_once()
+        assert aws.sent == [("email", "a@farm.com")]
+        dispatcher.stop()
+
+    def test_render_lists_alerts_and_deduplicates_actions(self, digest):
+        actions = ActionTemplates.get_actions_for_alert_type("umidade_critica_baixa")
+        digest.add("Umidade baixa T1", "msg", "media", ["a@farm.com"], actions=actions)
+        digest.add("Umidade baixa T2", "msg", "alta", ["a@farm.com"], actions=actions)
+        rendered = digest.render(digest._buffers["a@farm.com"].items)
+
+        assert rendered["subject"].startswith("[ALTA] Resumo: 2 alertas")
+        assert "Umidade baixa T1" in rendered["html"] and "Umidade baixa T2" in rendered["html"]
+        assert rendered["html"].count(actions[0].titulo) == 1
+
+
+@pytest.mark.unit
+class TestAlertsServiceDigest:
+    """Test that AlertsService routes non-critical emails to the digest"""
+
+    def test_non_critical_buffered_critical_immediate(self, tmp_path, digest, clock):
+        db = DatabaseService(f"sqlite:///{tmp_path / 'digest.db'}")
+        db.create_tables()
+        db.create_funcionario({"nome": "Ana", "email": "ana@farm.com", "cargo": "Agronoma"})
+
+        with db.get_session() as session:
+            service = AlertsService(session, db, digest.aws, digest=digest)
+            for i in range(3):
+                result = service.send_alert_notification(f"pH {i}", "msg", "alta", "fase3", "ph_baixo")
+                assert result["status"] == "digest"
+            critical = service.send_alert_notification("Umidade", "msg", "critica", "fase3", "umidade_baixa")
+
+        assert critical["status"] == "success"
+        assert digest.aws.sent == [("email", "ana@farm.com")]
+
+        clock.now = 61
+        digest.flush_due()
+        assert len(digest.aws.sent) == 2
+        assert digest.stats()["emails_saved"] == 2
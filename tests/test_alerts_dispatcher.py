@@ -0,0 +1,137 @@
+"""
+Unit tests for the notification dispatcher - Fase 7
+Tests outbox enqueueing, concurrent delivery, retries and rate limiting
+"""
+import time
+
+import pytest
+
+from services.core.alerts.dispatcher import NotificationDispatcher, TokenBucket
+from services.core.alerts.service import AlertsService
+from services.core.database.models import Alert, NotificacaoOutbox
+from services.core.database.service import DatabaseService
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'outbox.db'}")
+    service.create_tables()
+    return service
+
+
+def _outbox(db):
+    with db.get_session() as session:
+        return [(n.canal, n.status, n.tentativas) for n in session.query(NotificacaoOutbox).all()]
+
+
+@pytest.mark.unit
+class TestNotificationDispatcher:
+    """Test outbox delivery"""
+
+    def test_enqueue_then_deliver(self, db, fake_aws):
+        aws = fake_aws()
+        dispatcher = NotificationDispatcher(db, aws, max_workers=4)
+        queued = dispatcher.enqueue(
+            "Umidade Critica", "Solo seco", "critica",
+            emails=["a@farm.com", "b@farm.com", "invalido"], phones=["+5511999999999"],
+        )
+        assert queued == {"emails_queued": 2, "sms_queued": 1}
+        assert aws.sent == []
+
+        dispatcher.drain()
+        assert sorted(aws.sent) == [("email", "a@farm.com"), ("email", "b@farm.com"), ("sms", "+5511999999999")]
+        assert {status for _, status, _ in _outbox(db)} == {"enviado"}
+        dispatcher.stop()
+
+    def test_retry_with_backoff_then_fail(self, db, fake_aws):
+        aws = fake_aws(fail_times=10)
+        dispatcher = NotificationDispatcher(db, aws, max_attempts=3, base_backoff=0.0)
+        dispatcher.enqueue("Teste", "msg", "alta", emails=["a@farm.com"], phones=[])
+        dispatcher.drain()
+        assert _outbox(db) == [("email", "falhou", 3)]
+        assert dispatcher.counters["retried"] == 2 and dispatcher.counters["failed"] == 1
+        dispatcher.stop()
+
+    def test_transient_failure_recovers(self, db, fake_aws):
+        aws = fake_aws(fail_times=1)
+        dispatcher = NotificationDispatcher(db, aws, base_backoff=0.0)
+        dispatcher.enqueue("Teste", "msg", "alta", emails=["a@farm.com"], phones=[])
+        dispatcher.drain()
+        assert _outbox(db) == [("email", "enviado", 2)]
+        dispatcher.stop()
+
+    def test_concurrent_delivery(self, db, fake_aws):
+        aws = fake_aws(latency=0.3)
+        dispatcher = NotificationDispatcher(db, aws, max_workers=10, rates={"email": 0})
+        dispatcher.enqueue("Teste", "msg", "alta", emails=[f"u{i}@farm.com" for i in range(10)], phones=[])
+        start = time.monotonic()
+        dispatcher.drain()
+        assert len(aws.sent) == 10
+        assert time.monotonic() - start < 1.5  # sequencial levaria 3s
+        dispatcher.stop()
+
+    def test_claim_is_exclusive_and_lease_bounded(self, db, fake_aws):
+        first = NotificationDispatcher(db, fake_aws())
+        second = NotificationDispatcher(db, fake_aws(), lease_timeout=0.0)
+        first.enqueue("Teste", "msg", "alta", emails=["a@farm.com", "b@farm.com"], phones=[])
+
+        claimed = first._claim_due()
+        assert len(claimed) == 2
+        assert second._claim_due() == []
+        assert first.recover() == 0  # reserva dentro do lease: worker vivo
+        assert second.recover() == 2  # lease vencido: volta para a fila
+        assert {status for _, status, _ in _outbox(db)} == {"pendente"}
+        first.stop()
+        second.stop()
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        assert time.monotonic() - start >= 0.18
+
+
+@pytest.mark.unit
+class TestAlertsServiceEnqueue:
+    """Test that alerts only enqueue when a dispatcher is configured"""
+
+    def test_send_alert_notification_enqueues(self, db, fake_aws):
+        db.create_funcionario({"nome": "Ana", "email": "ana@farm.com", "cargo": "Agronoma"})
+        aws = fake_aws()
+        dispatcher = NotificationDispatcher(db, aws)
+        with db.get_session() as session:
+            service = AlertsService(session, db, aws, dispatcher)
+            result = service.send_alert_notification(
+                titulo="Umidade Critica", mensagem="Solo seco", severidade="critica",
+                origem="fase3", alert_type="umidade_baixa",
+            )
+        assert result["status"] == "queued"
+        assert result["emails_queued"] == 1
+        assert aws.sent == []
+
+        dispatcher.drain()
+        dispatcher.stop()
+        assert aws.sent == [("email", "ana@farm.com")]
+        assert len(aws.audits) == 1
+        with db.get_session() as session:
+            assert session.get(Alert, result["alert_id"]).message_id == "email-1"
+
+    def test_alert_and_outbox_in_one_transaction(self, db, fake_aws):
+        db.create_funcionario({"nome": "Ana", "email": "ana@farm.com", "cargo": "Agronoma"})
+
+        class BrokenRenderAWS(fake_aws):
+            def render_alert_sms(self, *args, **kwargs):
+                raise RuntimeError("template quebrado")
+
+        aws = BrokenRenderAWS()
+        dispatcher = NotificationDispatcher(db, aws)
+        with db.get_session() as session:
+            result = AlertsService(session, db, aws, dispatcher).send_alert_notification(
+                titulo="Umidade Critica", mensagem="Solo seco", severidade="critica", origem="fase3",
+            )
+        dispatcher.stop()
+        assert result["status"] == "error"
+        with db.get_session() as session:
+            assert session.query(Alert).count() == 0  # sem notificacao, sem alerta orfao
+        assert _outbox(db) == []
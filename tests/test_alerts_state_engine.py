@@ -0,0 +1,108 @@
+"""
+Unit tests for the alert state engine - Fase 7
+Tests hysteresis, cool-down, escalation, digests and persistence
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.core.alerts.service import AlertsService
+from services.core.alerts.state_engine import AlertStateEngine, default_iot_conditions
+from services.core.database.service import DatabaseService
+
+T0 = datetime(2025, 3, 1, 8, 0)
+UMIDADE_BAIXA = default_iot_conditions(15.0, 85.0, 5.5, 7.5, 10.0, 40.0)[0]
+
+
+def _minutes(m):
+    return T0 + timedelta(minutes=m)
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'state.db'}")
+    service.create_tables()
+    return service
+
+
+def _engine(db=None):
+    return AlertStateEngine(
+        db,
+        cooldown=timedelta(minutes=15),
+        escalation_steps=[timedelta(minutes=30)],
+        digest_interval=timedelta(minutes=60),
+    )
+
+
+@pytest.mark.unit
+class TestAlertStateEngine:
+    """Test state transitions for a single (sensor, alert_type)"""
+
+    def test_repeated_readings_open_once(self):
+        engine = _engine()
+        kinds = [engine.evaluate("s1", UMIDADE_BAIXA, 12.0, _minutes(m * 0.1)) for m in range(100)]
+        assert [k.kind for k in kinds if k] == ["aberto"]
+        assert engine.stats()["suppressed"] == 99
+
+    def test_hysteresis_requires_margin_to_resolve(self):
+        engine = _engine()
+        engine.evaluate("s1", UMIDADE_BAIXA, 12.0, _minutes(0))
+        assert engine.evaluate("s1", UMIDADE_BAIXA, 15.5, _minutes(1)) is None
+        assert engine.evaluate("s1", UMIDADE_BAIXA, 17.0, _minutes(2)).kind == "resolvido"
+
+    def test_flapping_within_cooldown_is_silent(self):
+        engine = _engine()
+        engine.evaluate("s1", UMIDADE_BAIXA, 12.0, _minutes(0))
+        engine.evaluate("s1", UMIDADE_BAIXA, 18.0, _minutes(5))
+        assert engine.evaluate("s1", UMIDADE_BAIXA, 12.0, _minutes(10)) is None
+        engine.evaluate("s1", UMIDADE_BAIXA, 18.0, _minutes(11))
+        assert engine.evaluate("s1", UMIDADE_BAIXA, 12.0, _minutes(40)).kind == "aberto"
+
+    def test_escalation_and_digest(self):
+        engine = _engine()
+        engine.evaluate("s1", UMIDADE_BAIXA, 12.0, _minutes(0))
+        escalated = engine.evaluate("s1", UMIDADE_BAIXA, 10.0, _minutes(31))
+        assert escalated.kind == "escalado" and escalated.severidade == "critica"
+        assert engine.evaluate("s1", UMIDADE_BAIXA, 11.0, _minutes(60)) is None
+        digest = engine.evaluate("s1", UMIDADE_BAIXA, 11.0, _minutes(92))
+        assert digest.kind == "resumo"
+        assert digest.ocorrencias == 4 and digest.pior_valor == 10.0
+
+    def test_sensors_are_independent(self):
+        engine = _engine()
+        assert engine.evaluate("s1", UMIDADE_BAIXA, 12.0, T0).kind == "aberto"
+        assert engine.evaluate("s2", UMIDADE_BAIXA, 12.0, T0).kind == "aberto"
+
+    def test_state_survives_restart(self, db):
+        engine = _engine(db)
+        engine.evaluate("s1", UMIDADE_BAIXA, 12.0, _minutes(0))
+
+        restarted = _engine(db)
+        assert restarted.load() == 1
+        assert restarted.evaluate("s1", UMIDADE_BAIXA, 12.0, _minutes(1)) is None
+        assert restarted.active()[0]["tipo_alerta"] == "umidade_critica_baixa"
+
+
+@pytest.mark.unit
+class TestAlertsServiceStateful:
+    """Test that send_iot_alert only notifies on transitions"""
+
+    def test_only_transitions_reach_notifier(self, db):
+        sent = []
+
+        class RecordingAlerts(AlertsService):
+            def send_alert_notification(self, titulo, mensagem, severidade, origem, alert_type=None, dados_contexto=None):
+                sent.append((titulo, severidade))
+                return {"status": "success"}
+
+        engine = _engine(db)
+        with db.get_session() as session:
+            service = RecordingAlerts(session, db, aws_service=object(), state_engine=engine)
+            for m in range(20):
+                service.send_iot_alert({"id_sensor": 1, "umidade": 12.0, "ph": 6.5, "temperatura": 25.0, "timestamp": _minutes(m)})
+            service.send_iot_alert({"id_sensor": 1, "umidade": 30.0, "ph": 6.5, "temperatura": 25.0, "timestamp": _minutes(21)})
+
+        assert sent == [
+            ("Umidade Crítica Detectada", "critica"),
+            ("Normalizado: Umidade Crítica Detectada", "baixa"),
+        ]
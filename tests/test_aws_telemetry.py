@@ -0,0 +1,111 @@
+"""
+Unit tests for batched CloudWatch telemetry - Fase 7
+Tests statistic-set aggregation, API-limit batching and log stream caching
+"""
+import threading
+import time
+
+import pytest
+
+from services.core.aws_integration import telemetry
+from services.core.aws_integration.telemetry import TelemetryShipper
+from services.core.aws_integration.transports import FakeTransport
+
+
+@pytest.fixture
+def transport():
+    return FakeTransport()
+
+
+@pytest.mark.unit
+class TestTelemetryShipper:
+    """Test buffering and flushing"""
+
+    def test_metrics_aggregated_into_statistic_sets(self, transport):
+        shipper = TelemetryShipper(transport, flush_interval=60)
+        for value in [1, 5, 3]:
+            shipper.put_metric("FarmTech/Alerts", "EmailSent", value, "Count", timestamp=120.0)
+        shipper.put_metric("FarmTech/Alerts", "SMSSent", 1, "Count", timestamp=130.0)
+        assert transport.counts == {}
+
+        assert shipper.flush() == 1
+        data = {d["MetricName"]: d for d in transport.messages("cloudwatch.put_metric_data")[0]["MetricData"]}
+        assert data["EmailSent"]["StatisticValues"] == {"SampleCount": 3, "Sum": 9, "Minimum": 1, "Maximum": 5}
+        assert data["SMSSent"]["StatisticValues"]["SampleCount"] == 1
+
+    def test_metric_batches_respect_api_limit(self, transport, monkeypatch):
+        monkeypatch.setattr(telemetry, "MAX_METRICS_PER_CALL", 10)
+        shipper = TelemetryShipper(transport, flush_interval=60, max_pending_metrics=1000)
+        for i in range(25):
+            shipper.put_metric("FarmTech/Sensors", f"m{i}", i)
+        assert shipper.flush() == 3
+
+    def test_full_buffer_flushed_by_background_thread(self, transport):
+        threads = []
+        record = transport.record
+        transport.record = lambda *args: threads.append(threading.current_thread().name) or record(*args)
+
+        shipper = TelemetryShipper(transport, flush_interval=60, max_pending_events=5)
+        for i in range(5):
+            shipper.log("/farmtech/logs", "alerts", f"evento {i}")
+        deadline = time.monotonic() + 5
+        while transport.counts["logs.put_log_events"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert transport.counts["logs.put_log_events"] == 1
+        assert shipper.stats()["pending_events"] == 0
+        # Quem registrou nao fez I/O: o envio aconteceu no thread de flush
+        assert set(threads) == {"telemetry-flusher"}
+
+    def test_hard_cap_drop_policy(self, transport):
+        shipper = TelemetryShipper(transport, flush_interval=60, max_pending_events=2, overflow="drop", overflow_factor=2)
+        shipper._maybe_flush = lambda full: None  # flusher parado: buffer so cresce
+        for i in range(6):
+            shipper.log("/farmtech/logs", "alerts", f"evento {i}")
+        assert shipper.stats()["pending_events"] == 4
+        assert shipper.stats()["dropped"] == 2
+        assert transport.counts == {}
+
+    def test_hard_cap_block_policy_ships_inline(self, transport):
+        shipper = TelemetryShipper(transport, flush_interval=60, max_pending_metrics=2, overflow_factor=2)
+        shipper._maybe_flush = lambda full: None
+        for i in range(5):
+            shipper.put_metric("FarmTech/Sensors", f"m{i}", i)
+        assert transport.counts["cloudwatch.put_metric_data"] == 1
+        assert shipper.stats()["pending_metrics"] == 1
+        assert shipper.stats()["dropped"] == 0
+
+    def test_invalid_overflow_policy(self, transport):
+        with pytest.raises(ValueError):
+            TelemetryShipper(transport, overflow="ignorar")
+
+    def test_log_group_and_stream_created_once(self, transport):
+        shipper = TelemetryShipper(transport, flush_interval=60)
+        for _ in range(3):
+            shipper.log("/farmtech/logs", "alerts", "evento")
+            shipper.flush()
+        assert transport.counts["logs.create_log_group"] == 1
+        assert transport.counts["logs.create_log_stream"] == 1
+        assert transport.counts["logs.put_log_events"] == 3
+
+    def test_log_batches_split_by_bytes(self, transport, monkeypatch):
+        monkeypatch.setattr(telemetry, "MAX_LOG_BYTES_PER_CALL", 1000)
+        shipper = TelemetryShipper(transport, flush_interval=60)
+        for _ in range(10):
+            shipper.log("/farmtech/logs", "alerts", "x" * 200)
+        shipper.flush()
+        batches = transport.messages("logs.put_log_events")
+        assert [len(b["logEvents"]) for b in batches] == [4, 4, 2]
+
+    def test_pending_data_survives_garbage_collection(self, transport):
+        import gc
+
+        shipper = TelemetryShipper(transport, flush_interval=60)
+        shipper.log("/farmtech/audit", "alerts", "[ALERT_AUDIT] evento")
+        shipper.put_metric("FarmTech/Alerts", "EmailSent", 1, "Count")
+        del shipper
+        gc.collect()
+
+        telemetry.flush_all()
+        assert len(transport.messages("logs.put_log_events")) == 1
+        assert len(transport.messages("cloudwatch.put_metric_data")) == 1
+        assert not telemetry._PENDING
@@ -0,0 +1,66 @@
+"""
+Unit tests for AWSService transports - Fase 7
+Tests lazy boto3 clients, the in-memory fake and the file sink
+"""
+import json
+
+import pytest
+
+from services.core.aws_integration.service import AWSService
+from services.core.aws_integration.transports import Boto3Transport, FakeTransport, FileSinkTransport, get_transport
+
+
+@pytest.mark.unit
+class TestTransports:
+    """Test transport selection and recording"""
+
+    def test_boto3_clients_are_lazy(self):
+        aws = AWSService(transport=Boto3Transport())
+        assert aws.transport._clients == {}
+
+    def test_get_transport_from_env(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("AWS_TRANSPORT", "fake")
+        assert isinstance(AWSService().transport, FakeTransport)
+        monkeypatch.setenv("AWS_TRANSPORT", "file")
+        monkeypatch.setenv("AWS_SINK_DIR", str(tmp_path))
+        assert isinstance(get_transport(), FileSinkTransport)
+
+    def test_fake_records_alerts(self):
+        transport = FakeTransport()
+        aws = AWSService(transport=transport)
+        results = aws.send_combined_alert(
+            "Umidade Critica", "Solo seco", "critica", ["a@farm.com"], ["+5511999999999"], "Ligar irrigacao"
+        )
+
+        assert len(results["email_ids"]) == 1 and len(results["sms_ids"]) == 1
+        email = transport.messages("ses.send_email")[0]
+        assert email["Destination"] == {"ToAddresses": ["a@farm.com"]}
+        assert email["Message"]["Subject"]["Data"] == "[CRITICA] Umidade Critica"
+        assert transport.messages("sns.publish")[0]["PhoneNumber"] == "+5511999999999"
+        aws.flush_telemetry()
+        assert transport.counts["cloudwatch.put_metric_data"] == 1
+
+    def test_log_stream_creation_is_cached(self):
+        transport = FakeTransport()
+        aws = AWSService(transport=transport)
+        aws.log_alert_audit({"alert_id": 1})
+        aws.flush_telemetry()
+        aws.log_alert_audit({"alert_id": 2})
+        aws.flush_telemetry()
+        assert transport.counts["logs.create_log_stream"] == 1
+        assert transport.counts["logs.put_log_events"] == 2
+
+    def test_fake_failures_surface_as_empty_ids(self):
+        aws = AWSService(transport=FakeTransport(fail_rate=1.0))
+        assert aws.send_email_html("a@farm.com", "s", "<p>x</p>") == ""
+
+    def test_file_sink_writes_eml_and_jsonl(self, tmp_path):
+        aws = AWSService(transport=FileSinkTransport(tmp_path))
+        aws.send_email_html("a@farm.com", "Assunto", "<p>corpo</p>", "corpo")
+        aws.send_sms("+5511999999999", "mensagem")
+
+        emails = list((tmp_path / "emails").glob("*.eml"))
+        assert len(emails) == 1
+        assert "Subject: Assunto" in emails[0].read_text()
+        sms = [json.loads(line) for line in (tmp_path / "sns.jsonl").read_text().splitlines()]
+        assert sms[0]["PhoneNumber"] == "+5511999999999"
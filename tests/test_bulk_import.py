@@ -0,0 +1,128 @@
+"""
+Unit tests for the bulk importer - Fase 7
+Tests chunked upserts, FK resolution, rejected rows and idempotent re-imports
+"""
+import csv
+import json
+from datetime import date, datetime
+
+import pytest
+
+from services.core.database.bulk_import import BulkImporter
+from services.core.database.models import Cultura, InsumoCultura, LeituraSensor, ProducaoAgricola, Sensor, Talhao, TipoSensor
+from services.core.database.service import DatabaseService
+
+FASE1_ROWS = [
+    {"cultura": "Milho", "area": "100", "insumo": "7", "custo_estimado": "580", "data_registro": "2025-01-10 08:00:00"},
+    {"cultura": "Milho", "area": "300", "insumo": "21", "custo_estimado": "1740", "data_registro": "2025-01-11 08:00:00"},
+    {"cultura": "Soja", "area": "50,5", "insumo": "3", "custo_estimado": "200", "data_registro": "2025-01-12 08:00:00"},
+    {"cultura": "Soja", "area": "abc", "insumo": "3", "custo_estimado": "200", "data_registro": "2025-01-13 08:00:00"},
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'import.db'}")
+    service.create_tables()
+    return service
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def _count(db, model):
+    with db.get_session() as session:
+        return session.query(model).count()
+
+
+@pytest.mark.unit
+class TestBulkImporter:
+    """Test producao, insumos and leituras imports"""
+
+    def test_fase1_producao_is_idempotent(self, db, tmp_path):
+        path = _write_csv(tmp_path / "fase1.csv", FASE1_ROWS)
+        importer = BulkImporter(db, chunk_size=2, fast_pragmas=True)
+
+        first = importer.import_file("producao", path, derive_insumos=True)
+        second = importer.import_file("producao", path, derive_insumos=True)
+
+        assert (first.read, first.written, first.rejected) == (4, 3, 1)
+        assert second.written == 3
+        assert _count(db, ProducaoAgricola) == 3
+        assert _count(db, Cultura) == 2
+        with db.get_session() as session:
+            milho = session.query(Cultura).filter_by(nome_cultura="Milho").one()
+            insumo = session.query(InsumoCultura).filter_by(id_cultura=milho.id_cultura).one()
+            assert float(insumo.coef_insumo_por_m2) == 0.07
+            assert float(insumo.custo_por_m2) == 5.8
+            soja = session.query(ProducaoAgricola).filter_by(quantidade_produzida=3).one()
+            assert float(soja.area_plantada) == 50.5
+            assert soja.data_colheita == datetime(2025, 1, 12, 8)
+
+    def test_corrected_row_updates_in_place(self, db):
+        importer = BulkImporter(db)
+        importer.import_records("producao", FASE1_ROWS[:2])
+        corrigida = {**FASE1_ROWS[1], "insumo": "24", "custo_estimado": "1800"}
+        report = importer.import_records("producao", [corrigida, corrigida])
+
+        assert (report.written, report.rejected) == (1, 1)  # repetida no mesmo arquivo: rejeitada
+        assert _count(db, ProducaoAgricola) == 2
+        with db.get_session() as session:
+            linha = session.query(ProducaoAgricola).filter_by(area_plantada=300).one()
+            assert (float(linha.quantidade_produzida), float(linha.valor_estimado)) == (24.0, 1800.0)
+
+    def test_source_id_keeps_identical_rows(self, db):
+        rows = [{**FASE1_ROWS[0], "id_origem": str(i)} for i in range(3)]
+        report = BulkImporter(db).import_records("producao", rows + [{k: v for k, v in FASE1_ROWS[0].items() if k != "data_registro"}])
+
+        assert (report.written, report.rejected) == (3, 1)
+        assert _count(db, ProducaoAgricola) == 3
+        BulkImporter(db).import_records("producao", rows)
+        assert _count(db, ProducaoAgricola) == 3
+
+    def test_insumos_upsert(self, db, tmp_path):
+        importer = BulkImporter(db)
+        importer.import_records("insumos", [{"cultura": "Cafe", "coef_insumo_por_m2": "0.1", "custo_por_m2": "9"}])
+        report = importer.import_records("insumos", [
+            {"cultura": "Cafe", "coef_insumo_por_m2": "0.2", "custo_por_m2": "10"},
+            {"id_cultura": "999", "coef_insumo_por_m2": "1", "custo_por_m2": "1"},
+        ])
+
+        assert (report.written, report.rejected) == (1, 1)
+        with db.get_session() as session:
+            assert [float(i.coef_insumo_por_m2) for i in session.query(InsumoCultura).all()] == [0.2]
+
+    def test_leituras_ndjson_resolves_sensors(self, db, tmp_path):
+        with db.get_session() as session:
+            session.add(TipoSensor(id_tipo_sensor=1, nome_tipo_sensor="Umidade", unidade_medida_padrao="%"))
+            session.add(Talhao(id_talhao=1, nome_talhao="T1", area_hectares=1))
+            session.flush()
+            session.add(Sensor(id_sensor=7, identificacao_fabricante="ESP32-A",
+                               data_instalacao=date(2025, 1, 1), id_tipo_sensor=1, id_talhao=1))
+        path = tmp_path / "dump.ndjson"
+        path.write_text("\n".join(json.dumps(r) for r in [
+            {"timestamp": "2025-02-01T10:00:00", "identificacao_fabricante": "ESP32-A", "valor_umidade": 31.5, "bomba_ligada": True},
+            {"data_hora_leitura": "2025-02-01T10:05:00", "id_sensor": 7, "valor_umidade": "29.0", "valor_ph": "6.4"},
+            {"data_hora_leitura": "2025-02-01T10:10:00", "id_sensor": 99, "valor_umidade": 20},
+            {"valor_umidade": 20, "id_sensor": 7},
+        ]))
+
+        counts = []
+        db.add_change_listener(lambda tables: counts.append(db.counts.count(LeituraSensor)[0]))
+        BulkImporter(db).import_file("leituras", path)
+        report = BulkImporter(db).import_file("leituras", path)
+
+        assert (report.read, report.written, report.rejected) == (4, 2, 2)
+        assert report.rows_per_second > 0
+        assert counts == [2, 2]  # listeners avisados; cache de totais invalidado
+        rows = db.reads.readings(limit=10).items
+        assert [(r.id_sensor, r.valor_umidade, r.bomba_ligada) for r in rows] == [(7, 29.0, False), (7, 31.5, True)]
+
+    def test_invalid_kind(self, db):
+        with pytest.raises(ValueError):
+            BulkImporter(db).import_records("deteccoes", [])
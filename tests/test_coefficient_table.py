@@ -0,0 +1,88 @@
+"""
+Unit tests for the in-memory coefficient table - Fase 7
+Tests accent-insensitive lookups, invalidation on writes and batch pricing
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from services.api.routes.calculations import router
+from services.core.calculations.area_insumos import calculate_area_insumos, calculate_area_insumos_batch
+from services.core.database.models import Cultura, InsumoCultura
+from services.core.database.service import DatabaseService
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'coef.db'}")
+    service.create_tables()
+    with service.get_session() as session:
+        for nome, coef, custo in [("Cana de Açúcar", 0.1, 12.0), ("Milho", 0.07, 6.0), ("Café", 0.04, 7.0)]:
+            cultura = Cultura(nome_cultura=nome)
+            session.add(cultura)
+            session.flush()
+            session.add(InsumoCultura(id_cultura=cultura.id_cultura, coef_insumo_por_m2=coef, custo_por_m2=custo))
+    return service
+
+
+def _count_queries(db):
+    calls = []
+    event.listen(db.engine, "before_cursor_execute", lambda *args: calls.append(args[2]))
+    return calls
+
+
+@pytest.mark.unit
+class TestCoefficientTable:
+    """Test lookups served from memory and invalidated by the change hooks"""
+
+    def test_lookup_without_queries(self, db):
+        assert db.coefficients.get("cana de acucar").custo_por_m2 == 12.0
+        calls = _count_queries(db)
+        for _ in range(50):
+            result = calculate_area_insumos("Cafe", 100, db_service=db)
+        assert calls == []
+        assert result["insumo_necessario"] == 4.0
+        assert result["breakdown"]["fonte"] == "db"
+        assert calculate_area_insumos("Soja", 10, db_service=db)["breakdown"]["fonte"] == "default"
+        assert db.coefficients.counters["builds"] == 1
+
+    def test_invalidated_on_write(self, db):
+        assert db.coefficients.get("Milho").insumo == 0.07
+        with db.get_session() as session:
+            session.get(InsumoCultura, 2).coef_insumo_por_m2 = 0.09
+        assert db.coefficients.get("Milho").insumo == 0.09
+        assert db.coefficients.counters["builds"] == 2
+
+    def test_batch(self, db):
+        result = calculate_area_insumos_batch([("Milho", 100), ("Cafe", 50), ("Arroz", 10), ("Milho", 0)], db_service=db)
+        assert result["erros"] == 2
+        assert result["total_insumo_necessario"] == 9.0
+        assert result["total_custo_estimado"] == 950.0
+        assert "não suportada" in result["itens"][2]["erro"]
+
+    def test_batch_endpoint(self, db):
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = db
+        client = TestClient(app)
+
+        itens = [{"cultura": "milho", "area": 10.0 * (i + 1)} for i in range(300)]
+        calls = _count_queries(db)
+        response = client.post("/api/calculations/insumos/batch", json={"itens": itens})
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["itens"]) == 300 and body["erros"] == 0
+        assert body["itens"][0]["custo_estimado"] == 60.0
+        assert len(calls) == 1
+
+        assert client.post("/api/calculations/insumos/batch", json={"itens": []}).status_code == 422
+
+        # Nomes pelo catalogo de coeficientes; cultura desconhecida e erro no item, nunca Mandioca
+        body = client.post("/api/calculations/insumos/batch", json={"itens": [
+            {"cultura": "Café", "area": 10.0}, {"cultura": "Arroz", "area": 10.0}, {"cultura": "soja", "area": 10.0},
+        ]}).json()
+        assert body["itens"][0]["custo_estimado"] == 70.0
+        assert "não suportada" in body["itens"][1]["erro"]
+        assert body["itens"][2]["breakdown"] == {"coeficiente_insumo": 0.06, "custo_por_m2": 5.0, "fonte": "default"}
+        assert body["erros"] == 1
@@ -0,0 +1,128 @@
+"""
+Unit tests for the detection cache - Fase 6
+Tests content-hash keys, perceptual matching and CVService integration
+"""
+import shutil
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageEnhance
+
+from services.core.cv_service.cache import DetectionCache
+from services.core.cv_service.service import CVService
+
+SAMPLE = Path(__file__).resolve().parents[1] / "models" / "cv_samples" / "01_healthy_field.png"
+DETECTIONS = [{"class_name": "praga", "confidence": 0.8, "bbox": [1, 2, 3, 4]}]
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "campo.png"
+    shutil.copy(SAMPLE, path)
+    return path
+
+
+@pytest.mark.unit
+class TestDetectionCache:
+    """Test cache keys and lookups"""
+
+    def test_round_trip(self, tmp_path, image):
+        cache = DetectionCache(tmp_path / "cache")
+        assert cache.get(image, "yolov8n.pt", 0.35) is None
+        cache.put(image, "yolov8n.pt", 0.35, DETECTIONS)
+        assert cache.get(image, "yolov8n.pt", 0.35) == DETECTIONS
+
+    def test_identical_content_hits_regardless_of_name(self, tmp_path, image):
+        cache = DetectionCache(tmp_path / "cache")
+        cache.put(image, "yolov8n.pt", 0.35, DETECTIONS)
+        copy = tmp_path / "reupload.png"
+        shutil.copy(image, copy)
+        assert cache.get(copy, "yolov8n.pt", 0.35) == DETECTIONS
+
+    def test_model_and_threshold_are_part_of_key(self, tmp_path, image):
+        cache = DetectionCache(tmp_path / "cache")
+        cache.put(image, "yolov8n.pt", 0.35, DETECTIONS)
+        assert cache.get(image, "yolov8s.pt", 0.35) is None
+        assert cache.get(image, "yolov8n.pt", 0.5) is None
+
+    def test_perceptual_mode_matches_near_duplicates(self, tmp_path, image):
+        near = tmp_path / "frame_2.png"
+        ImageEnhance.Brightness(Image.open(image).convert("RGB")).enhance(1.03).save(near)
+
+        exact = DetectionCache(tmp_path / "exact")
+        exact.put(image, "yolov8n.pt", 0.35, DETECTIONS)
+        assert exact.get(near, "yolov8n.pt", 0.35) is None
+
+        fuzzy = DetectionCache(tmp_path / "fuzzy", perceptual=True)
+        fuzzy.put(image, "yolov8n.pt", 0.35, DETECTIONS)
+        assert fuzzy.get(near, "yolov8n.pt", 0.35) == DETECTIONS
+
+    def test_disabled_from_env(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("CV_CACHE_ENABLED", "0")
+        assert DetectionCache.from_env(tmp_path) is None
+
+    def test_from_env_reuses_instance(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("CV_CACHE_DIR", str(tmp_path / "shared"))
+        assert DetectionCache.from_env(tmp_path) is DetectionCache.from_env(tmp_path)
+
+    def test_perceptual_index_is_appended_and_reloaded(self, tmp_path, image):
+        cache = DetectionCache(tmp_path / "cache", perceptual=True)
+        cache.put(image, "yolov8n.pt", 0.35, DETECTIONS)
+        cache.put(image, "yolov8n.pt", 0.5, DETECTIONS)
+        assert len(cache.index_file.read_text(encoding="utf-8").splitlines()) == 2
+
+        near = tmp_path / "frame_2.png"
+        ImageEnhance.Brightness(Image.open(image).convert("RGB")).enhance(1.03).save(near)
+        reopened = DetectionCache(tmp_path / "cache", perceptual=True)
+        assert reopened.get(near, "yolov8n.pt", 0.5) == DETECTIONS
+
+    def test_eviction_bounds_entries_and_index(self, tmp_path, image):
+        cache = DetectionCache(tmp_path / "cache", perceptual=True, max_entries=10)
+        for i in range(25):
+            cache.put(image, f"modelo-{i}.pt", 0.35, DETECTIONS)
+        assert len(list((tmp_path / "cache").glob("*/*.json"))) <= 10
+        assert cache.evictions >= 15
+        assert cache.get(image, "modelo-24.pt", 0.35) == DETECTIONS
+        assert cache.get(image, "modelo-0.pt", 0.35) is None
+        assert len(cache.index_file.read_text(encoding="utf-8").splitlines()) <= 2 * 64
+        assert sum(len(rows) for rows in cache._load_index().values()) <= 10
+
+
+@pytest.mark.unit
+class TestCVServiceCache:
+    """Test that cached results skip model loading"""
+
+    def test_cache_hit_does_not_load_model(self, tmp_path, image):
+        cache = DetectionCache(tmp_path / "cache")
+        cv = CVService(models_dir=tmp_path, model_source="yolov8n.pt", cache=cache)
+        cache.put(image, cv.model_id, 0.35, DETECTIONS)
+
+        def fail_load(*args, **kwargs):
+            raise AssertionError("model should not be loaded on cache hit")
+
+        cv.load_model = fail_load
+        detections = cv.detect_objects(image, confidence=0.35)
+        assert [d.class_name for d in detections] == ["praga"]
+        assert cache.stats() == {"hits": 1, "misses": 0}
+
+    def test_retrained_weights_change_model_id(self, tmp_path):
+        weights = tmp_path / "best.pt"
+        weights.write_bytes(b"epoch-1")
+        cv = CVService(models_dir=tmp_path, model_source=weights)
+        first = cv.model_id
+        assert first.startswith("best.pt@") and cv.model_id == first
+
+        weights.write_bytes(b"epoch-2-retrained")
+        assert cv.model_id != first
+        assert CVService(models_dir=tmp_path, model_source="hub/model.pt").model_id == "model.pt"
+
+    def test_weights_hashed_once_across_instances(self, tmp_path, monkeypatch):
+        from services.core.cv_service import service as cv_module
+
+        weights = tmp_path / "best.pt"
+        weights.write_bytes(b"pesos")
+        calls = []
+        digest = cv_module.content_digest
+        monkeypatch.setattr(cv_module, "content_digest", lambda p: calls.append(p) or digest(p))
+        ids = {CVService(models_dir=tmp_path, model_source=weights).model_id for _ in range(3)}
+        assert len(ids) == 1 and len(calls) == 1
@@ -0,0 +1,170 @@
+"""
+Unit tests for the stream detection pipeline - Fase 6
+Tests frame sampling, cross-frame dedupe and end-to-end runs over frame folders
+"""
+import numpy as np
+import pytest
+from PIL import Image
+
+from services.core.cv_service.service import CVService, Detection
+from services.core.cv_service.stream import DetectionTracker, FrameSampler, StreamDetector
+
+
+class _FakeBox:
+    def __init__(self, xyxy):
+        self.cls = 0
+        self.conf = 0.9
+        self.xyxy = np.asarray([xyxy], dtype=float)
+
+
+class _FakeResult:
+    names = {0: "pessoa-sem-capacete"}
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class _FakeModel:
+    """Detects the white square in each frame."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, frames, conf=0.5, verbose=False):
+        self.batches.append(len(frames))
+        results = []
+        for frame in frames:
+            ys, xs = np.nonzero(frame[:, :, 0] == 255)
+            boxes = [_FakeBox([xs.min(), ys.min(), xs.max() + 1, ys.max() + 1])] if len(xs) else []
+            results.append(_FakeResult(boxes))
+        return results
+
+
+def _frame(x=None):
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    if x is not None:
+        frame[40:80, x:x + 40] = 255
+    return frame
+
+
+@pytest.mark.unit
+class TestFrameSampler:
+    """Test FPS limiting and frame differencing"""
+
+    def test_rate_limit(self):
+        sampler = FrameSampler(target_fps=2, diff_threshold=0)
+        accepted = [sampler.accept(_frame(i % 100), i / 10) for i in range(20)]
+        assert sum(accepted) == 4
+
+    def test_static_frames_skipped_until_keyframe(self):
+        sampler = FrameSampler(target_fps=10, diff_threshold=2.0, max_interval=5.0)
+        accepted = [sampler.accept(_frame(), float(t)) for t in range(8)]
+        assert accepted == [True, False, False, False, False, True, False, False]
+        assert sampler.accept(_frame(60), 8.0) is True
+
+
+@pytest.mark.unit
+class TestDetectionTracker:
+    """Test cross-frame deduplication"""
+
+    def test_same_object_reported_once(self):
+        tracker = DetectionTracker(iou_threshold=0.5, ttl=2.0)
+        det = lambda x: Detection("praga", 0.9, [x, 0, x + 10, 10])
+        assert len(tracker.update([det(0)], 0.0)) == 1
+        assert tracker.update([det(1)], 0.5) == []
+        assert len(tracker.update([det(50)], 1.0)) == 1
+        # Objeto sumiu por mais que o TTL: volta a ser reportado
+        assert len(tracker.update([det(1)], 5.0)) == 1
+
+
+@pytest.mark.unit
+class TestStreamDetector:
+    """Test the threaded pipeline over a folder of frames"""
+
+    def test_directory_source_end_to_end(self, tmp_path):
+        frames = tmp_path / "camera"
+        frames.mkdir()
+        # 2s de video a 25fps: objeto parado no 1o segundo, depois muda de lugar
+        for i in range(50):
+            Image.fromarray(_frame(10 if i < 25 else 100)).save(frames / f"{i:04d}.png")
+
+        cv = CVService(models_dir=tmp_path)
+        cv.model = _FakeModel()
+        emitted = []
+        detector = StreamDetector(
+            cv,
+            frames,
+            stream_id="galpao-1",
+            target_fps=5,
+            batch_size=2,
+            on_detections=lambda sid, idx, ts, dets: emitted.append((sid, idx, dets)),
+        )
+        stats = detector.run()
+
+        assert stats["status"] == "finished"
+        assert stats["frames_read"] == 50
+        assert stats["frames_inferred"] == 2
+        assert max(cv.model.batches) <= 2
+        assert [(sid, idx) for sid, idx, _ in emitted] == [("galpao-1", 0), ("galpao-1", 25)]
+
+    def test_missing_video_backend_reports_error(self, tmp_path):
+        cv = CVService(models_dir=tmp_path)
+        cv.model = _FakeModel()
+        stats = StreamDetector(cv, str(tmp_path / "nao_existe.mp4")).run()
+        assert stats["status"] == "failed"
+        assert stats["error"]
+
+
+@pytest.mark.unit
+class TestStreamRoutes:
+    """Test source validation, registry pruning and per-stream persistence"""
+
+    def test_source_limited_to_cameras_urls_and_stream_dir(self, tmp_path, monkeypatch):
+        from services.api.routes.cv import _resolve_stream_source
+
+        (tmp_path / "galpao").mkdir()
+        monkeypatch.setenv("CV_STREAM_DIR", str(tmp_path))
+        assert _resolve_stream_source("0") == "0"
+        assert _resolve_stream_source("rtsp://cam/1") == "rtsp://cam/1"
+        assert _resolve_stream_source("galpao") == str((tmp_path / "galpao").resolve())
+        for bad in ("/etc", "../", "galpao/../../etc", "nao_existe.mp4"):
+            with pytest.raises(ValueError):
+                _resolve_stream_source(bad)
+
+        monkeypatch.delenv("CV_STREAM_DIR")
+        with pytest.raises(ValueError):
+            _resolve_stream_source("galpao")
+
+    def test_finished_streams_pruned(self, monkeypatch):
+        from types import SimpleNamespace
+
+        from services.api.routes.cv import _prune_streams
+
+        monkeypatch.setenv("CV_STREAM_HISTORY", "1")
+        streams = {
+            "a": SimpleNamespace(status="finished", finished_at=1.0),
+            "b": SimpleNamespace(status="running", finished_at=None),
+            "c": SimpleNamespace(status="stopped", finished_at=2.0),
+            "d": SimpleNamespace(status="failed", finished_at=0.5),
+        }
+        _prune_streams(streams)
+        assert sorted(streams) == ["b", "c"]
+
+    def test_stream_frames_share_one_image_row(self, tmp_path):
+        from types import SimpleNamespace
+
+        from services.api.routes.cv import _stream_callback
+        from services.core.database.models import Deteccao, ImagemCV
+        from services.core.database.service import DatabaseService
+
+        db = DatabaseService(f"sqlite:///{tmp_path / 'stream.db'}")
+        db.create_tables()
+        on_detections = _stream_callback(SimpleNamespace(state=SimpleNamespace(db=db)), False, False)
+        det = Detection(class_name="pessoa-sem-capacete", confidence=0.9, bbox=[0, 0, 10, 10])
+        for index in (0, 25, 50):
+            on_detections("galpao-1", index, index / 25, [det])
+
+        with db.get_session() as session:
+            assert session.query(ImagemCV).filter_by(origem="stream").count() == 1
+            frames = [d.frame for d in session.query(Deteccao).order_by(Deteccao.frame)]
+        assert frames == [0, 25, 50]
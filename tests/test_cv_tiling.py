@@ -0,0 +1,123 @@
+"""
+Unit tests for tiled detection - Fase 6
+Tests tile windows, NMS merging and lazy reading of large images
+"""
+import numpy as np
+import pytest
+
+from services.core.cv_service.service import CVService
+from services.core.cv_service.tiling import (
+    TiledImageReader,
+    iter_tile_windows,
+    non_max_suppression,
+)
+
+
+class _FakeBox:
+    def __init__(self, cls_id, conf, xyxy):
+        self.cls = cls_id
+        self.conf = conf
+        self.xyxy = np.asarray([xyxy], dtype=float)
+
+
+class _FakeResult:
+    names = {0: "praga"}
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class _FakeModel:
+    """Detects one 'praga' wherever a tile contains white pixels."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, tiles, conf=0.5, verbose=False):
+        self.batches.append(len(tiles))
+        results = []
+        for tile in tiles:
+            ys, xs = np.nonzero(tile[:, :, 0] == 255)
+            if len(xs):
+                results.append(_FakeResult([_FakeBox(0, 0.9, [xs.min(), ys.min(), xs.max() + 1, ys.max() + 1])]))
+            else:
+                results.append(_FakeResult([]))
+        return results
+
+
+@pytest.mark.unit
+class TestTileWindows:
+    """Test window generation"""
+
+    def test_windows_cover_whole_image(self):
+        width, height = 1500, 1000
+        covered = np.zeros((height, width), dtype=bool)
+        for x1, y1, x2, y2 in iter_tile_windows(width, height, tile_size=640, overlap=0.2):
+            assert x2 - x1 <= 640 and y2 - y1 <= 640
+            covered[y1:y2, x1:x2] = True
+        assert covered.all()
+
+    def test_small_image_single_window(self):
+        assert list(iter_tile_windows(300, 200, tile_size=640)) == [(0, 0, 300, 200)]
+
+    def test_invalid_overlap(self):
+        with pytest.raises(ValueError):
+            list(iter_tile_windows(100, 100, overlap=1.0))
+
+
+@pytest.mark.unit
+class TestNonMaxSuppression:
+    """Test box merging across tiles"""
+
+    def test_overlapping_same_class_suppressed(self):
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [50, 50, 60, 60]])
+        keep = non_max_suppression(boxes, np.array([0.9, 0.8, 0.7]), np.array([0, 0, 0]))
+        assert list(keep) == [0, 2]
+
+    def test_different_classes_kept(self):
+        boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10]])
+        keep = non_max_suppression(boxes, np.array([0.9, 0.8]), np.array([0, 1]))
+        assert sorted(keep) == [0, 1]
+
+    def test_empty_input(self):
+        assert len(non_max_suppression(np.empty((0, 4)), np.empty(0), np.empty(0))) == 0
+
+
+@pytest.mark.unit
+class TestTiledDetection:
+    """Test tiled pipeline end to end with a fake model"""
+
+    def test_npy_is_memory_mapped(self, tmp_path):
+        path = tmp_path / "orto.npy"
+        np.save(path, np.zeros((100, 200, 3), dtype=np.uint8))
+        with TiledImageReader(path) as reader:
+            assert reader.size == (200, 100)
+            assert reader.read_window((10, 10, 50, 30)).shape == (20, 40, 3)
+
+    def test_undecodable_by_window_above_limit_is_rejected(self, tmp_path):
+        from PIL import Image
+
+        path = tmp_path / "orto.png"
+        Image.new("RGB", (200, 100)).save(path)
+        limit = Image.MAX_IMAGE_PIXELS
+        with TiledImageReader(path, max_decode_pixels=50_000) as reader:
+            assert reader.read_window((0, 0, 10, 10)).shape == (10, 10, 3)
+        with pytest.raises(ValueError):
+            TiledImageReader(path, max_decode_pixels=10_000).open()
+        assert Image.MAX_IMAGE_PIXELS == limit
+
+    def test_detections_in_image_space_and_deduplicated(self, tmp_path):
+        image = np.zeros((1000, 1500, 3), dtype=np.uint8)
+        # Praga na regiao de sobreposicao entre tiles (aparece em mais de um tile)
+        image[540:560, 560:580] = 255
+        path = tmp_path / "orto.npy"
+        np.save(path, image)
+
+        cv = CVService(models_dir=tmp_path)
+        cv.model = _FakeModel()
+        detections = cv.detect_tiled(path, tile_size=640, overlap=0.2, batch_size=3)
+
+        assert len(detections) == 1
+        assert detections[0].class_name == "praga"
+        assert detections[0].bbox == [560.0, 540.0, 580.0, 560.0]
+        assert max(cv.model.batches) <= 3
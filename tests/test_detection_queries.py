@@ -0,0 +1,158 @@
+"""
+Unit tests for structured detection storage - Fase 6
+Tests numeric bbox columns, image FK, R-tree region queries and schema upgrade
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.core.database.schema import parse_bbox
+from services.core.database.service import DatabaseService
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'cv.db'}")
+    service.create_tables()
+    return service
+
+
+def _det(classe, bbox, hours_ago=0, imagem="campo.png"):
+    return {
+        "timestamp": datetime.now() - timedelta(hours=hours_ago),
+        "imagem_nome": imagem,
+        "classe": classe,
+        "confianca": 0.8,
+        "bbox": bbox,
+    }
+
+
+@pytest.mark.unit
+class TestDetectionStorage:
+    """Test bbox normalisation and image linkage"""
+
+    def test_parse_bbox_accepts_legacy_strings(self):
+        assert parse_bbox("[10, 20, 5, 40]") == (5.0, 20.0, 10.0, 40.0)
+        assert parse_bbox("invalido") is None
+
+    def test_numeric_columns_and_image_fk(self, db):
+        db.bulk_create_detections([_det("praga", [0, 0, 10, 10]), _det("praga", (5, 5, 20, 20))])
+        rows = db.query_detections()
+        assert {r.bbox_x2 for r in rows} == {10.0, 20.0}
+        assert len({r.id_imagem for r in rows}) == 1 and rows[0].id_imagem is not None
+
+    def test_uploads_with_same_name_keyed_by_content(self, db):
+        db.bulk_create_detections([dict(_det("praga", [0, 0, 1, 1]), imagem_chave="sha-a", origem="upload")])
+        db.bulk_create_detections([dict(_det("praga", [0, 0, 1, 1]), imagem_chave="sha-b", origem="upload")])
+        db.create_detection(dict(_det("folha", [0, 0, 1, 1]), imagem_chave="sha-a", origem="upload"))
+        rows = db.query_detections()
+        by_class = {}
+        for r in rows:
+            by_class.setdefault(r.classe, set()).add(r.id_imagem)
+        assert len(by_class["praga"]) == 2
+        assert by_class["folha"] <= by_class["praga"]
+
+    def test_concurrent_image_insert_reuses_winner(self, db):
+        from services.core.database.models import ImagemCV
+
+        with db.get_session() as session:
+            execute = session.execute
+            raced = []
+
+            def racing_execute(stmt, *args, **kwargs):
+                result = execute(stmt, *args, **kwargs)
+                if not raced:
+                    # Outra requisicao grava a mesma imagem entre o lookup e o insert desta
+                    raced.append(True)
+                    with db.engine.begin() as other:
+                        other.execute(ImagemCV.__table__.insert().values(
+                            nome_arquivo="campo.png", origem="upload", chave="sha-a", data_registro=datetime.now()
+                        ))
+                return result
+
+            session.execute = racing_execute
+            id_imagem = db._get_or_create_image(session, "sha-a", "campo.png", "upload")
+        with db.get_session() as session:
+            assert session.query(ImagemCV.id_imagem).all() == [(id_imagem,)]
+
+
+@pytest.mark.unit
+class TestDetectionQueries:
+    """Test class/time/region filters"""
+
+    def test_class_region_and_time_filter(self, db):
+        assert db.spatial_index is True
+        db.bulk_create_detections([
+            _det("praga", [0, 0, 10, 10]),
+            _det("praga", [100, 100, 120, 120]),
+            _det("praga", [2, 2, 8, 8], hours_ago=48),
+            _det("erva-daninha", [0, 0, 10, 10]),
+        ])
+        since = datetime.now() - timedelta(hours=24)
+        rows = db.query_detections(classe="praga", since=since, region=(5, 5, 50, 50))
+        assert [(r.bbox_x1, r.bbox_y1) for r in rows] == [(0.0, 0.0)]
+
+    def test_region_filter_without_rtree(self, db):
+        db.spatial_index = False
+        db.bulk_create_detections([_det("praga", [0, 0, 10, 10]), _det("praga", [100, 100, 120, 120])])
+        assert len(db.query_detections(region=(90, 90, 200, 200))) == 1
+
+    def test_count_by_class(self, db):
+        db.bulk_create_detections([_det("praga", [0, 0, 1, 1])] * 3 + [_det("folha", [0, 0, 1, 1])])
+        assert db.count_detections_by_class() == [("praga", 3), ("folha", 1)]
+        assert db.count_detections_by_class(limit=1) == [("praga", 3)]
+
+    def test_reset_clears_rtree(self, db):
+        db.bulk_create_detections([_det("praga", [0, 0, 10, 10])])
+        db.reset_detections()
+        with db.engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT COUNT(*) FROM deteccoes_rtree").scalar() == 0
+
+
+@pytest.mark.unit
+class TestSchemaUpgrade:
+    """Test upgrading a database created before the bbox columns existed"""
+
+    def test_legacy_table_is_migrated_and_backfilled(self, tmp_path):
+        path = tmp_path / "legado.db"
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE deteccoes (id_deteccao INTEGER PRIMARY KEY, timestamp DATETIME NOT NULL, "
+            "imagem_nome VARCHAR(255) NOT NULL, classe VARCHAR(100) NOT NULL, "
+            "confianca NUMERIC(5, 2) NOT NULL, bbox VARCHAR(255))"
+        )
+        conn.execute(
+            "INSERT INTO deteccoes (timestamp, imagem_nome, classe, confianca, bbox) "
+            "VALUES ('2025-01-01 10:00:00', 'a.png', 'praga', 0.9, '[1.0, 2.0, 30.0, 40.0]')"
+        )
+        conn.commit()
+        conn.close()
+
+        db = DatabaseService(f"sqlite:///{path}")
+        db.create_tables()
+        rows = db.query_detections(region=(25, 35, 50, 50))
+        assert len(rows) == 1
+        assert (rows[0].bbox_x1, rows[0].bbox_y2) == (1.0, 40.0)
+
+    def test_legacy_image_name_constraint_dropped(self, tmp_path):
+        path = tmp_path / "legado_imagens.db"
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE imagens_cv (id_imagem INTEGER PRIMARY KEY, nome_arquivo VARCHAR(255) NOT NULL, "
+            "origem VARCHAR(50) NOT NULL, data_registro DATETIME NOT NULL, "
+            "CONSTRAINT uq_imagens_cv_nome_origem UNIQUE (nome_arquivo, origem))"
+        )
+        conn.execute(
+            "INSERT INTO imagens_cv (nome_arquivo, origem, data_registro) VALUES ('a.png', 'seed', '2025-01-01')"
+        )
+        conn.commit()
+        conn.close()
+
+        db = DatabaseService(f"sqlite:///{path}")
+        db.create_tables()
+        db.bulk_create_detections([dict(_det("praga", [0, 0, 1, 1], imagem="a.png"), origem="seed")])
+        db.bulk_create_detections([dict(_det("praga", [0, 0, 1, 1], imagem="a.png"), imagem_chave="sha", origem="seed")])
+        rows = db.query_detections()
+        assert rows[0].id_imagem != rows[1].id_imagem
+        assert 1 in {r.id_imagem for r in rows}
@@ -0,0 +1,122 @@
+"""
+Unit tests for the farm-wide planning calculator
+Tests per-crop totals, alternative scenarios, strict crop names and scale
+"""
+import time
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.api.routes.calculations import router
+from services.core.calculations.area_insumos import calculate_area_insumos
+from services.core.calculations.planning import CropCatalog, FarmTalhoes, plan_farm
+from services.core.database.models import Cultura, InsumoCultura, Talhao
+from services.core.database.service import DatabaseService
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'planning.db'}")
+    service.create_tables()
+    with service.get_session() as session:
+        milho = Cultura(nome_cultura="Milho")
+        cafe = Cultura(nome_cultura="Café")
+        arroz = Cultura(nome_cultura="Arroz")  # sem coeficientes
+        soja = Cultura(nome_cultura="Soja")  # sem insumos_cultura: coeficientes padrao
+        session.add_all([milho, cafe, arroz, soja])
+        session.flush()
+        session.add_all([
+            InsumoCultura(id_cultura=milho.id_cultura, coef_insumo_por_m2=0.07, custo_por_m2=6.0),
+            InsumoCultura(id_cultura=cafe.id_cultura, coef_insumo_por_m2=0.04, custo_por_m2=7.0),
+            Talhao(nome_talhao="T1", area_hectares=1.5, id_cultura_atual=milho.id_cultura),
+            Talhao(nome_talhao="T2", area_hectares=2.0, id_cultura_atual=milho.id_cultura),
+            Talhao(nome_talhao="T3", area_hectares=0.5, id_cultura_atual=cafe.id_cultura),
+            Talhao(nome_talhao="T4", area_hectares=1.0, id_cultura_atual=arroz.id_cultura),
+            Talhao(nome_talhao="T5", area_hectares=3.0),
+            Talhao(nome_talhao="T6", area_hectares=0.5, id_cultura_atual=soja.id_cultura),
+        ])
+    return service
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.state.db = db
+    return TestClient(app)
+
+
+@pytest.mark.unit
+class TestFarmPlanning:
+    """Test the vectorized planning endpoint"""
+
+    def test_current_totals_match_single_pricing(self, db, client):
+        response = client.post("/api/calculations/planejamento", json={"incluir_talhoes": True})
+        assert response.status_code == 200
+        atual = response.json()["cenarios"]["atual"]
+
+        milho = atual["por_cultura"]["Milho"]
+        assert milho["talhoes"] == 2 and milho["area_m2"] == 35000.0
+        assert milho["custo_estimado"] == calculate_area_insumos("Milho", 35000.0, db_service=db)["custo_estimado"]
+        assert atual["por_cultura"]["Café"]["insumo_necessario"] == 200.0
+        # Talhao sem cultura ou cultura sem coeficiente: listado, nunca precificado como Mandioca
+        assert atual["por_cultura"]["sem_coeficiente"] == {
+            "talhoes": 2, "area_m2": 40000.0, "insumo_necessario": 0.0, "custo_estimado": 0.0,
+        }
+        # Cultura cadastrada so com coeficiente padrao: mesmo preco em "atual" e nos cenarios
+        assert atual["por_cultura"]["Soja"]["custo_estimado"] == calculate_area_insumos("Soja", 5000.0)["custo_estimado"]
+        assert atual["custo_estimado"] == 35000 * 6.0 + 5000 * 7.0 + 5000 * 5.0
+        assert [t["cultura"] for t in atual["talhoes"]] == [
+            "Milho", "Milho", "Café", "sem_coeficiente", "sem_coeficiente", "Soja",
+        ]
+
+    def test_alternative_scenarios(self, client):
+        response = client.post("/api/calculations/planejamento", json={"cenarios": {
+            "tudo_soja": {"cultura": "soja"},
+            "cafe_no_t5": {"talhoes": {"5": "cafe"}},
+        }})
+        cenarios = response.json()["cenarios"]
+        assert cenarios["tudo_soja"]["por_cultura"] == {
+            "Soja": {"talhoes": 6, "area_m2": 85000.0, "insumo_necessario": 5100.0, "custo_estimado": 425000.0},
+        }
+        assert cenarios["cafe_no_t5"]["por_cultura"]["Café"]["area_m2"] == 35000.0
+        assert cenarios["cafe_no_t5"]["por_cultura"]["sem_coeficiente"]["talhoes"] == 1
+
+    def test_unknown_crop_or_talhao_is_rejected(self, client):
+        assert client.post("/api/calculations/planejamento", json={"cenarios": {"x": {"cultura": "trigo"}}}).status_code == 400
+        assert client.post("/api/calculations/planejamento", json={"cenarios": {"x": {"talhoes": {"99": "Milho"}}}}).status_code == 400
+        assert client.post("/api/calculations/planejamento", json={"cenarios": {"atual": {}}}).status_code == 400
+
+    def test_farm_without_talhoes(self, tmp_path):
+        empty = DatabaseService(f"sqlite:///{tmp_path / 'vazia.db'}")
+        empty.create_tables()
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = empty
+        client = TestClient(app)
+
+        response = client.post("/api/calculations/planejamento", json={"cenarios": {"x": {"cultura": "Milho"}}})
+        assert response.status_code == 200 and response.json()["cenarios"]["x"]["custo_estimado"] == 0.0
+        response = client.post("/api/calculations/planejamento", json={"cenarios": {"x": {"talhoes": {"1": "Milho"}}}})
+        assert response.status_code == 400
+
+    def test_thousands_of_talhoes(self):
+        catalog = CropCatalog.build()
+        rng = np.random.default_rng(7)
+        n = 20000
+        talhoes = FarmTalhoes(
+            ids=np.arange(1, n + 1),
+            nomes=[f"T{i}" for i in range(n)],
+            area_m2=rng.uniform(1000, 50000, n),
+            id_cultura=np.full(n, -1),
+        )
+        cenarios = {nome: {"cultura": nome} for nome in ["Milho", "Soja", "Mandioca", "Cafe", "Cana de Acucar"]}
+
+        start = time.perf_counter()
+        result = plan_farm(talhoes, catalog, cenarios)
+        elapsed = time.perf_counter() - start
+
+        assert result["cenarios"]["Soja"]["insumo_necessario"] == pytest.approx(talhoes.area_m2.sum() * 0.06, rel=1e-9)
+        assert elapsed < 0.5
@@ -0,0 +1,58 @@
+"""
+Unit tests for the vectorized irrigation kernel - Fase 7
+Tests parity with apply_irrigation_logic, threshold boundaries and custom limits
+"""
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from services.core.iot_gateway.irrigation_logic import (
+    IrrigationThresholds,
+    apply_irrigation_logic,
+    apply_irrigation_logic_batch,
+)
+
+
+@pytest.mark.unit
+class TestIrrigationBatch:
+    """Test that the batch kernel takes the same branch as the scalar logic"""
+
+    @given(
+        readings=st.lists(
+            st.tuples(
+                st.floats(min_value=0, max_value=100, allow_nan=False, allow_infinity=False),
+                st.floats(min_value=0, max_value=14, allow_nan=False, allow_infinity=False),
+                st.booleans(),
+                st.booleans(),
+            ),
+            min_size=1,
+            max_size=50,
+        )
+    )
+    @settings(max_examples=100, deadline=None)
+    def test_batch_matches_scalar_logic(self, readings):
+        umidade, ph, fosforo, potassio = map(list, zip(*readings))
+        batch = apply_irrigation_logic_batch(umidade, ph, fosforo, potassio)
+
+        expected = [apply_irrigation_logic(*r) for r in readings]
+        assert batch.bomba_ligada.tolist() == [e[0] for e in expected]
+        assert batch.decisions() == [e[1] for e in expected]
+
+    def test_batch_boundaries_match_scalar(self):
+        # Limites 15, 20, 30, 4.5, 5.5, 6.5 e 7.5 caem no mesmo ramo nas duas versoes
+        umidade = [14.999, 15.0, 19.999, 20.0, 30.0, 30.001, 18.0, 18.0, 18.0, 18.0]
+        ph = [6.0, 4.5, 5.5, 6.5, 7.5, 6.0, 4.4999, 7.5001, 6.0, 6.0]
+        fosforo = [True, False, True, False, True, False, True, False, False, True]
+        potassio = [False, True, True, False, True, False, True, False, True, True]
+
+        batch = apply_irrigation_logic_batch(umidade, ph, fosforo, potassio)
+        for i, reading in enumerate(zip(umidade, ph, fosforo, potassio)):
+            assert (bool(batch.bomba_ligada[i]), batch.decision(i)) == apply_irrigation_logic(*reading)
+
+    def test_custom_thresholds_match_scalar(self):
+        thresholds = IrrigationThresholds(umidade_emergencia=18.0, ph_min_seguro=5.0)
+        umidade, ph = [17.0, 19.0, 25.0], [6.0, 4.8, 6.0]
+        batch = apply_irrigation_logic_batch(umidade, ph, [True] * 3, [True] * 3, thresholds)
+        for i in range(3):
+            expected = apply_irrigation_logic(umidade[i], ph[i], True, True, thresholds)
+            assert (bool(batch.bomba_ligada[i]), batch.decision(i)) == expected
+        assert batch.decision(0) == "EMERGÊNCIA: Umidade crítica < 18%"
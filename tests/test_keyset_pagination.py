@@ -0,0 +1,162 @@
+"""
+Unit tests for keyset (cursor) pagination - Fase 7
+Tests cursor walks with tied timestamps, invalid cursors and cached table totals
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from services.core.database.models import Alert, Deteccao, LeituraSensor, Sensor, Talhao, TipoSensor
+from services.core.database.pagination import InvalidCursor, TableCounter, decode_cursor, encode_cursor
+from services.core.database.service import DatabaseService
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'pages.db'}")
+    service.create_tables()
+    with service.get_session() as session:
+        session.add(TipoSensor(id_tipo_sensor=1, nome_tipo_sensor="Umidade", unidade_medida_padrao="%"))
+        session.add(Talhao(id_talhao=1, nome_talhao="T1", area_hectares=1))
+        session.flush()
+        for id_sensor in (1, 2):
+            session.add(Sensor(id_sensor=id_sensor, identificacao_fabricante=f"S{id_sensor}",
+                               data_instalacao=date(2025, 1, 1), id_tipo_sensor=1, id_talhao=1))
+        session.flush()
+        for i in range(23):
+            session.add(LeituraSensor(
+                data_hora_leitura=START + timedelta(minutes=i), id_sensor=1 + i % 2,
+                valor_umidade=30.0, valor_ph=6.5,
+            ))
+    return service
+
+
+def _walk(fetch, limit):
+    items, cursor, pages = [], None, 0
+    while True:
+        page = fetch(limit=limit, cursor=cursor)
+        items.extend(page.items)
+        pages += 1
+        if page.next_cursor is None:
+            return items, pages
+        cursor = page.next_cursor
+
+
+@pytest.mark.unit
+class TestKeysetPagination:
+    """Test cursor walks against the offset ordering"""
+
+    def test_readings_walk_matches_offset_order(self, db):
+        items, pages = _walk(db.get_readings_page, 5)
+        expected = [r.id_leitura for r in db.get_readings(limit=100)]
+
+        assert [r.id_leitura for r in items] == expected
+        assert len(expected) == 23
+        assert pages == 5
+
+    def test_readings_filtered_by_sensor(self, db):
+        items, _ = _walk(lambda **kw: db.get_readings_page(id_sensor=2, **kw), 4)
+
+        assert len(items) == 11
+        assert {r.id_sensor for r in items} == {2}
+
+    def test_tied_timestamps_are_not_skipped_or_repeated(self, db):
+        # Deteccoes de uma mesma imagem compartilham o timestamp
+        db.bulk_create_detections([
+            {"timestamp": START + timedelta(seconds=i // 4), "imagem_nome": f"img{i // 4}.jpg",
+             "classe": "praga", "confianca": 90.0}
+            for i in range(18)
+        ])
+        for i in range(7):
+            db.create_alert({"titulo": f"A{i}", "mensagem": "m", "severidade": "media",
+                             "origem": "teste", "data_hora": START})
+
+        detections, _ = _walk(db.get_detections_page, 3)
+        alerts, _ = _walk(db.get_alerts_page, 2)
+
+        ids = [d.id_deteccao for d in detections]
+        assert len(ids) == len(set(ids)) == 18
+        keys = [(d.timestamp, d.id_deteccao) for d in detections]
+        assert keys == sorted(keys, reverse=True)
+        assert [a.id for a in alerts] == list(range(7, 0, -1))
+
+    def test_invalid_cursor(self, db):
+        with pytest.raises(InvalidCursor):
+            db.get_readings_page(cursor="nao-e-um-cursor")
+        with pytest.raises(InvalidCursor):
+            db.get_readings_page(cursor=encode_cursor([1]))
+
+    def test_cursor_round_trip(self):
+        values = [START, 42]
+        assert decode_cursor(encode_cursor(values), 2) == values
+
+
+@pytest.mark.unit
+class TestTableCounter:
+    """Test cached and estimated totals"""
+
+    def test_count_is_cached_and_invalidated_on_write(self, db):
+        assert db.counts.count(LeituraSensor) == (23, False)
+        assert db.counts.count(LeituraSensor) == (23, False)
+        assert db.counts.stats()["hits"] == 1
+
+        db.create_reading({"data_hora_leitura": START + timedelta(days=1), "id_sensor": 1})
+
+        assert db.counts.count(LeituraSensor) == (24, False)
+        assert db.counts.stats()["exact"] == 2
+
+    def test_large_tables_are_estimated(self, db):
+        counter = TableCounter(db, ttl=60, exact_threshold=10)
+        with db.get_session() as session:
+            session.query(LeituraSensor).filter(LeituraSensor.id_leitura.in_([2, 3])).delete()
+
+        # Faixa da PK e um limite superior: linhas apagadas no meio ainda contam
+        assert counter.count(LeituraSensor) == (23, True)
+        assert counter.count(Alert) == (0, False)
+        assert counter.stats()["estimated"] == 1
+
+    def test_sparse_small_table_counted_exactly(self, db):
+        counter = TableCounter(db, ttl=60, exact_threshold=10)
+        with db.get_session() as session:
+            session.query(LeituraSensor).filter(LeituraSensor.id_leitura.between(2, 20)).delete()
+
+        # 4 linhas com PK de 1 a 23: a faixa superestimaria, a contagem limitada nao
+        assert counter.count(LeituraSensor) == (4, False)
+
+
+@pytest.mark.unit
+class TestTableDataRoute:
+    """Test the generic table browser keeps primary-key order and clamps limit"""
+
+    @pytest.fixture
+    def client(self, db):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from services.api.routes.database import router
+
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = db
+        return TestClient(app)
+
+    def test_offset_and_cursor_pages_in_pk_order(self, client):
+        first = client.get("/api/database/data/leituras_sensores", params={"limit": 5}).json()
+        ids = [row["id_leitura"] for row in first["data"]]
+        assert ids == [1, 2, 3, 4, 5]
+
+        by_offset = client.get("/api/database/data/leituras_sensores", params={"limit": 5, "offset": 5}).json()
+        by_cursor = client.get(
+            "/api/database/data/leituras_sensores", params={"limit": 5, "cursor": first["next_cursor"]}
+        ).json()
+        assert [r["id_leitura"] for r in by_offset["data"]] == [6, 7, 8, 9, 10]
+        assert by_cursor["data"] == by_offset["data"]
+
+    def test_limit_is_clamped(self, client):
+        response = client.get("/api/database/data/leituras_sensores", params={"limit": 5000})
+        assert response.status_code == 200
+        assert len(response.json()["data"]) == 23
+        assert response.json()["total"] == 23 and response.json()["total_estimated"] is False
+        assert len(client.get("/api/database/data/leituras_sensores", params={"limit": 0}).json()["data"]) == 1
@@ -0,0 +1,98 @@
+"""
+Unit tests for the production cube - Fase 7
+Tests incremental maintenance by triggers, rebuild, slice/drill-down and the endpoint
+"""
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.api.routes.analytics import router
+from services.core.database.bulk_import import BulkImporter
+from services.core.database.models import Cultura, CuboProducao, ProducaoAgricola
+from services.core.database.service import DatabaseService
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'cube.db'}")
+    service.create_tables()
+    with service.get_session() as session:
+        session.add_all([Cultura(nome_cultura="Milho"), Cultura(nome_cultura="Soja")])
+        session.flush()
+        session.add_all([
+            ProducaoAgricola(id_cultura=1, quantidade_produzida=10, valor_estimado=100, area_plantada=2,
+                             data_colheita=datetime(2024, 3, 5)),
+            ProducaoAgricola(id_cultura=1, quantidade_produzida=20, valor_estimado=150, area_plantada=3,
+                             data_colheita=datetime(2024, 3, 20)),
+            ProducaoAgricola(id_cultura=1, quantidade_produzida=5, valor_estimado=40, area_plantada=1,
+                             data_colheita=datetime(2025, 1, 10)),
+            ProducaoAgricola(id_cultura=2, quantidade_produzida=8, valor_estimado=90, area_plantada=4,
+                             data_colheita=datetime(2024, 3, 1)),
+            ProducaoAgricola(id_cultura=2, quantidade_produzida=1, valor_estimado=None, area_plantada=None),
+        ])
+    return service
+
+
+def _cells(db):
+    with db.get_session() as session:
+        return sorted(
+            (c.id_cultura, c.ano, c.mes, c.registros, round(c.quantidade, 6), round(c.valor, 6), round(c.area, 6))
+            for c in session.query(CuboProducao).all()
+        )
+
+
+@pytest.mark.unit
+class TestProductionCube:
+    """Test that the cube follows the fact table and answers slices"""
+
+    def test_maintained_on_insert_update_delete(self, db):
+        assert (1, 2024, 3, 2, 30.0, 250.0, 5.0) in _cells(db)
+        assert (2, 0, 0, 1, 1.0, 0.0, 0.0) in _cells(db)
+
+        with db.get_session() as session:
+            moved = session.get(ProducaoAgricola, 2)
+            moved.data_colheita = datetime(2024, 4, 1)
+            moved.quantidade_produzida = 25
+            session.delete(session.get(ProducaoAgricola, 5))
+        BulkImporter(db).import_records("producao", [
+            {"cultura": "Soja", "area": "2", "insumo": "6", "custo_estimado": "60", "data_registro": "2024-03-02 10:00:00"},
+        ])
+
+        incremental = _cells(db)
+        assert (1, 2024, 3, 1, 10.0, 100.0, 2.0) in incremental
+        assert (1, 2024, 4, 1, 25.0, 150.0, 3.0) in incremental
+        assert not [c for c in incremental if c[1] == 0]
+        db.production_cube.rebuild()
+        assert _cells(db) == incremental
+
+    def test_slice_and_drill_down(self, db):
+        cube = db.production_cube
+        por_cultura = cube.query(["cultura"])
+        assert [l["cultura"] for l in por_cultura["linhas"]] == ["Milho", "Soja"]
+        assert por_cultura["linhas"][0] == {
+            "cultura": "Milho", "registros": 3, "quantidade": 35.0, "valor": 290.0, "area": 6.0, "produtividade": 5.8333,
+        }
+        assert por_cultura["total"]["registros"] == 5
+
+        por_mes = cube.query(["ano", "mes"], cultura="Milho", ano=2024)
+        assert por_mes["linhas"] == [
+            {"ano": 2024, "mes": 3, "registros": 2, "quantidade": 30.0, "valor": 250.0, "area": 5.0, "produtividade": 6.0},
+        ]
+        assert por_mes["filtros"] == {"cultura": "Milho", "ano": 2024}
+
+        with pytest.raises(ValueError):
+            cube.query(["talhao"])
+
+    def test_endpoint(self, db):
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = db
+        client = TestClient(app)
+
+        response = client.get("/api/analytics/producao/cubo", params={"dimensoes": "cultura,ano", "mes": 3})
+        assert response.status_code == 200
+        linhas = response.json()["linhas"]
+        assert [(l["cultura"], l["ano"], l["registros"]) for l in linhas] == [("Milho", 2024, 2), ("Soja", 2024, 1)]
+        assert client.get("/api/analytics/producao/cubo", params={"dimensoes": "x"}).status_code == 400
@@ -0,0 +1,85 @@
+"""
+Unit tests for the projection read models - Fase 7
+Tests parity with the ORM read paths, float typing and cursor pages
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from services.core.database.models import LeituraSensor, Sensor, Talhao, TipoSensor
+from services.core.database.read_models import AlertRow, ReadingRow
+from services.core.database.service import DatabaseService
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'reads.db'}")
+    service.create_tables()
+    with service.get_session() as session:
+        session.add(TipoSensor(id_tipo_sensor=1, nome_tipo_sensor="Umidade", unidade_medida_padrao="%"))
+        session.add(Talhao(id_talhao=1, nome_talhao="T1", area_hectares=1))
+        session.flush()
+        session.add(Sensor(id_sensor=1, identificacao_fabricante="S1",
+                           data_instalacao=date(2025, 1, 1), id_tipo_sensor=1, id_talhao=1))
+        session.flush()
+        for i in range(12):
+            session.add(LeituraSensor(
+                data_hora_leitura=START + timedelta(minutes=i), id_sensor=1,
+                valor_umidade=20 + i * 0.25, valor_ph=6.5, temperatura=None,
+                bomba_ligada=i % 2 == 0,
+            ))
+    return service
+
+
+@pytest.mark.unit
+class TestReadModels:
+    """Test read models against the ORM paths"""
+
+    def test_readings_match_orm_entities(self, db):
+        rows = db.reads.readings(limit=100).items
+        entities = db.get_readings(limit=100)
+
+        assert all(isinstance(r, ReadingRow) for r in rows)
+        assert [r.id_leitura for r in rows] == [e.id_leitura for e in entities]
+        for row, entity in zip(rows, entities):
+            assert type(row.valor_umidade) is float
+            assert row.valor_umidade == float(entity.valor_umidade)
+            assert row.data_hora_leitura == entity.data_hora_leitura
+            assert row.bomba_ligada == entity.bomba_ligada
+            assert row.temperatura is None
+
+    def test_cursor_pages_match_orm_pages(self, db):
+        cursor, fast, orm = None, [], []
+        while True:
+            page = db.reads.readings(limit=5, cursor=cursor)
+            orm_page = db.get_readings_page(limit=5, cursor=cursor)
+            assert page.next_cursor == orm_page.next_cursor
+            fast.extend(r.id_leitura for r in page.items)
+            orm.extend(r.id_leitura for r in orm_page.items)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        assert fast == orm
+        assert len(fast) == 12
+
+    def test_alerts_and_funcionarios(self, db):
+        for i in range(3):
+            db.create_alert({"titulo": f"A{i}", "mensagem": "m", "severidade": "alta",
+                             "origem": "teste", "data_hora": START})
+        db.create_funcionario({"nome": "Ana", "email": "ana@farmtech.com", "cargo": "Agronoma"})
+        inativo = db.create_funcionario({"nome": "Bruno", "email": "bruno@farmtech.com", "cargo": "Operador"})
+        db.update_funcionario(inativo, {"ativo": False})
+
+        alerts = db.reads.alerts(limit=10).items
+        assert all(isinstance(a, AlertRow) for a in alerts)
+        assert [a.titulo for a in alerts] == ["A2", "A1", "A0"]
+        assert [f.nome for f in db.reads.funcionarios()] == ["Ana"]
+        assert [f.nome for f in db.reads.funcionarios(apenas_ativos=False)] == ["Ana", "Bruno"]
+
+    def test_rows_are_read_only(self, db):
+        row = db.reads.readings(limit=1).items[0]
+        with pytest.raises(AttributeError):
+            row.valor_ph = 7.0
@@ -0,0 +1,65 @@
+"""
+Unit tests for the cached recipient routing table - Fase 7
+Tests severity/channel routing, local invalidation and cross-worker version stamps
+"""
+import pytest
+
+from services.core.database.models import Funcionario
+from services.core.database.service import DatabaseService
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'routing.db'}"
+
+
+@pytest.fixture
+def db(db_url):
+    service = DatabaseService(db_url)
+    service.create_tables()
+    service.create_funcionario({
+        "nome": "Ana", "email": "ana@farm.com", "telefone": "+5511999999999", "cargo": "Agronoma",
+        "recebe_sms": True, "alertas_medios": True,
+    })
+    service.create_funcionario({"nome": "Bruno", "email": "bruno@farm.com", "cargo": "Operador"})
+    return service
+
+
+@pytest.mark.unit
+class TestRecipientRoutingTable:
+    """Test routing lookups and invalidation"""
+
+    def test_routes_by_severity_and_channel(self, db):
+        critica = db.get_alert_recipients("critica")
+        assert critica.emails == ("ana@farm.com", "bruno@farm.com")
+        assert critica.phones == ("+5511999999999",)
+        assert [f.nome for f in db.get_funcionarios_for_alert("media")] == ["Ana"]
+        assert db.get_alert_recipients("baixa").funcionarios == ()
+
+    def test_lookups_do_not_rebuild(self, db):
+        for _ in range(50):
+            db.get_alert_recipients("alta")
+        assert db.recipients.stats()["builds"] == 1
+
+    def test_local_changes_invalidate_immediately(self, db):
+        db.get_alert_recipients("alta")
+        bruno = db.get_funcionarios_for_alert("alta")[1].id_funcionario
+        db.delete_funcionario(bruno)
+        assert db.get_alert_recipients("alta").emails == ("ana@farm.com",)
+
+        db.create_funcionario({"nome": "Carla", "email": "carla@farm.com", "cargo": "Gerente"})
+        assert db.get_alert_recipients("alta").emails == ("ana@farm.com", "carla@farm.com")
+
+    def test_other_worker_changes_seen_via_version(self, db, db_url):
+        worker = DatabaseService(db_url)
+        worker.recipients.check_interval = 0
+        assert len(worker.get_alert_recipients("critica").funcionarios) == 2
+        version = db.get_config_version("funcionarios")
+
+        # Alteracao direta pela ORM de outro processo (ex: seed) tambem versiona
+        with db.get_session() as session:
+            session.add(Funcionario(nome="Davi", email="davi@farm.com", cargo="Tecnico"))
+
+        assert db.get_config_version("funcionarios") == version + 1
+        assert len(worker.get_alert_recipients("critica").funcionarios) == 3
+        assert worker.recipients.stats()["builds"] == 2
@@ -0,0 +1,109 @@
+"""
+Unit tests for the API response cache - Fase 7
+Tests TTL/LRU limits, table invalidation and ETag/304 handling on endpoints
+"""
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.api.cache import ResponseCache
+from services.api.routes import alerts, calculations
+from services.core.database.models import Cultura
+from services.core.database.service import DatabaseService
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'cache.db'}")
+    service.create_tables()
+    return service
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(calculations.router, prefix="/api")
+    app.include_router(alerts.router, prefix="/api")
+    app.state.db = db
+    app.state.response_cache = ResponseCache()
+    db.add_change_listener(app.state.response_cache.invalidate)
+    return TestClient(app)
+
+
+@pytest.mark.unit
+class TestResponseCache:
+    """Test cache limits and invalidation"""
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache()
+        cache.put("a", b"{}", ttl=0.05)
+        assert cache.get("a") is not None
+        time.sleep(0.06)
+        assert cache.get("a") is None
+
+    def test_lru_limits(self):
+        cache = ResponseCache(max_entries=2, max_bytes=40)
+        cache.put("a", b"x" * 5, ttl=60)
+        cache.put("b", b"x" * 5, ttl=60)
+        cache.get("a")
+        cache.put("c", b"x" * 5, ttl=60)
+        assert cache.get("b") is None  # menos recente
+        assert cache.get("a") is not None
+
+        cache.put("d", b"x" * 10, ttl=60)  # limite de bytes
+        assert cache.stats()["bytes"] <= 40
+        cache.put("huge", b"x" * 11, ttl=60)  # maior que 1/4 do limite: nao entra
+        assert cache.get("huge") is None
+
+    def test_invalidation_by_table_and_generation(self):
+        cache = ResponseCache()
+        cache.put("leituras", b"1", ttl=60, tables={"leituras_sensores"})
+        cache.put("culturas", b"2", ttl=60, tables={"culturas"})
+
+        assert cache.invalidate({"leituras_sensores"}) == 1
+        assert cache.get("leituras") is None
+        assert cache.get("culturas") is not None
+
+        # Resposta montada antes de uma escrita nao e guardada
+        generation = cache.generation()
+        cache.invalidate({"deteccoes"})
+        cache.put("stale", b"3", ttl=60, generation=generation)
+        assert cache.get("stale") is None
+
+
+@pytest.mark.unit
+class TestCachedEndpoints:
+    """Test ETag/304 and write invalidation through the API"""
+
+    def test_etag_revalidation_and_write_invalidation(self, client, db):
+        with db.get_session() as session:
+            session.add(Cultura(nome_cultura="Milho"))
+
+        first = client.get("/api/calculations/culturas")
+        etag = first.headers["etag"]
+        assert first.status_code == 200
+        assert first.headers["cache-control"] == "no-cache"
+        assert [c["nome"] for c in first.json()["culturas"]] == ["Milho"]
+
+        revalidated = client.get("/api/calculations/culturas", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+
+        with db.get_session() as session:
+            session.add(Cultura(nome_cultura="Soja"))
+
+        changed = client.get("/api/calculations/culturas", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert len(changed.json()["culturas"]) == 2
+
+        stats = client.app.state.response_cache.stats()
+        assert (stats["hits"], stats["misses"], stats["not_modified"]) == (1, 2, 1)
+
+    def test_static_endpoint_allows_browser_reuse(self, client):
+        response = client.get("/api/alerts/actions")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "max-age=300"
+        assert response.json()["total"] == len(response.json()["actions"])
@@ -0,0 +1,100 @@
+"""
+Unit tests for API startup warm-up - Fase 6
+Tests background task registry, readiness report and CV seed skipping
+"""
+import asyncio
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from services.api.main import _seed_cv_detections
+from services.api.startup import WarmupRegistry
+from services.core.database.service import DatabaseService
+
+SAMPLES = Path(__file__).resolve().parents[1] / "models" / "cv_samples"
+
+
+@pytest.fixture
+def seed_env(tmp_path, monkeypatch):
+    images = tmp_path / "images"
+    images.mkdir()
+    for name in ("01_healthy_field.png", "02_drought_stress.png"):
+        shutil.copy(SAMPLES / name, images / name)
+    monkeypatch.setenv("CV_STATIC_IMAGES_DIR", str(images))
+    monkeypatch.setenv("CV_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("CV_SEED_MARKER", str(tmp_path / "seed.json"))
+    monkeypatch.setenv("CV_SEED_RESET", "1")
+    monkeypatch.setenv("YOLO_MODEL_PATH", str(tmp_path / "missing.pt"))
+    db = DatabaseService(f"sqlite:///{tmp_path / 'seed.db'}")
+    db.create_tables()
+    return SimpleNamespace(state=SimpleNamespace(db=db))
+
+
+@pytest.mark.unit
+class TestWarmupRegistry:
+    """Test background task tracking"""
+
+    def test_progress_and_completion(self):
+        async def scenario():
+            registry = WarmupRegistry()
+
+            def work(task):
+                task.progress(0, 3)
+                for i in range(1, 4):
+                    task.progress(i)
+                return "ok"
+
+            registry.start("job", work)
+            await registry.shutdown()
+            return registry.snapshot()
+
+        snapshot = asyncio.run(scenario())
+        assert snapshot["ready"] is True
+        assert snapshot["tasks"]["job"]["status"] == "done"
+        assert snapshot["tasks"]["job"]["done"] == 3
+        assert snapshot["tasks"]["job"]["detail"] == "ok"
+
+    def test_failure_is_reported_not_raised(self):
+        async def scenario():
+            registry = WarmupRegistry()
+            registry.start("boom", lambda task: 1 / 0)
+            await registry.shutdown()
+            return registry.snapshot()
+
+        snapshot = asyncio.run(scenario())
+        assert snapshot["ready"] is True
+        assert snapshot["tasks"]["boom"]["status"] == "failed"
+
+
+@pytest.mark.unit
+class TestCVSeed:
+    """Test seeding skip logic"""
+
+    def test_second_run_skips_when_inputs_unchanged(self, seed_env):
+        assert _seed_cv_detections(seed_env) is None
+        seeded = seed_env.state.db.count_detections()
+        assert seeded > 0
+
+        assert _seed_cv_detections(seed_env) == "signature_unchanged"
+        assert seed_env.state.db.count_detections() == seeded
+
+    def test_user_detections_survive_restart(self, seed_env):
+        db = seed_env.state.db
+        _seed_cv_detections(seed_env)
+        seeded = db.count_detections(origem="seed")
+        db.create_detection({"imagem_nome": "talhao.jpg", "classe": "praga", "confianca": 0.9, "origem": "upload"})
+        changed = []
+        db.add_change_listener(changed.append)
+
+        assert _seed_cv_detections(seed_env) == "signature_unchanged"
+        assert db.reset_detections(origem="seed") == seeded
+        assert changed == [{"deteccoes"}]
+        assert db.count_detections() == 1
+
+    def test_reseeds_when_database_differs(self, seed_env):
+        _seed_cv_detections(seed_env)
+        seed_env.state.db.reset_detections()
+        assert _seed_cv_detections(seed_env) is None
+        assert seed_env.state.db.count_detections() > 0
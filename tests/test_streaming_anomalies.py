@@ -0,0 +1,179 @@
+"""
+Unit tests for the online sensor anomaly detector - Fase 7
+Tests running statistics, stuck/flatline/spike onsets and state persistence
+"""
+import math
+import random
+import threading
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.api.routes.alerts import router as alerts_router
+from services.api.routes.iot import router as iot_router
+from services.core.alerts.service import AlertsService
+from services.core.alerts.state_engine import AlertStateEngine
+from services.core.analytics.streaming import MetricState, StreamingAnomalyDetector
+from services.core.database.service import DatabaseService
+
+START = datetime(2025, 1, 1)
+
+
+def _umidade(i: int, rng: random.Random) -> float:
+    ts = START + timedelta(minutes=15 * i)
+    return round(40 + 10 * math.sin(2 * math.pi * (ts.hour + ts.minute / 60) / 24) + rng.gauss(0, 0.8), 2)
+
+
+def _feed(detector, values, start_index=0, sensor=1):
+    found = []
+    for offset, value in enumerate(values):
+        i = start_index + offset
+        for anomaly in detector.update(sensor, {"umidade": value}, START + timedelta(minutes=15 * i)):
+            found.append((i, anomaly.kind))
+    return found
+
+
+@pytest.fixture
+def history():
+    rng = random.Random(1)
+    return [_umidade(i, rng) for i in range(1500)]
+
+
+@pytest.mark.unit
+class TestStreamingAnomalyDetector:
+    """Test the O(1) per-reading detector"""
+
+    def test_running_statistics_match_numpy(self, history):
+        detector = StreamingAnomalyDetector(metrics=("umidade",))
+        _feed(detector, history)
+        state = detector._states[("1", "umidade")]
+
+        assert state.n == len(history)
+        assert state.mean == pytest.approx(np.mean(history))
+        assert state.std == pytest.approx(np.std(history, ddof=1))
+        assert state.diff_std == pytest.approx(np.std(np.abs(np.diff(history)), ddof=1))
+
+    def test_clean_seasonal_signal_has_no_anomalies(self, history):
+        assert _feed(StreamingAnomalyDetector(metrics=("umidade",)), history) == []
+
+    def test_spike_stuck_and_flatline_onsets(self, history):
+        detector = StreamingAnomalyDetector(metrics=("umidade",))
+        _feed(detector, history)
+        n = len(history)
+
+        spike = [history[-1] + 25.0]
+        stuck = [33.33] * 30
+        flat = [40.0 + k * 0.001 for k in range(40)]
+        found = _feed(detector, spike + stuck + flat, start_index=n)
+
+        kinds = [kind for _, kind in found]
+        assert found[0] == (n, "pico")
+        assert (n + 12, "travado") in found  # 12 leituras identicas
+        assert kinds.count("travado") == 1  # so o inicio e devolvido
+        assert "sem_variacao" in kinds
+        assert {a["metrica"] for a in detector.active()} == {"umidade"}
+
+    def test_state_persisted_and_restored_warm(self, tmp_path, history):
+        db = DatabaseService(f"sqlite:///{tmp_path / 'anomalias.db'}")
+        db.create_tables()
+        detector = StreamingAnomalyDetector(db, metrics=("umidade",), persist_interval=3600)
+        _feed(detector, history)
+        assert detector.save() == 1
+
+        restored = StreamingAnomalyDetector(db, metrics=("umidade",))
+        assert restored.load() == 1
+        assert restored._states[("1", "umidade")].to_bytes() == detector._states[("1", "umidade")].to_bytes()
+        # Sem aquecimento: o primeiro pico apos o restart ja e detectado
+        assert _feed(restored, [history[-1] + 25.0], start_index=len(history)) == [(len(history), "pico")]
+
+    def test_state_with_other_layout_restarts_warmup(self):
+        assert MetricState.from_bytes(MetricState(12).to_bytes(), buckets=24).n == 0
+
+    def test_anomaly_notified_as_sensor_failure(self, history):
+        sent = []
+
+        class RecordingAlerts(AlertsService):
+            def __init__(self, state_engine=None):
+                self.state_engine = state_engine
+
+            def send_alert_notification(self, titulo, mensagem, severidade, origem, alert_type=None, dados_contexto=None):
+                sent.append((titulo, severidade, alert_type, dados_contexto["anomalia"]["tipo"]))
+                return {"status": "success"}
+
+        detector = StreamingAnomalyDetector(metrics=("umidade",))
+        _feed(detector, history)
+        anomaly = detector.update(1, {"umidade": 33.0}, START)  # longe do perfil da meia-noite
+        RecordingAlerts().send_sensor_anomaly(anomaly[0], {"umidade": 33.0})
+
+        assert sent == [("Pico Anômalo em Sensor: umidade", "media", "falha_sensor", "pico")]
+
+        # Com motor de estado, picos repetidos dentro do cooldown nao geram nova notificacao
+        sent.clear()
+        alerts = RecordingAlerts(AlertStateEngine(cooldown=timedelta(minutes=15)))
+        for minutes in (0, 5, 20):
+            alerts.send_sensor_anomaly(replace(anomaly[0], timestamp=START + timedelta(minutes=minutes)), {"umidade": 33.0})
+        assert len(sent) == 2
+
+    def test_stuck_not_flagged_during_warmup(self):
+        detector = StreamingAnomalyDetector(metrics=("umidade",), stuck_count=3, min_samples=10)
+        assert _feed(detector, [40.0] * 9) == []
+        assert _feed(detector, [40.0] * 3, start_index=9) == [(10, "travado")]
+
+    def test_ingest_route_feeds_detector(self, tmp_path):
+        db = DatabaseService(f"sqlite:///{tmp_path / 'ingest.db'}")
+        db.create_tables()
+        app = FastAPI()
+        app.include_router(iot_router, prefix="/api")
+        app.state.db = db
+        app.state.anomaly_detector = StreamingAnomalyDetector(metrics=("umidade",))
+        client = TestClient(app)
+
+        for i in range(3):
+            response = client.post("/api/iot/readings", json={
+                "id_sensor": 1, "umidade": 40.0 + i, "ph_estimado": 6.5,
+                "timestamp": (START + timedelta(minutes=15 * i)).isoformat(),
+            })
+            assert response.status_code == 200
+            assert response.json()["reading_id"] == i + 1
+        assert app.state.anomaly_detector._states[("1", "umidade")].n == 3
+
+    def test_iot_alert_route_does_not_feed_detector(self, tmp_path):
+        db = DatabaseService(f"sqlite:///{tmp_path / 'alerta.db'}")
+        db.create_tables()
+        app = FastAPI()
+        app.include_router(alerts_router, prefix="/api")
+        app.state.db = db
+        app.state.anomaly_detector = StreamingAnomalyDetector(metrics=("umidade",))
+        client = TestClient(app)
+
+        for body in ({"umidade": 10.0}, {"id_sensor": "1", "umidade": 10.0}):
+            assert client.post("/api/alerts/iot-alert", json=body).status_code == 200
+        assert app.state.anomaly_detector.counters["readings"] == 0
+
+    def test_state_saved_by_background_thread(self, tmp_path, history):
+        import time
+
+        db = DatabaseService(f"sqlite:///{tmp_path / 'persistencia.db'}")
+        db.create_tables()
+        detector = StreamingAnomalyDetector(db, metrics=("umidade",), persist_interval=3600)
+        saves = []
+        save = detector.save
+        detector.save = lambda: saves.append(threading.current_thread().name) or save()
+
+        found = _feed(detector, history + [history[-1] + 25.0])
+        assert found and saves == []  # a ingestao nao grava no proprio thread
+
+        detector.start()
+        deadline = time.monotonic() + 5
+        while not saves and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert saves == ["anomaly-persister"]  # inicio de anomalia acorda o thread
+
+        detector.stop()
+        restored = StreamingAnomalyDetector(db, metrics=("umidade",))
+        assert restored.load() == 1
@@ -0,0 +1,94 @@
+"""
+Unit tests for streaming table export - Fase 7
+Tests CSV/NDJSON/Arrow output, period filters, chunking and the export endpoint
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.api.routes.database import router
+from services.core.database.export import ExportError, TableExporter
+from services.core.database.models import LeituraSensor, Sensor, Talhao, TipoSensor
+from services.core.database.service import DatabaseService
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'export.db'}")
+    service.create_tables()
+    with service.get_session() as session:
+        session.add(TipoSensor(id_tipo_sensor=1, nome_tipo_sensor="Umidade", unidade_medida_padrao="%"))
+        session.add(Talhao(id_talhao=1, nome_talhao="T1", area_hectares=1))
+        session.flush()
+        session.add(Sensor(id_sensor=1, identificacao_fabricante="S1",
+                           data_instalacao=date(2025, 1, 1), id_tipo_sensor=1, id_talhao=1))
+        session.flush()
+        for i in range(25):
+            session.add(LeituraSensor(
+                data_hora_leitura=START + timedelta(hours=i), id_sensor=1,
+                valor_umidade=20 + i, valor_ph=6.5, decisao_logica_esp32="ok, \"sem\" irrigacao",
+            ))
+    return service
+
+
+@pytest.mark.unit
+class TestTableExporter:
+    """Test export formats and chunked streaming"""
+
+    def test_csv_round_trip_in_chunks(self, db):
+        chunks = list(TableExporter(db, chunk_size=10).stream("leituras_sensores", "csv"))
+        rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+        assert len(chunks) == 3  # 10 + 10 + 5 linhas
+        assert len(rows) == 25
+        assert rows[0]["data_hora_leitura"] == START.isoformat()
+        assert float(rows[-1]["valor_umidade"]) == 44.0
+        assert rows[0]["decisao_logica_esp32"] == "ok, \"sem\" irrigacao"
+        assert rows[0]["temperatura"] == ""
+
+    def test_ndjson_period_filter(self, db):
+        data = b"".join(TableExporter(db).stream(
+            "leituras_sensores", "ndjson", inicio=START + timedelta(hours=5), fim=START + timedelta(hours=8)
+        ))
+        records = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+        assert [r["valor_umidade"] for r in records] == [25.0, 26.0, 27.0]
+        assert records[0]["data_hora_leitura"] == (START + timedelta(hours=5)).isoformat()
+
+    def test_arrow_stream(self, db):
+        pa = pytest.importorskip("pyarrow")
+        data = b"".join(TableExporter(db, chunk_size=7).stream("leituras_sensores", "arrow"))
+        table = pa.ipc.open_stream(data).read_all()
+
+        assert table.num_rows == 25
+        assert table.column("valor_umidade").to_pylist()[:2] == [20.0, 21.0]
+
+    def test_invalid_requests(self, db):
+        exporter = TableExporter(db)
+        with pytest.raises(ExportError):
+            exporter.stream("funcionarios", "csv")
+        with pytest.raises(ExportError):
+            exporter.stream("leituras_sensores", "xlsx")
+        with pytest.raises(ExportError):
+            exporter.stream("culturas", "csv", inicio=START)
+
+    def test_export_endpoint(self, db):
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = db
+        client = TestClient(app)
+
+        response = client.get("/api/database/export/leituras_sensores?format=ndjson&fim=2025-01-01T03:00:00")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert "leituras_sensores.ndjson" in response.headers["content-disposition"]
+        assert len(response.text.splitlines()) == 3
+
+        assert client.get("/api/database/export/config_versoes").status_code == 400
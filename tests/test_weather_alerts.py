@@ -0,0 +1,176 @@
+"""
+Unit tests for forecast-driven weather alerts - Fase 7
+Tests batch rule evaluation, per-day deduplication and the refresh hook
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from services.core.alerts.dispatcher import NotificationDispatcher
+from services.core.alerts.weather import WeatherAlertScheduler, evaluate_forecasts, parse_snapshot
+from services.core.database.models import Alert, AlertaPrevisao, NotificacaoOutbox
+from services.core.database.service import DatabaseService
+from services.core.weather.service import WeatherService
+
+TODAY = date.today()
+
+
+def _forecast(nome, *days):
+    return {
+        "city": nome,
+        "state": "SP",
+        "forecasts": [
+            {"dia": (TODAY + timedelta(days=offset)).isoformat(), "tempo": tempo, "maxima": "25", "minima": str(minima)}
+            for offset, tempo, minima in days
+        ],
+    }
+
+
+FORECASTS = {
+    "241": _forecast("Sao Paulo", (-1, "t", 15), (0, "t", 15), (1, "pn", 1), (2, "c", 12), (3, "t", 12)),
+    "227": _forecast("Campinas", (0, "cl", 10), (1, "ps", 9), (2, "cl", 8), (3, "c", 8)),
+}
+
+
+class FakeCPTEC:
+    """Client with the CPTECClient.fetch contract, serving fixed forecasts."""
+
+    def __init__(self, forecasts):
+        self.forecasts = forecasts
+        self.calls = 0
+
+    def fetch(self, city_code=None):
+        self.calls += 1
+        return self.forecasts[city_code]
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'weather_alerts.db'}")
+    service.create_tables()
+    return service
+
+
+def _kinds(alerts):
+    return sorted((a.city_code, a.dia, a.tipo_alerta) for a in alerts)
+
+
+@pytest.mark.unit
+class TestEvaluateForecasts:
+    """Test the vectorized rules over cities x days"""
+
+    def test_rules_within_horizon(self):
+        now = datetime.utcnow()
+        parsed = [parse_snapshot(code, data, now) for code, data in FORECASTS.items()]
+        alerts = evaluate_forecasts(parsed, TODAY, horizon_days=3, frost_temp=2.0, dry_days=3)
+
+        assert _kinds(alerts) == [
+            ("227", TODAY, "seca"),
+            ("241", TODAY, "chuva_forte"),
+            ("241", TODAY + timedelta(days=1), "geada"),
+            ("241", TODAY + timedelta(days=2), "chuva_forte"),
+        ]
+        geada = next(a for a in alerts if a.tipo_alerta == "geada")
+        assert geada.minima == 1.0 and "1.0°C" in geada.detalhe
+        seca = next(a for a in alerts if a.tipo_alerta == "seca")
+        assert seca.dias_secos == 3 and seca.cidade == "Campinas"
+
+    def test_short_or_missing_forecasts(self):
+        now = datetime.utcnow()
+        parsed = [
+            parse_snapshot("1", _forecast("Curta", (0, "cl", 10), (1, "cl", 10)), now),
+            parse_snapshot("2", {"city": "Vazia", "forecasts": []}, now),
+            parse_snapshot("3", _forecast("Sem minima", (0, "ps", "")), now),
+        ]
+        assert evaluate_forecasts(parsed, TODAY, dry_days=3) == []
+
+
+@pytest.mark.unit
+class TestWeatherAlertScheduler:
+    """Test dedup per (city, day, type) and the WeatherService refresh hook"""
+
+    def test_run_sends_once_per_forecast_day(self, db, fake_aws):
+        weather = WeatherService(FakeCPTEC(FORECASTS), city_codes=["241", "227"])
+        weather.refresh()
+        db.create_funcionario({"nome": "Ana", "email": "ana@farm.com", "cargo": "Agronoma", "alertas_medios": True})
+        dispatcher = NotificationDispatcher(db, fake_aws())
+        scheduler = WeatherAlertScheduler(db, weather, dispatcher.aws, dispatcher)
+
+        sent = scheduler.run(today=TODAY)
+        assert len(sent) == 4
+        assert scheduler.run(today=TODAY) == []
+        assert scheduler.counters["duplicates"] == 4
+        assert scheduler.counters["parsed"] == 2
+
+        # Novo dia: so o que ainda nao foi emitido
+        sent = scheduler.run(today=TODAY + timedelta(days=1))
+        assert _kinds(sent) == [
+            ("227", TODAY + timedelta(days=3), "chuva_forte"),
+            ("241", TODAY + timedelta(days=3), "chuva_forte"),
+        ]
+        with db.get_session() as session:
+            assert session.query(AlertaPrevisao).count() == 6
+            assert session.query(Alert).filter(Alert.titulo.like("Alerta de Geada%")).count() == 1
+            assert session.query(Alert).count() == 6
+            assert session.query(NotificacaoOutbox).count() == 6
+        dispatcher.stop()
+
+    def test_attached_to_refresh(self, db):
+        client = FakeCPTEC(FORECASTS)
+        weather = WeatherService(client, city_codes=["241", "227"])
+        scheduler = WeatherAlertScheduler(db, weather, horizon_days=7).attach()
+
+        weather.refresh()
+        weather.refresh()
+        assert client.calls == 4
+        assert scheduler.counters["runs"] == 2
+        assert scheduler.counters["parsed"] == 4
+        assert scheduler.counters["sent"] == 6
+        assert scheduler.counters["duplicates"] == 6
+        with db.get_session() as session:
+            assert session.query(AlertaPrevisao).count() == scheduler.counters["sent"]
+
+    def test_failed_delivery_releases_reservation(self, db, fake_aws):
+        class FlakyAWS(fake_aws):
+            def __init__(self):
+                super().__init__()
+                self.down = True
+
+            def send_combined_alert(self, title, message, severity, emails, phones, recommended_action=None):
+                if self.down:
+                    raise ConnectionError("SES indisponivel")
+                return {"email_ids": [f"msg-{title}" for _ in emails], "sms_ids": []}
+
+        weather = WeatherService(FakeCPTEC(FORECASTS), city_codes=["241", "227"])
+        weather.refresh()
+        db.create_funcionario({"nome": "Ana", "email": "ana@farm.com", "cargo": "Agronoma", "alertas_medios": True})
+        aws = FlakyAWS()
+        scheduler = WeatherAlertScheduler(db, weather, aws)
+
+        assert scheduler.run(today=TODAY) == []
+        assert scheduler.counters["released"] == 4
+        with db.get_session() as session:
+            assert session.query(AlertaPrevisao).count() == 0
+
+        aws.down = False
+        assert len(scheduler.run(today=TODAY)) == 4
+        with db.get_session() as session:
+            assert session.query(AlertaPrevisao).count() == 4
+
+    def test_ongoing_dry_spell_alerts_once_per_cooldown(self, db):
+        def dry_from(offset):
+            return {"227": _forecast("Campinas", *[(offset + d, "cl", 10) for d in range(4)])}
+
+        cptec = FakeCPTEC(dry_from(0))
+        weather = WeatherService(cptec, city_codes=["227"])
+        scheduler = WeatherAlertScheduler(db, weather, dry_cooldown_days=7)
+
+        sent = []
+        for day in range(9):
+            cptec.forecasts = dry_from(day)
+            weather.refresh()
+            sent += scheduler.run(today=TODAY + timedelta(days=day))
+        # Estiagem continua: um alerta no inicio e um lembrete apos o cooldown
+        assert [(a.tipo_alerta, a.dia) for a in sent] == [
+            ("seca", TODAY), ("seca", TODAY + timedelta(days=7)),
+        ]
@@ -0,0 +1,120 @@
+"""
+Unit tests for the background weather service - Fase 7
+Tests refresh against a local CPTEC stub, last-good snapshots and disk reload
+"""
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.core.weather.cptec_client import CPTECClient, build_session
+from services.core.weather.service import WeatherService
+
+XML = """<?xml version="1.0" encoding="ISO-8859-1"?>
+<cidade><nome>{nome}</nome><uf>SP</uf><atualizacao>2025-01-01</atualizacao>
+<previsao><dia>2025-01-02</dia><tempo>c</tempo><maxima>31</maxima><minima>19</minima><iuv>11</iuv></previsao>
+<previsao><dia>2025-01-03</dia><tempo>pc</tempo><maxima>29</maxima><minima>18</minima><iuv>9</iuv></previsao>
+</cidade>"""
+
+CITIES = {"241": "Sao Paulo", "227": "Campinas"}
+
+
+class _StubCPTEC(BaseHTTPRequestHandler):
+    failing = False
+    delay = 0.0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        code = self.path.split("/")[-2]
+        if self.failing or code not in CITIES:
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = XML.format(nome=CITIES[code]).encode("iso-8859-1")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    handler = type("Handler", (_StubCPTEC,), {"failing": False, "delay": 0.0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield handler, f"http://127.0.0.1:{server.server_port}/XML/cidade/{{code}}/previsao.xml"
+    server.shutdown()
+    server.server_close()
+
+
+def _service(base_url, tmp_path, **kwargs):
+    client = CPTECClient(base_url=base_url, session=build_session(retries=0), timeout=2)
+    return WeatherService(client, city_codes=["241", "227"], snapshot_path=tmp_path / "weather.json", **kwargs)
+
+
+@pytest.mark.unit
+class TestWeatherService:
+    """Test refresh, staleness and persistence"""
+
+    def test_refresh_multiple_cities(self, stub, tmp_path):
+        _, base_url = stub
+        service = _service(base_url, tmp_path)
+
+        assert service.get()["error"] == "weather_unavailable"
+        assert service.refresh() == 2
+
+        sp = service.get()
+        assert sp["city"] == "Sao Paulo"
+        assert sp["forecasts"][0] == {"dia": "2025-01-02", "tempo": "c", "maxima": "31", "minima": "19"}
+        assert sp["stale"] is False
+        assert service.get("227")["city"] == "Campinas"
+        with pytest.raises(KeyError):
+            service.get("999")
+
+    def test_failure_keeps_last_good_snapshot(self, stub, tmp_path):
+        handler, base_url = stub
+        service = _service(base_url, tmp_path, stale_after=60)
+        service.refresh()
+
+        handler.failing = True
+        assert service.refresh() == 0
+        payload = service.get()
+        assert payload["city"] == "Sao Paulo"
+        assert "500" in payload["last_error"]
+        assert service.stats()["failures"] == 2
+
+        # Idade acima do limite: continua servindo, marcado como stale
+        service._snapshots["241"].fetched_at -= timedelta(minutes=5)
+        assert service.get()["stale"] is True
+
+    def test_snapshot_survives_restart_without_network(self, stub, tmp_path):
+        handler, base_url = stub
+        _service(base_url, tmp_path).refresh()
+
+        handler.failing = True
+        restarted = _service(base_url, tmp_path)
+        assert restarted.load() == 2
+        assert restarted.get("227")["city"] == "Campinas"
+        assert restarted.get("227")["fetched_at"] is not None
+
+    def test_background_refresh_never_blocks_reads(self, stub, tmp_path):
+        handler, base_url = stub
+        handler.delay = 0.5
+        service = _service(base_url, tmp_path, refresh_interval=60).start()
+        try:
+            start = time.monotonic()
+            assert service.get()["error"] == "weather_unavailable"
+            assert time.monotonic() - start < 0.1
+            deadline = time.monotonic() + 5
+            while service.get()["fetched_at"] is None and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert service.get()["city"] == "Sao Paulo"
+        finally:
+            service.stop()
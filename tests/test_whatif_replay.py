@@ -0,0 +1,168 @@
+"""
+Unit tests for the what-if history replay - Fase 7
+Tests chunked replay parity, hysteresis alert counting and result caching
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from services.core.alerts.rules import RuleEngine
+from services.core.alerts.service import AlertsService
+from services.core.database.models import LeituraSensor, Sensor, Talhao, TipoSensor
+from services.core.database.service import DatabaseService
+from services.core.iot_gateway.irrigation_logic import IrrigationThresholds, apply_irrigation_logic
+from services.core.iot_gateway.replay import ReplayScenario, WhatIfReplay
+
+START = datetime(2025, 1, 1)
+STEP = timedelta(minutes=10)
+UMIDADE = [10.0, 12.0, 16.0, 11.0, 20.0, 9.0, 17.0, 25.0, 35.0, 18.0, 14.0, 19.0]
+PH = 7.0  # fora da faixa ideal: so a emergencia liga a bomba
+
+
+@pytest.fixture
+def db(tmp_path):
+    service = DatabaseService(f"sqlite:///{tmp_path / 'replay.db'}")
+    service.create_tables()
+    with service.get_session() as session:
+        session.add(TipoSensor(id_tipo_sensor=1, nome_tipo_sensor="Umidade", unidade_medida_padrao="%"))
+        session.add(Talhao(id_talhao=1, nome_talhao="T1", area_hectares=1))
+        session.flush()
+        for id_sensor in (1, 2):
+            session.add(Sensor(id_sensor=id_sensor, identificacao_fabricante=f"S{id_sensor}",
+                               data_instalacao=date(2025, 1, 1), id_tipo_sensor=1, id_talhao=1))
+        session.flush()
+        for id_sensor in (1, 2):
+            for i, umidade in enumerate(UMIDADE):
+                session.add(LeituraSensor(
+                    # data_hora_leitura e unica na tabela: sensor 2 um segundo depois
+                    data_hora_leitura=START + i * STEP + timedelta(seconds=id_sensor - 1),
+                    id_sensor=id_sensor, valor_umidade=umidade, valor_ph=PH,
+                    valor_fosforo_p=1.0, valor_potassio_k=0.0, temperatura=25.0,
+                ))
+    return service
+
+
+def _expected_pump_hours(umidade, thresholds_kwargs=None):
+    """Bomba fica no estado de cada leitura ate a seguinte"""
+    if thresholds_kwargs:
+        limit = thresholds_kwargs["umidade_emergencia"]
+        flags = [u < limit or apply_irrigation_logic(u, PH, True, False)[0] for u in umidade]
+    else:
+        flags = [apply_irrigation_logic(u, PH, True, False)[0] for u in umidade]
+    return sum(flags[:-1]) * STEP.total_seconds() / 3600
+
+
+@pytest.mark.unit
+class TestWhatIfReplay:
+    """Test replay totals, deltas and caching"""
+
+    def test_chunked_replay_matches_scalar_logic(self, db):
+        fim = START + timedelta(days=1)
+        small = WhatIfReplay(db, chunk_size=5, max_workers=2).compare(
+            ReplayScenario(), ReplayScenario(), START, fim
+        )
+        single = WhatIfReplay(db, chunk_size=10_000, max_workers=1).compare(
+            ReplayScenario(), ReplayScenario(), START, fim
+        )
+
+        expected = 2 * _expected_pump_hours(UMIDADE)
+        assert small["leituras"] == 2 * len(UMIDADE)
+        assert small["baseline"]["horas_bomba"] == pytest.approx(expected, abs=1e-3)
+        assert small["baseline"] == single["baseline"]
+        assert small["delta"]["custo"] == 0
+
+    def test_higher_emergency_threshold_increases_water_use(self, db):
+        scenario = ReplayScenario(thresholds=IrrigationThresholds(umidade_emergencia=18.0))
+        result = WhatIfReplay(db, chunk_size=4).compare(
+            ReplayScenario(), scenario, START, START + timedelta(days=1), sensor_ids=[1]
+        )
+
+        expected = _expected_pump_hours(UMIDADE, {"umidade_emergencia": 18.0})
+        assert result["cenario"]["horas_bomba"] == pytest.approx(expected, abs=1e-3)
+        assert result["delta"]["horas_bomba"] > 0
+        assert result["delta"]["agua_m3"] == pytest.approx(result["delta"]["horas_bomba"], abs=1e-3)
+        assert result["cenario"]["decisoes"]["emergencia"] > result["baseline"]["decisoes"]["emergencia"]
+
+    def test_emergency_follows_umidade_critica_baixa_rule(self, db):
+        # Como na ingestao: limites_alerta do cenario tambem movem a emergencia da bomba
+        explicit = ReplayScenario(thresholds=IrrigationThresholds(umidade_emergencia=18.0))
+        via_rule = ReplayScenario(alert_limits={"umidade_critica_baixa": 18.0})
+        replay = WhatIfReplay(db)
+        args = (START, START + timedelta(days=1))
+        assert replay.compare(ReplayScenario(), via_rule, *args)["cenario"]["horas_bomba"] == \
+            replay.compare(ReplayScenario(), explicit, *args)["cenario"]["horas_bomba"]
+
+        # Regra editada: o baseline ("atual") acompanha
+        engine = RuleEngine(db, check_interval=0)
+        engine.ensure_defaults(AlertsService.default_conditions())
+        regra = next(r for r in db.get_regras_alerta() if r.tipo_alerta == "umidade_critica_baixa")
+        db.update_regra_alerta(regra.id_regra, {"limite": 18.0})
+        result = WhatIfReplay(db, rule_engine=engine).compare(ReplayScenario(), ReplayScenario(), *args, sensor_ids=[1])
+        assert result["baseline"]["horas_bomba"] == pytest.approx(
+            _expected_pump_hours(UMIDADE, {"umidade_emergencia": 18.0}), abs=1e-3
+        )
+
+    def test_alert_counts_respect_hysteresis_across_chunks(self, db):
+        # Limite 15, margem 2: abre em 10, 16 nao normaliza, 20 normaliza, reabre em 9 e em 14
+        result = WhatIfReplay(db, chunk_size=3).compare(
+            ReplayScenario(), ReplayScenario(alert_limits={"umidade_critica_baixa": 10.0}),
+            START, START + timedelta(days=1), sensor_ids=[1],
+        )
+        assert result["baseline"]["alertas"] == {"umidade_critica_baixa": 3}
+        assert result["cenario"]["alertas"] == {"umidade_critica_baixa": 1}
+        assert result["delta"]["alertas"] == {"umidade_critica_baixa": -2}
+
+    def test_results_cached_until_data_or_rules_change(self, db):
+        engine = RuleEngine(db, check_interval=0)
+        engine.ensure_defaults(AlertsService.default_conditions())
+        replay = WhatIfReplay(db, rule_engine=engine)
+        args = (ReplayScenario(), ReplayScenario(), START, START + timedelta(days=1))
+
+        assert replay.compare(*args)["cached"] is False
+        assert replay.compare(*args)["cached"] is True
+
+        db.create_regra_alerta({
+            "tipo_alerta": "umidade_critica_baixa", "metrica": "umidade", "direcao": "below", "limite": 30.0,
+            "severidade": "critica", "titulo": "T1 seco", "mensagem": "{valor}", "id_talhao": 1,
+        })
+        changed = replay.compare(*args)
+        assert changed["cached"] is False
+        # Regra do talhao (30%, sem margem) vale para os dois sensores: abre no inicio e reabre em 18
+        assert changed["baseline"]["alertas"]["umidade_critica_baixa"] == 4
+
+        with db.get_session() as session:
+            session.add(LeituraSensor(data_hora_leitura=START + 12 * STEP, id_sensor=1, valor_umidade=5.0))
+        assert replay.compare(*args)["leituras"] == 2 * len(UMIDADE) + 1
+        assert replay.compare(*args)["cached"] is True
+
+        # Correcao de valor sem nova leitura tambem invalida o resultado
+        with db.get_session() as session:
+            session.query(LeituraSensor).filter_by(id_sensor=2, valor_umidade=35.0).one().valor_umidade = 5.0
+        corrected = replay.compare(*args)
+        assert corrected["cached"] is False
+
+    def test_default_period_is_cached(self, db):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from services.api.routes.ml import router
+
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.db = db
+        client = TestClient(app)
+        assert client.post("/api/ml/whatif/replay", json={}).json()["cached"] is False
+        assert client.post("/api/ml/whatif/replay", json={}).json()["cached"] is True
+
+        response = client.post("/api/ml/whatif/replay", json={
+            "inicio": START.isoformat(), "fim": (START + timedelta(days=1)).isoformat(),
+            "limites_irrigacao": {"umidade_emergencia": 18.0},
+        })
+        assert response.json()["delta"]["horas_bomba"] > 0
+        assert client.post("/api/ml/whatif/replay", json={"limites_irrigacao": {"x": 1}}).status_code == 400
+
+    def test_unknown_alert_type_rejected(self, db):
+        with pytest.raises(ValueError):
+            WhatIfReplay(db).compare(
+                ReplayScenario(), ReplayScenario(alert_limits={"granizo": 1.0}), START, START + timedelta(days=1)
+            )